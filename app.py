@@ -3,81 +3,285 @@
 Streamlitアプリケーション
 """
 
+import logging
+import os
+
+import numpy as np
 import streamlit as st
 import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import math
-
-# =============================================================================
-# 物性値テーブル（水、標準大気圧、15-40度）
-# =============================================================================
-WATER_PROPERTIES = {
-    # 温度: (動粘度 m²/s, 熱伝導率 W/m·K, プラントル数, 密度 kg/m³, 比熱 J/kg·K)
-    15: (1.139e-6, 0.589, 8.09, 999.1, 4186),
-    20: (1.004e-6, 0.598, 7.01, 998.2, 4182),
-    25: (0.893e-6, 0.607, 6.13, 997.0, 4179),
-    30: (0.801e-6, 0.615, 5.42, 995.6, 4178),
-    35: (0.726e-6, 0.623, 4.83, 994.0, 4178),
-    40: (0.658e-6, 0.631, 4.32, 992.2, 4179),
-}
 
-def get_water_properties(temp):
+from calculations.engine import (
+    ENGINE_VERSION,
+    calculate_cached,
+    configure_result_store,
+    normalize_inputs,
+)
+from calculations.montecarlo import default_uncertainty, monte_carlo
+from calculations.sensitivity import (
+    DEFAULT_FACTORS,
+    DEFAULT_TORNADO_TEMP_DELTA,
+    TORNADO_TEMP_FIELDS,
+    ranked,
+    sobol_indices,
+    tornado,
+)
+from calculations.prefetch import Prefetcher
+from calculations.properties import get_water_properties
+from calculations.surface import live_estimate
+from calculations.sweep import SweepGrid, iter_sweep, sweep_frame
+from calculations.warmup import WarmUp
+from utils.admission import (
+    PRIORITY_BATCH,
+    PRIORITY_COMPARISON,
+    PRIORITY_INTERACTIVE,
+    AdmissionController,
+)
+from utils.cache import input_hash
+from utils.jobs import JOB_CANCELLED, JOB_DONE, JOB_FAILED, JobExecutor
+from utils.result_store import ResultStore
+from utils.usage_log import UsageLog
+
+# 事前計算の所要時間などをサーバーのログに出力する
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# 計算結果の永続キャッシュの保存先（環境変数で変更、空文字で無効化）
+RESULT_STORE_PATH = os.environ.get(
+    "GEOTHERMAL_RESULT_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "results.sqlite3")
+)
+
+# 計算条件の利用ログの保存先（環境変数で変更、空文字で無効化）
+USAGE_LOG_PATH = os.environ.get(
+    "GEOTHERMAL_USAGE_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "usage.jsonl")
+)
+
+# サーバー起動時に事前計算する計算条件のファイル（JSON、省略可）
+WARMUP_FILE = os.environ.get("GEOTHERMAL_WARMUP_FILE", "")
+
+
+@st.cache_resource
+def init_result_store():
     """
-    指定温度における水の物性値を返す（バルク温度法：入口温度基準）
+    計算結果の永続キャッシュを設定する（サーバー起動時に1回だけ実行）
 
-    Parameters:
-        temp: 温度（度C）
+    Returns:
+        ResultStore: 永続キャッシュ（無効化されている場合は None）
+    """
+    store = ResultStore(RESULT_STORE_PATH, ENGINE_VERSION) if RESULT_STORE_PATH else None
+    configure_result_store(store)
+    return store
+
+
+@st.cache_resource
+def init_prefetcher():
+    """
+    近傍条件の先読み計算を開始する（サーバー起動時に1回だけ実行）
 
     Returns:
-        dict: kinematic_viscosity, thermal_conductivity, prandtl, density, specific_heat
+        Prefetcher: 先読み計算（全セッションで共有、受付制御を通して実行する）
     """
-    # 温度範囲の境界処理
-    if temp <= 15:
-        props = WATER_PROPERTIES[15]
-        return {
-            'kinematic_viscosity': props[0],
-            'thermal_conductivity': props[1],
-            'prandtl': props[2],
-            'density': props[3],
-            'specific_heat': props[4]
-        }
-    elif temp >= 40:
-        props = WATER_PROPERTIES[40]
-        return {
-            'kinematic_viscosity': props[0],
-            'thermal_conductivity': props[1],
-            'prandtl': props[2],
-            'density': props[3],
-            'specific_heat': props[4]
-        }
-
-    # 線形補間のための温度区間を特定
-    temps = sorted(WATER_PROPERTIES.keys())
-    for i in range(len(temps) - 1):
-        t_low, t_high = temps[i], temps[i + 1]
-        if t_low < temp <= t_high:
-            t_ratio = (temp - t_low) / (t_high - t_low)
-            props_low = WATER_PROPERTIES[t_low]
-            props_high = WATER_PROPERTIES[t_high]
-
-            return {
-                'kinematic_viscosity': props_low[0] + (props_high[0] - props_low[0]) * t_ratio,
-                'thermal_conductivity': props_low[1] + (props_high[1] - props_low[1]) * t_ratio,
-                'prandtl': props_low[2] + (props_high[2] - props_low[2]) * t_ratio,
-                'density': props_low[3] + (props_high[3] - props_low[3]) * t_ratio,
-                'specific_heat': props_low[4] + (props_high[4] - props_low[4]) * t_ratio
-            }
+    return Prefetcher(admission=init_admission())
 
-    # フォールバック（通常は到達しない）
-    props = WATER_PROPERTIES[20]
-    return {
-        'kinematic_viscosity': props[0],
-        'thermal_conductivity': props[1],
-        'prandtl': props[2],
-        'density': props[3],
-        'specific_heat': props[4]
-    }
+
+@st.cache_resource
+def init_usage_log():
+    """
+    計算条件の利用ログを開く（サーバー起動時に1回だけ実行）
+
+    Returns:
+        UsageLog: 利用ログ（無効化されている場合は None）
+    """
+    return UsageLog(USAGE_LOG_PATH) if USAGE_LOG_PATH else None
+
+
+@st.cache_resource
+def init_warm_up():
+    """
+    既定の計算条件とよく使われる計算条件の事前計算を開始する（サーバー起動時に1回だけ実行）
+
+    事前計算は受付制御を通し、利用者の計算より低い優先度で実行する。
+
+    Returns:
+        WarmUp: 事前計算（完了後は report に所要時間などを保持）
+    """
+    return WarmUp(scenarios_file=WARMUP_FILE, usage_log=init_usage_log(), admission=init_admission()).start()
+
+
+@st.cache_resource
+def init_job_executor():
+    """
+    バックグラウンドジョブの実行環境を作成する（サーバー起動時に1回だけ実行）
+
+    Returns:
+        JobExecutor: ジョブの実行環境（全セッションで共有）
+    """
+    return JobExecutor()
+
+
+@st.cache_resource
+def init_admission():
+    """
+    計算の受付制御を作成する（サーバー起動時に1回だけ実行）
+
+    Returns:
+        AdmissionController: 受付制御（全セッションで共有）
+    """
+    return AdmissionController()
+
+
+def current_session_id():
+    """現在のセッションの識別子を返す"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+
+def sweep_job(job, grid, session_id):
+    """パラメータスイープのジョブ（チャンクごとに受付を通し、進捗と途中結果を報告する）"""
+    chunks = iter_sweep(grid)
+    values = None
+    while True:
+        with admission.admit(session_id, PRIORITY_BATCH):
+            step = next(chunks, None)
+        if step is None:
+            return values
+        done, values = step
+        job.report(done, len(grid), values[:done])
+
+
+# パラメータスイープの対象（表示名: (条件名, 最小値, 最大値)）- 入力欄の範囲と同じ
+SWEEP_PARAMETERS = {
+    "流量 [L/min]": ("flow_rate", 20.0, 100.0),
+    "管浸水距離 [m]": ("pipe_length", 1.0, 30.0),
+    "入口温度 [℃]": ("initial_temp", 20.0, 40.0),
+    "地下水温度 [℃]": ("ground_temp", 0.0, 20.0),
+    "管外側熱伝達係数 [W/m²·K]": ("h_outer", 50.0, 500.0),
+}
+
+# ジョブの進捗を確認する間隔 [s]
+JOB_POLL_INTERVAL = 0.5
+
+# 不確実性解析の標本数の選択肢
+MC_SAMPLE_OPTIONS = (10000, 100000, 1000000)
+
+# 時系列計算（1件ずつ計算）の不確実性解析の標本数の上限
+MC_TIME_STEPPED_SAMPLES = 2000
+
+# 複数配管比較の不確実性解析の管径あたりの標本数
+MULTI_MC_SAMPLES = 20000
+
+# 感度解析の対象とする計算条件の表示名
+SOBOL_FACTOR_LABELS = {
+    'pipe_length': "管浸水距離",
+    'pipe_diameter': "管径",
+    'h_outer': "管外側熱伝達係数",
+    'flow_rate': "総流量",
+    'num_pipes': "配管セット本数",
+}
+
+# 感度解析の基本標本数の選択肢（計算件数は ×（条件数 + 2））
+SOBOL_SAMPLE_OPTIONS = (2 ** 14, 2 ** 17, 2 ** 20)
+
+# 時系列計算（1件ずつ計算）の感度解析の基本標本数の上限
+SOBOL_TIME_STEPPED_SAMPLES = 256
+
+# トルネード図で変化させる計算条件の表示名
+TORNADO_FIELD_LABELS = {
+    'initial_temp': "入口温度",
+    'ground_temp': "地下水温度",
+    'flow_rate': "総流量",
+    'pipe_length': "管浸水距離",
+    'h_outer': "管外側熱伝達係数",
+}
+
+# 感度解析の対象とする計算結果の項目
+SOBOL_OUTPUTS = {
+    "出口温度": 'final_temp',
+    "熱交換量": 'heat_exchange_rate',
+    "地下水温度上昇": 'groundwater_temp_rise',
+}
+
+
+def uncertainty_band_chart(sketch, summary, target_temp):
+    """出口温度の累積分布と P10〜P90 の範囲のグラフを作成する"""
+    temps = np.linspace(summary['min'], summary['max'], 200)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=temps, y=sketch.cdf(temps) * 100, mode='lines',
+                             name='累積確率', line=dict(color='blue', width=2)))
+    fig.add_vrect(x0=summary[0.1], x1=summary[0.9], fillcolor='blue', opacity=0.1, line_width=0,
+                  annotation_text="P10〜P90", annotation_position="top left")
+    fig.add_vline(x=summary[0.5], line_dash="dash", line_color="blue",
+                  annotation_text=f"P50 {summary[0.5]:.1f}℃", annotation_position="bottom right")
+    fig.add_vline(x=target_temp, line_dash="dot", line_color="gray",
+                  annotation_text=f"目標温度 {target_temp}℃", annotation_position="top right")
+    fig.update_layout(xaxis_title="出口温度（℃）", yaxis_title="累積確率（%）", height=350, showlegend=False)
+    return fig
+
+
+def tornado_field_label(result, name):
+    """トルネード図の条件名（変化幅を併記する）"""
+    if name in TORNADO_TEMP_FIELDS:
+        return f"{TORNADO_FIELD_LABELS[name]}（±{result['temp_delta']:g}℃）"
+    return f"{TORNADO_FIELD_LABELS[name]}（±{result['fraction'] * 100:g}%）"
+
+
+def tornado_chart(result, outputs):
+    """
+    各条件を ±X%（温度は ±ΔT℃）変化させたときの計算結果のトルネード図を作成する
+
+    Parameters:
+        result: tornado の戻り値
+        outputs: (計算結果の項目, 表示名) の list（項目ごとに横に並べる）
+    """
+    fig = make_subplots(rows=1, cols=len(outputs), subplot_titles=[label for _, label in outputs],
+                        horizontal_spacing=0.2)
+    for col, (output, label) in enumerate(outputs, start=1):
+        base = result['base'][output]
+        # 横棒グラフは下から描くため、影響の小さい順に並べる
+        rows = result['effects'][output][::-1]
+        names = [tornado_field_label(result, name) for name, _, _ in rows]
+        fig.add_trace(go.Bar(y=names, x=[low - base for _, low, _ in rows], base=base, orientation='h',
+                             name="減少させた場合", marker_color='rgba(31, 119, 180, 0.8)',
+                             showlegend=col == 1, customdata=[low for _, low, _ in rows],
+                             hovertemplate="%{y}: %{customdata:.2f}<extra>減少</extra>"),
+                      row=1, col=col)
+        fig.add_trace(go.Bar(y=names, x=[high - base for _, _, high in rows], base=base, orientation='h',
+                             name="増加させた場合", marker_color='rgba(214, 39, 40, 0.8)',
+                             showlegend=col == 1, customdata=[high for _, _, high in rows],
+                             hovertemplate="%{y}: %{customdata:.2f}<extra>増加</extra>"),
+                      row=1, col=col)
+        fig.add_vline(x=base, line_dash="dash", line_color="gray", row=1, col=col)
+        fig.update_xaxes(title_text=f"{label}（℃）", row=1, col=col)
+    fig.update_layout(barmode='overlay', height=320, legend=dict(orientation='h', y=1.2))
+    return fig
+
+
+def sobol_chart(result, output):
+    """Sobol 指標（1次・総合）の大きい順の横棒グラフを作成する"""
+    # 横棒グラフは下から描くため、指標の小さい順に並べる
+    items = ranked(result, output)[::-1]
+    labels = [SOBOL_FACTOR_LABELS[name] for name, _ in items]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(y=labels, x=[v['total'] for _, v in items], orientation='h', name="総合指標",
+                         error_x=dict(type='data', array=[v['total_conf'] for _, v in items]),
+                         marker_color='rgba(255, 127, 14, 0.8)'))
+    fig.add_trace(go.Bar(y=labels, x=[v['first'] for _, v in items], orientation='h', name="1次指標",
+                         error_x=dict(type='data', array=[v['first_conf'] for _, v in items]),
+                         marker_color='rgba(31, 119, 180, 0.8)'))
+    fig.update_layout(barmode='group', xaxis_title="Sobol 指標（分散への寄与率）", height=350,
+                      legend=dict(orientation='h', y=1.1))
+    return fig
+
+
+init_result_store()
+prefetcher = init_prefetcher()
+job_executor = init_job_executor()
+admission = init_admission()
+usage_log = init_usage_log()
+init_warm_up()
 
 # ページ設定
 st.set_page_config(
@@ -184,156 +388,11 @@ if page == "単一配管計算":
         </small>""", unsafe_allow_html=True)
     
     with input_col:
-        # 2行2列レイアウトで計算条件を配置
-        # 1行目
-        row1_col1, row1_col2 = st.columns([1, 1], gap="medium")
-        
-        with row1_col1:
-            st.subheader("基本条件")
-            
-            # 目標出口温度
-            if "target_temp" not in st.session_state:
-                st.session_state.target_temp = 23.0
-            
-            target_temp = st.number_input(
-                "目標出口温度 (℃)",
-                min_value=20.0,
-                max_value=30.0,
-                step=1.0,
-                key="target_temp",
-                help="最終温度との比較に使用する。計算には使用しない"
-            )
-            
-            # 入口温度
-            if "initial_temp" not in st.session_state:
-                st.session_state.initial_temp = 30.0
-            
-            initial_temp = st.number_input(
-                "入口温度 (℃)",
-                min_value=20.0,
-                max_value=40.0,
-                step=1.0,
-                key="initial_temp"
-            )
-            
-            # 総流量
-            if "flow_rate" not in st.session_state:
-                st.session_state.flow_rate = 50.0
-            
-            flow_rate = st.number_input(
-                "総流量 (L/min)",
-                min_value=20.0,
-                max_value=100.0,
-                step=1.0,
-                key="flow_rate"
-            )
-    
-        with row1_col2:
-            st.subheader("地盤条件")
-            
-            # 地下水温度
-            if "ground_temp" not in st.session_state:
-                st.session_state.ground_temp = 15.0
-            
-            ground_temp = st.number_input(
-                "地下水温度 (℃)",
-                min_value=0.0,
-                max_value=20.0,
-                step=1.0,
-                key="ground_temp"
-            )
-            
-            # 管浸水距離
-            if "pipe_length" not in st.session_state:
-                st.session_state.pipe_length = 5.0
-            
-            pipe_length = st.number_input(
-                "管浸水距離 (m)",
-                min_value=1.0,
-                max_value=30.0,
-                step=0.5,
-                key="pipe_length"
-            )
-            
-            # 掘削径の選択
-            if "boring_diameter" not in st.session_state:
-                st.session_state.boring_diameter = "φ250"
-            
-            boring_diameter = st.selectbox(
-                "掘削径",
-                ["φ116", "φ250"],
-                help="配管用の掘削径で、配管後に地下水などで充満される範囲を示す",
-                key="boring_diameter"
-            )
-            boring_diameter_mm = 116 if boring_diameter == "φ116" else 250
-    
-        # 2行目
-        row2_col1, row2_col2 = st.columns([1, 1], gap="medium")
-        
-        with row2_col1:
-            st.subheader("配管条件")
-            
-            # 配管材質の選択
-            if "pipe_material" not in st.session_state:
-                st.session_state.pipe_material = "鋼管"
-            
-            pipe_material = st.selectbox(
-                "配管材質",
-                ["鋼管", "アルミ管", "銅管"],
-                key="pipe_material"
-            )
-            
-            # 管径の選択
-            if "pipe_diameter" not in st.session_state:
-                st.session_state.pipe_diameter = "32A"
-            
-            pipe_diameter = st.selectbox(
-                "管径",
-                ["15A", "20A", "25A", "32A", "40A", "50A", "65A", "80A"],
-                key="pipe_diameter"
-            )
-            
-            # 管径別の推奨本数（参考値）
-            pipe_counts_default = {
-                "15A": 1,   # 50 L/min × 1本
-                "20A": 1,   # 50 L/min × 1本
-                "25A": 1,   # 50 L/min × 1本
-                "32A": 1,   # 12.5 L/min × 1本
-                "40A": 1,   # 25 L/min × 1本
-                "50A": 1,   # 50 L/min × 1本
-                "65A": 1,   # 50 L/min × 1本
-                "80A": 1    # 50 L/min × 1本
-            }
-            
-            # 配管セット本数の設定
-            # 初回のみ固定値で初期化
-            if "num_pipes_user" not in st.session_state:
-                st.session_state.num_pipes_user = 1
-            
-            num_pipes_user = st.selectbox(
-                "配管セット本数",
-                options=[1, 2, 3, 4, 5],
-                help="U字管構造のため往路復路の2本で1セットとする",
-                key="num_pipes_user"
-            )
+        # 計算モード（表示する入力項目が変わるため、フォームの外に置いて変更時に即座に再実行する）
+        st.subheader("計算モード")
+        mode_col1, mode_col2, mode_col3 = st.columns([1, 1, 2])
         
-        with row2_col2:
-            st.subheader("詳細設定")
-            
-            # 管外側熱伝達係数の設定
-            if "h_outer_value" not in st.session_state:
-                st.session_state.h_outer_value = 300.0
-            
-            h_outer = st.number_input(
-                "管外側熱伝達係数 (W/m²·K)",
-                min_value=50.0,
-                max_value=500.0,
-                value=st.session_state.h_outer_value,
-                step=50.0,
-                help="配管外表面から地下水への熱の伝わりやすさ。詳しくは物性値ページを参照",
-                key="h_outer_input"
-            )
-            
+        with mode_col1:
             # チェックボックスのセッション状態管理
             if "consider_groundwater_temp_rise" not in st.session_state:
                 st.session_state.consider_groundwater_temp_rise = False
@@ -344,9 +403,12 @@ if page == "単一配管計算":
                 help="熱交換による地下水温度の上昇を自動計算します",
                 key="consider_groundwater_temp_rise"
             )
-            
-            # 地下水循環の設定
-            if consider_groundwater_temp_rise:
+        
+        # 地下水循環の設定
+        consider_circulation = False
+        circulation_type = None
+        if consider_groundwater_temp_rise:
+            with mode_col2:
                 # 地下水循環のチェックボックス
                 if "consider_circulation" not in st.session_state:
                     st.session_state.consider_circulation = False
@@ -357,8 +419,9 @@ if page == "単一配管計算":
                     help="地下水が循環せず、指定時間運転した場合の温度上昇を計算",
                     key="consider_circulation"
                 )
-                
-                if consider_circulation:
+            
+            if consider_circulation:
+                with mode_col3:
                     # 循環方式の選択
                     if "circulation_type" not in st.session_state:
                         st.session_state.circulation_type = "同じ水を循環"
@@ -370,46 +433,213 @@ if page == "単一配管計算":
                         key="circulation_type",
                         horizontal=True
                     )
+        
+        # 計算条件はフォームにまとめ、入力を変更しても「計算開始」を押すまで再実行しない
+        # （リアルタイム更新時は変更のたびに概算値を表示するため、フォームを使わない）
+        live_mode = st.session_state.get("live_mode", False)
+        input_area = st.container() if live_mode else st.form("single_inputs", border=False)
+        
+        with input_area:
+            # 2行2列レイアウトで計算条件を配置
+            # 1行目
+            row1_col1, row1_col2 = st.columns([1, 1], gap="medium")
+            
+            with row1_col1:
+                st.subheader("基本条件")
+                
+                # 入口温度
+                if "initial_temp" not in st.session_state:
+                    st.session_state.initial_temp = 30.0
+                
+                initial_temp = st.number_input(
+                    "入口温度 (℃)",
+                    min_value=20.0,
+                    max_value=40.0,
+                    step=1.0,
+                    key="initial_temp"
+                )
+                
+                # 総流量
+                if "flow_rate" not in st.session_state:
+                    st.session_state.flow_rate = 50.0
+                
+                flow_rate = st.number_input(
+                    "総流量 (L/min)",
+                    min_value=20.0,
+                    max_value=100.0,
+                    step=1.0,
+                    key="flow_rate"
+                )
+        
+            with row1_col2:
+                st.subheader("地盤条件")
+                
+                # 地下水温度
+                if "ground_temp" not in st.session_state:
+                    st.session_state.ground_temp = 15.0
+                
+                ground_temp = st.number_input(
+                    "地下水温度 (℃)",
+                    min_value=0.0,
+                    max_value=20.0,
+                    step=1.0,
+                    key="ground_temp"
+                )
+                
+                # 管浸水距離
+                if "pipe_length" not in st.session_state:
+                    st.session_state.pipe_length = 5.0
+                
+                pipe_length = st.number_input(
+                    "管浸水距離 (m)",
+                    min_value=1.0,
+                    max_value=30.0,
+                    step=0.5,
+                    key="pipe_length"
+                )
+                
+                # 掘削径の選択
+                if "boring_diameter" not in st.session_state:
+                    st.session_state.boring_diameter = "φ250"
+                
+                boring_diameter = st.selectbox(
+                    "掘削径",
+                    ["φ116", "φ250"],
+                    help="配管用の掘削径で、配管後に地下水などで充満される範囲を示す",
+                    key="boring_diameter"
+                )
+                boring_diameter_mm = 116 if boring_diameter == "φ116" else 250
+        
+            # 2行目
+            row2_col1, row2_col2 = st.columns([1, 1], gap="medium")
+            
+            with row2_col1:
+                st.subheader("配管条件")
+                
+                # 配管材質の選択
+                if "pipe_material" not in st.session_state:
+                    st.session_state.pipe_material = "鋼管"
+                
+                pipe_material = st.selectbox(
+                    "配管材質",
+                    ["鋼管", "アルミ管", "銅管"],
+                    key="pipe_material"
+                )
+                
+                # 管径の選択
+                if "pipe_diameter" not in st.session_state:
+                    st.session_state.pipe_diameter = "32A"
+                
+                pipe_diameter = st.selectbox(
+                    "管径",
+                    ["15A", "20A", "25A", "32A", "40A", "50A", "65A", "80A"],
+                    key="pipe_diameter"
+                )
+                
+                # 管径別の推奨本数（参考値）
+                pipe_counts_default = {
+                    "15A": 1,   # 50 L/min × 1本
+                    "20A": 1,   # 50 L/min × 1本
+                    "25A": 1,   # 50 L/min × 1本
+                    "32A": 1,   # 12.5 L/min × 1本
+                    "40A": 1,   # 25 L/min × 1本
+                    "50A": 1,   # 50 L/min × 1本
+                    "65A": 1,   # 50 L/min × 1本
+                    "80A": 1    # 50 L/min × 1本
+                }
+                
+                # 配管セット本数の設定
+                # 初回のみ固定値で初期化
+                if "num_pipes_user" not in st.session_state:
+                    st.session_state.num_pipes_user = 1
+                
+                num_pipes_user = st.selectbox(
+                    "配管セット本数",
+                    options=[1, 2, 3, 4, 5],
+                    help="U字管構造のため往路復路の2本で1セットとする",
+                    key="num_pipes_user"
+                )
+            
+            with row2_col2:
+                st.subheader("詳細設定")
+                
+                # 管外側熱伝達係数の設定
+                if "h_outer_value" not in st.session_state:
+                    st.session_state.h_outer_value = 300.0
+                
+                h_outer = st.number_input(
+                    "管外側熱伝達係数 (W/m²·K)",
+                    min_value=50.0,
+                    max_value=500.0,
+                    value=st.session_state.h_outer_value,
+                    step=50.0,
+                    help="配管外表面から地下水への熱の伝わりやすさ。詳しくは物性値ページを参照",
+                    key="h_outer_input"
+                )
+                
+                if consider_groundwater_temp_rise:
+                    if consider_circulation:
+                        # 運転時間
+                        if "operation_minutes" not in st.session_state:
+                            st.session_state.operation_minutes = 10
+                        
+                        operation_minutes = st.number_input(
+                            "運転時間 (分)",
+                            min_value=1,
+                            max_value=60,
+                            step=1,
+                            key="operation_minutes"
+                        )
+                        operation_hours = operation_minutes / 60  # 時間に変換
+                        
+                        # 入口温度プロファイル（新しい水を連続供給の場合のみ）
+                        if circulation_type == "新しい水を連続供給":
+                            st.file_uploader(
+                                "入口温度プロファイル (CSV)",
+                                type=["csv"],
+                                help="1分ごとの入口温度を1列目に記載したCSV。指定した場合は入口温度・運転時間の代わりに使用する",
+                                key="inlet_profile_file"
+                            )
+                    else:
+                        # 1回の通水時間を計算（デフォルト）
+                        operation_hours = 1  # 暫定値、後で計算される
+                        
+                    # 温度上昇上限値
+                    if "temp_rise_limit" not in st.session_state:
+                        st.session_state.temp_rise_limit = 5
                     
-                    # 運転時間
-                    if "operation_minutes" not in st.session_state:
-                        st.session_state.operation_minutes = 10
-                    
-                    operation_minutes = st.number_input(
-                        "運転時間 (分)",
-                        min_value=1,
-                        max_value=60,
+                    temp_rise_limit = st.number_input(
+                        "温度上昇上限値 (℃)",
+                        min_value=5,
+                        max_value=20,
                         step=1,
-                        key="operation_minutes"
+                        key="temp_rise_limit",
+                        help="地下水温度上昇の最大制限値"
                     )
-                    operation_hours = operation_minutes / 60  # 時間に変換
                 else:
-                    # 1回の通水時間を計算（デフォルト）
-                    operation_hours = 1  # 暫定値、後で計算される
-                    
-                # 温度上昇上限値
-                if "temp_rise_limit" not in st.session_state:
-                    st.session_state.temp_rise_limit = 5
-                
-                temp_rise_limit = st.number_input(
-                    "温度上昇上限値 (℃)",
-                    min_value=5,
-                    max_value=20,
-                    step=1,
-                    key="temp_rise_limit",
-                    help="地下水温度上昇の最大制限値"
-                )
-            else:
-                operation_hours = 1  # デフォルト値（後で再計算される）
-                temp_rise_limit = 5  # デフォルト値
-                consider_circulation = False
-                circulation_type = None
-        
-        # 計算開始ボタン（配管条件と詳細設定の列を横断）
-        st.markdown("")  # スペース
-        calc_button_col1, calc_button_col2, calc_button_col3 = st.columns([1, 2, 1])
-        with calc_button_col2:
-            calculate_clicked = st.button("🔄 計算開始", type="primary", use_container_width=True, key="calc_single")
+                    operation_hours = 1  # デフォルト値（後で再計算される）
+                    temp_rise_limit = 5  # デフォルト値
+            
+            # 計算開始ボタン（配管条件と詳細設定の列を横断）
+            st.markdown("")  # スペース
+            calc_button_col1, calc_button_col2, calc_button_col3 = st.columns([1, 2, 1])
+            with calc_button_col2:
+                if live_mode:
+                    calculate_clicked = st.button("🔄 計算開始", type="primary", use_container_width=True, key="calc_single")
+                else:
+                    # フォーム内の入力はこのボタンを押したときにまとめて反映される
+                    calculate_clicked = st.form_submit_button("🔄 計算開始", type="primary", use_container_width=True,
+                                                              key="calc_single")
+        
+        # リアルタイム更新の切り替え（フォームの外に置き、変更時に入力欄のフォームを切り替える）
+        live_button_col1, live_button_col2, live_button_col3 = st.columns([1, 2, 1])
+        with live_button_col2:
+            live_mode = st.checkbox(
+                "リアルタイム更新",
+                value=st.session_state.get("live_mode", False),
+                help="条件を変更するたびに出口温度と熱交換量の概算を表示します（詳細は「計算開始」で表示）",
+                key="live_mode"
+            )
     
     st.markdown("---")  # 計算条件と結果を区切る
     
@@ -424,19 +654,17 @@ if page == "単一配管計算":
     st.header("📈 計算結果")
     
     # 計算が実行されていない場合はメッセージを表示して終了
-    if not st.session_state.single_calculated:
+    if not st.session_state.single_calculated and not live_mode:
         st.info("⬆️ 計算条件を設定して「計算開始」ボタンを押してください。")
         st.stop()  # これ以降の処理をスキップ
     
     # 入力セクションで定義された変数を取得
     # セッション状態から値を取得
-    target_temp = st.session_state.get("target_temp", 23.0)
     initial_temp = st.session_state.get("initial_temp", 30.0)
     flow_rate = st.session_state.get("flow_rate", 50.0)
     ground_temp = st.session_state.get("ground_temp", 15.0)
     pipe_length = st.session_state.get("pipe_length", 5.0)
     boring_diameter = st.session_state.get("boring_diameter", "φ250")
-    boring_diameter_mm = 116 if boring_diameter == "φ116" else 250
     pipe_material = st.session_state.get("pipe_material", "鋼管")
     pipe_diameter = st.session_state.get("pipe_diameter", "32A")
     num_pipes_user = st.session_state.get("num_pipes_user", 1)
@@ -444,296 +672,128 @@ if page == "単一配管計算":
     
     # 地下水温度上昇関連の変数
     operation_minutes = None  # デフォルト値を設定
+    inlet_profile = None  # 入口温度プロファイル（新しい水を連続供給の場合のみ）
     if consider_groundwater_temp_rise:
         consider_circulation = st.session_state.get("consider_circulation", False)
         if consider_circulation:
             circulation_type = st.session_state.get("circulation_type", "同じ水を循環")
             operation_minutes = st.session_state.get("operation_minutes", 10)
-            if circulation_type == "同じ水を循環":
-                operation_hours = operation_minutes / 60  # 分を時間に変換
-            else:
-                operation_hours = 1  # 新しい水を連続供給の場合
+            if circulation_type == "新しい水を連続供給":
+                inlet_profile_file = st.session_state.get("inlet_profile_file")
+                if inlet_profile_file is not None:
+                    inlet_profile_file.seek(0)
+                    profile_df = pd.read_csv(inlet_profile_file, header=None)
+                    inlet_profile = pd.to_numeric(profile_df.iloc[:, 0], errors="coerce").dropna().to_numpy(dtype=float)
+                    if len(inlet_profile) == 0:
+                        st.error("⚠️ 入口温度プロファイルに数値データがありません。入口温度一定で計算します。")
+                        inlet_profile = None
         else:
-            operation_hours = 1  # デフォルト値（後で再計算される）
             circulation_type = None
         temp_rise_limit = st.session_state.get("temp_rise_limit", 5)
     else:
-        operation_hours = 1  # デフォルト値
         temp_rise_limit = 5  # デフォルト値
         consider_circulation = False
         circulation_type = None
     
-    # 配管仕様データ（JIS規格に基づく内径mm）
-    pipe_specs = {
-        "15A": 16.1,
-        "20A": 22.2,
-        "25A": 28.0,
-        "32A": 33.5,  # summary.mdに合わせて修正
-        "40A": 41.2,
-        "50A": 52.6,
-        "65A": 67.8,
-        "80A": 80.1
-    }
-    
-    # 管径別の推奨本数（50L/minの総流量を分配）
-    pipe_counts = {
-        "15A": 1,   # 50 L/min × 1本
-        "20A": 1,   # 50 L/min × 1本
-        "25A": 1,   # 50 L/min × 1本
-        "32A": 4,   # 12.5 L/min × 4本
-        "40A": 2,   # 25 L/min × 2本
-        "50A": 1,   # 50 L/min × 1本
-        "65A": 1,   # 50 L/min × 1本
-        "80A": 1    # 50 L/min × 1本
-    }
-    
-    # 材質による熱伝導率 (W/m・K)
-    thermal_conductivity = {
-        "鋼管": 50.0,
-        "アルミ管": 237.0,
-        "銅管": 398.0
-    }
-    
-    # 配管外径データ（SGP規格）
-    pipe_outer_diameter_sgp = {
-        "15A": 21.7,   # mm
-        "20A": 27.2,   # mm
-        "25A": 34.0,   # mm
-        "32A": 42.7,   # mm
-        "40A": 48.6,   # mm
-        "50A": 60.5,   # mm
-        "65A": 76.3,   # mm
-        "80A": 89.1    # mm
-    }
-    
-    # 初期計算用の地下水温度
-    effective_ground_temp = ground_temp
+    # 計算エンジンで計算（同じ条件の計算結果はキャッシュから再利用）
+    scenario = normalize_inputs(
+        initial_temp=initial_temp,
+        ground_temp=ground_temp,
+        flow_rate=flow_rate,
+        pipe_length=pipe_length,
+        boring_diameter=boring_diameter,
+        pipe_material=pipe_material,
+        pipe_diameter=pipe_diameter,
+        num_pipes=num_pipes_user,
+        h_outer=h_outer,
+        consider_groundwater_temp_rise=consider_groundwater_temp_rise,
+        circulation_type=circulation_type,
+        operation_minutes=operation_minutes,
+        temp_rise_limit=temp_rise_limit,
+        inlet_profile=inlet_profile
+    )
+
+    # リアルタイム更新：応答曲面の補間値（誤差が大きい場合は厳密計算）を表示して終了
+    if live_mode and not calculate_clicked:
+        estimate = live_estimate(scenario)
+        live_col1, live_col2, live_col3 = st.columns(3)
+        with live_col1:
+            st.metric("出口温度", f"{estimate['final_temp']:.1f}℃",
+                      f"{estimate['final_temp'] - initial_temp:.1f}℃", delta_color="inverse")
+        with live_col2:
+            st.metric("熱交換量", f"{estimate['heat_exchange_rate']/1000:.1f} kW")
+        with live_col3:
+            st.metric("熱交換効率", f"{estimate['effectiveness']*100:.1f}%")
+        if estimate['approximate']:
+            st.caption(f"事前計算した応答曲面による概算値です（出口温度の誤差 ±{estimate['error_bound']:.3f}℃ 以内の見積もり）")
+        else:
+            st.caption("計算エンジンによる計算値です")
+        st.info("⬆️ 詳細な結果とグラフは「計算開始」ボタンを押すと表示されます。")
+        st.stop()
+
+    with prefetcher.foreground(), admission.admit(current_session_id(), PRIORITY_INTERACTIVE):
+        result = calculate_cached(scenario)
+
+    # 直前に変更した入力の前後の値を先読みして、次の計算をキャッシュから返せるようにする
+    prefetcher.submit(scenario, st.session_state.get("previous_scenario"))
+    st.session_state.previous_scenario = scenario
+    # 利用ログには「計算開始」で計算した条件のみ記録する（表示の変更による再実行は数えない）
+    if usage_log is not None and calculate_clicked:
+        usage_log.record(scenario)
     
     # バルク温度（物性値計算用）- 入口温度を使用
     avg_temp = initial_temp
-    
-    # 配管内径と断面積の計算
-    inner_diameter = pipe_specs[pipe_diameter] / 1000  # m
-    pipe_area = math.pi * (inner_diameter / 2) ** 2  # m²
-    
-    # 1本あたりの流量を計算
-    num_pipes = num_pipes_user  # ユーザー設定値を使用
-    flow_per_pipe = flow_rate / num_pipes  # L/min/本
-    
-    # 流速の計算 (m/s)
-    flow_rate_m3s_per_pipe = flow_per_pipe / 60000  # L/min → m³/s
-    velocity = flow_rate_m3s_per_pipe / pipe_area
-
-    # 温度依存の物性値計算（バルク温度法：入口温度基準）
-    water_props = get_water_properties(avg_temp)
+    water_props = result['water_props']
     kinematic_viscosity = water_props['kinematic_viscosity']
     water_thermal_conductivity = water_props['thermal_conductivity']
     prandtl = water_props['prandtl']
-    density = water_props['density']
     specific_heat = water_props['specific_heat']
-
-    reynolds = velocity * inner_diameter / kinematic_viscosity
-    
-    # ヌセルト数の計算（層流/乱流判定）
-    if reynolds < 2300:  # 層流
-        nusselt = 3.66
-    else:  # 乱流（Dittus-Boelter式、冷却時）
-        nusselt = 0.023 * (reynolds ** 0.8) * (prandtl ** 0.3)
-    
-    # 熱伝達係数の計算 (W/m²・K)
-    heat_transfer_coefficient = nusselt * water_thermal_conductivity / inner_diameter
-    
-    # 外径データ（JIS規格）
-    pipe_outer_diameters = {
-        "15A": 21.7 / 1000,  # m
-        "20A": 27.2 / 1000,
-        "25A": 34.0 / 1000,
-        "32A": 42.7 / 1000,
-        "40A": 48.6 / 1000,
-        "50A": 60.5 / 1000,
-        "65A": 76.3 / 1000,
-        "80A": 89.1 / 1000
-    }
-    
-    outer_diameter = pipe_outer_diameters[pipe_diameter]
-    pipe_thermal_cond = thermal_conductivity[pipe_material]
     
-    # 総括熱伝達係数 U (W/m²・K) - 内径基準
-    U = 1 / (1/heat_transfer_coefficient + 
-            inner_diameter/(2*pipe_thermal_cond) * math.log(outer_diameter/inner_diameter) + 
-            inner_diameter/(outer_diameter*h_outer))
+    num_pipes = num_pipes_user
+    inner_diameter = result['inner_diameter']
+    outer_diameter = result['outer_diameter']
+    pipe_thermal_cond = result['pipe_thermal_cond']
+    velocity = result['velocity']
+    reynolds = result['reynolds']
+    heat_transfer_coefficient = result['heat_transfer_coefficient']
+    U = result['U']
+    NTU = result['NTU']
+    effectiveness = result['effectiveness']
+    mass_flow_rate_per_pipe = result['mass_flow_rate_per_pipe']
+    final_temp = result['final_temp']
+    effective_ground_temp = result['effective_ground_temp']
+    groundwater_temp_rise = result['groundwater_temp_rise']
+    groundwater_temp_rise_unlimited = result['groundwater_temp_rise_unlimited']
+    boring_volume = result['boring_volume']
+    pipe_total_volume = result['pipe_total_volume']
+    groundwater_volume = result['groundwater_volume']
+    groundwater_mass = result['groundwater_mass']
     
     # 配管面積と掘削径の検証
-    total_pipe_area = num_pipes * math.pi * (outer_diameter / 2) ** 2 * 1000000  # mm²
-    boring_area = math.pi * (boring_diameter_mm / 2) ** 2  # mm²
-    
+    total_pipe_area = result['total_pipe_area']
+    boring_area = result['boring_area']
     if total_pipe_area > boring_area * 0.8:  # 80%を超えたら警告
         st.error(f"⚠️ 配管総面積が掘削径の80%を超えています！")
         st.warning(f"配管総面積: {total_pipe_area:.0f}mm²")
         st.warning(f"掘削断面積: {boring_area:.0f}mm²")
         st.warning(f"占有率: {total_pipe_area/boring_area*100:.1f}%")
     
-    # 熱交換面積（U字管として往復を考慮）
-    total_length = pipe_length * 2  # 往復分
-    heat_exchange_area = math.pi * inner_diameter * total_length
-    
-    # 質量流量（1本あたり）
-    mass_flow_rate_per_pipe = flow_rate_m3s_per_pipe * density  # kg/s
-    
-    # NTU（伝熱単位数）の計算（1本あたり）
-    NTU_per_pipe = U * heat_exchange_area / (mass_flow_rate_per_pipe * specific_heat)
-    NTU = NTU_per_pipe
-    
-    # 効率の計算
-    effectiveness = 1 - math.exp(-NTU)
+    heat_exchange_rate = result['heat_exchange_rate']
     
-    # 最終温度の計算
-    final_temp = initial_temp - effectiveness * (initial_temp - effective_ground_temp)
+    # 1回通水の場合の通水時間と地下水体積の検証
+    if consider_groundwater_temp_rise and not consider_circulation:
+        operation_hours = result['transit_time_seconds'] / 3600  # 1回の通水時間
+        if groundwater_mass <= 0:
+            st.error("⚠️ 地下水体積が負またはゼロです。配管が多すぎるか、掘削径が小さすぎます。")
     
-    # 変数の初期化（後で使用する可能性があるもの）
-    time_history = []
-    inlet_temp_history = []
-    outlet_temp_history = []
-    ground_temp_history = []
-    boring_volume = 0
-    pipe_total_volume = 0
-    groundwater_volume = 0
-    groundwater_mass = 0
-    heat_exchange_rate = 0
-    groundwater_temp_rise_unlimited = 0
-    
-    # 地下水温度上昇の計算
-    if consider_groundwater_temp_rise:
-        # 初期熱交換量の計算 [W]
-        heat_exchange_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (initial_temp - final_temp)
-        
-        # 地下水の体積計算（ボーリング孔内のみ）
-        # 掘削孔の体積
-        boring_volume = math.pi * (boring_diameter_mm / 2000) ** 2 * pipe_length  # m³
-        # 配管の総体積（U字管なので往復分で2倍）
-        pipe_total_volume = math.pi * (outer_diameter / 2) ** 2 * pipe_length * num_pipes * 2  # m³
-        # 地下水体積
-        groundwater_volume = boring_volume - pipe_total_volume  # m³
-        groundwater_mass = groundwater_volume * density  # kg
-        
-        # 1回の通水時間を計算（循環を考慮しない場合）
-        if not consider_circulation:
-            # U字管の全長を流速で除して通水時間を求める
-            total_pipe_length = pipe_length * 2  # U字管往復
-            transit_time_seconds = total_pipe_length / velocity  # 秒
-            operation_hours = transit_time_seconds / 3600  # 時間に変換
-            
-        # 循環方式に応じた計算
-        if consider_circulation and circulation_type == "同じ水を循環":
-            # 同じ水を循環させる場合の計算（反復計算）
-            time_step = 60  # 1分ごとの計算
-            num_steps = int(operation_hours * 3600 / time_step)
-            
-            current_inlet_temp = initial_temp
-            current_ground_temp = ground_temp
-            
-            # 時系列データを保存するリスト
-            time_history = []
-            inlet_temp_history = []
-            outlet_temp_history = []
-            ground_temp_history = []
-            
-            for i in range(num_steps):
-                # 現在の温度での熱交換計算
-                current_effectiveness = 1 - math.exp(-NTU)
-                current_outlet_temp = current_inlet_temp - current_effectiveness * (current_inlet_temp - current_ground_temp)
-                
-                # 熱交換量
-                current_heat_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (current_inlet_temp - current_outlet_temp)
-                
-                # 地下水温度上昇
-                if groundwater_mass > 0:
-                    delta_ground_temp = (current_heat_rate * time_step) / (groundwater_mass * specific_heat)
-                    current_ground_temp += delta_ground_temp
-                    # 物理的制約：地下水温度は入口温度を超えない
-                    current_ground_temp = min(current_ground_temp, ground_temp + temp_rise_limit, current_inlet_temp)
-                
-                # データを記録
-                time_history.append(i * time_step / 60)  # 分単位
-                inlet_temp_history.append(current_inlet_temp)
-                outlet_temp_history.append(current_outlet_temp)
-                ground_temp_history.append(current_ground_temp)
-                
-                # 次のステップの入口温度は現在の出口温度
-                current_inlet_temp = current_outlet_temp
-            
-            # 最終結果
-            final_temp = current_outlet_temp
-            effective_ground_temp = current_ground_temp
-            groundwater_temp_rise = current_ground_temp - ground_temp
-            groundwater_temp_rise_unlimited = groundwater_temp_rise
-            
-        else:
-            # 新しい水を連続供給する場合、または循環を考慮しない場合
-            if consider_circulation and circulation_type == "新しい水を連続供給":
-                # 時系列データを生成（新しい水を連続供給）
-                time_step = 60  # 1分ごとの計算
-                num_steps = int(operation_hours * 3600 / time_step)
-                
-                current_ground_temp = ground_temp
-                
-                # 時系列データを保存するリスト
-                time_history = []
-                inlet_temp_history = []
-                outlet_temp_history = []
-                ground_temp_history = []
-                
-                for i in range(num_steps):
-                    # 現在の地下水温度での出口温度計算
-                    current_effectiveness = 1 - math.exp(-NTU)
-                    current_outlet_temp = initial_temp - current_effectiveness * (initial_temp - current_ground_temp)
-                    
-                    # 熱交換量
-                    current_heat_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (initial_temp - current_outlet_temp)
-                    
-                    # 地下水温度上昇
-                    if groundwater_mass > 0:
-                        delta_ground_temp = (current_heat_rate * time_step) / (groundwater_mass * specific_heat)
-                        current_ground_temp += delta_ground_temp
-                        # 物理的制約：地下水温度は入口温度を超えない
-                        current_ground_temp = min(current_ground_temp, ground_temp + temp_rise_limit, initial_temp)
-                    
-                    # データを記録
-                    time_history.append(i * time_step / 60)  # 分単位
-                    inlet_temp_history.append(initial_temp)  # 入口温度は一定
-                    outlet_temp_history.append(current_outlet_temp)
-                    ground_temp_history.append(current_ground_temp)
-                
-                # 最終結果
-                final_temp = outlet_temp_history[-1] if outlet_temp_history else initial_temp
-                effective_ground_temp = current_ground_temp
-                groundwater_temp_rise = current_ground_temp - ground_temp
-                groundwater_temp_rise_unlimited = groundwater_temp_rise
-                
-            else:
-                # 循環を考慮しない場合（1回通水）
-                operation_time = operation_hours * 3600  # 秒
-                if groundwater_mass > 0:
-                    groundwater_temp_rise = (heat_exchange_rate * operation_time) / (groundwater_mass * specific_heat)
-                else:
-                    st.error("⚠️ 地下水体積が負またはゼロです。配管が多すぎるか、掘削径が小さすぎます。")
-                    groundwater_temp_rise = 0.0
-                
-                # 温度上昇を制限（物理的制約も考慮）
-                groundwater_temp_rise_unlimited = groundwater_temp_rise
-                # 地下水温度は入口温度を超えない
-                max_possible_rise = initial_temp - ground_temp
-                groundwater_temp_rise = min(groundwater_temp_rise, temp_rise_limit, max_possible_rise)
-                
-                # 実効地下水温度を更新
-                effective_ground_temp = ground_temp + groundwater_temp_rise
-                
-                # 最終温度を再計算
-                final_temp = initial_temp - effectiveness * (initial_temp - effective_ground_temp)
-    else:
-        groundwater_temp_rise = 0.0
-        # 地下水温度上昇を考慮しない場合、初回計算の値をそのまま使用
-        # （final_tempは既に586行目で計算済み）
+    # 時系列データ（循環を考慮する場合）
+    series = result['series']
+    if series is not None:
+        time_history = series.time
+        inlet_temp_history = series.inlet_temp
+        outlet_temp_history = series.outlet_temp
+        ground_temp_history = series.ground_temp
+        operation_minutes = result['operation_minutes']
     
     # 熱交換効率（％）
     if initial_temp != effective_ground_temp:
@@ -741,271 +801,519 @@ if page == "単一配管計算":
     else:
         efficiency = 0
     
-    # 結果表示
-    # 目標温度との比較（計算結果の上に表示）
-    if final_temp > target_temp:
-        st.warning(f"⚠️ 目標温度（{target_temp}℃）を超えています")
-    else:
-        st.success("✅ 目標温度範囲内です")
-    
-    st.markdown("")  # スペースを追加
+    # 計算結果の表示はフラグメントに分け、表示のみの入力（目標温度）や解析の条件を変更した場合は
+    # 該当するフラグメントのみ再実行する（計算条件の入力と計算エンジンの計算は再実行しない）
+    @st.fragment
+    def single_result_view():
+        """計算結果・目標温度との比較・時系列グラフ（目標温度の変更ではここのみ再実行する）"""
+        # 目標出口温度（計算には使用しないため、変更時はこのフラグメントのみ再実行する）
+        if "target_temp" not in st.session_state:
+            st.session_state.target_temp = 23.0
+
+        target_col, status_col = st.columns([1, 3], vertical_alignment="bottom")
+        with target_col:
+            target_temp = st.number_input(
+                "目標出口温度 (℃)",
+                min_value=20.0,
+                max_value=30.0,
+                step=1.0,
+                key="target_temp",
+                help="最終温度との比較に使用する。計算には使用しない"
+            )
+
+        # 目標温度との比較（計算結果の上に表示）
+        with status_col:
+            if final_temp > target_temp:
+                st.warning(f"⚠️ 目標温度（{target_temp}℃）を超えています")
+            else:
+                st.success("✅ 目標温度範囲内です")
     
-    # 重要な3つの指標を枠線で強調表示
-    main_col1, main_col2, main_col3 = st.columns([1, 1, 1], gap="medium")
+        st.markdown("")  # スペースを追加
     
-    with main_col1:
-        st.markdown(f"""
-        <div style="border: 3px solid #ff4b4b; border-radius: 10px; padding: 13px; background-color: #fff5f5; text-align: center; margin-bottom: 15px;">
-            <h3 style="margin: 0; color: #ff4b4b; font-size: 18px;">🌡️ 出口温度</h3>
-            <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{final_temp:.1f}℃</h1>
-            <p style="margin: 0; color: #666; font-size: 14px;">温度降下: {initial_temp - final_temp:.1f}℃</p>
-        </div>
-        """, unsafe_allow_html=True)
-        st.markdown("")  # モバイル表示時のスペース追加
+        # 重要な3つの指標を枠線で強調表示
+        main_col1, main_col2, main_col3 = st.columns([1, 1, 1], gap="medium")
     
-    with main_col2:
-        if consider_groundwater_temp_rise:
+        with main_col1:
             st.markdown(f"""
-            <div style="border: 3px solid #1976d2; border-radius: 10px; padding: 13px; background-color: #f0f7ff; text-align: center; margin-bottom: 15px;">
-                <h3 style="margin: 0; color: #1976d2; font-size: 18px;">💧 地下水温</h3>
-                <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{effective_ground_temp:.1f}℃</h1>
-                <p style="margin: 0; color: #666; font-size: 14px;">温度上昇: +{groundwater_temp_rise:.1f}℃</p>
-            </div>
-            """, unsafe_allow_html=True)
-            st.markdown("")  # モバイル表示時のスペース追加
-        else:
-            st.markdown(f"""
-            <div style="border: 3px solid #1976d2; border-radius: 10px; padding: 13px; background-color: #f0f7ff; text-align: center; margin-bottom: 15px;">
-                <h3 style="margin: 0; color: #1976d2; font-size: 18px;">💧 地下水温</h3>
-                <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{effective_ground_temp:.1f}℃</h1>
-                <p style="margin: 0; color: #666; font-size: 14px;">初期温度のまま</p>
+            <div style="border: 3px solid #ff4b4b; border-radius: 10px; padding: 13px; background-color: #fff5f5; text-align: center; margin-bottom: 15px;">
+                <h3 style="margin: 0; color: #ff4b4b; font-size: 18px;">🌡️ 出口温度</h3>
+                <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{final_temp:.1f}℃</h1>
+                <p style="margin: 0; color: #666; font-size: 14px;">温度降下: {initial_temp - final_temp:.1f}℃</p>
             </div>
             """, unsafe_allow_html=True)
             st.markdown("")  # モバイル表示時のスペース追加
     
-    with main_col3:
-        # 通水時間の計算
-        total_pipe_length = pipe_length * 2  # U字管往復
-        transit_time_seconds = total_pipe_length / velocity
-        transit_time_minutes = transit_time_seconds / 60
+        with main_col2:
+            if consider_groundwater_temp_rise:
+                st.markdown(f"""
+                <div style="border: 3px solid #1976d2; border-radius: 10px; padding: 13px; background-color: #f0f7ff; text-align: center; margin-bottom: 15px;">
+                    <h3 style="margin: 0; color: #1976d2; font-size: 18px;">💧 地下水温</h3>
+                    <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{effective_ground_temp:.1f}℃</h1>
+                    <p style="margin: 0; color: #666; font-size: 14px;">温度上昇: +{groundwater_temp_rise:.1f}℃</p>
+                </div>
+                """, unsafe_allow_html=True)
+                st.markdown("")  # モバイル表示時のスペース追加
+            else:
+                st.markdown(f"""
+                <div style="border: 3px solid #1976d2; border-radius: 10px; padding: 13px; background-color: #f0f7ff; text-align: center; margin-bottom: 15px;">
+                    <h3 style="margin: 0; color: #1976d2; font-size: 18px;">💧 地下水温</h3>
+                    <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{effective_ground_temp:.1f}℃</h1>
+                    <p style="margin: 0; color: #666; font-size: 14px;">初期温度のまま</p>
+                </div>
+                """, unsafe_allow_html=True)
+                st.markdown("")  # モバイル表示時のスペース追加
+    
+        with main_col3:
+            # 通水時間の計算
+            total_pipe_length = pipe_length * 2  # U字管往復
+            transit_time_seconds = total_pipe_length / velocity
+            transit_time_minutes = transit_time_seconds / 60
         
-        if consider_circulation:
-            time_display = f"{operation_minutes}"
-            time_unit = "分"
-            time_description = "循環運転時間"
-        else:
-            time_display = f"{transit_time_minutes:.1f}"
-            time_unit = "分"
-            time_description = "1回通水時間"
+            if consider_circulation:
+                time_display = f"{operation_minutes}"
+                time_unit = "分"
+                time_description = "循環運転時間"
+            else:
+                time_display = f"{transit_time_minutes:.1f}"
+                time_unit = "分"
+                time_description = "1回通水時間"
         
-        st.markdown(f"""
-        <div style="border: 3px solid #4caf50; border-radius: 10px; padding: 13px; background-color: #f1f8e9; text-align: center; margin-bottom: 15px;">
-            <h3 style="margin: 0; color: #4caf50; font-size: 18px;">⏱️ 通水時間</h3>
-            <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{time_display}{time_unit}</h1>
-            <p style="margin: 0; color: #666; font-size: 14px;">{time_description}</p>
-        </div>
-        """, unsafe_allow_html=True)
+            st.markdown(f"""
+            <div style="border: 3px solid #4caf50; border-radius: 10px; padding: 13px; background-color: #f1f8e9; text-align: center; margin-bottom: 15px;">
+                <h3 style="margin: 0; color: #4caf50; font-size: 18px;">⏱️ 通水時間</h3>
+                <h1 style="margin: 0px 0; color: #333; font-size: 36px;">{time_display}{time_unit}</h1>
+                <p style="margin: 0; color: #666; font-size: 14px;">{time_description}</p>
+            </div>
+            """, unsafe_allow_html=True)
     
-    st.markdown("")  # スペース追加
+        st.markdown("")  # スペース追加
     
-    # その他の指標（1行4列）
-    sub_col1, sub_col2, sub_col3, sub_col4 = st.columns(4)
+        # その他の指標（1行4列）
+        sub_col1, sub_col2, sub_col3, sub_col4 = st.columns(4)
     
-    with sub_col1:
-        st.metric("熱交換効率", f"{efficiency:.1f}%", help="水から地下水への熱の移動割合。100%に近いほど効率的")
+        with sub_col1:
+            st.metric("熱交換効率", f"{efficiency:.1f}%", help="水から地下水への熱の移動割合。100%に近いほど効率的")
     
-    with sub_col2:
-        if consider_groundwater_temp_rise:
-            st.metric("熱交換量", f"{heat_exchange_rate/1000:.1f} kW", help="地下に捨てられる熱量。エアコン1台は約2-3kW")
-        else:
-            heat_exchange_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (initial_temp - final_temp)
-            st.metric("熱交換量", f"{heat_exchange_rate/1000:.1f} kW", help="地下に捨てられる熱量。エアコン1台は約2-3kW")
+        with sub_col2:
+            if consider_groundwater_temp_rise:
+                st.metric("熱交換量", f"{heat_exchange_rate/1000:.1f} kW", help="地下に捨てられる熱量。エアコン1台は約2-3kW")
+            else:
+                constant_heat_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (initial_temp - final_temp)
+                st.metric("熱交換量", f"{constant_heat_rate/1000:.1f} kW", help="地下に捨てられる熱量。エアコン1台は約2-3kW")
     
-    with sub_col3:
-        if consider_groundwater_temp_rise:
-            st.metric("地下水体積", f"{groundwater_volume:.1f} m³", help="ボーリング孔内の地下水量。配管を除いた有効体積")
-        else:
-            st.metric("地下水体積", "-", help="温度上昇計算時のみ表示")
-    
-    with sub_col4:
-        st.metric("配管本数", f"{num_pipes} セット")
-    
-    # 結果表示終了
-    
-    # 最適化提案（コメントアウト - 将来的に復活しやすいように）
-    # st.markdown("---")
-    # st.subheader("⚙️ 最適化提案")
-    # 
-    # if final_temp > target_temp:
-    #     st.warning(f"⚠️ 目標温度（{target_temp}℃）を超えています")
-    #     st.markdown("**改善提案：**")
-    #     if pipe_length < 20:
-    #         st.markdown(f"- 管浸水距離を約{20}mに延長（現在: {pipe_length}m）")
-    #     else:
-    #         st.markdown("- より大口径の配管を検討")
-    #     st.markdown("- 地下水循環システムの導入")
-    #     if pipe_diameter != "32A":
-    #         st.markdown("- 32A配管の使用（最適効率）")
-    #     else:
-    #         st.markdown("- 複数の32A配管を並列配置")
-    # else:
-    #     st.success("✅ 目標温度範囲内です")
-    
-    # 計算条件の表示（コメントアウト - 将来的に復活しやすいように）
-    # st.markdown("---")
-    # st.subheader("📝 計算条件")
-    # condition_col1, condition_col2, condition_col3 = st.columns(3)
-    # 
-    # with condition_col1:
-    #     st.markdown("**基本条件**")
-    #     st.markdown(f"- 初期温度: {initial_temp}℃")
-    #     st.markdown(f"- 地下水温度: {ground_temp}℃")
-    #     st.markdown(f"- 目標温度: {target_temp}℃")
-    #     if consider_groundwater_temp_rise:
-    #         st.markdown(f"- 地下水温度上昇: +{groundwater_temp_rise:.2f}℃（自動計算）")
-    #         st.markdown(f"- 最終地下水温度: {effective_ground_temp:.1f}℃")
-    #         if consider_circulation:
-    #             st.markdown(f"- 運転時間: {operation_minutes}分")
-    #         else:
-    #             st.markdown(f"- 通水時間: {operation_hours*3600:.1f}秒（{operation_hours*60:.1f}分）")
-    #         st.markdown(f"- 温度上昇上限: {temp_rise_limit}℃")
-    #     st.markdown(f"- 掘削径: {boring_diameter}")
-    # 
-    # with condition_col2:
-    #     st.markdown("**流量条件**")
-    #     st.markdown(f"- 総流量: {flow_rate} L/min")
-    #     st.markdown(f"- 管浸水距離: {pipe_length} m")
-    #     st.markdown(f"- 管径: {pipe_diameter}")
-    # 
-    # with condition_col3:
-    #     st.markdown("**配管仕様**")
-    #     st.markdown(f"- 配管材質: {pipe_material}")
-    #     st.markdown(f"- 内径: {inner_diameter*1000:.1f} mm")
-    #     st.markdown(f"- 外径: {outer_diameter*1000:.1f} mm")
-    #     st.markdown(f"- 熱伝導率: {pipe_thermal_cond} W/m·K")
-    #     st.markdown(f"- 配管セット本数: {num_pipes} セット")
-    
-    # 温度変化グラフ（循環を考慮する場合）
-    if consider_groundwater_temp_rise and consider_circulation:
-        st.markdown("---")
-        st.subheader("📊 温度変化の時系列")
-        
-        # グラフを作成
-        fig = go.Figure()
+        with sub_col3:
+            if consider_groundwater_temp_rise:
+                st.metric("地下水体積", f"{groundwater_volume:.1f} m³", help="ボーリング孔内の地下水量。配管を除いた有効体積")
+            else:
+                st.metric("地下水体積", "-", help="温度上昇計算時のみ表示")
+    
+        with sub_col4:
+            st.metric("配管本数", f"{num_pipes} セット")
+    
+        # 結果表示終了
+    
+        # 最適化提案（コメントアウト - 将来的に復活しやすいように）
+        # st.markdown("---")
+        # st.subheader("⚙️ 最適化提案")
+        # 
+        # if final_temp > target_temp:
+        #     st.warning(f"⚠️ 目標温度（{target_temp}℃）を超えています")
+        #     st.markdown("**改善提案：**")
+        #     if pipe_length < 20:
+        #         st.markdown(f"- 管浸水距離を約{20}mに延長（現在: {pipe_length}m）")
+        #     else:
+        #         st.markdown("- より大口径の配管を検討")
+        #     st.markdown("- 地下水循環システムの導入")
+        #     if pipe_diameter != "32A":
+        #         st.markdown("- 32A配管の使用（最適効率）")
+        #     else:
+        #         st.markdown("- 複数の32A配管を並列配置")
+        # else:
+        #     st.success("✅ 目標温度範囲内です")
+    
+        # 計算条件の表示（コメントアウト - 将来的に復活しやすいように）
+        # st.markdown("---")
+        # st.subheader("📝 計算条件")
+        # condition_col1, condition_col2, condition_col3 = st.columns(3)
+        # 
+        # with condition_col1:
+        #     st.markdown("**基本条件**")
+        #     st.markdown(f"- 初期温度: {initial_temp}℃")
+        #     st.markdown(f"- 地下水温度: {ground_temp}℃")
+        #     st.markdown(f"- 目標温度: {target_temp}℃")
+        #     if consider_groundwater_temp_rise:
+        #         st.markdown(f"- 地下水温度上昇: +{groundwater_temp_rise:.2f}℃（自動計算）")
+        #         st.markdown(f"- 最終地下水温度: {effective_ground_temp:.1f}℃")
+        #         if consider_circulation:
+        #             st.markdown(f"- 運転時間: {operation_minutes}分")
+        #         else:
+        #             st.markdown(f"- 通水時間: {operation_hours*3600:.1f}秒（{operation_hours*60:.1f}分）")
+        #         st.markdown(f"- 温度上昇上限: {temp_rise_limit}℃")
+        #     st.markdown(f"- 掘削径: {boring_diameter}")
+        # 
+        # with condition_col2:
+        #     st.markdown("**流量条件**")
+        #     st.markdown(f"- 総流量: {flow_rate} L/min")
+        #     st.markdown(f"- 管浸水距離: {pipe_length} m")
+        #     st.markdown(f"- 管径: {pipe_diameter}")
+        # 
+        # with condition_col3:
+        #     st.markdown("**配管仕様**")
+        #     st.markdown(f"- 配管材質: {pipe_material}")
+        #     st.markdown(f"- 内径: {inner_diameter*1000:.1f} mm")
+        #     st.markdown(f"- 外径: {outer_diameter*1000:.1f} mm")
+        #     st.markdown(f"- 熱伝導率: {pipe_thermal_cond} W/m·K")
+        #     st.markdown(f"- 配管セット本数: {num_pipes} セット")
+    
+        # 温度変化グラフ（循環を考慮する場合）
+        if consider_groundwater_temp_rise and consider_circulation:
+            st.markdown("---")
+            st.subheader("📊 温度変化の時系列")
+        
+            # グラフを作成
+            fig = go.Figure()
+        
+            # 入口温度（循環水温度）
+            fig.add_trace(go.Scatter(
+                x=time_history,
+                y=inlet_temp_history,
+            mode='lines',
+            name='入口温度（循環水）',
+            line=dict(color='red', width=2)
+            ))
+        
+            # 出口温度
+            fig.add_trace(go.Scatter(
+            x=time_history,
+            y=outlet_temp_history,
+            mode='lines',
+            name='出口温度',
+            line=dict(color='blue', width=2)
+            ))
         
-        # 入口温度（循環水温度）
-        fig.add_trace(go.Scatter(
+            # 地下水温度
+            fig.add_trace(go.Scatter(
             x=time_history,
-            y=inlet_temp_history,
-        mode='lines',
-        name='入口温度（循環水）',
-        line=dict(color='red', width=2)
-        ))
-        
-        # 出口温度
-        fig.add_trace(go.Scatter(
-        x=time_history,
-        y=outlet_temp_history,
-        mode='lines',
-        name='出口温度',
-        line=dict(color='blue', width=2)
-        ))
-        
-        # 地下水温度
-        fig.add_trace(go.Scatter(
-        x=time_history,
-        y=ground_temp_history,
-        mode='lines',
-        name='地下水温度',
-        line=dict(color='green', width=2, dash='dash')
-        ))
-        
-        # 目標温度線
-        fig.add_hline(y=target_temp, line_dash="dot", line_color="gray", 
-                 annotation_text=f"目標温度 {target_temp}℃", 
-                 annotation_position="right")
-        
-        # 初期地下水温度線
-        fig.add_hline(y=ground_temp, line_dash="dot", line_color="lightgreen", 
-                 annotation_text=f"初期地下水温度 {ground_temp}℃", 
-                 annotation_position="left")
-        
-        # グラフタイトルを運転方式に応じて変更
-        graph_title = "循環による温度変化" if circulation_type == "同じ水を循環" else "連続供給による温度変化"
-        
-        fig.update_layout(
-        title=graph_title,
-        xaxis_title="経過時間（分）",
-        yaxis_title="温度（℃）",
-        height=400,
-        showlegend=True,
-        hovermode='x unified'
-        )
+            y=ground_temp_history,
+            mode='lines',
+            name='地下水温度',
+            line=dict(color='green', width=2, dash='dash')
+            ))
+        
+            # 目標温度線
+            fig.add_hline(y=target_temp, line_dash="dot", line_color="gray", 
+                     annotation_text=f"目標温度 {target_temp}℃", 
+                     annotation_position="right")
+        
+            # 初期地下水温度線
+            fig.add_hline(y=ground_temp, line_dash="dot", line_color="lightgreen", 
+                     annotation_text=f"初期地下水温度 {ground_temp}℃", 
+                     annotation_position="left")
+        
+            # グラフタイトルを運転方式に応じて変更
+            graph_title = "循環による温度変化" if circulation_type == "同じ水を循環" else "連続供給による温度変化"
+        
+            fig.update_layout(
+            title=graph_title,
+            xaxis_title="経過時間（分）",
+            yaxis_title="温度（℃）",
+            height=400,
+            showlegend=True,
+            hovermode='x unified'
+            )
         
-        st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(fig, use_container_width=True)
         
-        # 収束状況の説明
-        if circulation_type == "同じ水を循環":
-            convergence_temp = (inlet_temp_history[-1] + ground_temp_history[-1]) / 2
-            st.info(f"💡 {operation_minutes}分後の状態：循環水温度 {inlet_temp_history[-1]:.1f}℃、地下水温度 {ground_temp_history[-1]:.1f}℃に向かって収束中")
-        else:
-            st.info(f"💡 {operation_minutes}分後の状態：出口温度 {outlet_temp_history[-1]:.1f}℃、地下水温度 {ground_temp_history[-1]:.1f}℃")
-    
-    # 地下水温度上昇の詳細（チェックされている場合）
-    if consider_groundwater_temp_rise:
-        st.markdown("---")
-        st.subheader("🌊 地下水温度上昇の詳細")
-        gw_col1, gw_col2, gw_col3, gw_col4 = st.columns(4)
-        with gw_col1:
-            st.metric("掘削孔体積", f"{boring_volume:.1f} m³")
-        with gw_col2:
-            st.metric("配管総体積", f"{pipe_total_volume:.1f} m³")
-        with gw_col3:
-            st.metric("地下水質量", f"{groundwater_mass:.0f} kg")
-        with gw_col4:
-            if consider_circulation:
-                time_label = f"{operation_minutes}分運転"
+            # 収束状況の説明
+            if circulation_type == "同じ水を循環":
+                st.info(f"💡 {operation_minutes}分後の状態：循環水温度 {inlet_temp_history[-1]:.1f}℃、地下水温度 {ground_temp_history[-1]:.1f}℃に向かって収束中")
             else:
-                time_label = f"1回通水（{operation_hours*60:.1f}分）"
+                st.info(f"💡 {operation_minutes}分後の状態：出口温度 {outlet_temp_history[-1]:.1f}℃、地下水温度 {ground_temp_history[-1]:.1f}℃")
+    
+        # 地下水温度上昇の詳細（チェックされている場合）
+        if consider_groundwater_temp_rise:
+            st.markdown("---")
+            st.subheader("🌊 地下水温度上昇の詳細")
+            gw_col1, gw_col2, gw_col3, gw_col4 = st.columns(4)
+            with gw_col1:
+                st.metric("掘削孔体積", f"{boring_volume:.1f} m³")
+            with gw_col2:
+                st.metric("配管総体積", f"{pipe_total_volume:.1f} m³")
+            with gw_col3:
+                st.metric("地下水質量", f"{groundwater_mass:.0f} kg")
+            with gw_col4:
+                if consider_circulation:
+                    time_label = f"{operation_minutes}分運転"
+                else:
+                    time_label = f"1回通水（{operation_hours*60:.1f}分）"
                 
-            if groundwater_temp_rise_unlimited > temp_rise_limit:
-                st.metric(f"{time_label}での温度上昇", f"{groundwater_temp_rise:.1f}℃", f"制限前: {groundwater_temp_rise_unlimited:.1f}℃")
-            else:
-                st.metric(f"{time_label}での温度上昇", f"{groundwater_temp_rise:.1f}℃")
+                if groundwater_temp_rise_unlimited > temp_rise_limit:
+                    st.metric(f"{time_label}での温度上昇", f"{groundwater_temp_rise:.1f}℃", f"制限前: {groundwater_temp_rise_unlimited:.1f}℃")
+                else:
+                    st.metric(f"{time_label}での温度上昇", f"{groundwater_temp_rise:.1f}℃")
     
-        # 追加の計算結果表示（地下水温度上昇に関係なく表示）
-        st.markdown("---")
-        st.subheader("詳細パラメータ")
-    detail_col1, detail_col2, detail_col3, detail_col4 = st.columns(4)
+            # 追加の計算結果表示（地下水温度上昇に関係なく表示）
+            st.markdown("---")
+            st.subheader("詳細パラメータ")
+        detail_col1, detail_col2, detail_col3, detail_col4 = st.columns(4)
     
-    with detail_col1:
-        st.metric("流速", f"{velocity:.1f} m/s", help="配管内の水の流れる速度。0.5-2.0m/sが適正範囲")
+        with detail_col1:
+            st.metric("流速", f"{velocity:.1f} m/s", help="配管内の水の流れる速度。0.5-2.0m/sが適正範囲")
     
-    with detail_col2:
-        st.metric("レイノルズ数", f"{reynolds:.0f}", help="流れの状態を示す数値。2300以下は層流（おとなしい流れ）、以上は乱流（かき混ぜ効果あり）")
+        with detail_col2:
+            st.metric("レイノルズ数", f"{reynolds:.0f}", help="流れの状態を示す数値。2300以下は層流（おとなしい流れ）、以上は乱流（かき混ぜ効果あり）")
     
-    with detail_col3:
-        st.metric("熱伝達係数", f"{heat_transfer_coefficient:.0f} W/m²·K", help="配管内面での熱の移動しやすさ。数値が大きいほど熱交換が活発")
+        with detail_col3:
+            st.metric("熱伝達係数", f"{heat_transfer_coefficient:.0f} W/m²·K", help="配管内面での熱の移動しやすさ。数値が大きいほど熱交換が活発")
     
-    with detail_col4:
-        st.metric("NTU", f"{NTU:.1f}", help="熱交換の能力を示す無次元数。0.3以上で効率的な熱交換が期待できる")
+        with detail_col4:
+            st.metric("NTU", f"{NTU:.1f}", help="熱交換の能力を示す無次元数。0.3以上で効率的な熱交換が期待できる")
     
-    # 物性値の表示
-    st.markdown("---")
-    st.subheader(f"物性値（平均温度 {avg_temp:.1f}℃）")
-    prop_col1, prop_col2, prop_col3, prop_col4 = st.columns(4)
+        # 物性値の表示
+        st.markdown("---")
+        st.subheader(f"物性値（平均温度 {avg_temp:.1f}℃）")
+        prop_col1, prop_col2, prop_col3, prop_col4 = st.columns(4)
     
-    with prop_col1:
-        st.metric("動粘度", f"{kinematic_viscosity*1e6:.1f}×10⁻⁶ m²/s", help="水の粘っこさ。温度が高いほど小さくなり流れやすくなる")
+        with prop_col1:
+            st.metric("動粘度", f"{kinematic_viscosity*1e6:.1f}×10⁻⁶ m²/s", help="水の粘っこさ。温度が高いほど小さくなり流れやすくなる")
     
-    with prop_col2:
-        st.metric("熱伝導率", f"{water_thermal_conductivity:.1f} W/m·K", help="水の熱の伝わりやすさ。温度によって微妙に変化する")
+        with prop_col2:
+            st.metric("熱伝導率", f"{water_thermal_conductivity:.1f} W/m·K", help="水の熱の伝わりやすさ。温度によって微妙に変化する")
     
-    with prop_col3:
-        st.metric("プラントル数", f"{prandtl:.1f}", help="水の熱的性質を表す数値。水は約6-7で、熱移動計算に使用")
+        with prop_col3:
+            st.metric("プラントル数", f"{prandtl:.1f}", help="水の熱的性質を表す数値。水は約6-7で、熱移動計算に使用")
     
-    with prop_col4:
-        st.metric("総括熱伝達係数", f"{U:.1f} W/m²·K")
+        with prop_col4:
+            st.metric("総括熱伝達係数", f"{U:.1f} W/m²·K")
+
+        uncertainty_view()
+
+    @st.fragment
+    def uncertainty_view():
+        """不確実性解析（計算結果の表示のフラグメント内で実行する）"""
+        target_temp = st.session_state.target_temp
+
+        # 不確実性解析（入力条件のばらつきに対する出口温度の分布）
+        st.markdown("---")
+        st.subheader("🎲 不確実性解析")
+        mc_enabled = st.checkbox(
+            "入力条件のばらつきを考慮して出口温度の分布を計算する",
+            key="mc_enabled",
+            help="管外側熱伝達係数・地下水温度・総流量のばらつきを確率分布で与え、モンテカルロ法で出口温度の P10/P50/P90 を求めます"
+        )
+        if mc_enabled:
+            mc_col1, mc_col2, mc_col3, mc_col4 = st.columns(4)
+            with mc_col1:
+                mc_h_outer_range = st.slider("管外側熱伝達係数の範囲 (W/m²·K)", min_value=50.0, max_value=500.0,
+                                             value=(50.0, 500.0), step=10.0, key="mc_h_outer_range",
+                                             help="範囲内で一様に分布するとします")
+            with mc_col2:
+                mc_ground_std = st.number_input("地下水温度の標準偏差 (℃)", min_value=0.0, max_value=5.0,
+                                                value=1.0, step=0.1, key="mc_ground_std")
+            with mc_col3:
+                mc_flow_std = st.number_input("総流量の標準偏差 (%)", min_value=0.0, max_value=30.0,
+                                              value=5.0, step=1.0, key="mc_flow_std")
+            with mc_col4:
+                mc_samples = st.selectbox("標本数", MC_SAMPLE_OPTIONS, index=1, key="mc_samples",
+                                          format_func=lambda n: f"{n:,}")
+
+            uncertainty = {
+                'h_outer': {'dist': 'uniform', 'low': mc_h_outer_range[0], 'high': mc_h_outer_range[1]},
+                'ground_temp': {'dist': 'normal', 'std': mc_ground_std},
+                'flow_rate': {'dist': 'normal', 'std': flow_rate * mc_flow_std / 100},
+            }
+            # 時系列計算は1件ずつ計算するため標本数を制限する
+            samples = mc_samples if series is None else min(mc_samples, MC_TIME_STEPPED_SAMPLES)
+            # 目標温度の変更で再実行された場合は、前回の計算結果（分位点の推定）を使用する
+            mc_key = input_hash('single_mc', scenario, uncertainty, samples)
+            mc_cached = st.session_state.get("mc_result")
+            if mc_cached is not None and mc_cached[0] == mc_key:
+                mc = mc_cached[1]
+            else:
+                with admission.admit(current_session_id(), PRIORITY_INTERACTIVE):
+                    mc = monte_carlo(scenario, uncertainty, samples=samples, fields=('final_temp',))
+                mc = {name: mc[name] for name in ('summary', 'sketches', 'seconds')}
+                st.session_state.mc_result = (mc_key, mc)
+            mc_summary = mc['summary']['final_temp']
+            mc_sketch = mc['sketches']['final_temp']
+
+            band_col1, band_col2, band_col3, band_col4 = st.columns(4)
+            with band_col1:
+                st.metric("P10 出口温度", f"{mc_summary[0.1]:.1f}℃", help="10%の確率でこの温度以下になります")
+            with band_col2:
+                st.metric("P50 出口温度", f"{mc_summary[0.5]:.1f}℃", help="中央値")
+            with band_col3:
+                st.metric("P90 出口温度", f"{mc_summary[0.9]:.1f}℃", help="90%の確率でこの温度以下になります")
+            with band_col4:
+                st.metric("目標温度を超える確率", f"{(1 - mc_sketch.cdf(target_temp)) * 100:.1f}%")
+            st.plotly_chart(uncertainty_band_chart(mc_sketch, mc_summary, target_temp), use_container_width=True)
+            caption = f"標本数 {samples:,}（{mc['seconds']:.2f} 秒）"
+            if samples < mc_samples:
+                caption += f" - 時系列計算のため標本数を {MC_TIME_STEPPED_SAMPLES:,} に制限しています"
+            st.caption(caption)
+
+    single_result_view()
+
+    @st.fragment
+    def sensitivity_view():
+        """感度解析（変化幅・Sobol 指標の条件の変更ではここのみ再実行する）"""
+        # 感度解析（どの条件が出口温度などに最も影響するか）
+        st.markdown("---")
+        st.subheader("🔍 感度解析")
+
+        # 局所感度（現在の条件から各条件を ±X%、温度は ±ΔT℃ 変化させた計算を1回の一括計算で求める）
+        tornado_col1, tornado_col2 = st.columns(2)
+        with tornado_col1:
+            tornado_percent = st.slider("総流量・管浸水距離・管外側熱伝達係数の変化幅 (±%)", min_value=1,
+                                        max_value=50, value=10, step=1, key="tornado_percent",
+                                        help="各条件をそれぞれ増減させたときの計算結果を表示します")
+        with tornado_col2:
+            tornado_temp_delta = st.slider("入口温度・地下水温度の変化幅 (±℃)", min_value=0.5, max_value=10.0,
+                                           value=DEFAULT_TORNADO_TEMP_DELTA, step=0.5, key="tornado_temp_delta",
+                                           help="温度は割合ではなく絶対値で増減させます")
+        tornado_outputs = [('final_temp', "出口温度")]
+        if consider_groundwater_temp_rise:
+            tornado_outputs.append(('groundwater_temp_rise', "地下水温度上昇"))
+        tornado_result = tornado(scenario, tornado_percent / 100, base=result,
+                                 outputs=[output for output, _ in tornado_outputs],
+                                 temp_delta=tornado_temp_delta)
+        st.plotly_chart(tornado_chart(tornado_result, tornado_outputs), use_container_width=True)
+
+        sobol_enabled = st.checkbox(
+            "各条件が計算結果に与える影響の大きさ（Sobol 指標）を計算する",
+            key="sobol_enabled",
+            help="選んだ条件を範囲内で同時に変化させ、計算結果のばらつき（分散）のうち各条件による割合を求めます。"
+                 "1次指標はその条件単独の影響、総合指標は他の条件との組み合わせを含めた影響です"
+        )
+        if sobol_enabled:
+            sobol_col1, sobol_col2, sobol_col3 = st.columns([2, 1, 1])
+            with sobol_col1:
+                sobol_names = st.multiselect("変化させる条件", list(SOBOL_FACTOR_LABELS), default=list(SOBOL_FACTOR_LABELS),
+                                             format_func=SOBOL_FACTOR_LABELS.get, key="sobol_factors")
+            with sobol_col2:
+                sobol_outputs = dict(SOBOL_OUTPUTS)
+                if not consider_groundwater_temp_rise:
+                    del sobol_outputs["地下水温度上昇"]
+                sobol_output_label = st.selectbox("対象の計算結果", list(sobol_outputs), key="sobol_output")
+            with sobol_col3:
+                sobol_samples = st.selectbox("基本標本数", SOBOL_SAMPLE_OPTIONS, index=1, key="sobol_samples",
+                                             format_func=lambda n: f"{n:,}")
+
+            # 連続量の条件は範囲を指定できる（範囲ごとに結果をキャッシュする）
+            sobol_factors = {}
+            range_names = [name for name in sobol_names if 'low' in DEFAULT_FACTORS[name]]
+            range_cols = st.columns(max(len(range_names), 1))
+            for col, name in zip(range_cols, range_names):
+                spec = DEFAULT_FACTORS[name]
+                with col:
+                    low, high = st.slider(f"{SOBOL_FACTOR_LABELS[name]}の範囲", min_value=spec['low'],
+                                          max_value=spec['high'], value=(spec['low'], spec['high']),
+                                          key=f"sobol_range_{name}")
+                if low < high:
+                    sobol_factors[name] = {'low': low, 'high': high}
+            for name in sobol_names:
+                if 'levels' in DEFAULT_FACTORS[name]:
+                    sobol_factors[name] = DEFAULT_FACTORS[name]
+
+            if not sobol_factors:
+                st.info("変化させる条件を1つ以上選んでください")
+            else:
+                # 時系列計算は1件ずつ計算するため標本数を制限する
+                samples = sobol_samples if series is None else min(sobol_samples, SOBOL_TIME_STEPPED_SAMPLES)
+                sobol_output = sobol_outputs[sobol_output_label]
+                with admission.admit(current_session_id(), PRIORITY_INTERACTIVE):
+                    sobol = sobol_indices(scenario, sobol_factors, samples=samples, outputs=(sobol_output,))
+                st.plotly_chart(sobol_chart(sobol, sobol_output), use_container_width=True)
+                top_name, top = ranked(sobol, sobol_output)[0]
+                st.markdown(f"**{sobol_output_label}に最も影響する条件：{SOBOL_FACTOR_LABELS[top_name]}**"
+                            f"（ばらつきの約 {top['total'] * 100:.0f}% に関係）")
+                caption = (f"基本標本数 {sobol['samples']:,}、計算 {sobol['evaluations']:,} 件"
+                           f"（{sobol['seconds']:.2f} 秒）。誤差棒は 95% 信頼区間")
+                if samples < sobol_samples:
+                    caption += f" - 時系列計算のため基本標本数を {SOBOL_TIME_STEPPED_SAMPLES:,} に制限しています"
+                st.caption(caption)
+
+    sensitivity_view()
+
+    # パラメータスイープ（バックグラウンドのジョブで計算し、進捗と途中結果を表示）
+    @st.fragment(run_every=JOB_POLL_INTERVAL if st.session_state.get("sweep_polling") else None)
+    def sweep_view():
+        """パラメータスイープ（実行中は一定間隔でここのみ再実行する）"""
+        st.markdown("---")
+        st.subheader("📊 パラメータスイープ")
+        sweep_job_handle = st.session_state.get("sweep_job")
+        sweep_col1, sweep_col2, sweep_col3, sweep_col4 = st.columns([2, 1, 1, 1])
+        with sweep_col1:
+            sweep_label = st.selectbox("変化させる条件", list(SWEEP_PARAMETERS), key="sweep_parameter")
+        sweep_name, sweep_min, sweep_max = SWEEP_PARAMETERS[sweep_label]
+        with sweep_col2:
+            sweep_start = st.number_input("開始値", min_value=sweep_min, max_value=sweep_max,
+                                          value=sweep_min, key=f"sweep_start_{sweep_name}")
+        with sweep_col3:
+            sweep_stop = st.number_input("終了値", min_value=sweep_min, max_value=sweep_max,
+                                         value=sweep_max, key=f"sweep_stop_{sweep_name}")
+        with sweep_col4:
+            sweep_points = st.number_input("計算点数", min_value=2, max_value=5000, value=200,
+                                           step=10, key="sweep_points")
+
+        sweep_running = sweep_job_handle is not None and sweep_job_handle.active
+        button_col1, button_col2 = st.columns(2)
+        with button_col1:
+            if st.button("▶️ スイープ開始", disabled=sweep_running, use_container_width=True, key="sweep_start"):
+                axis_values = [float(v) for v in np.linspace(sweep_start, sweep_stop, int(sweep_points))]
+                grid = SweepGrid(scenario, {sweep_name: axis_values})
+                sweep_job_handle = job_executor.submit(sweep_label, sweep_job, grid, current_session_id())
+                st.session_state.sweep_job = sweep_job_handle
+                st.session_state.sweep_grid = grid
+                sweep_running = True
+        with button_col2:
+            if st.button("⏹️ 中止", disabled=not sweep_running, use_container_width=True, key="sweep_cancel"):
+                sweep_job_handle.cancel()
+
+        if sweep_job_handle is not None:
+            grid = st.session_state.sweep_grid
+            axis_name = next(iter(grid.axes))
+            axis_label = next(label for label, spec in SWEEP_PARAMETERS.items() if spec[0] == axis_name)
+            if sweep_job_handle.active:
+                st.progress(sweep_job_handle.fraction,
+                            text=f"計算中: {sweep_job_handle.done}/{len(grid)} 件（{sweep_job_handle.elapsed:.1f} 秒）")
+                admission_stats = admission.stats()
+                batch_waits = admission_stats['waits'].get(PRIORITY_BATCH)
+                st.caption(
+                    f"サーバーの計算状況: 実行中 {admission_stats['running']}/{admission_stats['max_concurrent']} 件、"
+                    f"待ち {admission_stats['queue_depth']} 件"
+                    + (f"、一括計算の待ち時間 p99 {batch_waits['p99']*1000:.0f} ms" if batch_waits else "")
+                )
+            elif sweep_job_handle.status == JOB_DONE:
+                st.success(f"✅ {len(grid)} 件の計算が完了しました（{sweep_job_handle.elapsed:.1f} 秒）")
+            elif sweep_job_handle.status == JOB_CANCELLED:
+                st.warning(f"⏹️ 中止しました（{sweep_job_handle.done}/{len(grid)} 件計算済み）")
+            elif sweep_job_handle.status == JOB_FAILED:
+                st.error(f"⚠️ 計算に失敗しました: {sweep_job_handle.error}")
+
+            values = sweep_job_handle.result if sweep_job_handle.status == JOB_DONE else sweep_job_handle.partial
+            if values is not None and len(values) > 0:
+                sweep_df = sweep_frame(grid, values)
+                fig_sweep = make_subplots(specs=[[{"secondary_y": True}]])
+                fig_sweep.add_trace(go.Scatter(x=sweep_df[axis_name], y=sweep_df['final_temp'],
+                                               mode='lines', name='出口温度 [℃]', line=dict(color='red')),
+                                    secondary_y=False)
+                fig_sweep.add_trace(go.Scatter(x=sweep_df[axis_name], y=sweep_df['heat_exchange_rate'] / 1000,
+                                               mode='lines', name='熱交換量 [kW]', line=dict(color='blue')),
+                                    secondary_y=True)
+                fig_sweep.update_xaxes(title_text=axis_label)
+                fig_sweep.update_yaxes(title_text="出口温度 [℃]", secondary_y=False)
+                fig_sweep.update_yaxes(title_text="熱交換量 [kW]", secondary_y=True)
+                fig_sweep.update_layout(height=400, hovermode='x unified')
+                st.plotly_chart(fig_sweep, use_container_width=True)
+
+        # 実行中はこのフラグメントのみ一定間隔で再実行して進捗を更新する。
+        # 開始・終了時は全体を再実行して再実行の間隔を切り替える
+        if sweep_running != st.session_state.get("sweep_polling", False):
+            st.session_state.sweep_polling = sweep_running
+            st.rerun()
+
+    sweep_view()
 
 elif page == "複数配管比較":
     # ページ遷移時のスクロールリセット用
@@ -1044,19 +1352,6 @@ elif page == "複数配管比較":
         with row1_col1_multi:
             st.subheader("基本条件")
             
-            # 目標出口温度（複数配管用）
-            if "multi_target_temp" not in st.session_state:
-                st.session_state.multi_target_temp = 23.0
-            
-            multi_target_temp = st.number_input(
-                "目標出口温度 (℃)",
-                min_value=20.0,
-                max_value=30.0,
-                step=1.0,
-                key="multi_target_temp",
-                help="最終温度との比較に使用する。計算には使用しない"
-            )
-            
             # 入口温度（複数配管用）
             if "multi_initial_temp" not in st.session_state:
                 st.session_state.multi_initial_temp = 30.0
@@ -1281,281 +1576,204 @@ elif page == "複数配管比較":
         st.info("⬆️ 計算条件を設定して「計算開始」ボタンを押してください。")
         st.stop()  # これ以降の処理をスキップ
     
-    # 配管仕様（JIS G 3452規格に基づく内径）
-    pipe_specs = {
-        "15A": 16.1,   # mm
-        "20A": 22.2,   # mm
-        "25A": 28.0,   # mm
-        "32A": 33.5,   # mm
-        "40A": 41.2,   # mm
-        "50A": 52.6,   # mm
-        "65A": 67.8,   # mm
-        "80A": 80.1    # mm
-    }
-    
-    # 材質による熱伝導率 (W/m・K)
-    thermal_conductivity = {
-        "鋼管": 50.0,
-        "アルミ管": 237.0,
-        "銅管": 398.0
-    }
-    
-    # 配管外径データ（SGP規格）
-    pipe_outer_diameter_sgp = {
-        "15A": 21.7,   # mm
-        "20A": 27.2,   # mm
-        "25A": 34.0,   # mm
-        "32A": 42.7,   # mm
-        "40A": 48.6,   # mm
-        "50A": 60.5,   # mm
-        "65A": 76.3,   # mm
-        "80A": 89.1    # mm
-    }
-    
-    # 初期計算用の地下水温度（複数配管用の値を使用）
-    effective_ground_temp = multi_ground_temp
-    
-    # 掘削径の取得（複数配管用）
-    if multi_boring_diameter == "φ116":
-        boring_diameter_mm = 116
-    elif multi_boring_diameter == "φ250":
-        boring_diameter_mm = 250
-    else:
-        boring_diameter_mm = 250  # デフォルト
-    
-    # バルク温度（物性値計算用）- 入口温度を使用
-    avg_temp = multi_initial_temp
-
-    # 温度依存の物性値計算（バルク温度法：入口温度基準）
-    water_props = get_water_properties(avg_temp)
-    kinematic_viscosity = water_props['kinematic_viscosity']
-    water_thermal_conductivity = water_props['thermal_conductivity']
-    prandtl = water_props['prandtl']
+    # 温度依存の物性値（熱交換量の表示用）
+    water_props = get_water_properties(multi_initial_temp)
     density = water_props['density']
     specific_heat = water_props['specific_heat']
-
-    pipe_thermal_cond = thermal_conductivity[multi_pipe_material]
-    # h_outer は詳細設定でユーザー入力済み（multi_h_outer）
-    total_length = multi_pipe_length * 2
-    boring_area = math.pi * (boring_diameter_mm / 2) ** 2  # mm²
     
     # 管径別比較データの計算
     pipe_comparison = []
+    multi_scenarios = []  # 不確実性解析用の計算条件
     warnings_list = []  # 警告メッセージ用リスト
     
-    # 外径データ（JIS規格）
-    pipe_outer_diameters_comp = {
-        "15A": 21.7 / 1000,  # m
-        "20A": 27.2 / 1000,
-        "25A": 34.0 / 1000,
-        "32A": 42.7 / 1000,
-        "40A": 48.6 / 1000,
-        "50A": 60.5 / 1000,
-        "65A": 76.3 / 1000,
-        "80A": 89.1 / 1000
-    }
-    
     # 選択された配管のみ計算
     for pipe_size in compare_pipes:
-        # 各管径での計算
-        inner_d = pipe_specs[pipe_size] / 1000
-        area = math.pi * (inner_d / 2) ** 2
         n_pipes = pipe_counts_user[pipe_size]
-        flow_per_p = multi_flow_rate / n_pipes
-        flow_rate_m3s_per_p = flow_per_p / 60000
-        vel = flow_rate_m3s_per_p / area
-        outer_d = pipe_outer_diameters_comp[pipe_size]
-        A_temp = math.pi * inner_d * total_length
         
-        # 配管面積と掘削径の検証
-        total_pipe_area_temp = n_pipes * math.pi * (outer_d / 2) ** 2 * 1000000  # mm²
-        if total_pipe_area_temp > boring_area * 0.8:
-            warnings_list.append(f"{pipe_size}: 配管総面積が掘削径の80%を超過 ({total_pipe_area_temp/boring_area*100:.1f}%)")
-        
-        # 熱伝達係数の計算（バルク温度法：入口温度基準）
-        re = vel * inner_d / kinematic_viscosity
-        if re < 2300:
-            nu = 3.66
-        else:
-            nu = 0.023 * (re ** 0.8) * (prandtl ** 0.3)
-
-        h = nu * water_thermal_conductivity / inner_d
-
-        # 総括熱伝達係数（内径基準）
-        U_temp = 1 / (1/h +
-                     inner_d/(2*pipe_thermal_cond) * math.log(outer_d/inner_d) +
-                     inner_d/(outer_d*multi_h_outer))
-
-        mass_flow_per_p = flow_rate_m3s_per_p * density
-        NTU_temp = U_temp * A_temp / (mass_flow_per_p * specific_heat)
-        eff_temp = 1 - math.exp(-NTU_temp)
-        final_t = multi_initial_temp - eff_temp * (multi_initial_temp - effective_ground_temp)
+        # 各管径での計算（連続供給は運転時間で一括計算）
+        scenario = normalize_inputs(
+            initial_temp=multi_initial_temp,
+            ground_temp=multi_ground_temp,
+            flow_rate=multi_flow_rate,
+            pipe_length=multi_pipe_length,
+            boring_diameter=multi_boring_diameter,
+            pipe_material=multi_pipe_material,
+            pipe_diameter=pipe_size,
+            num_pipes=n_pipes,
+            h_outer=multi_h_outer,
+            consider_groundwater_temp_rise=multi_consider_groundwater_temp_rise,
+            circulation_type=multi_circulation_type if multi_consider_circulation else None,
+            operation_minutes=multi_operation_minutes if multi_consider_circulation else None,
+            temp_rise_limit=multi_temp_rise_limit,
+            stepwise=False
+        )
+        with prefetcher.foreground(), admission.admit(current_session_id(), PRIORITY_COMPARISON):
+            result = calculate_cached(scenario)
+        if usage_log is not None and calculate_clicked_multi:
+            usage_log.record(scenario)
+        multi_scenarios.append(scenario)
         
-        # 地下水温度上昇の計算（各配管サイズごと）
-        if multi_consider_groundwater_temp_rise:
-            # 熱交換量の計算 [W]
-            heat_rate_temp = mass_flow_per_p * n_pipes * specific_heat * (multi_initial_temp - final_t)
-            
-            # 地下水の体積計算（ボーリング孔内のみ）
-            boring_volume_temp = math.pi * (boring_diameter_mm / 2000) ** 2 * multi_pipe_length  # m³
-            # 配管の総体積（U字管なので往復分で2倍）
-            pipe_total_volume_temp = math.pi * (outer_d / 2) ** 2 * multi_pipe_length * n_pipes * 2  # m³
-            # 地下水体積
-            groundwater_volume_temp = boring_volume_temp - pipe_total_volume_temp  # m³
-            groundwater_mass_temp = groundwater_volume_temp * density  # kg
-            
-            # 循環方式に応じた計算
-            if multi_consider_circulation and multi_circulation_type == "同じ水を循環":
-                # 同じ水を循環させる場合の計算（反復計算）
-                time_step = 60  # 1分ごとの計算
-                if multi_operation_hours is not None:
-                    num_steps = int(multi_operation_hours * 3600 / time_step)
-                else:
-                    num_steps = 1  # デフォルト値
-                
-                current_inlet_temp = multi_initial_temp
-                current_ground_temp = multi_ground_temp
-                    
-                for i in range(num_steps):
-                    # 現在の温度での熱交換計算
-                    current_effectiveness = 1 - math.exp(-NTU_temp)
-                    current_outlet_temp = current_inlet_temp - current_effectiveness * (current_inlet_temp - current_ground_temp)
-                    
-                    # 熱交換量
-                    current_heat_rate = mass_flow_per_p * n_pipes * specific_heat * (current_inlet_temp - current_outlet_temp)
-                    
-                    # 地下水温度上昇
-                    if groundwater_mass_temp > 0:
-                        delta_ground_temp = (current_heat_rate * time_step) / (groundwater_mass_temp * specific_heat)
-                        current_ground_temp += delta_ground_temp
-                        # 物理的制約：地下水温度は入口温度を超えない
-                        current_ground_temp = min(current_ground_temp, multi_ground_temp + multi_temp_rise_limit, current_inlet_temp)
-                    
-                    # 次のステップの入口温度は現在の出口温度
-                    current_inlet_temp = current_outlet_temp
-                
-                # 最終結果
-                final_t = current_outlet_temp
-                effective_ground_temp_local = current_ground_temp
-                gw_temp_rise = current_ground_temp - multi_ground_temp
-                    
-            else:
-                # 新しい水を連続供給する場合、または循環を考慮しない場合
-                # 循環を考慮しない場合は1回の通水時間を計算
-                if not multi_consider_circulation:
-                    total_pipe_length_temp = multi_pipe_length * 2  # U字管往復
-                    transit_time_seconds_temp = total_pipe_length_temp / vel  # 秒
-                    operation_hours_temp = transit_time_seconds_temp / 3600  # 時間に変換
-                else:
-                    operation_hours_temp = multi_operation_hours if multi_operation_hours is not None else 1.0
-                    
-                operation_time = operation_hours_temp * 3600  # 秒
-                if groundwater_mass_temp > 0:
-                    gw_temp_rise = (heat_rate_temp * operation_time) / (groundwater_mass_temp * specific_heat)
-                    # 物理的制約：地下水温度は入口温度を超えない
-                    max_possible_rise = multi_initial_temp - multi_ground_temp
-                    gw_temp_rise = min(gw_temp_rise, multi_temp_rise_limit, max_possible_rise)
-                else:
-                    gw_temp_rise = 0.0
-                
-                # 実効地下水温度で再計算
-                effective_ground_temp_local = multi_ground_temp + gw_temp_rise
-                final_t = multi_initial_temp - eff_temp * (multi_initial_temp - effective_ground_temp_local)
-        else:
-            gw_temp_rise = 0.0
+        # 配管面積と掘削径の検証
+        if result['total_pipe_area'] > result['boring_area'] * 0.8:
+            warnings_list.append(f"{pipe_size}: 配管総面積が掘削径の80%を超過 ({result['total_pipe_area']/result['boring_area']*100:.1f}%)")
         
         pipe_comparison.append({
             "管径": pipe_size,
             "本数": n_pipes,
-            "出口温度(℃)": round(final_t, 1),
-            "効率(%)": round(eff_temp * 100, 1),
-            "流速(m/s)": round(vel, 1),
-            "レイノルズ数": int(re),
-            "h_i(W/m²K)": int(h),
-            "U(W/m²K)": round(U_temp, 1),
-            "NTU": round(NTU_temp, 1)
+            "出口温度(℃)": round(result['final_temp'], 1),
+            "効率(%)": round(result['effectiveness'] * 100, 1),
+            "流速(m/s)": round(result['velocity'], 1),
+            "レイノルズ数": int(result['reynolds']),
+            "h_i(W/m²K)": int(result['heat_transfer_coefficient']),
+            "U(W/m²K)": round(result['U'], 1),
+            "NTU": round(result['NTU'], 1)
         })
 
     df = pd.DataFrame(pipe_comparison)
-    
-    # 管径別比較結果
-    st.subheader("📋 管径別比較結果")
-    st.dataframe(df, use_container_width=True)
-    
-    # 警告表示
-    if warnings_list:
-        st.error("⚠️ 配管面積に関する警告")
-        for warning in warnings_list:
-            st.warning(warning)
 
-    # グラフ表示
-    st.header("📊 視覚化")
+    # 比較結果の表示はフラグメントに分け、表示のみの入力（目標温度・不確実性解析の表示）を変更した場合は
+    # 該当するフラグメントのみ再実行する（管径ごとの計算は再実行しない）
+    @st.fragment
+    def multi_result_view():
+        """管径別比較結果の表（不確実性解析の表示の切り替えではここのみ再実行する）"""
+        # 不確実性解析の列は表示用のコピーに追加する（計算結果の表は再実行しても変更しない）
+        table = df.copy()
 
-    # 管径別効率比較
-    fig = make_subplots(
-        rows=1, cols=2,
-        subplot_titles=("管径別効率", "管径別出口温度"),
-        specs=[[{"secondary_y": False}, {"secondary_y": False}]]
-    )
+        # 不確実性解析（管外側熱伝達係数・地下水温度・総流量の既定のばらつき）
+        multi_mc_enabled = st.checkbox(
+            "入力条件のばらつきを考慮した出口温度の範囲（P10〜P90）を表示する",
+            key="multi_mc_enabled",
+            help="管外側熱伝達係数 50〜500 W/m²·K（一様分布）、地下水温度 ±1℃・総流量 ±5%（標準偏差）のばらつきを与えます"
+        )
+        if multi_mc_enabled and len(table) > 0:
+            # 目標温度の変更などで再実行された場合は、前回の計算結果（分位点）を使用する
+            mc_key = input_hash('multi_mc', multi_scenarios, MULTI_MC_SAMPLES)
+            mc_cached = st.session_state.get("multi_mc_result")
+            if mc_cached is not None and mc_cached[0] == mc_key:
+                bands = mc_cached[1]
+            else:
+                bands = {0.1: [], 0.5: [], 0.9: []}
+                for scenario in multi_scenarios:
+                    with admission.admit(current_session_id(), PRIORITY_COMPARISON):
+                        mc = monte_carlo(scenario, default_uncertainty(scenario), samples=MULTI_MC_SAMPLES,
+                                         fields=('final_temp',))
+                    for q in bands:
+                        bands[q].append(round(mc['summary']['final_temp'][q], 1))
+                st.session_state.multi_mc_result = (mc_key, bands)
+            table["出口温度P10(℃)"] = bands[0.1]
+            table["出口温度P50(℃)"] = bands[0.5]
+            table["出口温度P90(℃)"] = bands[0.9]
+    
+        # 管径別比較結果
+        st.subheader("📋 管径別比較結果")
+        st.dataframe(table, use_container_width=True)
+    
+        # 警告表示
+        if warnings_list:
+            st.error("⚠️ 配管面積に関する警告")
+            for warning in warnings_list:
+                st.warning(warning)
 
-    # 効率グラフ
-    fig.add_trace(
-        go.Bar(x=df["管径"], y=df["効率(%)"], name="効率", marker_color="blue"),
-        row=1, col=1
-    )
+        multi_target_view(table)
 
-    # 温度グラフ
-    fig.add_trace(
-        go.Scatter(x=df["管径"], y=df["出口温度(℃)"], mode="lines+markers", 
-                   name="出口温度", line=dict(color="red")),
-        row=1, col=2
-    )
+    @st.fragment
+    def multi_target_view(df):
+        """グラフと最適配管の分析（目標温度の変更ではここのみ再実行する）"""
+        # グラフ表示
+        st.header("📊 視覚化")
+
+        # 目標出口温度（複数配管用、計算には使用しないため変更時はこのフラグメントのみ再実行する）
+        if "multi_target_temp" not in st.session_state:
+            st.session_state.multi_target_temp = 23.0
+
+        multi_target_temp = st.number_input(
+            "目標出口温度 (℃)",
+            min_value=20.0,
+            max_value=30.0,
+            step=1.0,
+            key="multi_target_temp",
+            help="最終温度との比較に使用する。計算には使用しない"
+        )
+
+        # 管径別効率比較
+        fig = make_subplots(
+            rows=1, cols=2,
+            subplot_titles=("管径別効率", "管径別出口温度"),
+            specs=[[{"secondary_y": False}, {"secondary_y": False}]]
+        )
+
+        # 効率グラフ
+        fig.add_trace(
+            go.Bar(x=df["管径"], y=df["効率(%)"], name="効率", marker_color="blue"),
+            row=1, col=1
+        )
+
+        # 出口温度の P10〜P90 の範囲（不確実性解析を表示する場合）
+        if "出口温度P10(℃)" in df:
+            fig.add_trace(
+                go.Scatter(x=df["管径"], y=df["出口温度P90(℃)"], mode="lines", line=dict(width=0),
+                           showlegend=False, hoverinfo="skip"),
+                row=1, col=2
+            )
+            fig.add_trace(
+                go.Scatter(x=df["管径"], y=df["出口温度P10(℃)"], mode="lines", line=dict(width=0),
+                           fill="tonexty", fillcolor="rgba(255, 0, 0, 0.15)", name="出口温度 P10〜P90"),
+                row=1, col=2
+            )
+
+        # 温度グラフ
+        fig.add_trace(
+            go.Scatter(x=df["管径"], y=df["出口温度(℃)"], mode="lines+markers", 
+                       name="出口温度", line=dict(color="red")),
+            row=1, col=2
+        )
     
-    # 目標温度ラインを追加
-    fig.add_hline(y=multi_target_temp, line_dash="dash", line_color="green", 
-                  annotation_text=f"目標温度: {multi_target_temp}℃", 
-                  annotation_position="right", row=1, col=2)
+        # 目標温度ラインを追加
+        fig.add_hline(y=multi_target_temp, line_dash="dash", line_color="green", 
+                      annotation_text=f"目標温度: {multi_target_temp}℃", 
+                      annotation_position="right", row=1, col=2)
 
-    fig.update_layout(height=400, showlegend=True)
-    st.plotly_chart(fig, use_container_width=True)
+        fig.update_layout(height=400, showlegend=True)
+        st.plotly_chart(fig, use_container_width=True)
     
-    # 最適配管の提案
-    st.header("🎆 最適配管の分析")
+        # 最適配管の提案
+        st.header("🎆 最適配管の分析")
     
-    # 目標温度との比較
-    if len(df) > 0:
-        # 最も効率が高い配管を特定
-        best_pipe = df.loc[df["効率(%)"].idxmax()]
+        # 目標温度との比較
+        if len(df) > 0:
+            # 最も効率が高い配管を特定
+            best_pipe = df.loc[df["効率(%)"].idxmax()]
         
-        # 目標温度を満たす配管を探す
-        df_target_met = df[df["出口温度(℃)"] <= multi_target_temp]
+            # 目標温度を満たす配管を探す
+            df_target_met = df[df["出口温度(℃)"] <= multi_target_temp]
         
-        if len(df_target_met) > 0:
-            # 目標温度を満たす中で最も効率が高い配管
-            best_pipe_target = df_target_met.loc[df_target_met["効率(%)"].idxmax()]
-            st.success(f"✅ 目標温度（{multi_target_temp}℃）を満たす最適配管: {best_pipe_target['管径']}")
+            if len(df_target_met) > 0:
+                # 目標温度を満たす中で最も効率が高い配管
+                best_pipe_target = df_target_met.loc[df_target_met["効率(%)"].idxmax()]
+                st.success(f"✅ 目標温度（{multi_target_temp}℃）を満たす最適配管: {best_pipe_target['管径']}")
             
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("出口温度", f"{best_pipe_target['出口温度(℃)']}℃")
-                st.metric("効率", f"{best_pipe_target['効率(%)']}%")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("出口温度", f"{best_pipe_target['出口温度(℃)']}℃")
+                    st.metric("効率", f"{best_pipe_target['効率(%)']}%")
             
-            with col2:
-                st.metric("本数", f"{best_pipe_target['本数']}セット")
-                st.metric("流速", f"{best_pipe_target['流速(m/s)']} m/s")
+                with col2:
+                    st.metric("本数", f"{best_pipe_target['本数']}セット")
+                    st.metric("流速", f"{best_pipe_target['流速(m/s)']} m/s")
             
-            with col3:
-                st.metric("NTU", f"{best_pipe_target['NTU']}")
-                # 熱交換量を計算
-                best_pipe_size = best_pipe_target['管径']
-                best_n_pipes = best_pipe_target['本数']
-                best_flow_per_p = multi_flow_rate / best_n_pipes / 60000  # L/min → m³/s
-                best_mass_flow_per_p = best_flow_per_p * density
-                heat_exchange_kw = best_mass_flow_per_p * best_n_pipes * specific_heat * (multi_initial_temp - best_pipe_target['出口温度(℃)']) / 1000
-                st.metric("熱交換量", f"{heat_exchange_kw:.1f} kW")
-        else:
-            st.warning(f"⚠️ 選択した配管では目標温度（{multi_target_temp}℃）を満たせません")
-            st.info(f"最も効率的な配管: {best_pipe['管径']} (出口温度: {best_pipe['出口温度(℃)']}℃)")
+                with col3:
+                    st.metric("NTU", f"{best_pipe_target['NTU']}")
+                    # 熱交換量を計算
+                    best_n_pipes = best_pipe_target['本数']
+                    best_flow_per_p = multi_flow_rate / best_n_pipes / 60000  # L/min → m³/s
+                    best_mass_flow_per_p = best_flow_per_p * density
+                    heat_exchange_kw = best_mass_flow_per_p * best_n_pipes * specific_heat * (multi_initial_temp - best_pipe_target['出口温度(℃)']) / 1000
+                    st.metric("熱交換量", f"{heat_exchange_kw:.1f} kW")
+            else:
+                st.warning(f"⚠️ 選択した配管では目標温度（{multi_target_temp}℃）を満たせません")
+                st.info(f"最も効率的な配管: {best_pipe['管径']} (出口温度: {best_pipe['出口温度(℃)']}℃)")
+
+    multi_result_view()
 
     # フッター
     st.markdown("---")
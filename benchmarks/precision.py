@@ -0,0 +1,93 @@
+"""
+計算精度のベンチマーク
+float64 と float32 の一括計算の処理速度・使用メモリと、float64 に対する float32 の誤差を比較する
+
+使用例:
+    python -m benchmarks.precision --samples 2000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from calculations.batch import BATCH_FIELDS, calculate_arrays
+from calculations.engine import CIRCULATION_CONTINUOUS_SUPPLY
+from calculations.properties import BORING_DIAMETERS, PIPE_INNER_DIAMETERS, PIPE_THERMAL_CONDUCTIVITY
+
+# 温度で評価する項目（絶対誤差 [℃]）、それ以外は相対誤差で評価する
+_TEMPERATURE_FIELDS = ('final_temp', 'effective_ground_temp', 'groundwater_temp_rise')
+
+
+def sample_inputs(samples, seed=0):
+    """画面の入力範囲から一様に計算条件を抽出する"""
+    rng = np.random.default_rng(seed)
+    return {
+        'initial_temp': rng.uniform(20.0, 40.0, samples),
+        'ground_temp': rng.uniform(0.0, 20.0, samples),
+        'flow_rate': rng.uniform(20.0, 100.0, samples),
+        'pipe_length': rng.uniform(1.0, 30.0, samples),
+        'h_outer': rng.uniform(50.0, 500.0, samples),
+        'num_pipes': rng.integers(1, 6, samples),
+        'pipe_diameter': rng.choice(list(PIPE_INNER_DIAMETERS), samples),
+        'pipe_material': rng.choice(list(PIPE_THERMAL_CONDUCTIVITY), samples),
+        'boring_diameter': rng.choice(list(BORING_DIAMETERS), samples),
+        'consider_groundwater_temp_rise': rng.random(samples) < 0.5,
+        'circulation_type': np.where(rng.random(samples) < 0.5, None, CIRCULATION_CONTINUOUS_SUPPLY),
+        'operation_minutes': rng.integers(1, 61, samples),
+        'temp_rise_limit': rng.uniform(5.0, 20.0, samples),
+        'stepwise': False,
+    }
+
+
+def measure(inputs, precision, repeat):
+    """処理時間（最短）と計算中の最大使用メモリ、結果を返す"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = calculate_arrays(**inputs, precision=precision)
+        best = min(best, time.perf_counter() - started)
+        del result
+    tracemalloc.start()
+    result = calculate_arrays(**inputs, precision=precision)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.precision", description="計算精度のベンチマーク")
+    parser.add_argument("--samples", type=int, default=1000000, help="計算条件数")
+    parser.add_argument("--repeat", type=int, default=3, help="処理時間の測定回数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    inputs = sample_inputs(args.samples, args.seed)
+    results = {}
+    print(f"計算条件 {args.samples} 件")
+    print(f"{'精度':<8} {'処理速度 [件/s]':>16} {'最大使用メモリ [MB]':>20} {'結果 [MB]':>10}")
+    for precision in ('float64', 'float32'):
+        seconds, peak, result = measure(inputs, precision, args.repeat)
+        results[precision] = (seconds, peak, result)
+        result_bytes = sum(values.nbytes for values in result.values())
+        print(f"{precision:<8} {args.samples / seconds:>16,.0f} {peak / 1e6:>20,.1f} {result_bytes / 1e6:>10,.1f}")
+    print(f"float32 / float64: 処理速度 {results['float64'][0] / results['float32'][0]:.2f} 倍, "
+          f"最大使用メモリ {results['float32'][1] / results['float64'][1]:.2f} 倍")
+
+    print("\nfloat64 に対する float32 の最大誤差")
+    reference, approximate = results['float64'][2], results['float32'][2]
+    for field in BATCH_FIELDS:
+        exact = reference[field]
+        error = np.abs(approximate[field].astype(np.float64) - exact)
+        if field in _TEMPERATURE_FIELDS:
+            print(f"  {field:<32} {np.nanmax(error):.2e} ℃")
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                relative = np.where(exact != 0, error / np.abs(exact), error)
+            print(f"  {field:<32} {np.nanmax(relative):.2e}（相対）")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,211 @@
+"""
+画面操作の再実行回数ベンチマーク
+ヘッドレスで起動した Streamlit サーバーに WebSocket で接続し、単一配管計算の設計作業
+（条件の入力→計算開始→条件の見直し）を再現して、スクリプトの再実行回数とサーバーの CPU 時間を測定する
+
+使用例:
+    python -m benchmarks.reruns
+    git show HEAD~1:app.py > /tmp/app_old.py && python -m benchmarks.reruns --app /tmp/app_old.py
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+import websockets
+
+# リポジトリのルート（計算モジュールを読み込めるよう、サーバーはここで起動する）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 設計作業の操作手順（("set", キー, 値) は入力の変更、("click", キー) はボタンの押下）
+DESIGN_SESSION = [
+    ("set", "initial_temp", 32.0),
+    ("set", "flow_rate", 40.0),
+    ("set", "ground_temp", 16.0),
+    ("set", "pipe_length", 10.0),
+    ("set", "boring_diameter", "φ116"),
+    ("set", "pipe_material", "銅管"),
+    ("set", "pipe_diameter", "25A"),
+    ("set", "num_pipes_user", 2),
+    ("set", "h_outer_input", 250.0),
+    ("set", "consider_groundwater_temp_rise", True),
+    ("set", "temp_rise_limit", 8),
+    ("click", "calc_single"),
+    # 条件の見直し（複数の条件を変更して再計算）
+    ("set", "flow_rate", 60.0),
+    ("set", "pipe_length", 15.0),
+    ("set", "num_pipes_user", 3),
+    ("click", "calc_single"),
+    ("set", "initial_temp", 35.0),
+    ("set", "pipe_diameter", "32A"),
+    ("click", "calc_single"),
+]
+
+# 1回の再実行の待ち時間の上限（秒）
+RERUN_TIMEOUT = 120
+
+
+def cpu_seconds(pid):
+    """プロセスの CPU 時間（ユーザー + システム、秒）"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port):
+    """Streamlit サーバーをヘッドレスで起動し、接続できるまで待つ"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.abspath(app),
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+    for _ in range(300):
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Streamlit サーバーが起動しませんでした")
+
+
+class BrowserSession:
+    """ブラウザの代わりに入力の変更とボタンの押下を送り、再実行の完了を待つ"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.page_script_hash = ""
+        # キー → (ウィジェットID, ウィジェットの種類, フラグメントID, フォームID)
+        self.widgets = {}
+        # 確定済みの入力と、フォーム内の未送信の入力（フォームID → {ウィジェットID: 状態}）
+        self.states = {}
+        self.pending = {}
+        self.reruns = 0
+
+    async def rerun(self, fragment_id="", trigger=None):
+        message = BackMsg()
+        client_state = message.rerun_script
+        client_state.page_script_hash = self.page_script_hash
+        client_state.fragment_id = fragment_id
+        client_state.widget_states.widgets.extend(self.states.values())
+        if trigger is not None:
+            client_state.widget_states.widgets.add(id=trigger, trigger_value=True)
+        await self.connection.send(message.SerializeToString())
+        await self.wait()
+        self.reruns += 1
+
+    async def wait(self):
+        """スクリプトの実行完了まで受信し、表示されたウィジェットを記録する"""
+        while True:
+            raw = await asyncio.wait_for(self.connection.recv(), RERUN_TIMEOUT)
+            message = ForwardMsg()
+            message.ParseFromString(raw)
+            kind = message.WhichOneof("type")
+            if kind == "new_session":
+                self.page_script_hash = (message.new_session.page_script_hash
+                                         or message.new_session.main_script_hash)
+            elif kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+                element = message.delta.new_element
+                if element.WhichOneof("type") == "exception":
+                    raise RuntimeError(f"スクリプトで例外が発生しました: {element.exception.message}")
+                widget = getattr(element, element.WhichOneof("type"))
+                widget_id = getattr(widget, "id", "")
+                if widget_id.startswith("$$ID"):
+                    key = widget_id.split("-", 2)[-1]
+                    self.widgets[key] = (widget_id, element.WhichOneof("type"), message.delta.fragment_id,
+                                         getattr(widget, "form_id", ""))
+            elif kind == "script_finished":
+                if message.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("スクリプトの実行に失敗しました")
+                return
+
+    async def set(self, key, value):
+        """入力を変更する（フォーム内の入力は送信ボタンを押すまで再実行しない）"""
+        widget_id, kind, fragment_id, form_id = self.widgets[key]
+        state = WidgetState(id=widget_id)
+        if kind in ("selectbox", "radio"):
+            # 選択肢は表示文字列で送る
+            state.string_value = str(value)
+        elif isinstance(value, bool):
+            state.bool_value = value
+        elif isinstance(value, float):
+            state.double_value = value
+        elif isinstance(value, int):
+            state.int_value = value
+        else:
+            state.string_value = value
+        if form_id:
+            self.pending.setdefault(form_id, {})[widget_id] = state
+        else:
+            self.states[widget_id] = state
+            await self.rerun(fragment_id)
+
+    async def click(self, key):
+        """ボタンを押す（フォームの送信ボタンの場合はフォーム内の入力も確定する）"""
+        widget_id, kind, fragment_id, form_id = self.widgets[key]
+        if form_id:
+            self.states.update(self.pending.pop(form_id, {}))
+        await self.rerun(fragment_id, trigger=widget_id)
+
+
+async def run_session(port, steps):
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream",
+                                  subprotocols=["streamlit"], max_size=None) as connection:
+        session = BrowserSession(connection)
+        await session.rerun()
+        for step in steps:
+            await getattr(session, step[0])(*step[1:])
+        return session.reruns
+
+
+def measure(app, steps):
+    """設計作業1回分の再実行回数・サーバーの CPU 時間・所要時間を返す（起動時の読み込みは含まない）"""
+    port = free_port()
+    process = start_server(app, port)
+    try:
+        # 初回表示で計算モジュールの読み込み・応答曲面の準備を済ませてから測定する
+        asyncio.run(run_session(port, []))
+        cpu_before = cpu_seconds(process.pid)
+        started = time.perf_counter()
+        reruns = asyncio.run(run_session(port, steps))
+        return reruns, cpu_seconds(process.pid) - cpu_before, time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.reruns", description="画面操作の再実行回数ベンチマーク")
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"), help="測定するアプリのスクリプト")
+    parser.add_argument("--repeat", type=int, default=3, help="測定回数（CPU 時間は最小値を表示）")
+    args = parser.parse_args(argv)
+
+    edits = sum(step[0] == "set" for step in DESIGN_SESSION)
+    clicks = len(DESIGN_SESSION) - edits
+    print(f"設計作業: 入力の変更 {edits} 回, 計算開始 {clicks} 回（{args.app}）")
+    results = [measure(args.app, DESIGN_SESSION) for _ in range(args.repeat)]
+    reruns = results[0][0]
+    cpu = min(result[1] for result in results)
+    elapsed = min(result[2] for result in results)
+    print(f"再実行 {reruns} 回, サーバーの CPU 時間 {cpu:.2f} 秒（1回あたり {cpu / reruns:.3f} 秒）, "
+          f"所要時間 {elapsed:.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,9 @@
+"""
+計算条件ファイルの一括計算（python -m calculations）
+"""
+
+import sys
+
+from calculations.cli import main
+
+sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+複数の計算条件の一括計算
+計算条件の列を numpy の配列として扱い、熱交換と地下水温度上昇をまとめて計算する
+"""
+
+import numpy as np
+
+from calculations.engine import (
+    CIRCULATION_CONTINUOUS_SUPPLY,
+    CIRCULATION_SAME_WATER,
+    calculate,
+    normalize_inputs,
+)
+from calculations.properties import (
+    BORING_DIAMETERS,
+    PIPE_INNER_DIAMETERS,
+    PIPE_OUTER_DIAMETERS,
+    PIPE_THERMAL_CONDUCTIVITY,
+    WATER_PROPERTIES,
+)
+
+# 一括計算で返す計算結果の項目（calculate の戻り値のうち数値のもの）
+BATCH_FIELDS = (
+    'inner_diameter',
+    'outer_diameter',
+    'velocity',
+    'reynolds',
+    'nusselt',
+    'heat_transfer_coefficient',
+    'mass_flow_rate_per_pipe',
+    'total_pipe_area',
+    'pipe_thermal_cond',
+    'U',
+    'NTU',
+    'effectiveness',
+    'heat_exchange_rate',
+    'transit_time_seconds',
+    'boring_area',
+    'boring_volume',
+    'pipe_total_volume',
+    'groundwater_volume',
+    'groundwater_mass',
+    'operation_minutes',
+    'final_temp',
+    'effective_ground_temp',
+    'groundwater_temp_rise',
+    'groundwater_temp_rise_unlimited',
+)
+
+_PROPERTY_NAMES = ('kinematic_viscosity', 'thermal_conductivity', 'prandtl', 'density', 'specific_heat')
+
+# 計算精度
+# float32 は配列の使用メモリと転送量が半分になる。画面の入力範囲での float64 との差は
+# 出口温度・地下水温度上昇が 1e-4 ℃ 未満、熱交換量などその他の項目が相対 1e-4 未満
+# （benchmarks/precision.py で確認できる）
+PRECISIONS = {
+    'float64': np.float64,
+    'float32': np.float32,
+}
+
+# calculate_arrays で配列として与えられる計算条件（normalize_inputs の引数のうち inlet_profile 以外）
+_ARRAY_INPUTS = (
+    'initial_temp', 'ground_temp', 'flow_rate', 'pipe_length', 'boring_diameter', 'pipe_material',
+    'pipe_diameter', 'num_pipes', 'h_outer', 'consider_groundwater_temp_rise', 'circulation_type',
+    'operation_minutes', 'temp_rise_limit', 'stepwise',
+)
+
+
+def _dtype(precision):
+    try:
+        return PRECISIONS[precision]
+    except KeyError:
+        raise ValueError(f"計算精度 {precision} は未対応です（{', '.join(PRECISIONS)}）") from None
+
+
+def water_properties_batch(temps, dtype=np.float64):
+    """
+    get_water_properties の配列版（同じ式で線形補間する）
+
+    Parameters:
+        temps: 温度の配列 [℃]
+        dtype: 計算に使用する型
+
+    Returns:
+        dict: 物性値名 → 配列
+    """
+    temps = np.asarray(temps, dtype=dtype)
+    table_temps = np.array(sorted(WATER_PROPERTIES), dtype=dtype)
+    table = np.array([WATER_PROPERTIES[t] for t in sorted(WATER_PROPERTIES)], dtype=dtype)
+
+    # t_low < temp <= t_high となる区間（範囲外は端の値）
+    high = np.clip(np.searchsorted(table_temps, temps, side='left'), 1, len(table_temps) - 1)
+    low = high - 1
+    t_ratio = (temps - table_temps[low]) / (table_temps[high] - table_temps[low])
+
+    props = {}
+    for column, name in enumerate(_PROPERTY_NAMES):
+        values = table[low, column] + (table[high, column] - table[low, column]) * t_ratio
+        values = np.where(temps <= table_temps[0], table[0, column], values)
+        values = np.where(temps >= table_temps[-1], table[-1, column], values)
+        props[name] = values
+    return props
+
+
+def _lookup(table, keys, label, dtype=np.float64):
+    """文字列の条件（1つまたは列）を仕様表の値（の配列）に変換する"""
+    try:
+        if isinstance(keys, str):
+            return np.asarray(table[keys], dtype=dtype)
+        if isinstance(keys, np.ndarray):
+            # 配列は仕様表の項目ごとに一致する要素をまとめて置き換える
+            values = np.empty(keys.shape, dtype=dtype)
+            found = np.zeros(keys.shape, dtype=bool)
+            for key, value in table.items():
+                match = keys == key
+                values[match] = value
+                found |= match
+            if not found.all():
+                raise KeyError(keys[~found][0])
+            return values
+        return np.array([table[key] for key in keys], dtype=dtype)
+    except KeyError as exc:
+        raise ValueError(f"{label} {exc.args[0]} は未対応です") from None
+
+
+def _optional(scenarios, name):
+    """None を NaN とした数値の配列を返す"""
+    return np.array([np.nan if s[name] is None else s[name] for s in scenarios], dtype=float)
+
+
+def _kernel(initial_temp, ground_temp, flow_rate, pipe_length, num_pipes, h_outer,
+            inner_diameter, outer_diameter, pipe_thermal_cond, boring_diameter_mm,
+            consider, no_circulation, operation_minutes, temp_rise_limit):
+    """
+    熱交換と地下水温度上昇（一括計算）を配列で計算する
+
+    引数はすべて同じ型の配列（またはブロードキャストできる配列）とし、
+    計算結果も同じ型になる。
+    """
+    # 物性値
+    water_props = water_properties_batch(initial_temp, initial_temp.dtype)
+    specific_heat = water_props['specific_heat']
+
+    # 流れ
+    pipe_area = np.pi * (inner_diameter / 2) ** 2
+    flow_rate_m3s_per_pipe = flow_rate / num_pipes / 60000
+    velocity = flow_rate_m3s_per_pipe / pipe_area
+    reynolds = velocity * inner_diameter / water_props['kinematic_viscosity']
+    nusselt = np.where(reynolds < 2300, initial_temp.dtype.type(3.66),
+                       0.023 * (reynolds ** 0.8) * (water_props['prandtl'] ** 0.3))
+    heat_transfer_coefficient = nusselt * water_props['thermal_conductivity'] / inner_diameter
+    mass_flow_rate_per_pipe = flow_rate_m3s_per_pipe * water_props['density']
+
+    # 総括熱伝達係数
+    U = 1 / (1/heat_transfer_coefficient +
+             inner_diameter/(2*pipe_thermal_cond) * np.log(outer_diameter/inner_diameter) +
+             inner_diameter/(outer_diameter*h_outer))
+
+    # 熱交換
+    heat_exchange_area = np.pi * inner_diameter * pipe_length * 2
+    NTU = U * heat_exchange_area / (mass_flow_rate_per_pipe * specific_heat)
+    effectiveness = -np.expm1(-NTU)
+    final_temp = initial_temp - effectiveness * (initial_temp - ground_temp)
+    # initial_temp - final_temp と同じ値（温度差が小さい場合に桁落ちしない式）
+    heat_exchange_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * effectiveness * (initial_temp - ground_temp)
+    transit_time_seconds = pipe_length * 2 / velocity
+
+    # 掘削孔
+    boring_volume = np.pi * (boring_diameter_mm / 2000) ** 2 * pipe_length
+    pipe_total_volume = np.pi * (outer_diameter / 2) ** 2 * pipe_length * num_pipes * 2
+    groundwater_volume = boring_volume - pipe_total_volume
+    groundwater_mass = groundwater_volume * water_props['density']
+
+    # 地下水温度上昇（一括計算）
+    operation_time = np.where(no_circulation, transit_time_seconds, operation_minutes * 60)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rise = np.where(groundwater_mass > 0,
+                        (heat_exchange_rate * operation_time) / (groundwater_mass * specific_heat), 0)
+    limited_rise = np.minimum(np.minimum(rise, temp_rise_limit), initial_temp - ground_temp)
+    effective_ground_temp = np.where(consider, ground_temp + limited_rise, ground_temp)
+    groundwater_temp_rise = np.where(consider, limited_rise, 0)
+    groundwater_temp_rise_unlimited = np.where(consider, rise, 0)
+    final_temp = np.where(consider,
+                          initial_temp - effectiveness * (initial_temp - effective_ground_temp),
+                          final_temp)
+
+    shape = np.broadcast_shapes(*(np.shape(a) for a in (
+        initial_temp, ground_temp, flow_rate, pipe_length, num_pipes, h_outer, inner_diameter,
+        pipe_thermal_cond, boring_diameter_mm, consider, no_circulation, operation_minutes, temp_rise_limit)))
+    result = {
+        'inner_diameter': inner_diameter,
+        'outer_diameter': outer_diameter,
+        'velocity': velocity,
+        'reynolds': reynolds,
+        'nusselt': nusselt,
+        'heat_transfer_coefficient': heat_transfer_coefficient,
+        'mass_flow_rate_per_pipe': mass_flow_rate_per_pipe,
+        'total_pipe_area': num_pipes * np.pi * (outer_diameter / 2) ** 2 * 1000000,
+        'pipe_thermal_cond': pipe_thermal_cond,
+        'U': U,
+        'NTU': NTU,
+        'effectiveness': effectiveness,
+        'heat_exchange_rate': heat_exchange_rate,
+        'transit_time_seconds': transit_time_seconds,
+        'boring_area': np.pi * (boring_diameter_mm / 2) ** 2,
+        'boring_volume': boring_volume,
+        'pipe_total_volume': pipe_total_volume,
+        'groundwater_volume': groundwater_volume,
+        'groundwater_mass': groundwater_mass,
+        'operation_minutes': operation_minutes,
+        'final_temp': final_temp,
+        'effective_ground_temp': effective_ground_temp,
+        'groundwater_temp_rise': groundwater_temp_rise,
+        'groundwater_temp_rise_unlimited': groundwater_temp_rise_unlimited,
+    }
+    # スカラーの条件から求めた項目は計算条件数の配列に広げる
+    dtype = initial_temp.dtype
+    for field, values in result.items():
+        values = np.asarray(values, dtype=dtype)
+        result[field] = values if values.shape == shape else np.broadcast_to(values, shape).copy()
+    return result
+
+
+def calculate_arrays(initial_temp=30.0, ground_temp=15.0, flow_rate=50.0, pipe_length=5.0,
+                     boring_diameter="φ250", pipe_material="鋼管", pipe_diameter="32A",
+                     num_pipes=1, h_outer=300.0, consider_groundwater_temp_rise=False,
+                     circulation_type=None, operation_minutes=10, temp_rise_limit=5.0,
+                     stepwise=True, precision='float64'):
+    """
+    配列で与えた計算条件をまとめて計算する（モンテカルロ計算など、条件の dict を作らない場合）
+
+    数値の条件は配列またはスカラー（互いにブロードキャストできる形）、
+    文字列の条件は1つの値または計算条件数と同じ長さの列で指定する。
+    時系列計算が必要な循環方式（同じ水を循環、連続供給の時系列計算）は
+    calculate_batch を使用すること。
+
+    Parameters:
+        normalize_inputs と同じ（inlet_profile を除く）
+        precision: 計算精度（'float64' または 'float32'）
+
+    Returns:
+        dict: BATCH_FIELDS の各項目 → 配列（指定した精度）
+    """
+    dtype = _dtype(precision)
+    consider = np.asarray(consider_groundwater_temp_rise, dtype=bool)
+    if isinstance(circulation_type, str) or circulation_type is None:
+        circulations = np.array([circulation_type], dtype=object)
+    else:
+        circulations = np.array(list(circulation_type), dtype=object)
+    stepwise = np.asarray(stepwise, dtype=bool)
+    time_stepped = consider & ((circulations == CIRCULATION_SAME_WATER) |
+                               ((circulations == CIRCULATION_CONTINUOUS_SUPPLY) & stepwise))
+    if time_stepped.any():
+        raise ValueError("時系列計算が必要な循環方式は calculate_batch で計算してください")
+    no_circulation = np.equal(circulations, None)
+    if isinstance(circulation_type, str) or circulation_type is None:
+        no_circulation = no_circulation[0]
+    # 使用しない運転時間は normalize_inputs と同じく未設定（NaN）とする
+    operation_minutes = np.where(consider & ~no_circulation,
+                                 np.asarray(operation_minutes, dtype=dtype), np.nan).astype(dtype)
+
+    return _kernel(
+        initial_temp=np.asarray(initial_temp, dtype=dtype),
+        ground_temp=np.asarray(ground_temp, dtype=dtype),
+        flow_rate=np.asarray(flow_rate, dtype=dtype),
+        pipe_length=np.asarray(pipe_length, dtype=dtype),
+        num_pipes=np.asarray(num_pipes, dtype=dtype),
+        h_outer=np.asarray(h_outer, dtype=dtype),
+        inner_diameter=_lookup(PIPE_INNER_DIAMETERS, pipe_diameter, "管径", dtype) / 1000,
+        outer_diameter=_lookup(PIPE_OUTER_DIAMETERS, pipe_diameter, "管径", dtype) / 1000,
+        pipe_thermal_cond=_lookup(PIPE_THERMAL_CONDUCTIVITY, pipe_material, "配管材質", dtype),
+        boring_diameter_mm=_lookup(BORING_DIAMETERS, boring_diameter, "掘削径", dtype),
+        consider=consider,
+        no_circulation=no_circulation,
+        operation_minutes=operation_minutes,
+        temp_rise_limit=np.asarray(temp_rise_limit, dtype=dtype),
+    )
+
+
+def is_time_stepped(inputs):
+    """時系列計算が必要な条件（配列の一括計算を使用できない）なら True"""
+    if not inputs['consider_groundwater_temp_rise']:
+        return False
+    circulation = inputs['circulation_type']
+    return circulation == CIRCULATION_SAME_WATER or (
+        circulation == CIRCULATION_CONTINUOUS_SUPPLY and inputs['stepwise'])
+
+
+def calculate_varied(inputs, varied, precision='float64'):
+    """
+    1つの計算条件の一部の項目を配列で変化させて一括計算する
+
+    時系列計算が必要な条件は normalize_inputs で1件ずつの条件にして
+    calculate_batch で計算する。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値（変化させない項目の値）
+        varied: 項目名 → 値の配列（すべて同じ長さ）
+        precision: 計算精度（'float64' または 'float32'）
+
+    Returns:
+        dict: BATCH_FIELDS の各項目 → 配列（該当しない値は NaN）
+    """
+    conditions = {name: inputs[name] for name in _ARRAY_INPUTS}
+    if not is_time_stepped(inputs):
+        conditions.update(varied)
+        if conditions['operation_minutes'] is None:
+            conditions['operation_minutes'] = np.nan
+        if conditions['temp_rise_limit'] is None:
+            conditions['temp_rise_limit'] = np.nan
+        return calculate_arrays(**conditions, precision=precision)
+
+    size = len(next(iter(varied.values()))) if varied else 1
+    conditions['inlet_profile'] = inputs['inlet_profile']
+    scenarios = [
+        normalize_inputs(**{**conditions, **{name: _item(values[i]) for name, values in varied.items()}})
+        for i in range(size)
+    ]
+    return calculate_batch(scenarios, precision)
+
+
+def _item(value):
+    """numpy の値を Python の値にする（normalize_inputs の引数用）"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def calculate_batch(scenarios, precision='float64'):
+    """
+    複数の計算条件をまとめて計算する
+
+    地下水温度一定と一括計算（1回通水、連続供給の一括計算）は配列で計算し、
+    時系列計算が必要な条件（同じ水を循環、連続供給の時系列計算）は
+    1件ずつ calculate で計算する（ステージのキャッシュは通さない）。
+
+    Parameters:
+        scenarios: normalize_inputs の戻り値の list
+        precision: 計算精度（'float64' または 'float32'）
+
+    Returns:
+        dict: BATCH_FIELDS の各項目 → 配列（該当しない値は NaN）
+    """
+    dtype = _dtype(precision)
+    if len(scenarios) == 0:
+        return {field: np.empty(0, dtype=dtype) for field in BATCH_FIELDS}
+
+    def column(name):
+        return np.array([s[name] for s in scenarios], dtype=dtype)
+
+    pipe_diameters = [s['pipe_diameter'] for s in scenarios]
+    result = _kernel(
+        initial_temp=column('initial_temp'),
+        ground_temp=column('ground_temp'),
+        flow_rate=column('flow_rate'),
+        pipe_length=column('pipe_length'),
+        num_pipes=column('num_pipes'),
+        h_outer=column('h_outer'),
+        inner_diameter=_lookup(PIPE_INNER_DIAMETERS, pipe_diameters, "管径", dtype) / 1000,
+        outer_diameter=_lookup(PIPE_OUTER_DIAMETERS, pipe_diameters, "管径", dtype) / 1000,
+        pipe_thermal_cond=_lookup(PIPE_THERMAL_CONDUCTIVITY, [s['pipe_material'] for s in scenarios],
+                                  "配管材質", dtype),
+        boring_diameter_mm=_lookup(BORING_DIAMETERS, [s['boring_diameter'] for s in scenarios], "掘削径", dtype),
+        consider=np.array([s['consider_groundwater_temp_rise'] for s in scenarios], dtype=bool),
+        no_circulation=np.array([s['circulation_type'] is None for s in scenarios], dtype=bool),
+        operation_minutes=_optional(scenarios, 'operation_minutes').astype(dtype),
+        temp_rise_limit=_optional(scenarios, 'temp_rise_limit').astype(dtype),
+    )
+
+    # 時系列計算が必要な条件は1件ずつ計算する
+    for i, scenario in enumerate(scenarios):
+        if is_time_stepped(scenario):
+            exact = calculate(scenario, cache=False)
+            for field in BATCH_FIELDS:
+                value = exact[field]
+                result[field][i] = np.nan if value is None else value
+    return result
+
+
+def batch_rows(scenarios):
+    """
+    calculate_batch の結果を計算条件ごとの dict の list にする
+
+    Returns:
+        list: BATCH_FIELDS の各項目 → 値（NaN は None）の dict
+    """
+    columns = calculate_batch(scenarios)
+    rows = []
+    for i in range(len(scenarios)):
+        row = {}
+        for field in BATCH_FIELDS:
+            value = float(columns[field][i])
+            row[field] = None if np.isnan(value) else value
+        rows.append(row)
+    return rows
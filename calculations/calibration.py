@@ -0,0 +1,436 @@
+"""
+運転ログによるモデルパラメータの同定
+設置済みシステムの入口温度・出口温度・流量のログ（CSV）をチャンクごとに読み込み、
+時系列モデルの管外側熱伝達係数・実効地下水量・地下水の交換率を非線形最小二乗法で推定する
+
+使用例:
+    python -m calculations.calibration operation_log.csv --pipe-length 10 --pipe-diameter 32A --num-pipes 2
+
+ログの列（列名はオプションで変更できる）:
+    time         時刻（日時、または数値の場合は経過時間 [s]。calculations.twin の計測値と同じ）
+    inlet_temp   入口温度 [℃]
+    outlet_temp  出口温度 [℃]
+    flow_rate    総流量 [L/min]（0 以下の行は停止中とみなす）
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import optimize, stats
+
+from calculations.batch import calculate_arrays
+from calculations.engine import TIME_STEP, calculate, normalize_inputs
+from calculations.properties import BORING_DIAMETERS, PIPE_INNER_DIAMETERS, PIPE_THERMAL_CONDUCTIVITY
+
+# ログの列名の既定値（モデルの項目名 → CSV の列名）
+DEFAULT_COLUMNS = {
+    'time': 'time',
+    'inlet_temp': 'inlet_temp',
+    'outlet_temp': 'outlet_temp',
+    'flow_rate': 'flow_rate',
+}
+
+# 推定できるパラメータと探索範囲
+#   h_outer: 管外側熱伝達係数 [W/m²·K]
+#   groundwater_volume: 熱交換に寄与する実効地下水量 [m³]（既定値はボーリング孔内の地下水量）
+#   exchange_rate: 周囲の帯水層との交換により地下水温度が初期温度へ戻る割合 [1/h]
+#   ground_temp: 初期（周囲の）地下水温度 [℃]
+CALIBRATION_PARAMETERS = {
+    'h_outer': (1.0, 5000.0),
+    'groundwater_volume': (1e-3, 1e3),
+    'exchange_rate': (0.0, 10.0),
+    'ground_temp': (-10.0, 40.0),
+}
+
+# 既定で推定するパラメータ（それ以外は初期値に固定する）
+DEFAULT_FIT = ('h_outer', 'groundwater_volume', 'exchange_rate')
+
+# 既定の交換率の初期値 [1/h]
+DEFAULT_EXCHANGE_RATE = 0.01
+
+# ログを読み込む1チャンクの行数
+DEFAULT_CHUNK_ROWS = 200000
+
+# 既定の信頼水準
+DEFAULT_CONFIDENCE = 0.95
+
+
+def _elapsed_seconds(values, origin):
+    """時刻の列を経過時間 [s] に変換する（origin は最初のチャンクで決めた基準）"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float), origin
+    stamps = pd.to_datetime(values)
+    nanoseconds = stamps.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    if origin is None:
+        origin = nanoseconds[0]
+    return (nanoseconds - origin) / 1e9, origin
+
+
+def read_log(source, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS, resample=None):
+    """
+    運転ログの CSV をチャンクごとに読み込む
+
+    数値でない値や欠損を含む行は除く。resample を指定すると各チャンクを
+    その間隔の平均に集約してから連結するため、細かいログでも使用メモリを抑えられる。
+
+    Parameters:
+        source: CSV のパスまたはファイルオブジェクト
+        columns: モデルの項目名 → CSV の列名（省略した項目は DEFAULT_COLUMNS）
+        chunk_rows: 1チャンクの行数
+        resample: 集約する間隔 [s]（省略時は集約しない。区間内の入口温度・流量は平均値で一定と
+            みなすため、流量・入口温度の変化より十分短くする）
+
+    Returns:
+        dict: time（経過時間 [s]）, inlet_temp, outlet_temp, flow_rate の配列（時刻順）
+    """
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    names = list(DEFAULT_COLUMNS)
+    parts = {name: [] for name in names}
+    origin = None
+    carry = None  # 次のチャンクに持ち越す、集約途中の区間の行
+
+    reader = pd.read_csv(source, usecols=[columns[name] for name in names], chunksize=chunk_rows)
+    for chunk in reader:
+        chunk = chunk.rename(columns={columns[name]: name for name in names})
+        elapsed, origin = _elapsed_seconds(chunk['time'], origin)
+        data = {'time': elapsed}
+        for name in names[1:]:
+            data[name] = pd.to_numeric(chunk[name], errors='coerce').to_numpy(dtype=float)
+        valid = np.isfinite(data['time']) & np.isfinite(data['inlet_temp']) & np.isfinite(data['flow_rate'])
+        data = {name: values[valid] for name, values in data.items()}
+
+        if resample is not None:
+            if carry is not None:
+                data = {name: np.concatenate([carry[name], data[name]]) for name in names}
+            bins = np.floor(data['time'] / resample).astype(np.int64)
+            # 最後の区間は次のチャンクに続く可能性があるため持ち越す
+            last = bins.size and bins[-1]
+            keep = bins == last
+            carry = {name: values[keep] for name, values in data.items()}
+            data = {name: values[~keep] for name, values in data.items()}
+            data = _bin_means(data, bins[~keep])
+        for name in names:
+            parts[name].append(data[name])
+
+    if carry is not None and carry['time'].size:
+        data = _bin_means(carry, np.floor(carry['time'] / resample).astype(np.int64))
+        for name in names:
+            parts[name].append(data[name])
+
+    log = {name: np.concatenate(parts[name]) if parts[name] else np.empty(0) for name in names}
+    order = np.argsort(log['time'], kind='stable')
+    return {name: values[order] for name, values in log.items()}
+
+
+def _bin_means(data, bins):
+    """
+    同じ区間の行を平均する（出口温度は欠損を除いて平均する）
+
+    運転中と停止中の行は別々に平均し、起動・停止をまたぐ区間は2行にする
+    （停止中の流量 0 を平均に含めると、運転中の出口温度と対応しなくなるため）。
+    """
+    if bins.size == 0:
+        return data
+    keys = bins * 2 + (data['flow_rate'] > 0)
+    _, index = np.unique(keys, return_inverse=True)
+    means = {}
+    for name, values in data.items():
+        finite = np.isfinite(values)
+        total = np.bincount(index, weights=np.where(finite, values, 0.0))
+        count = np.bincount(index, weights=finite.astype(float))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[name] = total / count
+    return means
+
+
+def substep_sums(log_decay, steps):
+    """
+    TIME_STEP ごとの更新 y ← A·y + B を steps 回繰り返したときの係数
+
+    steps 回後は y_n = A^n·y_0 + B·Σ_{j<n} A^j、更新前の値の合計は
+    Σ_{j<n} y_j = y_0·Σ_{j<n} A^j + B·Σ_{j<n} Σ_{i<j} A^i となる。
+    steps は整数でなくてもよい（ログの時間刻みが TIME_STEP の倍数でない場合）。
+
+    Parameters:
+        log_decay: log A（0 以下、-inf は A = 0）
+        steps: 繰り返す回数 n
+
+    Returns:
+        tuple: (A^n, Σ_{j<n} A^j, Σ_{j<n} Σ_{i<j} A^i)
+    """
+    log_decay = np.asarray(log_decay, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        one_minus = -np.expm1(log_decay)
+        total = np.where(log_decay < 0, np.expm1(steps * log_decay) / np.expm1(log_decay), steps)
+        inner = np.where(log_decay < 0, (steps - total) / one_minus, steps * (steps - 1) / 2)
+    return np.exp(steps * log_decay), total, inner
+
+
+def _affine_scan(a, b, initial):
+    """
+    y_t = a_t·y_{t-1} + b_t（係数が時間変化する1次の線形漸化式）を一括評価する
+
+    1次式の合成 (a2, b2)∘(a1, b1) = (a2·a1, a2·b1 + b2) を 1, 2, 4, ... ステップ離れた
+    要素どうしで繰り返す（Hillis–Steele の並列スキャン）。配列演算 log2(n) 回で
+    全ステップを求められ、除算を含まないため長い系列でも誤差は増えない。
+    """
+    a = np.array(a, dtype=float)
+    b = np.array(b, dtype=float)
+    shift = 1
+    while shift < a.size:
+        b[shift:] += a[shift:] * b[:-shift]
+        a[shift:] *= a[:-shift]
+        shift *= 2
+    return a * initial + b
+
+
+class LogModel:
+    """
+    運転ログの運転条件に対する時系列モデル
+
+    各行の入口温度・流量での流速・管内側熱伝達係数・NTU は calculate_arrays で
+    1回だけ計算し、管外側熱伝達係数を変えたときの NTU は熱抵抗の置き換えで求める。
+    地下水温度は計算エンジンの連続供給と同じ TIME_STEP ごとの更新式
+        T_gw ← T_gw + k·(T_in - T_gw)、k = ṁ·ε·TIME_STEP / m_gw（1 以下）
+    で入口温度へ近づけたのち、交換率 λ で初期温度へ指数的に戻す。各行の時間刻みは
+    その行の入口温度・流量のまま TIME_STEP ごとに更新を繰り返したものとして
+    閉じた式（substep_sums）で求め、出口温度は繰り返し中の地下水温度の平均で計算する。
+    このため結果はログの間隔（resample の有無）によらず、λ = 0 で
+    計算エンジンの時系列計算（温度上昇上限値を除く）と一致する。
+
+    Parameters:
+        log: read_log の戻り値
+        inputs: normalize_inputs の戻り値（配管・掘削孔の条件）
+    """
+
+    def __init__(self, log, inputs):
+        self.inputs = inputs
+        self.time = log['time']
+        self.inlet_temp = log['inlet_temp']
+        self.outlet_temp = log['outlet_temp']
+        flow_rate = log['flow_rate']
+        if self.time.size < 2:
+            raise ValueError("ログの行数が不足しています（2行以上必要です）")
+
+        # 各行の時間刻み（先頭の行は時間刻みの中央値）
+        steps = np.diff(self.time)
+        self.time_step = np.concatenate([[np.median(steps)], steps])
+
+        # 停止中（流量 0 以下）の行は熱交換しない
+        self.running = flow_rate > 0
+        reference_h_outer = inputs['h_outer']
+        result = calculate_arrays(
+            initial_temp=self.inlet_temp,
+            ground_temp=inputs['ground_temp'],
+            flow_rate=np.where(self.running, flow_rate, 1.0),
+            pipe_length=inputs['pipe_length'],
+            boring_diameter=inputs['boring_diameter'],
+            pipe_material=inputs['pipe_material'],
+            pipe_diameter=inputs['pipe_diameter'],
+            num_pipes=inputs['num_pipes'],
+            h_outer=reference_h_outer,
+        )
+        # 管外側以外の熱抵抗と、U に対する NTU の比（いずれも h_outer によらない）
+        diameter_ratio = result['inner_diameter'] / result['outer_diameter']
+        self._resistance = 1 / result['U'] - diameter_ratio / reference_h_outer
+        self._diameter_ratio = diameter_ratio
+        self._ntu_per_u = result['NTU'] / result['U']
+        self._mass_flow_rate = np.where(self.running, result['mass_flow_rate_per_pipe'] * inputs['num_pipes'], 0.0)
+        self.groundwater_volume = float(np.median(result['groundwater_volume']))
+        # 地下水の密度は計算エンジンと同じく各行の入口温度での値とする（k では流量の密度と約分される）
+        self._density = result['groundwater_mass'] / result['groundwater_volume']
+
+    def effectiveness(self, h_outer):
+        """各行の熱交換効率 ε"""
+        U = 1 / (self._resistance + self._diameter_ratio / h_outer)
+        return np.where(self.running, -np.expm1(-U * self._ntu_per_u), 0.0)
+
+    def simulate(self, h_outer, groundwater_volume, exchange_rate, ground_temp):
+        """
+        各行の出口温度と地下水温度を計算する
+
+        Returns:
+            tuple: (出口温度の配列, 各行更新後の地下水温度の配列)
+        """
+        effectiveness = self.effectiveness(h_outer)
+        k = self._mass_flow_rate * effectiveness * TIME_STEP / (groundwater_volume * self._density)
+        # 地下水温度は入口温度を超えない（k ≤ 1）
+        k = np.minimum(k, 1.0)
+        recovery = math.exp(-exchange_rate * TIME_STEP / 3600)
+        # TIME_STEP ごとの更新 T_gw ← A·T_gw + B を各行の時間刻みの分だけ繰り返す
+        forcing = k * self.inlet_temp * recovery + (1 - recovery) * ground_temp
+        with np.errstate(divide='ignore'):
+            log_decay = np.log1p(-k) - exchange_rate * TIME_STEP / 3600
+        steps = self.time_step / TIME_STEP
+        decay, total, inner = substep_sums(log_decay, steps)
+        ground = _affine_scan(decay, total * forcing, ground_temp)
+
+        # 出口温度は各 TIME_STEP の更新前の地下水温度の平均で計算する
+        previous = np.concatenate([[ground_temp], ground[:-1]])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_ground = np.where(steps > 0, (previous * total + forcing * inner) / steps, previous)
+        outlet = self.inlet_temp - effectiveness * (self.inlet_temp - mean_ground)
+        return outlet, ground
+
+    def residual_mask(self):
+        """残差に使用する行（運転中で出口温度が記録されている行）"""
+        return self.running & np.isfinite(self.outlet_temp)
+
+
+def calibrate(log, inputs, fit=DEFAULT_FIT, initial=None, confidence=DEFAULT_CONFIDENCE):
+    """
+    運転ログの出口温度に合うようにモデルパラメータを推定する
+
+    scipy.optimize.least_squares（信頼領域法、範囲制約付き）で出口温度の残差二乗和を最小化する。
+    信頼区間は解でのヤコビ行列による線形近似（残差は独立と仮定するため、
+    自己相関の強いログでは狭めに出る。モデルはログの間隔によらないため、
+    resample で間引いて自己相関を弱めると緩和できる）。
+
+    Parameters:
+        log: read_log の戻り値
+        inputs: normalize_inputs の戻り値（配管・掘削孔の条件、h_outer・ground_temp は初期値）
+        fit: 推定するパラメータ名（CALIBRATION_PARAMETERS のキー）
+        initial: パラメータ名 → 初期値（省略したものは inputs・ボーリング孔内の地下水量・既定の交換率）
+        confidence: 信頼区間の信頼水準
+
+    Returns:
+        dict: parameters（名前 → {'value', 'std', 'low', 'high', 'fitted'}）, rmse [℃], rows, nfev,
+              seconds, success, message
+    """
+    started = time.perf_counter()
+    fit = tuple(fit)
+    for name in fit:
+        if name not in CALIBRATION_PARAMETERS:
+            raise ValueError(f"パラメータ {name} は推定できません（{', '.join(CALIBRATION_PARAMETERS)}）")
+    if not fit:
+        raise ValueError("推定するパラメータを1つ以上指定してください")
+
+    model = LogModel(log, inputs)
+    values = {
+        'h_outer': inputs['h_outer'],
+        'groundwater_volume': model.groundwater_volume,
+        'exchange_rate': DEFAULT_EXCHANGE_RATE,
+        'ground_temp': inputs['ground_temp'],
+    }
+    values.update(initial or {})
+    mask = model.residual_mask()
+    rows = int(mask.sum())
+    if rows <= len(fit):
+        raise ValueError(f"運転中で出口温度のある行が {rows} 行しかありません")
+    measured = model.outlet_temp[mask]
+
+    def residuals(x):
+        params = {**values, **dict(zip(fit, x))}
+        outlet, _ = model.simulate(**params)
+        return outlet[mask] - measured
+
+    lower = [CALIBRATION_PARAMETERS[name][0] for name in fit]
+    upper = [CALIBRATION_PARAMETERS[name][1] for name in fit]
+    x0 = np.clip([values[name] for name in fit], lower, upper)
+    solution = optimize.least_squares(residuals, x0, bounds=(lower, upper), x_scale='jac')
+
+    # 共分散 s²·(JᵀJ)⁻¹ と t 分布による信頼区間
+    dof = rows - len(fit)
+    s2 = 2 * solution.cost / dof
+    covariance = np.linalg.pinv(solution.jac.T @ solution.jac) * s2
+    t = stats.t.ppf((1 + confidence) / 2, dof)
+
+    parameters = {}
+    for name in CALIBRATION_PARAMETERS:
+        if name in fit:
+            i = fit.index(name)
+            value = float(solution.x[i])
+            std = float(math.sqrt(max(covariance[i, i], 0.0)))
+            half_width = float(t * std)
+            parameters[name] = {'value': value, 'std': std, 'low': value - half_width, 'high': value + half_width,
+                                'fitted': True}
+        else:
+            value = float(values[name])
+            parameters[name] = {'value': value, 'std': 0.0, 'low': value, 'high': value, 'fitted': False}
+    return {
+        'parameters': parameters,
+        'rmse': math.sqrt(2 * solution.cost / rows),
+        'rows': rows,
+        'nfev': solution.nfev,
+        'seconds': time.perf_counter() - started,
+        'success': bool(solution.success),
+        'message': solution.message,
+    }
+
+
+# パラメータの表示名と単位
+_LABELS = {
+    'h_outer': ("管外側熱伝達係数", "W/m²·K"),
+    'groundwater_volume': ("実効地下水量", "m³"),
+    'exchange_rate': ("地下水の交換率", "1/h"),
+    'ground_temp': ("初期地下水温度", "℃"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calculations.calibration",
+                                     description="運転ログによるモデルパラメータの同定")
+    parser.add_argument("log", help="運転ログの CSV（- は標準入力）")
+    parser.add_argument("--pipe-length", type=float, default=5.0, help="管浸水距離 [m]")
+    parser.add_argument("--pipe-diameter", choices=list(PIPE_INNER_DIAMETERS), default="32A")
+    parser.add_argument("--pipe-material", choices=list(PIPE_THERMAL_CONDUCTIVITY), default="鋼管")
+    parser.add_argument("--num-pipes", type=int, default=1, help="配管セット本数")
+    parser.add_argument("--boring-diameter", choices=list(BORING_DIAMETERS), default="φ250")
+    parser.add_argument("--ground-temp", type=float, default=15.0, help="初期地下水温度 [℃]")
+    parser.add_argument("--h-outer", type=float, default=300.0, help="管外側熱伝達係数の初期値 [W/m²·K]")
+    parser.add_argument("--fit", default=",".join(DEFAULT_FIT),
+                        help=f"推定するパラメータ（カンマ区切り、{', '.join(CALIBRATION_PARAMETERS)}）")
+    parser.add_argument("--resample", type=float, help="ログを集約する間隔 [s]")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="ログを読み込む1チャンクの行数")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="信頼区間の信頼水準")
+    for name, column in DEFAULT_COLUMNS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}-column", default=column, help=f"{name} の列名")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+    if args.chunk_rows < 1:
+        parser.error("--chunk-rows は1以上で指定してください")
+    if args.resample is not None and args.resample <= 0:
+        parser.error("--resample は正の値で指定してください")
+
+    columns = {name: getattr(args, f"{name}_column") for name in DEFAULT_COLUMNS}
+    inputs = normalize_inputs(
+        ground_temp=args.ground_temp, pipe_length=args.pipe_length, boring_diameter=args.boring_diameter,
+        pipe_material=args.pipe_material, pipe_diameter=args.pipe_diameter, num_pipes=args.num_pipes,
+        h_outer=args.h_outer,
+    )
+    try:
+        log = read_log(sys.stdin if args.log == '-' else args.log, columns, args.chunk_rows, args.resample)
+        result = calibrate(log, inputs, [name.strip() for name in args.fit.split(',') if name.strip()],
+                           confidence=args.confidence)
+    except (KeyError, ValueError) as exc:
+        print(f"同定を中止しました: {exc}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+    percent = args.confidence * 100
+    print(f"ログ {result['rows']} 行、評価 {result['nfev']} 回（{result['seconds']:.1f} 秒）")
+    print(f"出口温度の残差（RMS）: {result['rmse']:.3f} ℃")
+    for name, param in result['parameters'].items():
+        label, unit = _LABELS[name]
+        if param['fitted']:
+            print(f"  {label}: {param['value']:.4g} {unit}"
+                  f"（{percent:g}% 信頼区間 {param['low']:.4g}〜{param['high']:.4g}）")
+        else:
+            print(f"  {label}: {param['value']:.4g} {unit}（固定）")
+    # ボーリング孔内の地下水量（参考）
+    reference = calculate(inputs)['groundwater_volume']
+    print(f"  （ボーリング孔内の地下水量 {reference:.4g} m³）")
+    if not result['success']:
+        print(f"収束しませんでした: {result['message']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+時系列計算のチェックポイント
+計算済みの時系列と最終状態を入力ハッシュごとに保持し、
+運転時間の延長や入口温度プロファイルの追加時に続きから計算する
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from calculations.groundwater import TimeSeries, simulate_circulation, simulate_continuous_supply
+from utils.cache import input_hash
+
+# 保持する時系列の合計サイズの上限 [bytes]（1分ごとの1年分の時系列は約17MB）
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 連続供給のキーに含める入口温度の先頭ステップ数（入口温度プロファイルごとにチェックポイントを分ける）
+PROFILE_KEY_STEPS = 60
+
+
+class CheckpointStore:
+    """
+    入力ハッシュごとに最も長く計算した時系列と計算再開用の状態を保持する
+
+    時系列の合計サイズが上限を超えた場合は最も古く参照されたものから破棄する
+    （上限を超える1件は保持しない）。保持する時系列は読み取り専用にし、
+    返す状態は複写するため、呼び出し側の変更でチェックポイントが壊れることはない。
+    複数セッションから同時に参照されるためロックで保護する。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """保存済みの時系列を返す（なければ None）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        buffer, state = entry
+        return TimeSeries(buffer, dict(state))
+
+    def put(self, key, series):
+        """時系列を読み取り専用にして保存する（同じキーの既存の時系列は置き換える）"""
+        series.buffer.setflags(write=False)
+        entry = (series.buffer, dict(series.state))
+        size = series.buffer.nbytes
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0].nbytes
+            if size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def nbytes(self):
+        """保持している時系列の合計サイズ [bytes]"""
+        with self._lock:
+            return self._bytes
+
+    def clear(self):
+        """全てのチェックポイントを破棄する"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def _extend_buffer(head, num_steps):
+    """
+    計算済みの時系列を先頭に複写した num_steps ステップ分のバッファを確保する
+
+    Returns:
+        tuple: (バッファ, 追加区間の書き込み先ビュー)
+    """
+    computed_steps = len(head)
+    buffer = np.empty((len(TimeSeries.CHANNELS), num_steps))
+    buffer[:, :computed_steps] = head.buffer
+    return buffer, buffer[:, computed_steps:]
+
+
+def simulate_circulation_cached(store, initial_temp, ground_temp, NTU, mass_flow_rate,
+                                groundwater_mass, temp_rise_limit, num_steps, time_step=60):
+    """
+    同じ水を循環させる場合の時系列をチェックポイントから計算する
+
+    計算済みの運転時間以下ならその一部を返し、より長い場合は
+    最新のチェックポイントから追加分のみを計算する。
+
+    Parameters:
+        store: CheckpointStore
+        その他: simulate_circulation と同じ
+
+    Returns:
+        TimeSeries: 時系列（読み取り専用。途中で切り詰めた場合 state は None）
+    """
+    key = input_hash('circulation', initial_temp, ground_temp, NTU, mass_flow_rate,
+                     groundwater_mass, temp_rise_limit, time_step)
+    cached = store.get(key)
+
+    if cached is not None and cached.state is not None:
+        computed_steps = cached.state['step']
+        if num_steps <= computed_steps:
+            return cached.head(num_steps) if num_steps < computed_steps else cached
+        buffer, tail = _extend_buffer(cached, num_steps)
+        extension = simulate_circulation(initial_temp, ground_temp, NTU, mass_flow_rate,
+                                         groundwater_mass, temp_rise_limit,
+                                         num_steps - computed_steps, time_step,
+                                         state=cached.state, out=tail)
+        series = TimeSeries(buffer, extension.state)
+    else:
+        series = simulate_circulation(initial_temp, ground_temp, NTU, mass_flow_rate,
+                                      groundwater_mass, temp_rise_limit, num_steps, time_step)
+
+    if series.state is not None:
+        store.put(key, series)
+    series.buffer.setflags(write=False)
+    return series
+
+
+def simulate_continuous_supply_cached(store, inlet_temps, ground_temp, NTU, mass_flow_rate,
+                                      groundwater_mass, temp_rise_limit, time_step=60):
+    """
+    新しい水を連続供給する場合の時系列をチェックポイントから計算する
+
+    入口温度の配列が計算済みのものと先頭から一致する場合は、
+    一致する区間の結果を再利用し、追加された区間のみを計算する。
+
+    Parameters:
+        store: CheckpointStore
+        その他: simulate_continuous_supply と同じ
+
+    Returns:
+        TimeSeries: 時系列（読み取り専用。途中で切り詰めた場合 state は None）
+    """
+    inlet = np.asarray(inlet_temps, dtype=float)
+    num_steps = inlet.size
+    # 先頭 PROFILE_KEY_STEPS ステップの入口温度をキーに含め、異なるプロファイルで互いに破棄しないようにする
+    # （それより短い計算済みの時系列は延長時に再利用しないが、計算量は小さい）
+    key = input_hash('continuous_supply', ground_temp, NTU, mass_flow_rate,
+                     groundwater_mass, temp_rise_limit, time_step,
+                     inlet[:PROFILE_KEY_STEPS])
+    cached = store.get(key)
+
+    if cached is not None and cached.state is not None:
+        computed_steps = cached.state['step']
+        shared = min(num_steps, computed_steps)
+        if np.array_equal(cached.inlet_temp[:shared], inlet[:shared]):
+            if num_steps <= computed_steps:
+                return cached.head(num_steps) if num_steps < computed_steps else cached
+            buffer, tail = _extend_buffer(cached, num_steps)
+            extension = simulate_continuous_supply(inlet[computed_steps:], ground_temp, NTU,
+                                                   mass_flow_rate, groundwater_mass, temp_rise_limit,
+                                                   time_step, state=cached.state, out=tail)
+            series = TimeSeries(buffer, extension.state)
+            store.put(key, series)
+            return series
+
+    series = simulate_continuous_supply(inlet, ground_temp, NTU, mass_flow_rate,
+                                        groundwater_mass, temp_rise_limit, time_step)
+    if series.state is not None:
+        store.put(key, series)
+    series.buffer.setflags(write=False)
+    return series
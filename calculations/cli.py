@@ -0,0 +1,306 @@
+"""
+計算条件ファイルの一括計算
+CSV/YAML/JSONL の計算条件を一定件数のチャンクごとに一括計算し、結果を順に書き出す
+
+使用例:
+    python -m calculations scenarios.csv -o results.csv
+    python -m calculations scenarios.jsonl --format jsonl > results.jsonl
+
+計算条件の列は normalize_inputs の引数（サイドバーの入力項目）と同じ名前とする。
+省略した条件は既定値を使用し、それ以外の列（id など）は結果にそのまま出力する。
+入力と出力はチャンクごとに読み書きするため、行数によらず使用メモリは一定となる。
+"""
+
+import argparse
+import csv
+import inspect
+import itertools
+import json
+import math
+import os
+import sys
+import time
+
+from calculations.batch import BATCH_FIELDS, PRECISIONS, calculate_batch
+from calculations.engine import normalize_inputs
+
+# 1回の一括計算の計算条件数の既定値
+DEFAULT_CHUNK_SIZE = 10000
+
+# 計算条件の項目（normalize_inputs の引数）
+INPUT_FIELDS = tuple(inspect.signature(normalize_inputs).parameters)
+
+# 計算結果の項目（normalize_inputs の戻り値の項目）
+OUTPUT_FIELDS = tuple(field for field in BATCH_FIELDS if field not in INPUT_FIELDS)
+
+# 結果の各行に出力する項目（入力の列以外。inlet_profile は出力しない）
+RESULT_FIELDS = tuple(name for name in INPUT_FIELDS if name != 'inlet_profile') + OUTPUT_FIELDS
+
+# 真偽値の計算条件
+_BOOL_FIELDS = ('consider_groundwater_temp_rise', 'stepwise')
+
+# 文字列の計算条件（それ以外の数値の条件は CSV の文字列を数値に変換する）
+_TEXT_FIELDS = ('boring_diameter', 'pipe_material', 'pipe_diameter', 'circulation_type')
+
+_TRUE_TEXTS = ('true', '1', 'yes', 'on')
+_FALSE_TEXTS = ('false', '0', 'no', 'off')
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE_TEXTS:
+            return True
+        if text in _FALSE_TEXTS:
+            return False
+        raise ValueError(f"真偽値 {value!r} を解釈できません")
+    return bool(value)
+
+
+def _parse_csv_row(row):
+    """CSV の1行（文字列の dict）を計算条件の値に変換する（空欄は省略とみなす）"""
+    parsed = {}
+    for name, value in row.items():
+        if name is None or value is None or value == '':
+            continue
+        if name in _BOOL_FIELDS:
+            parsed[name] = _parse_bool(value)
+        elif name == 'inlet_profile':
+            # 1分ごとの入口温度はセミコロン区切り
+            parsed[name] = [float(v) for v in value.split(';')]
+        elif name in INPUT_FIELDS and name not in _TEXT_FIELDS:
+            parsed[name] = float(value)
+        else:
+            parsed[name] = value
+    return parsed
+
+
+def read_csv(f):
+    for row in csv.DictReader(f):
+        yield _parse_csv_row(row)
+
+
+def read_jsonl(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_yaml(f):
+    """
+    YAML の計算条件を読む
+
+    計算条件の list の文書、または1件ずつの文書（--- 区切り）に対応する。
+    1件ずつの文書は順に読むため、大きなファイルでも使用メモリは一定となる。
+    """
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("YAML の読み込みには PyYAML が必要です（pip install pyyaml）") from None
+    for document in yaml.safe_load_all(f):
+        if document is None:
+            continue
+        if isinstance(document, list):
+            yield from document
+        else:
+            yield document
+
+
+_READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'yaml': read_yaml}
+
+# 拡張子と入力の形式の対応
+_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.yaml': 'yaml', '.yml': 'yaml'}
+
+
+def _split_row(row):
+    """行を (normalize_inputs の引数, そのまま出力する列) に分ける"""
+    if not isinstance(row, dict):
+        raise ValueError("計算条件は項目名と値の組で指定してください")
+    if 'num_pipes' in row:
+        row = {**row, 'num_pipes': _as_int(row['num_pipes'], 'num_pipes')}
+    if 'operation_minutes' in row:
+        row = {**row, 'operation_minutes': _as_int(row['operation_minutes'], 'operation_minutes')}
+    for name in _BOOL_FIELDS:
+        if name in row:
+            row = {**row, name: _parse_bool(row[name])}
+    inputs = {name: value for name, value in row.items() if name in INPUT_FIELDS}
+    extras = {name: value for name, value in row.items() if name not in INPUT_FIELDS}
+    return inputs, extras
+
+
+def _as_int(value, name):
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"{name} は整数で指定してください（{value!r}）")
+    return int(number)
+
+
+def _normalize_chunk(rows, first_line):
+    """チャンクの行を正規化する（不正な行は行番号付きの ValueError）"""
+    scenarios = []
+    extras = []
+    for offset, row in enumerate(rows):
+        try:
+            inputs, extra = _split_row(row)
+            scenarios.append(normalize_inputs(**inputs))
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"{first_line + offset} 件目: {exc}") from None
+        extras.append(extra)
+    return scenarios, extras
+
+
+def _calculate_chunk(scenarios, first_line, precision):
+    try:
+        return calculate_batch(scenarios, precision)
+    except ValueError:
+        # 不正な条件の行を特定する
+        for offset, inputs in enumerate(scenarios):
+            try:
+                calculate_batch([inputs])
+            except ValueError as exc:
+                raise ValueError(f"{first_line + offset} 件目: {exc}") from None
+        raise
+
+
+def _output_value(value):
+    """NaN（該当しない値）や無限大は空欄（JSON では null）にする"""
+    return value if math.isfinite(value) else None
+
+
+def iter_results(rows, chunk_size=DEFAULT_CHUNK_SIZE, precision='float64'):
+    """
+    計算条件をチャンクごとに一括計算する
+
+    Parameters:
+        rows: 計算条件の dict の iterable（normalize_inputs の引数とそれ以外の列）
+        chunk_size: 1回の一括計算の計算条件数
+        precision: 計算精度（'float64' または 'float32'）
+
+    Yields:
+        list: チャンクの結果（各行は入力の列、正規化した計算条件、BATCH_FIELDS の dict）
+    """
+    rows = iter(rows)
+    first_line = 1
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        scenarios, extras = _normalize_chunk(chunk, first_line)
+        columns = _calculate_chunk(scenarios, first_line, precision)
+        values = zip(*(map(_output_value, columns[field].tolist()) for field in OUTPUT_FIELDS))
+        results = []
+        for inputs, extra, row_values in zip(scenarios, extras, values):
+            row = dict(extra)
+            row.update((name, inputs[name]) for name in INPUT_FIELDS if name != 'inlet_profile')
+            row.update(zip(OUTPUT_FIELDS, row_values))
+            results.append(row)
+        yield results
+        first_line += len(chunk)
+
+
+class CsvWriter:
+    """
+    結果を CSV で書き出す
+
+    列は最初の行の入力の列（id など）と RESULT_FIELDS とする。
+    2行目以降に最初の行にない入力の列がある場合は書き落とさずに ValueError とする。
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._writer = None
+        self._fields = None
+
+    def write(self, rows):
+        if self._writer is None:
+            extras = [name for name in rows[0] if name not in RESULT_FIELDS]
+            self._writer = csv.DictWriter(self._f, fieldnames=extras + list(RESULT_FIELDS))
+            self._writer.writeheader()
+            self._fields = set(self._writer.fieldnames)
+        for row in rows:
+            unknown = [name for name in row if name not in self._fields]
+            if unknown:
+                raise ValueError(f"最初の行にない列 {', '.join(map(str, unknown))} は CSV に出力できません"
+                                 "（--format jsonl を使用してください）")
+        self._writer.writerows(rows)
+        self._f.flush()
+
+
+class JsonlWriter:
+    """
+    結果を JSON Lines で書き出す
+
+    計算結果の NaN・無限大は null にする。入力の列に NaN などの JSON で
+    表せない値がある場合は NaN と書き出さずに ValueError とする。
+    """
+
+    def __init__(self, f):
+        self._f = f
+
+    def write(self, rows):
+        for row in rows:
+            self._f.write(json.dumps(row, ensure_ascii=False, allow_nan=False))
+            self._f.write('\n')
+        self._f.flush()
+
+
+_WRITERS = {'csv': CsvWriter, 'jsonl': JsonlWriter}
+
+
+def _input_format(path, name):
+    if name is not None:
+        return name
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _EXTENSIONS:
+        raise ValueError(f"{path} の形式を判別できません（--input-format で指定してください）")
+    return _EXTENSIONS[extension]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calculations",
+                                     description="計算条件ファイルの一括計算")
+    parser.add_argument("scenarios", help="計算条件のファイル（.csv/.jsonl/.yaml、- は標準入力）")
+    parser.add_argument("-o", "--output", help="結果の出力先（省略時は標準出力）")
+    parser.add_argument("--input-format", choices=sorted(_READERS), help="入力の形式（省略時は拡張子で判別）")
+    parser.add_argument("--format", choices=sorted(_WRITERS), help="出力の形式（省略時は出力先の拡張子、既定は csv）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="1回の一括計算の計算条件数")
+    parser.add_argument("--precision", choices=sorted(PRECISIONS), default="float64",
+                        help="計算精度（float32 は出口温度の誤差 1e-4 ℃ 未満）")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size は1以上で指定してください")
+
+    if args.scenarios == '-' and args.input_format is None:
+        parser.error("標準入力から読む場合は --input-format を指定してください")
+    try:
+        reader = _READERS[_input_format(args.scenarios, args.input_format)]
+    except ValueError as exc:
+        parser.error(str(exc))
+    output_format = args.format
+    if output_format is None:
+        output_format = 'jsonl' if args.output and args.output.lower().endswith('.jsonl') else 'csv'
+
+    source = sys.stdin if args.scenarios == '-' else open(args.scenarios, encoding='utf-8', newline='')
+    target = sys.stdout if args.output is None else open(args.output, 'w', encoding='utf-8', newline='')
+    started = time.perf_counter()
+    count = 0
+    try:
+        writer = _WRITERS[output_format](target)
+        for rows in iter_results(reader(source), args.chunk_size, args.precision):
+            writer.write(rows)
+            count += len(rows)
+    except ValueError as exc:
+        print(f"計算を中止しました: {exc}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # 出力先（head など）が先に終了した場合は残りを書き出さずに終了する
+        sys.stdout = open(os.devnull, 'w')
+        return 0
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    print(f"{count} 件を計算しました（{time.perf_counter() - started:.1f} 秒）", file=sys.stderr)
+    return 0
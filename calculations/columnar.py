@@ -0,0 +1,393 @@
+"""
+スイープ結果の列ファイル
+スイープの結果を項目ごとの .npy ファイルに書き込み、メモリマップでチャンクごとに集計する。
+メモリに収まらない件数の結果も、同じ計算機で集計できる
+
+使用例:
+    python -m calculations.columnar write sweep.json runs/columns
+    python -m calculations.columnar summary runs/columns --by pipe_diameter --target-temp 23
+
+sweep.json は calculations.shard と同じ {"base": ..., "axes": ...} とする。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from calculations.batch import PRECISIONS, calculate_batch
+from calculations.sweep import SWEEP_FIELDS, SweepGrid, chunk_ranges
+
+META_NAME = "columns.json"
+
+# 書き込み・集計の1チャンクの行数
+DEFAULT_CHUNK_ROWS = 100000
+
+# 分位点の計算に使用するヒストグラムのビン数
+_QUANTILE_BINS = 4096
+
+
+def _column_path(path, field):
+    return os.path.join(path, field + ".npy")
+
+
+def _write_meta(path, meta):
+    tmp_path = os.path.join(path, META_NAME + f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, os.path.join(path, META_NAME))
+
+
+def write_columns(grid, path, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None, precision='float64'):
+    """
+    スイープを計算して項目ごとの列ファイルに書き込む
+
+    列ファイルは全件分を先に確保し、チャンクごとに書き込んで書き込み済みの
+    行数をメタデータに記録する。中断した場合は同じ引数で再実行すると
+    書き込み済みの行の続きから計算する。
+
+    Parameters:
+        grid: SweepGrid
+        path: 出力先のディレクトリ
+        chunk_rows: 1回の一括計算の行数
+        progress: 書き込み済みの行数と全件数を受け取る関数（省略可）
+        precision: 計算と保存の精度（'float32' はファイルの大きさが半分になる）
+
+    Returns:
+        SweepColumns: 書き込んだ列ファイル
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"計算精度 {precision} は未対応です（{', '.join(PRECISIONS)}）")
+    total = len(grid)
+    meta = {
+        "base": grid.base,
+        "axes": grid.axes,
+        "fields": list(SWEEP_FIELDS),
+        "precision": precision,
+        "total": total,
+        "rows": 0,
+    }
+    meta_path = os.path.join(path, META_NAME)
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            existing = json.load(f)
+        if {**existing, "rows": 0} != meta:
+            raise ValueError(f"{path} には別のスイープの結果があります")
+        meta = existing
+        columns = {field: np.load(_column_path(path, field), mmap_mode="r+") for field in SWEEP_FIELDS}
+    else:
+        os.makedirs(path, exist_ok=True)
+        columns = {
+            field: np.lib.format.open_memmap(_column_path(path, field), mode="w+",
+                                             dtype=PRECISIONS[precision], shape=(total,))
+            for field in SWEEP_FIELDS
+        }
+        _write_meta(path, meta)
+
+    for start, stop in chunk_ranges(total, chunk_rows):
+        if stop <= meta["rows"]:
+            continue
+        start = max(start, meta["rows"])
+        values = calculate_batch(list(grid.scenarios(start, stop)), precision)
+        for field in SWEEP_FIELDS:
+            columns[field][start:stop] = values[field]
+            columns[field].flush()
+        meta["rows"] = stop
+        _write_meta(path, meta)
+        if progress is not None:
+            progress(stop, total)
+    del columns
+    return SweepColumns(path)
+
+
+class SweepColumns:
+    """
+    列ファイルに書き込んだスイープの結果
+
+    軸の値は行番号から求める（SweepGrid と同じく最後の軸が最も速く変わる）ため、
+    列ファイルには計算結果の項目のみを保存する。集計は書き込み済みの行のみを対象とする。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_NAME), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.grid = SweepGrid(self.meta["base"], self.meta["axes"])
+        self.fields = tuple(self.meta["fields"])
+        self.precision = self.meta.get("precision", "float64")
+        self.rows = self.meta["rows"]
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, field):
+        """項目の列を読み取り専用のメモリマップで返す（書き込み済みの行のみ）"""
+        if field not in self.fields:
+            raise KeyError(f"項目 {field} はありません")
+        return np.load(_column_path(self.path, field), mmap_mode="r")[:self.rows]
+
+    def axis_codes(self, axis, start, stop):
+        """区間 [start, stop) の各行の軸の値の添字を返す"""
+        names = list(self.grid.axes)
+        if axis not in names:
+            raise KeyError(f"軸 {axis} はありません")
+        position = names.index(axis)
+        stride = int(np.prod(self.grid.shape[position + 1:], dtype=np.int64))
+        return (np.arange(start, stop, dtype=np.int64) // stride) % self.grid.shape[position]
+
+    def iter_chunks(self, fields, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        書き込み済みの行をチャンクごとに返す
+
+        Yields:
+            tuple: (start, stop, 項目 → 配列の dict)
+        """
+        columns = {field: self.column(field) for field in fields}
+        for start, stop in chunk_ranges(self.rows, chunk_rows):
+            yield start, stop, {field: np.asarray(column[start:stop]) for field, column in columns.items()}
+
+
+def _group_codes(columns, by, start, stop):
+    """集計の区分（軸の値の添字、区分なしは 0）と区分数を返す"""
+    if by is None:
+        return np.zeros(stop - start, dtype=np.int64), 1
+    return columns.axis_codes(by, start, stop), len(columns.grid.axes[by])
+
+
+def _group_labels(columns, by):
+    return [None] if by is None else list(columns.grid.axes[by])
+
+
+def feasible_fraction(columns, by=None, field="final_temp", max_value=None, min_value=None,
+                      chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    条件を満たす計算条件の割合を区分ごとに集計する
+
+    Parameters:
+        columns: SweepColumns
+        by: 区分にする軸の名前（例: "pipe_diameter"、省略時は全体）
+        field: 判定する項目（既定は出口温度）
+        max_value: 上限値（例: 目標出口温度）
+        min_value: 下限値
+
+    Returns:
+        dict: 軸の値 → {'count', 'feasible', 'fraction'}（by 省略時のキーは None）
+    """
+    labels = _group_labels(columns, by)
+    counts = np.zeros(len(labels), dtype=np.int64)
+    feasible = np.zeros(len(labels), dtype=np.int64)
+    for start, stop, chunk in columns.iter_chunks((field,), chunk_rows):
+        codes, size = _group_codes(columns, by, start, stop)
+        values = chunk[field]
+        ok = ~np.isnan(values)
+        if max_value is not None:
+            ok &= values <= max_value
+        if min_value is not None:
+            ok &= values >= min_value
+        counts += np.bincount(codes, minlength=size)
+        feasible += np.bincount(codes, weights=ok, minlength=size).astype(np.int64)
+    return {
+        label: {
+            'count': int(count),
+            'feasible': int(ok_count),
+            'fraction': float(ok_count / count) if count else float('nan'),
+        }
+        for label, count, ok_count in zip(labels, counts, feasible)
+    }
+
+
+def best_by(columns, by, field="heat_exchange_rate", maximize=True, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    区分ごとに項目が最良となる計算条件を求める
+
+    Parameters:
+        columns: SweepColumns
+        by: 区分にする軸の名前（例: "pipe_material"）
+        field: 比較する項目
+        maximize: True なら最大、False なら最小を最良とする
+
+    Returns:
+        dict: 軸の値 → {'value', 'index', 'axes'（その計算条件の各軸の値）}（該当なしは None）
+    """
+    labels = _group_labels(columns, by)
+    best_values = np.full(len(labels), -np.inf if maximize else np.inf)
+    best_index = np.full(len(labels), -1, dtype=np.int64)
+    for start, stop, chunk in columns.iter_chunks((field,), chunk_rows):
+        codes, _ = _group_codes(columns, by, start, stop)
+        values = chunk[field]
+        for group in np.unique(codes):
+            mask = (codes == group) & ~np.isnan(values)
+            if not mask.any():
+                continue
+            candidates = np.where(mask, values, -np.inf if maximize else np.inf)
+            row = int(np.argmax(candidates) if maximize else np.argmin(candidates))
+            better = candidates[row] > best_values[group] if maximize else candidates[row] < best_values[group]
+            if better:
+                best_values[group] = candidates[row]
+                best_index[group] = start + row
+    return {
+        label: None if index < 0 else {
+            'value': float(value),
+            'index': int(index),
+            'axes': columns.grid.axis_values(int(index)),
+        }
+        for label, value, index in zip(labels, best_values, best_index)
+    }
+
+
+def _rank_position(count, fraction):
+    """分位に対応する順位（小数、np.quantile の linear と同じ式）"""
+    return (count - 1) * fraction
+
+
+def quantiles(columns, field, q=(0.1, 0.5, 0.9), by=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    項目の分位点を区分ごとに求める（np.quantile の linear と同じ値）
+
+    1回目の走査で最小・最大値、2回目でヒストグラムを求めて分位点を含むビンを特定し、
+    3回目でそのビンの値のみを集めて正確な値を求める。メモリに保持するのは
+    ヒストグラムと該当するビンの値のみとなる。
+
+    Parameters:
+        columns: SweepColumns
+        field: 項目
+        q: 分位（0〜1）の列
+        by: 区分にする軸の名前（省略時は全体）
+
+    Returns:
+        dict: 軸の値 → {分位: 値}（by 省略時のキーは None、該当なしは NaN）
+    """
+    q = np.atleast_1d(np.asarray(q, dtype=float))
+    labels = _group_labels(columns, by)
+    groups = len(labels)
+
+    # 1回目: 区分ごとの件数と範囲
+    counts = np.zeros(groups, dtype=np.int64)
+    lows = np.full(groups, np.inf)
+    highs = np.full(groups, -np.inf)
+    for start, stop, chunk in columns.iter_chunks((field,), chunk_rows):
+        codes, _ = _group_codes(columns, by, start, stop)
+        values = chunk[field]
+        valid = ~np.isnan(values)
+        codes, values = codes[valid], values[valid]
+        counts += np.bincount(codes, minlength=groups)
+        np.minimum.at(lows, codes, values)
+        np.maximum.at(highs, codes, values)
+
+    # 2回目: ヒストグラム
+    widths = np.where(highs > lows, (highs - lows) / _QUANTILE_BINS, 1.0)
+    histogram = np.zeros((groups, _QUANTILE_BINS), dtype=np.int64)
+
+    def bins_of(codes, values):
+        bins = ((values - lows[codes]) / widths[codes]).astype(np.int64)
+        return np.clip(bins, 0, _QUANTILE_BINS - 1)
+
+    for start, stop, chunk in columns.iter_chunks((field,), chunk_rows):
+        codes, _ = _group_codes(columns, by, start, stop)
+        values = chunk[field]
+        valid = ~np.isnan(values)
+        codes, values = codes[valid], values[valid]
+        flat = codes * _QUANTILE_BINS + bins_of(codes, values)
+        histogram += np.bincount(flat, minlength=groups * _QUANTILE_BINS).reshape(groups, _QUANTILE_BINS)
+
+    # 分位点の前後の順位の値を含むビン
+    cumulative = np.cumsum(histogram, axis=1)
+    wanted = {}
+    for group in range(groups):
+        if counts[group] == 0:
+            continue
+        for position in _rank_position(counts[group], q):
+            for rank in {int(np.floor(position)), int(np.ceil(position))}:
+                wanted[(group, rank)] = int(np.searchsorted(cumulative[group], rank, side='right'))
+
+    # 3回目: 該当するビンの値を集めて順位の値を求める
+    needed = {(group, bin_) for (group, _), bin_ in wanted.items()}
+    collected = {key: [] for key in needed}
+    if needed:
+        for start, stop, chunk in columns.iter_chunks((field,), chunk_rows):
+            codes, _ = _group_codes(columns, by, start, stop)
+            values = chunk[field]
+            valid = ~np.isnan(values)
+            codes, values = codes[valid], values[valid]
+            bins = bins_of(codes, values)
+            for group, bin_ in needed:
+                selected = values[(codes == group) & (bins == bin_)]
+                if selected.size:
+                    collected[(group, bin_)].append(selected)
+
+    ranked = {}
+    for (group, rank), bin_ in wanted.items():
+        values = np.sort(np.concatenate(collected[(group, bin_)]))
+        below = cumulative[group, bin_ - 1] if bin_ > 0 else 0
+        ranked[(group, rank)] = values[rank - below]
+
+    result = {}
+    for group, label in enumerate(labels):
+        result[label] = {}
+        for fraction in q:
+            if counts[group] == 0:
+                result[label][float(fraction)] = float('nan')
+                continue
+            position = _rank_position(counts[group], fraction)
+            lower = ranked[(group, int(np.floor(position)))]
+            upper = ranked[(group, int(np.ceil(position)))]
+            # np.quantile と同じ補間式（端の値に近い側から補間する）
+            t = position - np.floor(position)
+            value = lower + (upper - lower) * t if t < 0.5 else upper - (upper - lower) * (1 - t)
+            result[label][float(fraction)] = float(value)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calculations.columnar",
+                                     description="スイープ結果の列ファイル")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    write_parser = commands.add_parser("write", help="スイープを計算して列ファイルに書き込む（再実行で再開）")
+    write_parser.add_argument("sweep", help="スイープの定義（JSON）")
+    write_parser.add_argument("path", help="出力先のディレクトリ")
+    write_parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    write_parser.add_argument("--precision", choices=sorted(PRECISIONS), default="float64",
+                              help="計算と保存の精度（float32 は出口温度の誤差 1e-4 ℃ 未満でファイルが半分）")
+
+    summary_parser = commands.add_parser("summary", help="列ファイルを集計する")
+    summary_parser.add_argument("path", help="列ファイルのディレクトリ")
+    summary_parser.add_argument("--by", help="区分にする軸の名前")
+    summary_parser.add_argument("--target-temp", type=float, help="目標出口温度 [℃]（達成割合を集計する）")
+    summary_parser.add_argument("--field", default="final_temp", help="分位点を求める項目")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "write":
+        if args.chunk_rows < 1:
+            parser.error("--chunk-rows は1以上で指定してください")
+        with open(args.sweep, encoding="utf-8") as f:
+            sweep = json.load(f)
+        started = time.perf_counter()
+        try:
+            columns = write_columns(SweepGrid(sweep.get("base"), sweep.get("axes")), args.path, args.chunk_rows,
+                                    precision=args.precision)
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        print(f"{len(columns)} 件の結果を {args.path} に書き込みました"
+              f"（{time.perf_counter() - started:.1f} 秒）")
+    elif args.command == "summary":
+        columns = SweepColumns(args.path)
+        print(f"書き込み済み {len(columns)}/{columns.meta['total']} 件")
+        if args.target_temp is not None:
+            for label, stats in feasible_fraction(columns, args.by, max_value=args.target_temp).items():
+                prefix = "" if label is None else f"{label}: "
+                print(f"{prefix}目標温度以下 {stats['feasible']}/{stats['count']} 件"
+                      f"（{stats['fraction']:.1%}）")
+        for label, values in quantiles(columns, args.field, by=args.by).items():
+            prefix = "" if label is None else f"{label}: "
+            print(prefix + ", ".join(f"P{fraction * 100:.0f} {value:.4g}" for fraction, value in values.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
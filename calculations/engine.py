@@ -0,0 +1,432 @@
+"""
+地中熱交換計算エンジン
+1つの計算条件（管径・材質・流量など）に対する熱交換と地下水温度上昇を計算する
+"""
+
+import logging
+import math
+
+import numpy as np
+
+from calculations.checkpoint import (
+    CheckpointStore,
+    simulate_circulation_cached,
+    simulate_continuous_supply_cached,
+)
+from calculations.groundwater import simulate_circulation, simulate_continuous_supply
+from calculations.properties import (
+    BORING_DIAMETERS,
+    PIPE_INNER_DIAMETERS,
+    PIPE_OUTER_DIAMETERS,
+    PIPE_THERMAL_CONDUCTIVITY,
+    get_water_properties,
+)
+from calculations.stages import Stage, StageGraph
+from utils.cache import MemoCache, input_hash
+
+logger = logging.getLogger(__name__)
+
+# 循環方式
+CIRCULATION_SAME_WATER = "同じ水を循環"
+CIRCULATION_CONTINUOUS_SUPPLY = "新しい水を連続供給"
+
+# 時系列計算の時間刻み（1分ごと）[s]
+TIME_STEP = 60
+
+# 計算エンジンのバージョン（計算式を変更した場合は更新し、永続キャッシュを無効化する）
+ENGINE_VERSION = "1.0"
+
+# 計算結果のメモ化キャッシュが保持する時系列の合計サイズの上限 [bytes]
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# 計算結果のメモ化キャッシュと時系列のチェックポイント（プロセス内で共通）
+_RESULT_CACHE = MemoCache(max_bytes=RESULT_CACHE_MAX_BYTES)
+_CHECKPOINTS = CheckpointStore()
+
+# 計算結果の永続キャッシュ（configure_result_store で設定）
+_RESULT_STORE = None
+
+
+def normalize_inputs(initial_temp=30.0, ground_temp=15.0, flow_rate=50.0, pipe_length=5.0,
+                     boring_diameter="φ250", pipe_material="鋼管", pipe_diameter="32A",
+                     num_pipes=1, h_outer=300.0, consider_groundwater_temp_rise=False,
+                     circulation_type=None, operation_minutes=10, temp_rise_limit=5.0,
+                     stepwise=True, inlet_profile=None):
+    """
+    計算条件を正規化する
+
+    数値を float/int に揃え、選択されたモードで使用しない条件は None にする。
+    同じ計算になる条件は常に同じ dict になるため、キャッシュキーに使用できる。
+
+    Parameters:
+        initial_temp: 入口温度 [℃]
+        ground_temp: 地下水温度 [℃]
+        flow_rate: 総流量 [L/min]
+        pipe_length: 管浸水距離 [m]
+        boring_diameter: 掘削径（"φ116" または "φ250"）
+        pipe_material: 配管材質（"鋼管", "アルミ管", "銅管"）
+        pipe_diameter: 管径（"15A"〜"80A"）
+        num_pipes: 配管セット本数
+        h_outer: 管外側熱伝達係数 [W/m²·K]
+        consider_groundwater_temp_rise: 地下水温度上昇を考慮するか
+        circulation_type: 循環方式（None は循環を考慮しない＝1回通水）
+        operation_minutes: 運転時間 [分]（循環を考慮する場合のみ使用）
+        temp_rise_limit: 温度上昇上限値 [℃]
+        stepwise: 連続供給を1分ごとの時系列で計算するか（False は運転時間で一括計算）
+        inlet_profile: 1分ごとの入口温度（連続供給の場合のみ使用）
+
+    Returns:
+        dict: 正規化した計算条件
+    """
+    inputs = {
+        'initial_temp': float(initial_temp),
+        'ground_temp': float(ground_temp),
+        'flow_rate': float(flow_rate),
+        'pipe_length': float(pipe_length),
+        'boring_diameter': boring_diameter,
+        'pipe_material': pipe_material,
+        'pipe_diameter': pipe_diameter,
+        'num_pipes': int(num_pipes),
+        'h_outer': float(h_outer),
+        'consider_groundwater_temp_rise': bool(consider_groundwater_temp_rise),
+        'circulation_type': None,
+        'operation_minutes': None,
+        'temp_rise_limit': None,
+        'stepwise': True,
+        'inlet_profile': None,
+    }
+    if not consider_groundwater_temp_rise:
+        return inputs
+
+    inputs['temp_rise_limit'] = float(temp_rise_limit)
+    if circulation_type is None:
+        return inputs
+
+    inputs['circulation_type'] = circulation_type
+    inputs['operation_minutes'] = int(operation_minutes)
+    if circulation_type == CIRCULATION_CONTINUOUS_SUPPLY:
+        inputs['stepwise'] = bool(stepwise)
+        if stepwise and inlet_profile is not None:
+            profile = np.asarray(inlet_profile, dtype=float)
+            inputs['inlet_profile'] = profile
+            inputs['operation_minutes'] = int(profile.size)
+    return inputs
+
+
+def scenario_hash(inputs):
+    """
+    正規化した計算条件のハッシュを返す
+
+    Parameters:
+        inputs: normalize_inputs の戻り値
+
+    Returns:
+        str: SHA-256 ハッシュ（16進数）
+    """
+    return input_hash('scenario', inputs)
+
+
+def _properties_stage(initial_temp):
+    """物性値ステージ：入口温度のみに依存する"""
+    # 温度依存の物性値計算（バルク温度法：入口温度基準）
+    return {'water_props': get_water_properties(initial_temp)}
+
+
+def _flow_stage(flow_rate, pipe_diameter, num_pipes, properties):
+    """流れステージ：流速・レイノルズ数・ヌセルト数・管内側熱伝達係数"""
+    water_props = properties['water_props']
+
+    # 配管内径と断面積、1本あたりの流量と流速
+    inner_diameter = PIPE_INNER_DIAMETERS[pipe_diameter] / 1000  # m
+    outer_diameter = PIPE_OUTER_DIAMETERS[pipe_diameter] / 1000  # m
+    pipe_area = math.pi * (inner_diameter / 2) ** 2  # m²
+    flow_per_pipe = flow_rate / num_pipes  # L/min/本
+    flow_rate_m3s_per_pipe = flow_per_pipe / 60000  # L/min → m³/s
+    velocity = flow_rate_m3s_per_pipe / pipe_area
+
+    reynolds = velocity * inner_diameter / water_props['kinematic_viscosity']
+
+    # ヌセルト数の計算（層流/乱流判定）
+    if reynolds < 2300:  # 層流
+        nusselt = 3.66
+    else:  # 乱流（Dittus-Boelter式、冷却時）
+        nusselt = 0.023 * (reynolds ** 0.8) * (water_props['prandtl'] ** 0.3)
+
+    # 熱伝達係数の計算 (W/m²・K)
+    heat_transfer_coefficient = nusselt * water_props['thermal_conductivity'] / inner_diameter
+
+    return {
+        'inner_diameter': inner_diameter,
+        'outer_diameter': outer_diameter,
+        'velocity': velocity,
+        'reynolds': reynolds,
+        'nusselt': nusselt,
+        'heat_transfer_coefficient': heat_transfer_coefficient,
+        'mass_flow_rate_per_pipe': flow_rate_m3s_per_pipe * water_props['density'],  # kg/s
+        # 配管面積（掘削径の検証用）
+        'total_pipe_area': num_pipes * math.pi * (outer_diameter / 2) ** 2 * 1000000,  # mm²
+    }
+
+
+def _overall_stage(pipe_material, h_outer, flow):
+    """総括熱伝達係数ステージ：材質と管外側熱伝達係数が加わる"""
+    inner_diameter = flow['inner_diameter']
+    outer_diameter = flow['outer_diameter']
+
+    # 総括熱伝達係数 U (W/m²・K) - 内径基準
+    pipe_thermal_cond = PIPE_THERMAL_CONDUCTIVITY[pipe_material]
+    U = 1 / (1/flow['heat_transfer_coefficient'] +
+            inner_diameter/(2*pipe_thermal_cond) * math.log(outer_diameter/inner_diameter) +
+            inner_diameter/(outer_diameter*h_outer))
+
+    return {'pipe_thermal_cond': pipe_thermal_cond, 'U': U}
+
+
+def _exchange_stage(initial_temp, ground_temp, pipe_length, num_pipes, properties, flow, overall):
+    """熱交換ステージ：NTU・効率と地下水温度一定での出口温度"""
+    specific_heat = properties['water_props']['specific_heat']
+    mass_flow_rate_per_pipe = flow['mass_flow_rate_per_pipe']
+
+    # 熱交換面積（U字管として往復を考慮）
+    heat_exchange_area = math.pi * flow['inner_diameter'] * pipe_length * 2
+
+    # NTU（伝熱単位数）と効率の計算（1本あたり）
+    NTU = overall['U'] * heat_exchange_area / (mass_flow_rate_per_pipe * specific_heat)
+    effectiveness = 1 - math.exp(-NTU)
+
+    # 最終温度と熱交換量（地下水温度一定）
+    final_temp = initial_temp - effectiveness * (initial_temp - ground_temp)
+    heat_exchange_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (initial_temp - final_temp)
+
+    return {
+        'NTU': NTU,
+        'effectiveness': effectiveness,
+        'final_temp': final_temp,
+        'heat_exchange_rate': heat_exchange_rate,
+        # 1回の通水時間（U字管の全長を流速で除す）
+        'transit_time_seconds': pipe_length * 2 / flow['velocity'],
+    }
+
+
+def _boring_stage(boring_diameter, pipe_length, num_pipes, properties, flow):
+    """掘削孔ステージ：掘削断面積と孔内の地下水量"""
+    boring_diameter_mm = BORING_DIAMETERS[boring_diameter]
+
+    # 地下水の体積計算（ボーリング孔内のみ）
+    boring_volume = math.pi * (boring_diameter_mm / 2000) ** 2 * pipe_length  # m³
+    # 配管の総体積（U字管なので往復分で2倍）
+    pipe_total_volume = math.pi * (flow['outer_diameter'] / 2) ** 2 * pipe_length * num_pipes * 2  # m³
+    groundwater_volume = boring_volume - pipe_total_volume  # m³
+
+    return {
+        'boring_area': math.pi * (boring_diameter_mm / 2) ** 2,  # mm²
+        'boring_volume': boring_volume,
+        'pipe_total_volume': pipe_total_volume,
+        'groundwater_volume': groundwater_volume,
+        'groundwater_mass': groundwater_volume * properties['water_props']['density'],  # kg
+    }
+
+
+def _groundwater_stage(initial_temp, ground_temp, num_pipes, consider_groundwater_temp_rise,
+                       circulation_type, operation_minutes, temp_rise_limit, stepwise,
+                       inlet_profile, properties, flow, exchange, boring, checkpoints=True):
+    """
+    地下水ステージ：地下水温度上昇を考慮した出口温度と時系列
+
+    checkpoints が偽の場合は時系列をチェックポイントに保存せずに計算する（一括計算用）
+    """
+    result = {
+        'operation_minutes': operation_minutes,
+        'final_temp': exchange['final_temp'],
+        'effective_ground_temp': ground_temp,
+        'groundwater_temp_rise': 0.0,
+        'groundwater_temp_rise_unlimited': 0.0,
+        'series': None,
+    }
+    if not consider_groundwater_temp_rise:
+        return result
+
+    NTU = exchange['NTU']
+    groundwater_mass = boring['groundwater_mass']
+    mass_flow_rate = flow['mass_flow_rate_per_pipe'] * num_pipes
+
+    if circulation_type == CIRCULATION_SAME_WATER or (
+            circulation_type == CIRCULATION_CONTINUOUS_SUPPLY and stepwise):
+        # 時系列計算（計算済みの運転時間があれば、その続きから計算する）
+        if circulation_type == CIRCULATION_SAME_WATER:
+            num_steps = int(operation_minutes * 60 / TIME_STEP)
+            args = (initial_temp, ground_temp, NTU, mass_flow_rate, groundwater_mass,
+                    temp_rise_limit, num_steps, TIME_STEP)
+            if checkpoints:
+                series = simulate_circulation_cached(_CHECKPOINTS, *args)
+            else:
+                series = simulate_circulation(*args)
+        else:
+            if inlet_profile is not None:
+                inlet_temps = inlet_profile
+            else:
+                inlet_temps = np.full(int(operation_minutes * 60 / TIME_STEP), initial_temp)
+            args = (inlet_temps, ground_temp, NTU, mass_flow_rate, groundwater_mass,
+                    temp_rise_limit, TIME_STEP)
+            if checkpoints:
+                series = simulate_continuous_supply_cached(_CHECKPOINTS, *args)
+            else:
+                series = simulate_continuous_supply(*args)
+
+        if len(series) > 0:
+            result['final_temp'] = float(series.outlet_temp[-1])
+            result['effective_ground_temp'] = float(series.ground_temp[-1])
+        groundwater_temp_rise = result['effective_ground_temp'] - ground_temp
+        result.update({
+            'groundwater_temp_rise': groundwater_temp_rise,
+            'groundwater_temp_rise_unlimited': groundwater_temp_rise,
+            'series': series,
+        })
+        return result
+
+    # 一括計算：1回通水（循環を考慮しない場合）または運転時間分の連続供給
+    if circulation_type is None:
+        operation_time = exchange['transit_time_seconds']  # 秒
+    else:
+        operation_time = operation_minutes * 60  # 秒
+    if groundwater_mass > 0:
+        specific_heat = properties['water_props']['specific_heat']
+        groundwater_temp_rise = (exchange['heat_exchange_rate'] * operation_time) / (groundwater_mass * specific_heat)
+    else:
+        groundwater_temp_rise = 0.0
+
+    # 温度上昇を制限（物理的制約：地下水温度は入口温度を超えない）
+    groundwater_temp_rise_unlimited = groundwater_temp_rise
+    max_possible_rise = initial_temp - ground_temp
+    groundwater_temp_rise = min(groundwater_temp_rise, temp_rise_limit, max_possible_rise)
+
+    # 実効地下水温度で最終温度を再計算
+    effective_ground_temp = ground_temp + groundwater_temp_rise
+    result.update({
+        'final_temp': initial_temp - exchange['effectiveness'] * (initial_temp - effective_ground_temp),
+        'effective_ground_temp': effective_ground_temp,
+        'groundwater_temp_rise': groundwater_temp_rise,
+        'groundwater_temp_rise_unlimited': groundwater_temp_rise_unlimited,
+    })
+    return result
+
+
+# 計算ステージの依存グラフ
+#   properties ─┬─ flow ─┬─ overall ─ exchange ─┬─ groundwater
+#               │        └────────── boring ────┘
+_STAGES = StageGraph([
+    Stage('properties', _properties_stage, inputs=('initial_temp',)),
+    Stage('flow', _flow_stage, inputs=('flow_rate', 'pipe_diameter', 'num_pipes'),
+          depends=('properties',)),
+    Stage('overall', _overall_stage, inputs=('pipe_material', 'h_outer'), depends=('flow',)),
+    Stage('exchange', _exchange_stage,
+          inputs=('initial_temp', 'ground_temp', 'pipe_length', 'num_pipes'),
+          depends=('properties', 'flow', 'overall')),
+    Stage('boring', _boring_stage, inputs=('boring_diameter', 'pipe_length', 'num_pipes'),
+          depends=('properties', 'flow')),
+    Stage('groundwater', _groundwater_stage,
+          inputs=('initial_temp', 'ground_temp', 'num_pipes', 'consider_groundwater_temp_rise',
+                  'circulation_type', 'operation_minutes', 'temp_rise_limit', 'stepwise',
+                  'inlet_profile'),
+          depends=('properties', 'flow', 'exchange', 'boring')),
+])
+
+
+def calculate(inputs, report=None, cache=True):
+    """
+    1つの計算条件について熱交換と地下水温度上昇を計算する
+
+    計算はステージごとにメモ化されており、前回から変更のあった入力に
+    依存するステージのみ再計算する。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値
+        report: 再計算したステージ名を追記する list（省略可）
+        cache: 偽の場合、ステージのキャッシュと時系列のチェックポイントを通さずに
+               全ステージを計算する（一括計算で画面の計算のキャッシュを追い出さないため）
+
+    Returns:
+        dict: 計算結果（出口温度、地下水温度、各種パラメータ、時系列など）
+    """
+    if not cache:
+        outputs = _STAGES.evaluate(inputs, {'groundwater': {'checkpoints': False}})
+        return {name: value for stage in _STAGES.stages for name, value in outputs[stage.name].items()}
+    recomputed = []
+    outputs = _STAGES.run(inputs, recomputed)
+    logger.debug("再計算したステージ: %s", ", ".join(recomputed) or "なし")
+    if report is not None:
+        report.extend(recomputed)
+    result = {}
+    for stage in _STAGES.stages:
+        result.update(outputs[stage.name])
+    return result
+
+
+def transfer_units(initial_temp, flow_rate, pipe_diameter, pipe_material, h_outer,
+                   pipe_length=1.0, num_pipes=1):
+    """
+    キャッシュを通さずに NTU とレイノルズ数を計算する（応答曲面の作成用）
+
+    Returns:
+        tuple: (NTU, レイノルズ数)
+    """
+    properties = _properties_stage(initial_temp)
+    flow = _flow_stage(flow_rate, pipe_diameter, num_pipes, properties)
+    overall = _overall_stage(pipe_material, h_outer, flow)
+    exchange = _exchange_stage(initial_temp, initial_temp, pipe_length, num_pipes,
+                               properties, flow, overall)
+    return exchange['NTU'], flow['reynolds']
+
+
+def _calculate_persistent(key, inputs, report, persist):
+    """永続キャッシュを参照し、なければ計算して保存する（persist が偽の場合は保存しない）"""
+    store = _RESULT_STORE
+    if store is not None:
+        result = store.get(key)
+        if result is not None:
+            return result
+    result = calculate(inputs, report)
+    if store is not None and persist:
+        store.put(key, result)
+    return result
+
+
+def calculate_cached(inputs, report=None, persist=True):
+    """
+    計算結果をキャッシュから返す（なければ計算して保存する）
+
+    メモ化キャッシュ、永続キャッシュ（設定されている場合）の順に参照する。
+    同じ条件の計算が複数セッションから同時に要求された場合は1回だけ計算する。
+    戻り値はセッション間で共有されるため、変更しないこと。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値
+        report: 再計算したステージ名を追記する list（キャッシュから返した場合は空のまま）
+        persist: 偽の場合、計算した結果を永続キャッシュに保存しない（先読みなどの投機的な計算用）
+
+    Returns:
+        dict: calculate の戻り値
+    """
+    key = scenario_hash(inputs)
+    return _RESULT_CACHE.get_or_compute(key, lambda: _calculate_persistent(key, inputs, report, persist))
+
+
+def stage_stats():
+    """計算ステージごとのキャッシュ統計を返す"""
+    return _STAGES.stats()
+
+
+def configure_result_store(store):
+    """
+    計算結果の永続キャッシュを設定する
+
+    Parameters:
+        store: ResultStore（None で無効化）
+    """
+    global _RESULT_STORE
+    _RESULT_STORE = store
+
+
+def result_cache():
+    """計算結果のメモ化キャッシュを返す（統計の参照用）"""
+    return _RESULT_CACHE
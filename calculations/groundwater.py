@@ -0,0 +1,348 @@
+"""
+地下水温度の時系列計算
+ボーリング孔内の地下水温度の時間発展を計算する
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+# 漸化式を一括評価する区間長の初期値
+_MIN_WINDOW = 256
+
+# 非クランプ区間とクランプ区間の合計がこれより短い場合は、クランプが頻繁に切り替わるとみなす
+_SHORT_RUN = 64
+
+# クランプが頻繁に切り替わる場合に1ステップずつ計算するステップ数
+_SCALAR_STEPS = 4096
+
+
+class TimeSeries:
+    """
+    時系列の計算結果
+
+    時刻（分）・入口温度・出口温度・地下水温度を1つの2次元配列
+    （4 × ステップ数、行優先）にまとめて保持する。各列は行のビューとして
+    参照するため、ステップごとの確保やコピーは発生しない。
+    """
+
+    CHANNELS = ('time', 'inlet_temp', 'outlet_temp', 'ground_temp')
+
+    def __init__(self, buffer, state=None):
+        self.buffer = buffer
+        self.state = state
+
+    @classmethod
+    def empty(cls, num_steps):
+        """num_steps ステップ分の未初期化バッファを確保する"""
+        return cls(np.empty((len(cls.CHANNELS), num_steps)))
+
+    def __len__(self):
+        return self.buffer.shape[1]
+
+    @property
+    def nbytes(self):
+        """バッファのサイズ [bytes]"""
+        return self.buffer.nbytes
+
+    def __getitem__(self, channel):
+        return self.buffer[self.CHANNELS.index(channel)]
+
+    @property
+    def time(self):
+        return self.buffer[0]
+
+    @property
+    def inlet_temp(self):
+        return self.buffer[1]
+
+    @property
+    def outlet_temp(self):
+        return self.buffer[2]
+
+    @property
+    def ground_temp(self):
+        return self.buffer[3]
+
+    def head(self, num_steps):
+        """先頭から num_steps ステップ分のビューを返す（state は持たない）"""
+        return TimeSeries(self.buffer[:, :num_steps])
+
+    def to_frame(self):
+        """バッファを共有した DataFrame を返す"""
+        return pd.DataFrame(self.buffer.T, columns=list(self.CHANNELS), copy=False)
+
+
+def _output_buffer(out, num_steps):
+    """出力先が指定されていればそれを、なければ新しいバッファを返す"""
+    if out is None:
+        return np.empty((len(TimeSeries.CHANNELS), num_steps))
+    if out.shape != (len(TimeSeries.CHANNELS), num_steps):
+        raise ValueError(f"出力バッファの形状が不正です: {out.shape}")
+    return out
+
+
+def groundwater_exchange_rate(mass_flow_rate, effectiveness, groundwater_mass, time_step):
+    """
+    1ステップあたりに地下水温度が入口温度へ近づく割合を返す
+
+    地下水温度の更新式
+        ΔT_gw = ṁ·Cp·ε·(T_in - T_gw)·Δt / (m_gw·Cp)
+    の係数 k = ṁ·ε·Δt / m_gw（比熱は約分される）
+
+    Parameters:
+        mass_flow_rate: 全配管の質量流量 [kg/s]
+        effectiveness: 熱交換効率 ε [-]
+        groundwater_mass: 地下水質量 [kg]
+        time_step: 時間刻み [s]
+
+    Returns:
+        float: 係数 k（地下水質量が0以下の場合は0）
+    """
+    if groundwater_mass <= 0:
+        return 0.0
+    return mass_flow_rate * effectiveness * time_step / groundwater_mass
+
+
+def _scalar_recurrence(inlet, cap, a, k, prev, start, end, out):
+    """
+    y_i = min(a·y_{i-1} + k·x_i, cap_i) を start から end まで1ステップずつ評価する
+
+    Returns:
+        float: 最後のステップの y
+    """
+    values = []
+    for x, limit in zip(inlet[start:end].tolist(), cap[start:end].tolist()):
+        prev = a * prev + k * x
+        if prev > limit:
+            prev = limit
+        values.append(prev)
+    out[start:end] = values
+    return prev
+
+
+def _clamped_linear_recurrence(inlet, k, initial, upper, out=None):
+    """
+    y_i = min((1 - k)·y_{i-1} + k·x_i, upper, x_i) をベクトル化して評価する
+
+    クランプが効かない区間は線形漸化式として lfilter で一括評価し、
+    クランプが効いている区間は「前ステップが上限に張り付いている」条件を
+    一括判定して読み飛ばす。区間長は倍々に伸ばし、クランプ解除後は直前の
+    非クランプ区間の長さから再開する。入口温度が地下水温度付近で変動して
+    クランプがほぼ毎ステップ切り替わる場合は、一括評価の方が遅くなるため
+    _SCALAR_STEPS ステップずつ1ステップごとの計算に切り替える。
+
+    Parameters:
+        inlet: 入口温度の配列 x [℃]
+        k: 追従係数（groundwater_exchange_rate の戻り値）
+        initial: 初期地下水温度 y_{-1} [℃]
+        upper: 地下水温度の上限（初期温度 + 温度上昇上限値）[℃]
+        out: 結果の書き込み先（省略時は新規に確保）
+
+    Returns:
+        ndarray: 各ステップ更新後の地下水温度 y
+    """
+    n = inlet.size
+    ground = np.empty(n) if out is None else out
+    cap = np.minimum(inlet, upper)
+    a = 1.0 - k
+    prev = initial
+    i = 0
+    window = _MIN_WINDOW
+    short = False
+
+    while i < n:
+        if short:
+            end = min(n, i + _SCALAR_STEPS)
+            prev = _scalar_recurrence(inlet, cap, a, k, prev, i, end, ground)
+            i = end
+            window = _MIN_WINDOW
+            short = False
+            continue
+
+        # 非クランプ区間：y_i = a·y_{i-1} + k·x_i を lfilter で評価
+        run_start = i
+        while i < n:
+            end = min(n, i + window)
+            z, _ = lfilter([k], [1.0, -a], inlet[i:end], zi=[a * prev])
+            over = np.flatnonzero(z > cap[i:end])
+            if over.size == 0:
+                ground[i:end] = z
+                prev = z[-1]
+                i = end
+                window *= 2
+                continue
+            j = i + over[0]
+            ground[i:j] = z[:over[0]]
+            ground[j] = cap[j]
+            i = j + 1
+            break
+        else:
+            break
+        free_run = i - run_start
+
+        # クランプ区間：y_{i-1} = cap_{i-1} のとき a·cap_{i-1} + k·x_i > cap_i なら再びクランプ
+        clamp_window = _MIN_WINDOW
+        while i < n:
+            end = min(n, i + clamp_window)
+            stay = a * cap[i - 1:end - 1] + k * inlet[i:end] > cap[i:end]
+            run = stay.size if stay.all() else int(np.argmin(stay))
+            ground[i:i + run] = cap[i:i + run]
+            i += run
+            if run < stay.size:
+                break
+            clamp_window *= 2
+
+        prev = ground[i - 1]
+        # 次の非クランプ区間は直前の非クランプ区間の2倍の長さから評価する
+        window = max(_MIN_WINDOW, 2 * free_run)
+        short = i - run_start < _SHORT_RUN
+
+    return ground
+
+
+def _make_state(step, loop_temp, ground_temp):
+    """
+    計算再開用の状態（チェックポイント）を作成する
+
+    Parameters:
+        step: 計算済みのステップ数
+        loop_temp: 次ステップの入口温度（循環水温度）[℃]
+        ground_temp: 地下水温度 [℃]
+
+    Returns:
+        dict: step, loop_temp, ground_temp
+    """
+    return {
+        'step': int(step),
+        'loop_temp': float(loop_temp),
+        'ground_temp': float(ground_temp),
+    }
+
+
+def simulate_continuous_supply(inlet_temps, ground_temp, NTU, mass_flow_rate,
+                               groundwater_mass, temp_rise_limit, time_step=60, state=None,
+                               out=None):
+    """
+    新しい水を連続供給する場合の時系列を計算する
+
+    入口温度は配列で与え、時間変化する入口温度（実測ログなど）をそのまま
+    再生できる。各ステップの地下水温度は入口温度と温度上昇上限値を超えない。
+    state を与えるとその時点から計算を再開する（inlet_temps は追加分のみ）。
+
+    Parameters:
+        inlet_temps: 各ステップの入口温度 [℃]（配列またはスカラー列）
+        ground_temp: 初期地下水温度 [℃]
+        NTU: 伝熱単位数 [-]
+        mass_flow_rate: 全配管の質量流量 [kg/s]
+        groundwater_mass: 地下水質量 [kg]
+        temp_rise_limit: 温度上昇上限値 [℃]
+        time_step: 時間刻み [s]
+        state: 再開する状態（前回計算結果の state）
+        out: 結果の書き込み先（4 × ステップ数の配列、省略時は新規に確保）
+
+    Returns:
+        TimeSeries: 時系列（state に計算再開用の状態を持つ）
+    """
+    inlet = np.asarray(inlet_temps, dtype=float)
+    num_steps = inlet.size
+    effectiveness = 1 - math.exp(-NTU)
+    k = groundwater_exchange_rate(mass_flow_rate, effectiveness, groundwater_mass, time_step)
+    upper = ground_temp + temp_rise_limit
+
+    start_step = state['step'] if state is not None else 0
+    start_ground = state['ground_temp'] if state is not None else ground_temp
+
+    series = TimeSeries(_output_buffer(out, num_steps))
+    np.multiply(np.arange(start_step, start_step + num_steps), time_step / 60, out=series.time)
+    series.inlet_temp[:] = inlet
+    ground = series.ground_temp
+    if k > 0:
+        _clamped_linear_recurrence(inlet, k, start_ground, upper, out=ground)
+    else:
+        ground[:] = start_ground
+
+    # 出口温度は更新前の地下水温度で計算する：T_out = T_in - ε·(T_in - T_gw)
+    outlet = series.outlet_temp
+    if num_steps > 0:
+        outlet[0] = start_ground
+        outlet[1:] = ground[:-1]
+    np.subtract(inlet, outlet, out=outlet)
+    np.multiply(outlet, -effectiveness, out=outlet)
+    np.add(outlet, inlet, out=outlet)
+
+    if num_steps > 0:
+        series.state = _make_state(start_step + num_steps, outlet[-1], ground[-1])
+    else:
+        series.state = state
+    return series
+
+
+def simulate_circulation(initial_temp, ground_temp, NTU, mass_flow_rate, groundwater_mass,
+                         temp_rise_limit, num_steps, time_step=60, state=None, out=None):
+    """
+    同じ水を循環させる場合の時系列を計算する（反復計算）
+
+    各ステップの出口温度が次ステップの入口温度になる。
+    state を与えるとその時点から num_steps ステップ分を追加計算する。
+
+    Parameters:
+        initial_temp: 初期入口温度 [℃]
+        ground_temp: 初期地下水温度 [℃]
+        NTU: 伝熱単位数 [-]
+        mass_flow_rate: 全配管の質量流量 [kg/s]
+        groundwater_mass: 地下水質量 [kg]
+        temp_rise_limit: 温度上昇上限値 [℃]
+        num_steps: 計算ステップ数
+        time_step: 時間刻み [s]
+        state: 再開する状態（前回計算結果の state）
+        out: 結果の書き込み先（4 × ステップ数の配列、省略時は新規に確保）
+
+    Returns:
+        TimeSeries: 時系列（state に計算再開用の状態を持つ）
+    """
+    effectiveness = 1 - math.exp(-NTU)
+    upper = ground_temp + temp_rise_limit
+
+    if state is not None:
+        start_step = state['step']
+        current_inlet_temp = state['loop_temp']
+        current_ground_temp = state['ground_temp']
+    else:
+        start_step = 0
+        current_inlet_temp = initial_temp
+        current_ground_temp = ground_temp
+
+    # 時系列データは確保済みのバッファに直接書き込む
+    series = TimeSeries(_output_buffer(out, num_steps))
+    np.multiply(np.arange(start_step, start_step + num_steps), time_step / 60, out=series.time)
+    inlet_temp_history = series.inlet_temp
+    outlet_temp_history = series.outlet_temp
+    ground_temp_history = series.ground_temp
+
+    for i in range(num_steps):
+        # 現在の温度での熱交換計算
+        current_outlet_temp = current_inlet_temp - effectiveness * (current_inlet_temp - current_ground_temp)
+
+        # 地下水温度上昇（熱交換量 ṁ·Cp·ΔT を地下水の熱容量 m_gw·Cp で除す）
+        if groundwater_mass > 0:
+            delta_ground_temp = (mass_flow_rate * (current_inlet_temp - current_outlet_temp) * time_step) / groundwater_mass
+            current_ground_temp += delta_ground_temp
+            # 物理的制約：地下水温度は入口温度を超えない
+            current_ground_temp = min(current_ground_temp, upper, current_inlet_temp)
+
+        # データを記録
+        inlet_temp_history[i] = current_inlet_temp
+        outlet_temp_history[i] = current_outlet_temp
+        ground_temp_history[i] = current_ground_temp
+
+        # 次のステップの入口温度は現在の出口温度
+        current_inlet_temp = current_outlet_temp
+
+    if num_steps > 0:
+        series.state = _make_state(start_step + num_steps, current_inlet_temp, current_ground_temp)
+    else:
+        series.state = state
+    return series
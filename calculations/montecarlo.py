@@ -0,0 +1,329 @@
+"""
+モンテカルロ法による不確実性解析
+不確かな計算条件を確率分布で与えて標本をチャンクごとに一括計算し、
+平均・分散（Welford 法）と分位点（t-digest 型のスケッチ）を逐次集計する
+"""
+
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from calculations.batch import calculate_varied
+
+# ばらつきを与えられる計算条件
+UNCERTAIN_FIELDS = ('initial_temp', 'ground_temp', 'flow_rate', 'pipe_length', 'h_outer', 'temp_rise_limit')
+
+# 標本の下限値（正の値のみ意味を持つ条件）
+_MIN_VALUES = {
+    'flow_rate': 0.1,
+    'pipe_length': 0.1,
+    'h_outer': 1.0,
+    'temp_rise_limit': 0.0,
+}
+
+# 既定で集計する計算結果の項目
+DEFAULT_FIELDS = ('final_temp', 'heat_exchange_rate', 'effective_ground_temp')
+
+# 既定で求める分位（P10/P50/P90）
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+
+# 1チャンクの標本数（チャンクごとに独立した乱数列を使用する）
+DEFAULT_BATCH_SIZE = 50000
+
+# t-digest の圧縮パラメータ（重心の数は約 compression / 2 以下）
+DEFAULT_COMPRESSION = 500
+
+
+def default_uncertainty(inputs):
+    """
+    既定の不確実性（管外側熱伝達係数 50〜500 W/m²K の一様分布、
+    地下水温度 ±1 ℃・総流量 ±5% の正規分布の標準偏差）
+    """
+    return {
+        'h_outer': {'dist': 'uniform', 'low': 50.0, 'high': 500.0},
+        'ground_temp': {'dist': 'normal', 'mean': inputs['ground_temp'], 'std': 1.0},
+        'flow_rate': {'dist': 'normal', 'mean': inputs['flow_rate'], 'std': inputs['flow_rate'] * 0.05},
+    }
+
+
+def sample(spec, size, rng, base=None):
+    """
+    確率分布から標本を抽出する
+
+    Parameters:
+        spec: {'dist': 'uniform', 'low', 'high'} / {'dist': 'normal', 'mean', 'std'} /
+              {'dist': 'triangular', 'low', 'mode', 'high'}
+              （mean・mode を省略した場合は base、'low'・'high' は正規分布では切り捨ての範囲）
+        size: 標本数
+        rng: np.random.Generator
+        base: 計算条件の値（mean・mode の既定値）
+
+    Returns:
+        np.ndarray: 標本
+    """
+    dist = spec.get('dist', 'normal')
+    if dist == 'uniform':
+        return rng.uniform(spec['low'], spec['high'], size)
+    if dist == 'normal':
+        values = rng.normal(spec.get('mean', base), spec['std'], size)
+        if 'low' in spec or 'high' in spec:
+            values = np.clip(values, spec.get('low', -np.inf), spec.get('high', np.inf))
+        return values
+    if dist == 'triangular':
+        return rng.triangular(spec['low'], spec.get('mode', base), spec['high'], size)
+    raise ValueError(f"確率分布 {dist} は未対応です（uniform, normal, triangular）")
+
+
+class RunningStats:
+    """
+    件数・平均・分散・最小・最大の逐次集計（Welford 法をチャンク単位に拡張した Chan の方法）
+
+    チャンクの統計量を順に合成するため、使用メモリは標本数によらず一定となる。
+    別々に集計した結果も merge で合成できる。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        other = RunningStats()
+        other.count = values.size
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """不偏分散（標本が2件未満なら NaN）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+
+class QuantileSketch:
+    """
+    分位点のスケッチ（マージ型 t-digest）
+
+    標本を重心（平均と重み）の列に要約する。重心の大きさは分位の両端ほど小さく
+    なるよう k1 スケール関数 k(q) = compression / (2π) · asin(2q - 1) の1単位に
+    制限するため、P10・P90 などの分位点も精度よく求められる。
+    重心の数は compression / 2 程度で、標本数によらず一定となる。
+    """
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._buffer.append(values)
+        self._buffered += values.size
+        # 未集約の標本は重心数の数倍までに抑える
+        if self._buffered >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._means = np.concatenate([self._means, other._means])
+        self._weights = np.concatenate([self._weights, other._weights])
+        self._compress(force=True)
+
+    def _compress(self, force=False):
+        if not self._buffer and not force:
+            return
+        means = np.concatenate([self._means] + self._buffer)
+        weights = np.concatenate([self._weights] + [np.ones(b.size) for b in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+        if means.size == 0:
+            return
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        # 各重心の中央の分位から k スケールの区間（幅1）を求め、同じ区間の重心を統合する
+        total = weights.sum()
+        q_mid = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q_mid - 1, -1, 1))
+        groups = np.floor(k + self.compression / 4).astype(np.int64)
+        _, groups = np.unique(groups, return_inverse=True)
+        merged_weights = np.bincount(groups, weights=weights)
+        self._means = np.bincount(groups, weights=means * weights) / merged_weights
+        self._weights = merged_weights
+
+    def _centroids(self):
+        self._compress()
+        cumulative = np.cumsum(self._weights) - self._weights / 2
+        # 最小値・最大値を両端の点として補間する
+        positions = np.concatenate([[0.0], cumulative, [float(self.count)]])
+        values = np.concatenate([[self.min], self._means, [self.max]])
+        return positions, values
+
+    def quantile(self, q):
+        """分位 q（0〜1、配列可）の値を返す（標本がなければ NaN）"""
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else math.nan
+        positions, values = self._centroids()
+        result = np.interp(np.asarray(q, dtype=float) * self.count, positions, values)
+        return result if np.ndim(q) else float(result)
+
+    def cdf(self, x):
+        """値 x 以下となる割合（配列可）を返す"""
+        if self.count == 0:
+            return np.full(np.shape(x), np.nan) if np.ndim(x) else math.nan
+        positions, values = self._centroids()
+        result = np.interp(x, values, positions / self.count, left=0.0, right=1.0)
+        return result if np.ndim(x) else float(result)
+
+
+def _evaluate_batch(inputs, uncertainty, size, rng, precision):
+    """標本を1チャンク抽出して計算し、計算結果の項目 → 配列を返す"""
+    varied = {}
+    for name in sorted(uncertainty):
+        if name not in UNCERTAIN_FIELDS:
+            raise ValueError(f"計算条件 {name} にはばらつきを与えられません（{', '.join(UNCERTAIN_FIELDS)}）")
+        if inputs[name] is None:
+            continue
+        values = sample(uncertainty[name], size, rng, inputs[name])
+        if name in _MIN_VALUES:
+            values = np.maximum(values, _MIN_VALUES[name])
+        varied[name] = values
+    if not varied:
+        varied['initial_temp'] = np.full(size, inputs['initial_temp'])
+    return calculate_varied(inputs, varied, precision)
+
+
+def _run_batches(inputs, uncertainty, seed, batches, samples, batch_size, fields, precision, compression,
+                 progress=None):
+    """チャンク番号 batches の標本を計算して集計する（ワーカープロセスからも呼ぶ）"""
+    stats = {field: RunningStats() for field in fields}
+    sketches = {field: QuantileSketch(compression) for field in fields}
+    for batch in batches:
+        size = min(batch_size, samples - batch * batch_size)
+        # チャンク番号ごとに独立した乱数列（並列化・分割の仕方によらず同じ標本になる）
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(batch,)))
+        result = _evaluate_batch(inputs, uncertainty, size, rng, precision)
+        for field in fields:
+            stats[field].update(result[field])
+            sketches[field].update(result[field])
+        if progress is not None:
+            progress(size)
+    return stats, sketches
+
+
+def monte_carlo(inputs, uncertainty=None, samples=100000, seed=0, fields=DEFAULT_FIELDS,
+                quantiles=DEFAULT_QUANTILES, batch_size=DEFAULT_BATCH_SIZE, precision='float64',
+                workers=1, compression=DEFAULT_COMPRESSION, progress=None):
+    """
+    計算条件のばらつきに対する計算結果の分布を求める
+
+    標本を batch_size ごとに抽出して一括計算し、統計量とスケッチに集計して
+    標本は破棄するため、使用メモリは標本数によらず一定となる。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値（ばらつきの中心）
+        uncertainty: 計算条件名 → 確率分布（sample の spec）の dict（省略時は default_uncertainty）
+        samples: 標本数
+        seed: 乱数のシード（同じシードなら同じ結果）
+        fields: 集計する計算結果の項目
+        quantiles: 求める分位
+        batch_size: 1チャンクの標本数
+        precision: 計算精度（'float64' または 'float32'）
+        workers: ワーカープロセス数（2以上でチャンクを分担して並列に計算する）
+        compression: スケッチの圧縮パラメータ
+        progress: 計算済みの標本数と全標本数を受け取る関数（省略可、workers=1 の場合のみ）
+
+    Returns:
+        dict: samples, seconds, summary（項目 → {'count', 'mean', 'std', 'min', 'max', 分位: 値}）,
+              sketches（項目 → QuantileSketch）
+    """
+    if samples < 1:
+        raise ValueError("標本数は1以上で指定してください")
+    uncertainty = default_uncertainty(inputs) if uncertainty is None else uncertainty
+    fields = tuple(fields)
+    started = time.perf_counter()
+    batches = list(range(math.ceil(samples / batch_size)))
+    args = (inputs, uncertainty, seed)
+    options = (samples, batch_size, fields, precision, compression)
+
+    if workers <= 1 or len(batches) == 1:
+        done = [0]
+
+        def report(size):
+            done[0] += size
+            progress(done[0], samples)
+
+        stats, sketches = _run_batches(*args, batches, *options, report if progress else None)
+    else:
+        # Streamlit のスレッドを複製しないよう、ワーカーは spawn で起動する
+        context = multiprocessing.get_context('spawn')
+        stats = {field: RunningStats() for field in fields}
+        sketches = {field: QuantileSketch(compression) for field in fields}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(_run_batches, *args, batches[i::workers], *options)
+                       for i in range(workers)]
+            for future in futures:
+                part_stats, part_sketches = future.result()
+                for field in fields:
+                    stats[field].merge(part_stats[field])
+                    sketches[field].merge(part_sketches[field])
+
+    summary = {}
+    for field in fields:
+        summary[field] = {
+            'count': stats[field].count,
+            'mean': stats[field].mean if stats[field].count else math.nan,
+            'std': stats[field].std,
+            'min': stats[field].min,
+            'max': stats[field].max,
+        }
+        for q in quantiles:
+            summary[field][q] = sketches[field].quantile(q)
+    return {
+        'samples': samples,
+        'seconds': time.perf_counter() - started,
+        'summary': summary,
+        'sketches': sketches,
+    }
@@ -0,0 +1,192 @@
+"""
+近傍条件の先読み計算
+直前に変更された入力項目を入力欄の刻み幅だけ増減させた条件をバックグラウンドで計算し、
+次のクリックで結果をキャッシュから即座に返せるようにする
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from calculations.engine import calculate_cached, result_cache, scenario_hash
+from utils.admission import PRIORITY_BATCH, QuotaExceeded
+
+# 先読みする入力項目の（刻み幅, 最小値, 最大値）- 単一配管計算ページの入力欄と同じ
+INPUT_STEPS = {
+    'initial_temp': (1.0, 20.0, 40.0),
+    'ground_temp': (1.0, 0.0, 20.0),
+    'flow_rate': (1.0, 20.0, 100.0),
+    'pipe_length': (0.5, 1.0, 30.0),
+    'h_outer': (50.0, 50.0, 500.0),
+    'operation_minutes': (1, 1, 60),
+    'temp_rise_limit': (1.0, 5.0, 20.0),
+}
+
+# 先読み計算に使用する CPU 時間の割合（1コアあたり）
+DEFAULT_CPU_BUDGET = 0.25
+
+# 1回の要求で先読みする条件の上限数
+DEFAULT_MAX_NEIGHBORS = 8
+
+# 受付制御で先読み計算の CPU 時間を集計するセッションの識別子（全セッションの先読みで共通の上限）
+PREFETCH_SESSION_ID = "prefetch"
+
+
+def changed_fields(inputs, previous):
+    """
+    前回の計算条件から変更された先読み対象の入力項目を返す
+
+    前回の条件がない場合や、先読み対象以外の項目（管径・材質など）が
+    変更された場合は、全ての先読み対象を返す。
+    """
+    fields = [name for name in INPUT_STEPS if inputs.get(name) is not None]
+    if previous is None:
+        return fields
+    changed = [name for name in inputs
+               if scenario_hash(inputs.get(name)) != scenario_hash(previous.get(name))]
+    if not changed or any(name not in INPUT_STEPS for name in changed):
+        return fields
+    return [name for name in fields if name in changed]
+
+
+def neighbor_inputs(inputs, fields):
+    """
+    指定した入力項目を ±1 刻み変更した計算条件を返す
+
+    入力欄の範囲外になる条件と、入口温度プロファイルで運転時間が決まる場合の
+    運転時間の変更は除く。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値
+        fields: 変更する入力項目
+
+    Returns:
+        list: 計算条件（変更した項目の順、各項目 +1 刻み → -1 刻み）
+    """
+    neighbors = []
+    for name in fields:
+        value = inputs.get(name)
+        if value is None:
+            continue
+        if name == 'operation_minutes' and inputs.get('inlet_profile') is not None:
+            continue
+        step, lower, upper = INPUT_STEPS[name]
+        for candidate in (value + step, value - step):
+            if lower <= candidate <= upper:
+                neighbors.append({**inputs, name: type(value)(candidate)})
+    return neighbors
+
+
+class Prefetcher:
+    """
+    近傍条件をバックグラウンドのスレッドで先読み計算する
+
+    計算は1本のデーモンスレッドで行い、新しい要求が来た時点で古い要求の
+    残りは破棄する。実際の計算要求（foreground の内側）が実行中の間は
+    次の先読みを始めず、先読みの計算時間に応じて待ち時間を入れることで
+    CPU 使用率を cpu_budget 以下に抑える。先読みは calculate_cached を
+    通すため、同じ条件が実際に要求された場合は先読みの結果を待って共有する。
+    先読みの結果はメモ化キャッシュにのみ保存し、永続キャッシュには保存しない。
+    admission を指定した場合は一括計算の優先度で受付を通し、CPU 時間は
+    PREFETCH_SESSION_ID のセッションとして集計する（上限を超えた間は先読みしない）。
+    """
+
+    def __init__(self, cpu_budget=DEFAULT_CPU_BUDGET, max_neighbors=DEFAULT_MAX_NEIGHBORS,
+                 admission=None):
+        if not 0 < cpu_budget <= 1:
+            raise ValueError("cpu_budget は 0 より大きく 1 以下で指定してください")
+        self.cpu_budget = cpu_budget
+        self.max_neighbors = max_neighbors
+        self.admission = admission
+        self._queue = []
+        self._active = 0
+        self._condition = threading.Condition()
+        self.computed = 0
+        self.skipped = 0
+        self.busy_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def foreground(self):
+        """実際の計算要求を囲む（実行中は先読みを止める）"""
+        with self._condition:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    def submit(self, inputs, previous=None):
+        """
+        計算条件の近傍を先読みの対象にする（未計算の要求は破棄する）
+
+        Parameters:
+            inputs: 直前に計算した条件（normalize_inputs の戻り値）
+            previous: その前に計算した条件（変更された項目の判定用、省略可）
+        """
+        neighbors = neighbor_inputs(inputs, changed_fields(inputs, previous))
+        with self._condition:
+            self._queue = neighbors[:self.max_neighbors]
+            self._condition.notify_all()
+
+    def _next(self):
+        """次に先読みする条件を取り出す（実際の計算要求が終わるまで待つ）"""
+        with self._condition:
+            while not self._queue or self._active > 0:
+                self._condition.wait()
+            return self._queue.pop(0)
+
+    def _run(self):
+        while True:
+            inputs = self._next()
+            if scenario_hash(inputs) in result_cache():
+                self.skipped += 1
+                continue
+            started = time.perf_counter()
+            try:
+                with self._admit():
+                    calculate_cached(inputs, persist=False)
+            except QuotaExceeded:
+                # 先読みの CPU 時間が上限に達した場合は、残りの要求を破棄する
+                with self._condition:
+                    self.skipped += 1 + len(self._queue)
+                    self._queue = []
+                continue
+            except Exception:
+                # 先読みの失敗は無視する（実際に要求された時に改めて計算する）
+                pass
+            elapsed = time.perf_counter() - started
+            self.computed += 1
+            self.busy_seconds += elapsed
+
+            # CPU 使用率を cpu_budget 以下に抑える
+            time.sleep(elapsed * (1 / self.cpu_budget - 1))
+
+    @contextmanager
+    def _admit(self):
+        """受付制御が指定されていれば、一括計算の優先度で実行枠を確保する"""
+        if self.admission is None:
+            yield
+            return
+        with self.admission.admit(PREFETCH_SESSION_ID, PRIORITY_BATCH):
+            yield
+
+    def stats(self):
+        """
+        先読みの統計を返す
+
+        Returns:
+            dict: computed（先読みした件数）, skipped（計算済みで省略した件数）,
+                  busy_seconds（先読みの計算時間の合計）, pending（未計算の件数）
+        """
+        with self._condition:
+            pending = len(self._queue)
+        return {
+            'computed': self.computed,
+            'skipped': self.skipped,
+            'busy_seconds': self.busy_seconds,
+            'pending': pending,
+        }
@@ -0,0 +1,118 @@
+"""
+物性値・配管仕様データ
+水の温度依存物性値と、配管・掘削径の仕様を定義する
+"""
+
+# =============================================================================
+# 物性値テーブル（水、標準大気圧、15-40度）
+# =============================================================================
+WATER_PROPERTIES = {
+    # 温度: (動粘度 m²/s, 熱伝導率 W/m·K, プラントル数, 密度 kg/m³, 比熱 J/kg·K)
+    15: (1.139e-6, 0.589, 8.09, 999.1, 4186),
+    20: (1.004e-6, 0.598, 7.01, 998.2, 4182),
+    25: (0.893e-6, 0.607, 6.13, 997.0, 4179),
+    30: (0.801e-6, 0.615, 5.42, 995.6, 4178),
+    35: (0.726e-6, 0.623, 4.83, 994.0, 4178),
+    40: (0.658e-6, 0.631, 4.32, 992.2, 4179),
+}
+
+def get_water_properties(temp):
+    """
+    指定温度における水の物性値を返す（バルク温度法：入口温度基準）
+
+    Parameters:
+        temp: 温度（度C）
+
+    Returns:
+        dict: kinematic_viscosity, thermal_conductivity, prandtl, density, specific_heat
+    """
+    # 温度範囲の境界処理
+    if temp <= 15:
+        props = WATER_PROPERTIES[15]
+        return {
+            'kinematic_viscosity': props[0],
+            'thermal_conductivity': props[1],
+            'prandtl': props[2],
+            'density': props[3],
+            'specific_heat': props[4]
+        }
+    elif temp >= 40:
+        props = WATER_PROPERTIES[40]
+        return {
+            'kinematic_viscosity': props[0],
+            'thermal_conductivity': props[1],
+            'prandtl': props[2],
+            'density': props[3],
+            'specific_heat': props[4]
+        }
+
+    # 線形補間のための温度区間を特定
+    temps = sorted(WATER_PROPERTIES.keys())
+    for i in range(len(temps) - 1):
+        t_low, t_high = temps[i], temps[i + 1]
+        if t_low < temp <= t_high:
+            t_ratio = (temp - t_low) / (t_high - t_low)
+            props_low = WATER_PROPERTIES[t_low]
+            props_high = WATER_PROPERTIES[t_high]
+
+            return {
+                'kinematic_viscosity': props_low[0] + (props_high[0] - props_low[0]) * t_ratio,
+                'thermal_conductivity': props_low[1] + (props_high[1] - props_low[1]) * t_ratio,
+                'prandtl': props_low[2] + (props_high[2] - props_low[2]) * t_ratio,
+                'density': props_low[3] + (props_high[3] - props_low[3]) * t_ratio,
+                'specific_heat': props_low[4] + (props_high[4] - props_low[4]) * t_ratio
+            }
+
+    # フォールバック（通常は到達しない）
+    props = WATER_PROPERTIES[20]
+    return {
+        'kinematic_viscosity': props[0],
+        'thermal_conductivity': props[1],
+        'prandtl': props[2],
+        'density': props[3],
+        'specific_heat': props[4]
+    }
+
+
+# =============================================================================
+# 配管仕様（JIS G 3452 / SGP規格）
+# =============================================================================
+# 管径の一覧（呼び径）
+PIPE_SIZES = ["15A", "20A", "25A", "32A", "40A", "50A", "65A", "80A"]
+
+# 配管内径 (mm)
+PIPE_INNER_DIAMETERS = {
+    "15A": 16.1,
+    "20A": 22.2,
+    "25A": 28.0,
+    "32A": 33.5,
+    "40A": 41.2,
+    "50A": 52.6,
+    "65A": 67.8,
+    "80A": 80.1
+}
+
+# 配管外径 (mm)
+PIPE_OUTER_DIAMETERS = {
+    "15A": 21.7,
+    "20A": 27.2,
+    "25A": 34.0,
+    "32A": 42.7,
+    "40A": 48.6,
+    "50A": 60.5,
+    "65A": 76.3,
+    "80A": 89.1
+}
+
+# 材質による熱伝導率 (W/m・K)
+PIPE_THERMAL_CONDUCTIVITY = {
+    "鋼管": 50.0,
+    "アルミ管": 237.0,
+    "銅管": 398.0
+}
+
+# 掘削径 (mm)
+BORING_DIAMETERS = {
+    "φ116": 116,
+    "φ250": 250
+}
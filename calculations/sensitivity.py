@@ -0,0 +1,246 @@
+"""
+感度解析
+大域的感度解析（Sobol 指標）は計算条件を範囲内で変化させたときの出口温度などの分散に対する
+各条件の寄与を、Saltelli の抽出法で作成した標本をチャンクごとに一括計算して求める。
+局所感度（トルネード図）は各条件を ±X%（温度は ±ΔT℃）変化させた計算条件をまとめて一括計算する
+"""
+
+import math
+import time
+import warnings
+
+import numpy as np
+from scipy.stats import qmc
+
+from calculations.batch import calculate_varied
+from calculations.engine import calculate_cached
+from calculations.montecarlo import RunningStats
+from calculations.properties import PIPE_INNER_DIAMETERS
+from utils.cache import MemoCache, input_hash
+
+# 感度解析の対象とする計算条件と既定の範囲（画面の入力範囲）
+# 連続量は {'low', 'high'} の一様分布、離散量は {'levels'} から等確率で選ぶ
+DEFAULT_FACTORS = {
+    'pipe_length': {'low': 1.0, 'high': 30.0},
+    'pipe_diameter': {'levels': tuple(PIPE_INNER_DIAMETERS)},
+    'h_outer': {'low': 50.0, 'high': 500.0},
+    'flow_rate': {'low': 20.0, 'high': 100.0},
+    'num_pipes': {'levels': (1, 2, 3, 4, 5)},
+}
+
+# 範囲を与えられる計算条件
+SOBOL_FIELDS = ('initial_temp', 'ground_temp', 'flow_rate', 'pipe_length', 'h_outer', 'num_pipes',
+                'pipe_diameter', 'pipe_material', 'boring_diameter')
+
+# 既定で求める計算結果の項目
+DEFAULT_OUTPUTS = ('final_temp',)
+
+# 1チャンクの基本標本数（2のべき乗。1回の一括計算は この数 ×（条件数 + 2）件）
+DEFAULT_CHUNK_SAMPLES = 2 ** 15
+
+# 信頼区間（95%）の係数
+_CONFIDENCE_Z = 1.96
+
+# 感度解析の結果のキャッシュ（同じ範囲・標本数の解析は再計算しない）
+_SOBOL_CACHE = MemoCache(max_entries=32)
+
+
+def _scale(spec, unit):
+    """[0, 1) の一様乱数を計算条件の値に変換する"""
+    if 'levels' in spec:
+        levels = np.asarray(spec['levels'])
+        index = np.minimum((unit * len(levels)).astype(np.int64), len(levels) - 1)
+        return levels[index]
+    return spec['low'] + unit * (spec['high'] - spec['low'])
+
+
+def _check_factors(factors):
+    if not factors:
+        raise ValueError("感度解析の対象の計算条件を1つ以上指定してください")
+    for name, spec in factors.items():
+        if name not in SOBOL_FIELDS:
+            raise ValueError(f"計算条件 {name} は感度解析に使用できません（{', '.join(SOBOL_FIELDS)}）")
+        if 'levels' in spec:
+            if len(spec['levels']) == 0:
+                raise ValueError(f"{name} の値を1つ以上指定してください")
+        elif not spec['low'] < spec['high']:
+            raise ValueError(f"{name} の範囲は low < high で指定してください")
+
+
+def _run(inputs, factors, samples, seed, outputs, chunk_samples, precision):
+    names = list(factors)
+    d = len(names)
+    # A・B の2つの行列を1つの 2d 次元の Sobol 列から作る
+    sampler = qmc.Sobol(2 * d, scramble=True, seed=seed)
+    variance = {field: RunningStats() for field in outputs}
+    first = {field: [RunningStats() for _ in names] for field in outputs}
+    total = {field: [RunningStats() for _ in names] for field in outputs}
+
+    for _ in range(samples // chunk_samples):
+        unit = sampler.random(chunk_samples)
+        a, b = unit[:, :d], unit[:, d:]
+        # A、B、AB_i（A の i 列目を B に置き換えた行列）を縦に並べて1回で計算する
+        matrix = np.concatenate([a, b] + [np.where(np.arange(d) == i, b, a) for i in range(d)])
+        varied = {name: _scale(factors[name], matrix[:, i]) for i, name in enumerate(names)}
+        result = calculate_varied(inputs, varied, precision)
+        for field in outputs:
+            values = np.asarray(result[field], dtype=np.float64).reshape(d + 2, chunk_samples)
+            f_a, f_b = values[0], values[1]
+            variance[field].update(values[:2])
+            for i in range(d):
+                f_ab = values[2 + i]
+                # 1次指標は Saltelli (2010)、総合指標は Jansen の推定式
+                first[field][i].update(f_b * (f_ab - f_a))
+                total[field][i].update((f_a - f_ab) ** 2 / 2)
+    return names, variance, first, total
+
+
+def sobol_indices(inputs, factors=None, samples=2 ** 17, seed=0, outputs=DEFAULT_OUTPUTS,
+                  chunk_samples=DEFAULT_CHUNK_SAMPLES, precision='float64'):
+    """
+    Sobol の1次指標と総合指標を求める
+
+    基本標本数 N に対して N ×（条件数 + 2）件を計算する。標本はチャンクごとに
+    一括計算して推定式の和のみを集計するため、使用メモリは標本数によらず一定となる。
+    同じ計算条件・範囲・標本数の結果はキャッシュする。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値（範囲を与えない計算条件の値）
+        factors: 計算条件名 → 範囲（{'low', 'high'} または {'levels'}）の dict（省略時は DEFAULT_FACTORS）
+        samples: 基本標本数 N（Sobol 列の均等性のため2のべき乗に切り上げる）
+        seed: 乱数のシード（Sobol 列のスクランブル）
+        outputs: 指標を求める計算結果の項目
+        chunk_samples: 1チャンクの基本標本数（2のべき乗）
+        precision: 計算精度（'float64' または 'float32'）
+
+    Returns:
+        dict: samples, evaluations, seconds, factors（条件名の list）,
+              indices（項目 → 条件名 → {'first', 'first_conf', 'total', 'total_conf'}）,
+              variance（項目 → 分散）
+    """
+    factors = DEFAULT_FACTORS if factors is None else factors
+    _check_factors(factors)
+    if samples < 1:
+        raise ValueError("標本数は1以上で指定してください")
+    samples = 1 << (int(samples) - 1).bit_length()
+    chunk_samples = min(1 << (int(chunk_samples) - 1).bit_length(), samples)
+    outputs = tuple(outputs)
+    key = input_hash('sobol', inputs, factors, samples, seed, outputs, precision)
+
+    def compute():
+        started = time.perf_counter()
+        with warnings.catch_warnings():
+            # 全標本数は2のべき乗のため、途中のチャンクの均等性の警告は無視する
+            warnings.simplefilter('ignore', UserWarning)
+            names, variance, first, total = _run(inputs, factors, samples, seed, outputs, chunk_samples,
+                                                 precision)
+        indices = {}
+        for field in outputs:
+            var = variance[field].variance
+            indices[field] = {}
+            for i, name in enumerate(names):
+                # 分散が0（計算結果が変化しない）なら指標は NaN
+                scale = 1 / var if var > 0 else math.nan
+                count = first[field][i].count
+                indices[field][name] = {
+                    'first': first[field][i].mean * scale,
+                    'first_conf': _CONFIDENCE_Z * first[field][i].std / math.sqrt(count) * scale,
+                    'total': total[field][i].mean * scale,
+                    'total_conf': _CONFIDENCE_Z * total[field][i].std / math.sqrt(count) * scale,
+                }
+        return {
+            'samples': samples,
+            'evaluations': samples * (len(names) + 2),
+            'seconds': time.perf_counter() - started,
+            'factors': names,
+            'indices': indices,
+            'variance': {field: variance[field].variance for field in outputs},
+        }
+
+    return _SOBOL_CACHE.get_or_compute(key, compute)
+
+
+def ranked(result, output='final_temp', by='total'):
+    """
+    sobol_indices の結果を指標の大きい順に並べる
+
+    Returns:
+        list: (条件名, {'first', 'first_conf', 'total', 'total_conf'}) の list
+    """
+    indices = result['indices'][output]
+    return sorted(indices.items(), key=lambda item: -np.nan_to_num(item[1][by], nan=-math.inf))
+
+
+# 局所感度（トルネード図）で変化させる計算条件
+TORNADO_FIELDS = ('initial_temp', 'ground_temp', 'flow_rate', 'pipe_length', 'h_outer')
+
+# 局所感度の既定の計算結果の項目
+TORNADO_OUTPUTS = ('final_temp', 'groundwater_temp_rise')
+
+# 局所感度で割合ではなく絶対値で変化させる計算条件（℃ の値の ±X% は原点の取り方で変わるため）
+TORNADO_TEMP_FIELDS = ('initial_temp', 'ground_temp')
+
+# 温度の変化幅の既定値 [℃]
+DEFAULT_TORNADO_TEMP_DELTA = 1.0
+
+
+def tornado(inputs, fraction=0.1, base=None, fields=TORNADO_FIELDS, outputs=TORNADO_OUTPUTS,
+            precision='float64', temp_delta=DEFAULT_TORNADO_TEMP_DELTA):
+    """
+    各計算条件を ±fraction（温度は ±temp_delta ℃）変化させたときの計算結果（トルネード図用）
+
+    2 × 条件数の計算条件を配列にまとめて1回で一括計算する。
+    TORNADO_TEMP_FIELDS の温度は割合ではなく temp_delta ℃ だけ増減させる。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値（基準の計算条件）
+        fraction: 変化の割合（0.1 なら ±10%）
+        base: 基準の計算条件の計算結果（calculate_cached の戻り値、省略時は計算する）
+        fields: 変化させる計算条件
+        outputs: 求める計算結果の項目
+        precision: 計算精度（'float64' または 'float32'）
+        temp_delta: 温度の変化幅 [℃]
+
+    Returns:
+        dict: base（項目 → 基準の値）,
+              effects（項目 → [(条件名, 減少時の値, 増加時の値), ...]、影響の大きい順）,
+              values（条件名 → (減少時の条件値, 増加時の条件値)）,
+              fraction, temp_delta（変化の割合と温度の変化幅）
+    """
+    if not 0 < fraction < 1:
+        raise ValueError("変化の割合は 0 より大きく 1 未満で指定してください")
+    if not temp_delta > 0:
+        raise ValueError("温度の変化幅は 0 より大きい値で指定してください")
+    if base is None:
+        base = calculate_cached(inputs)
+    fields = tuple(fields)
+    n = len(fields)
+
+    # i 行目は i 番目の条件を減少、n + i 行目は増加させ、他の条件は基準の値とする
+    factors = np.concatenate([np.full(n, 1 - fraction), np.full(n, 1 + fraction)])
+    offsets = np.concatenate([np.full(n, -temp_delta), np.full(n, temp_delta)])
+    changed = np.tile(np.arange(n), 2)
+    varied = {}
+    for i, name in enumerate(fields):
+        if name in TORNADO_TEMP_FIELDS:
+            values = inputs[name] + offsets
+        else:
+            values = inputs[name] * factors
+        varied[name] = np.where(changed == i, values, float(inputs[name]))
+    result = calculate_varied(inputs, varied, precision)
+
+    effects = {}
+    base_values = {}
+    for output in outputs:
+        value = base[output]
+        base_values[output] = math.nan if value is None else float(value)
+        values = np.asarray(result[output], dtype=np.float64)
+        rows = [(name, float(values[i]), float(values[n + i])) for i, name in enumerate(fields)]
+        effects[output] = sorted(rows, key=lambda row: -np.nan_to_num(abs(row[2] - row[1])))
+    return {
+        'base': base_values,
+        'effects': effects,
+        'values': {name: (varied[name][i], varied[name][n + i]) for i, name in enumerate(fields)},
+        'fraction': fraction,
+        'temp_delta': temp_delta,
+    }
@@ -0,0 +1,440 @@
+"""
+計算エンジンの HTTP JSON API
+Streamlit を使わずに他のツールから計算を呼び出すための asyncio の HTTP サーバー。
+数ミリ秒以内に届いた単一条件の要求はまとめて calculate_batch で計算する
+
+使用例:
+    python -m calculations.server --host 127.0.0.1 --port 8765
+
+エンドポイント:
+    GET  /health     稼働状況
+    POST /calculate  {normalize_inputs の引数} → {"result": 計算結果}
+    POST /batch      {"scenarios": [normalize_inputs の引数, ...]} → {"results": [計算結果, ...]}
+    POST /sweep      {"base": ..., "axes": {条件名: 値の list}} → {"rows": [軸の値と計算結果, ...]}
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import sys
+import time
+
+import numpy as np
+
+from calculations.batch import BATCH_FIELDS, batch_rows
+from calculations.cli import _BOOL_FIELDS, _parse_bool
+from calculations.engine import (
+    CIRCULATION_CONTINUOUS_SUPPLY,
+    CIRCULATION_SAME_WATER,
+    ENGINE_VERSION,
+    normalize_inputs,
+)
+from calculations.properties import BORING_DIAMETERS, PIPE_INNER_DIAMETERS, PIPE_THERMAL_CONDUCTIVITY
+from calculations.sweep import SweepGrid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 単一条件の要求をまとめる待ち時間 [s]
+DEFAULT_BATCH_WINDOW = 0.002
+
+# 1回の一括計算にまとめる要求数の上限
+DEFAULT_MAX_BATCH = 256
+
+# 要求本文の上限 [byte]
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+# 1回のスイープの計算条件数の上限（これを超えるものは calculations.shard を使用する）
+MAX_SWEEP_ROWS = 100000
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """要求の内容が不正（400 系の応答にする）"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# 正の値でなければならない計算条件
+_POSITIVE_FIELDS = ('flow_rate', 'pipe_length', 'h_outer')
+
+# 選択肢から選ぶ計算条件
+_CHOICES = {
+    'boring_diameter': BORING_DIAMETERS,
+    'pipe_material': PIPE_THERMAL_CONDUCTIVITY,
+    'pipe_diameter': PIPE_INNER_DIAMETERS,
+    'circulation_type': (None, CIRCULATION_SAME_WATER, CIRCULATION_CONTINUOUS_SUPPLY),
+}
+
+
+def _check_ranges(inputs):
+    """
+    正規化した計算条件の範囲を確認する（範囲外の条件は RequestError）
+
+    流量0などの条件は計算結果が NaN・無限大になり JSON で返せないため、
+    計算する前に 400 の応答にする。
+    """
+    for name in ('initial_temp', 'ground_temp', 'temp_rise_limit'):
+        if inputs[name] is not None and not math.isfinite(inputs[name]):
+            raise RequestError(f"{name} は有限の数値で指定してください")
+    for name in _POSITIVE_FIELDS:
+        if not (math.isfinite(inputs[name]) and inputs[name] > 0):
+            raise RequestError(f"{name} は正の数値で指定してください: {inputs[name]}")
+    if inputs['num_pipes'] < 1:
+        raise RequestError(f"num_pipes は1以上で指定してください: {inputs['num_pipes']}")
+    if inputs['temp_rise_limit'] is not None and inputs['temp_rise_limit'] < 0:
+        raise RequestError(f"temp_rise_limit は0以上で指定してください: {inputs['temp_rise_limit']}")
+    if inputs['operation_minutes'] is not None and inputs['operation_minutes'] < 1:
+        raise RequestError(f"operation_minutes は1以上で指定してください: {inputs['operation_minutes']}")
+    if inputs['inlet_profile'] is not None and not np.isfinite(inputs['inlet_profile']).all():
+        raise RequestError("inlet_profile は有限の数値で指定してください")
+    for name, choices in _CHOICES.items():
+        if not isinstance(inputs[name], (str, type(None))) or inputs[name] not in choices:
+            raise RequestError(f"{name} の値が不正です: {inputs[name]}")
+    return inputs
+
+
+def _parse_bools(kwargs):
+    """真偽値の計算条件を変換する（"false" などの文字列も受け付ける）"""
+    for name in _BOOL_FIELDS:
+        if name in kwargs:
+            kwargs = {**kwargs, name: _parse_bool(kwargs[name])}
+    return kwargs
+
+
+def _normalize(kwargs):
+    """要求の計算条件を正規化して範囲を確認する（不正な条件は RequestError）"""
+    if not isinstance(kwargs, dict):
+        raise RequestError("計算条件は JSON オブジェクトで指定してください")
+    try:
+        inputs = normalize_inputs(**_parse_bools(kwargs))
+    except (TypeError, ValueError) as exc:
+        raise RequestError(f"計算条件が不正です: {exc}") from None
+    return _check_ranges(inputs)
+
+
+class MicroBatcher:
+    """
+    単一条件の要求をまとめて計算する
+
+    最初の要求が届いてから window 秒の間（または max_batch 件に達するまで）に
+    届いた要求を1回の calculate_batch で計算する。計算はスレッドで行うため、
+    計算中も次の要求を受け付けられる。
+    """
+
+    def __init__(self, window=DEFAULT_BATCH_WINDOW, max_batch=DEFAULT_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def calculate(self, inputs):
+        """正規化した計算条件を計算して結果の dict を返す"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((inputs, future))
+        return await future
+
+    async def _collect(self):
+        """最初の要求から window 秒の間に届いた要求を返す"""
+        items = [await self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(items) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # 待ち時間内に取り出せなかった要求もすでに届いていればまとめる
+        while len(items) < self.max_batch and not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            scenarios = [inputs for inputs, _ in items]
+            try:
+                results = await loop.run_in_executor(None, batch_rows, scenarios)
+            except Exception:
+                # 不正な条件を含む場合は1件ずつ計算し、その要求のみエラーにする
+                results = []
+                for inputs in scenarios:
+                    try:
+                        results.append(await loop.run_in_executor(None, batch_rows, [inputs]))
+                    except Exception as exc:
+                        results.append(exc)
+                results = [r if isinstance(r, Exception) else r[0] for r in results]
+            self.batches += 1
+            self.requests += len(items)
+            for (_, future), result in zip(items, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+        }
+
+
+class EngineServer:
+    """
+    計算エンジンの HTTP サーバー（HTTP/1.1、keep-alive 対応の最小限の実装）
+
+    Parameters:
+        window: 単一条件の要求をまとめる待ち時間 [s]
+        max_batch: 1回の一括計算にまとめる要求数の上限
+    """
+
+    def __init__(self, window=DEFAULT_BATCH_WINDOW, max_batch=DEFAULT_MAX_BATCH):
+        self.batcher = MicroBatcher(window, max_batch)
+        self.started = time.time()
+        self._routes = {
+            ('GET', '/health'): self.health,
+            ('POST', '/calculate'): self.calculate,
+            ('POST', '/batch'): self.batch,
+            ('POST', '/sweep'): self.sweep,
+        }
+
+    async def health(self, body):
+        return {
+            'status': 'ok',
+            'engine_version': ENGINE_VERSION,
+            'uptime': time.time() - self.started,
+            'batcher': self.batcher.stats(),
+        }
+
+    async def calculate(self, body):
+        inputs = _normalize(body)
+        try:
+            result = await self.batcher.calculate(inputs)
+        except ValueError as exc:
+            raise RequestError(str(exc)) from None
+        return {'result': result}
+
+    async def batch(self, body):
+        scenarios = body.get('scenarios') if isinstance(body, dict) else body
+        if not isinstance(scenarios, list):
+            raise RequestError("scenarios に計算条件の配列を指定してください")
+        scenarios = [_normalize(kwargs) for kwargs in scenarios]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, batch_rows, scenarios)
+        except ValueError as exc:
+            raise RequestError(str(exc)) from None
+        return {'results': results}
+
+    async def sweep(self, body):
+        if not isinstance(body, dict):
+            raise RequestError("スイープは {\"base\": ..., \"axes\": ...} で指定してください")
+        try:
+            base = body.get('base')
+            if isinstance(base, dict):
+                base = _parse_bools(base)
+            axes = body.get('axes')
+            if isinstance(axes, dict):
+                axes = {name: [_parse_bool(value) for value in values] if name in _BOOL_FIELDS else values
+                        for name, values in axes.items()}
+            grid = SweepGrid(base, axes)
+        except (AttributeError, TypeError, ValueError) as exc:
+            raise RequestError(f"スイープの指定が不正です: {exc}") from None
+        if len(grid) > MAX_SWEEP_ROWS:
+            raise RequestError(f"計算条件が {len(grid)} 件あります（上限 {MAX_SWEEP_ROWS} 件）", 413)
+        try:
+            scenarios = list(grid.scenarios())
+        except (TypeError, ValueError) as exc:
+            raise RequestError(f"計算条件が不正です: {exc}") from None
+        for inputs in scenarios:
+            _check_ranges(inputs)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, batch_rows, scenarios)
+        except ValueError as exc:
+            raise RequestError(str(exc)) from None
+        rows = [{**grid.axis_values(i), **result} for i, result in enumerate(results)]
+        return {'axes': list(grid.axes), 'fields': list(BATCH_FIELDS), 'rows': rows}
+
+    async def _dispatch(self, method, path, body):
+        """要求を処理して (状態コード, 応答の dict) を返す"""
+        handler = self._routes.get((method, path.split('?', 1)[0]))
+        if handler is None:
+            if any(route_path == path for _, route_path in self._routes):
+                return 405, {'error': f"{method} は使用できません"}
+            return 404, {'error': f"{path} は存在しません"}
+        try:
+            if body:
+                try:
+                    payload = json.loads(body)
+                except ValueError as exc:
+                    raise RequestError(f"JSON を解析できません: {exc}") from None
+            else:
+                payload = {}
+            return 200, await handler(payload)
+        except RequestError as exc:
+            return exc.status, {'error': str(exc)}
+        except Exception:
+            logger.exception("%s %s の処理に失敗しました", method, path)
+            return 500, {'error': "計算に失敗しました"}
+
+    @staticmethod
+    async def _readline(reader, status, message):
+        """1行読み込む（上限を超える長さの行は RequestError）"""
+        try:
+            return await reader.readline()
+        except ValueError:
+            # 行が StreamReader の上限（64 KiB）を超えた場合（LimitOverrunError は ValueError になる）
+            raise RequestError(message, status) from None
+
+    async def _read_head(self, reader):
+        """
+        要求行とヘッダーを読み込む
+
+        Returns:
+            tuple: (メソッド, パス, HTTP のバージョン, ヘッダーの dict)（接続が閉じられた場合は None）
+        """
+        request_line = await self._readline(reader, 400, "要求行が長すぎます")
+        if not request_line:
+            return None
+        try:
+            method, path, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise RequestError("要求行が不正です") from None
+
+        headers = {}
+        while True:
+            line = await self._readline(reader, 431, "ヘッダーが長すぎます")
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return method, path, version, headers
+
+    async def handle(self, reader, writer):
+        """1つの接続の要求を順に処理する"""
+        try:
+            while True:
+                try:
+                    head = await self._read_head(reader)
+                except RequestError as exc:
+                    await self._respond(writer, exc.status, {'error': str(exc)}, keep_alive=False)
+                    break
+                if head is None:
+                    break
+                method, path, version, headers = head
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413 if length > 0 else 400,
+                                        {'error': "Content-Length が不正です"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self._dispatch(method.upper(), path, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        try:
+            body = json.dumps(payload, ensure_ascii=False, allow_nan=False).encode('utf-8')
+        except (TypeError, ValueError):
+            # NaN・無限大など JSON で表せない結果は接続を切らずに 500 で返す
+            logger.exception("応答を JSON に変換できません")
+            status = 500
+            body = json.dumps({'error': "計算結果を JSON に変換できません"},
+                              ensure_ascii=False).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        """
+        サーバーを起動して停止されるまで要求を処理する
+
+        Parameters:
+            ready: 待ち受け開始後に (host, port) を受け取る関数（省略可）
+        """
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        try:
+            address = server.sockets[0].getsockname()[:2]
+            logger.info("計算エンジンの API を http://%s:%s で待ち受けています", *address)
+            if ready is not None:
+                ready(address)
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calculations.server",
+                                     description="計算エンジンの HTTP JSON API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW * 1000,
+                        help="単一条件の要求をまとめる待ち時間 [ms]")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="1回の一括計算にまとめる要求数の上限")
+    args = parser.parse_args(argv)
+    if args.max_batch < 1:
+        parser.error("--max-batch は1以上で指定してください")
+
+    logging.basicConfig(level=logging.INFO)
+    server = EngineServer(args.batch_window_ms / 1000, args.max_batch)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+分散パラメータスイープ
+スイープを決まった区間のチャンクに分割して共有ファイルシステム上のマニフェストに記録し、
+複数のプロセス・計算機がロックファイルでチャンクを確保して計算する
+
+使用例:
+    python -m calculations.shard plan sweep.json runs/study1 --chunk-size 500
+    python -m calculations.shard work runs/study1 --workers 4   # 各計算機で実行
+    python -m calculations.shard status runs/study1
+    python -m calculations.shard collect runs/study1 results.csv
+
+sweep.json は {"base": normalize_inputs の引数, "axes": {条件名: 値の list}} とする。
+中断した場合は同じ work コマンドを再実行すると、計算済みのチャンクを飛ばして再開する。
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+import numpy as np
+
+from calculations.sweep import SWEEP_FIELDS, SweepGrid, evaluate_range, sweep_frame
+
+MANIFEST_NAME = "manifest.json"
+
+# 既定の1チャンクの計算条件数
+DEFAULT_CHUNK_SIZE = 1000
+
+# 他の計算機のロックを放棄されたとみなすまでの時間 [s]
+DEFAULT_STALE_SECONDS = 6 * 3600
+
+
+def _chunk_id(index):
+    return f"{index:06d}"
+
+
+def _result_path(run_dir, chunk_id):
+    return os.path.join(run_dir, "chunks", chunk_id + ".npy")
+
+
+def _lock_path(run_dir, chunk_id):
+    return os.path.join(run_dir, "locks", chunk_id + ".lock")
+
+
+def plan(sweep, run_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    スイープをチャンクに分割してマニフェストを作成する
+
+    チャンクの区間は計算条件の数と chunk_size のみで決まるため、
+    同じ定義からは常に同じマニフェストになる。
+
+    Parameters:
+        sweep: {"base": ..., "axes": ...} の dict
+        run_dir: 作業ディレクトリ（共有ファイルシステム上）
+        chunk_size: 1チャンクの計算条件数
+
+    Returns:
+        dict: マニフェスト
+    """
+    grid = SweepGrid(sweep.get("base"), sweep.get("axes"))
+    total = len(grid)
+    chunks = [
+        {"id": _chunk_id(i), "start": start, "stop": min(start + chunk_size, total)}
+        for i, start in enumerate(range(0, total, chunk_size))
+    ]
+    manifest = {
+        "base": grid.base,
+        "axes": grid.axes,
+        "fields": list(SWEEP_FIELDS),
+        "total": total,
+        "chunk_size": chunk_size,
+        "chunks": chunks,
+    }
+
+    path = os.path.join(run_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            existing = json.load(f)
+        if existing != manifest:
+            raise ValueError(f"{path} には別のスイープのマニフェストがあります")
+        return existing
+
+    for name in ("chunks", "locks"):
+        os.makedirs(os.path.join(run_dir, name), exist_ok=True)
+    tmp_path = path + f".{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_manifest(run_dir):
+    """マニフェストを読み込む"""
+    with open(os.path.join(run_dir, MANIFEST_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _stale_lock(lock_path, stale_seconds):
+    """
+    ロックを作成したプロセスが終了しているか、ロックが古すぎる場合にそのファイルの情報を返す
+
+    内容を読み取れないロック（書き込み途中、または書き込む前にプロセスが終了したもの）は
+    ファイルの更新時刻から stale_seconds を過ぎた場合に放棄されたとみなす。
+
+    Returns:
+        tuple: 放棄されたロックの (os.stat_result, 内容)（放棄されていなければ None）
+    """
+    try:
+        with open(lock_path, encoding="utf-8") as f:
+            info = os.fstat(f.fileno())
+            text = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        owner = json.loads(text)
+    except ValueError:
+        if time.time() - info.st_mtime > stale_seconds:
+            return info, text
+        return None
+    if owner.get("host") == socket.gethostname():
+        try:
+            os.kill(owner["pid"], 0)
+        except ProcessLookupError:
+            return info, text
+        except PermissionError:
+            pass
+    if time.time() - owner.get("time", 0) > stale_seconds:
+        return info, text
+    return None
+
+
+def _same_lock(info, text, path):
+    """path のファイルが確認済みのロック（同じファイル・同じ内容）なら True"""
+    current = os.stat(path)
+    if (current.st_dev, current.st_ino, current.st_mtime_ns) != (info.st_dev, info.st_ino, info.st_mtime_ns):
+        return False
+    with open(path, encoding="utf-8") as f:
+        return f.read() == text
+
+
+def _claim(run_dir, chunk_id, stale_seconds):
+    """
+    チャンクのロックを確保する（O_EXCL による作成のため確保できるのは1プロセスのみ）
+
+    放棄されたロックは名前を変えてから削除する。放棄されたと判定してから名前を変えるまでに
+    他のプロセスが同じロックを削除して新しいロックを作成している場合、rename はその新しい
+    ロックにも成功するため、名前を変えたファイルが判定したロックと異なれば元に戻して諦める。
+
+    Returns:
+        bool: 確保できた場合 True
+    """
+    lock_path = _lock_path(run_dir, chunk_id)
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            stale = _stale_lock(lock_path, stale_seconds)
+            if stale is None:
+                return False
+            stale_path = f"{lock_path}.{socket.gethostname()}.{os.getpid()}.stale"
+            try:
+                os.rename(lock_path, stale_path)
+            except FileNotFoundError:
+                continue
+            if not _same_lock(*stale, stale_path):
+                # 他のプロセスの新しいロックを戻す（その間にさらに別のロックが作成されていればそちらを残す）
+                try:
+                    os.link(stale_path, lock_path)
+                except FileExistsError:
+                    pass
+                os.remove(stale_path)
+                return False
+            os.remove(stale_path)
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"host": socket.gethostname(), "pid": os.getpid(), "time": time.time()}, f)
+        return True
+    return False
+
+
+def _release(run_dir, chunk_id):
+    try:
+        os.remove(_lock_path(run_dir, chunk_id))
+    except FileNotFoundError:
+        pass
+
+
+def work(run_dir, stale_seconds=DEFAULT_STALE_SECONDS, max_chunks=None):
+    """
+    未計算のチャンクを確保して計算する（確保できるチャンクがなくなるまで繰り返す）
+
+    結果は一時ファイルに書き込んでから名前を変えるため、中断しても
+    不完全な結果ファイルは残らない。
+
+    Parameters:
+        run_dir: 作業ディレクトリ
+        stale_seconds: 他の計算機のロックを放棄されたとみなすまでの時間 [s]
+        max_chunks: 計算するチャンク数の上限（省略時は無制限）
+
+    Returns:
+        int: 計算したチャンク数
+    """
+    manifest = load_manifest(run_dir)
+    grid = SweepGrid(manifest["base"], manifest["axes"])
+    computed = 0
+    for chunk in manifest["chunks"]:
+        if max_chunks is not None and computed >= max_chunks:
+            break
+        chunk_id = chunk["id"]
+        result_path = _result_path(run_dir, chunk_id)
+        if os.path.exists(result_path) or not _claim(run_dir, chunk_id, stale_seconds):
+            continue
+        try:
+            # ロックを確保する間に他のプロセスが計算を終えている場合がある
+            if os.path.exists(result_path):
+                continue
+            values = np.empty((chunk["stop"] - chunk["start"], len(SWEEP_FIELDS)))
+            evaluate_range(grid, chunk["start"], chunk["stop"], values)
+            tmp_path = f"{result_path}.{socket.gethostname()}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, values)
+            os.replace(tmp_path, result_path)
+            computed += 1
+        finally:
+            _release(run_dir, chunk_id)
+    return computed
+
+
+def status(run_dir):
+    """
+    チャンクの進捗を返す
+
+    Returns:
+        dict: total（チャンク数）, done（計算済み）, running（ロック中）, pending（未着手）
+    """
+    manifest = load_manifest(run_dir)
+    done = running = 0
+    for chunk in manifest["chunks"]:
+        if os.path.exists(_result_path(run_dir, chunk["id"])):
+            done += 1
+        elif os.path.exists(_lock_path(run_dir, chunk["id"])):
+            running += 1
+    total = len(manifest["chunks"])
+    return {"total": total, "done": done, "running": running, "pending": total - done - running}
+
+
+def collect(run_dir):
+    """
+    全チャンクの結果を軸の値と結果の項目を列とする表にまとめる
+
+    Returns:
+        pd.DataFrame: sweep_frame の戻り値
+
+    Raises:
+        ValueError: 未計算のチャンクがある場合
+    """
+    manifest = load_manifest(run_dir)
+    if manifest["fields"] != list(SWEEP_FIELDS):
+        raise ValueError("マニフェストの結果の項目が現在の計算エンジンと異なります")
+    missing = [chunk["id"] for chunk in manifest["chunks"]
+               if not os.path.exists(_result_path(run_dir, chunk["id"]))]
+    if missing:
+        raise ValueError(f"未計算のチャンクが {len(missing)} 件あります（{missing[0]} など）")
+    values = [np.empty((0, len(SWEEP_FIELDS)))]
+    values.extend(np.load(_result_path(run_dir, chunk["id"])) for chunk in manifest["chunks"])
+    return sweep_frame(SweepGrid(manifest["base"], manifest["axes"]), np.concatenate(values))
+
+
+def _work_process(run_dir, stale_seconds):
+    work(run_dir, stale_seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calculations.shard",
+                                     description="分散パラメータスイープ")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser("plan", help="スイープをチャンクに分割してマニフェストを作成する")
+    plan_parser.add_argument("sweep", help="スイープの定義（JSON）")
+    plan_parser.add_argument("run_dir", help="作業ディレクトリ")
+    plan_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    work_parser = commands.add_parser("work", help="未計算のチャンクを計算する")
+    work_parser.add_argument("run_dir", help="作業ディレクトリ")
+    work_parser.add_argument("--workers", type=int, default=1, help="この計算機で起動するプロセス数")
+    work_parser.add_argument("--stale-seconds", type=float, default=DEFAULT_STALE_SECONDS)
+
+    status_parser = commands.add_parser("status", help="進捗を表示する")
+    status_parser.add_argument("run_dir", help="作業ディレクトリ")
+
+    collect_parser = commands.add_parser("collect", help="結果を1つの CSV にまとめる")
+    collect_parser.add_argument("run_dir", help="作業ディレクトリ")
+    collect_parser.add_argument("output", help="出力する CSV ファイル")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "plan":
+        if args.chunk_size < 1:
+            parser.error("--chunk-size は1以上で指定してください")
+        with open(args.sweep, encoding="utf-8") as f:
+            manifest = plan(json.load(f), args.run_dir, args.chunk_size)
+        print(f"計算条件 {manifest['total']} 件を {len(manifest['chunks'])} チャンクに分割しました")
+    elif args.command == "work":
+        started = time.perf_counter()
+        if args.workers <= 1:
+            work(args.run_dir, args.stale_seconds)
+        else:
+            context = multiprocessing.get_context("spawn")
+            processes = [context.Process(target=_work_process, args=(args.run_dir, args.stale_seconds))
+                         for _ in range(args.workers)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        progress = status(args.run_dir)
+        print(f"計算済み {progress['done']}/{progress['total']} チャンク"
+              f"（{time.perf_counter() - started:.1f} 秒）")
+    elif args.command == "status":
+        progress = status(args.run_dir)
+        print(f"計算済み {progress['done']} / ロック中 {progress['running']} / "
+              f"未着手 {progress['pending']}（全 {progress['total']} チャンク）")
+    elif args.command == "collect":
+        try:
+            frame = collect(args.run_dir)
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        frame.to_csv(args.output, index=False)
+        print(f"{len(frame)} 件の結果を {args.output} に保存しました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+応答曲面による高速近似計算
+管径・材質ごとに NTU を格子点で事前計算し、多重線形補間で出口温度と熱交換量を求める
+"""
+
+import itertools
+import math
+
+import numpy as np
+
+from calculations.engine import calculate_cached, transfer_units
+from calculations.properties import PIPE_INNER_DIAMETERS, PIPE_THERMAL_CONDUCTIVITY, get_water_properties
+from utils.cache import MemoCache
+
+# 格子の軸（入口温度 [℃]、1本あたりの流量 [L/min]、管外側熱伝達係数 [W/m²·K]）
+# 入口温度の格子点は物性値テーブルの温度を含めて、折れ点を格子上に揃える
+# 流量と管外側熱伝達係数は値が小さいほど曲率が大きいため等比間隔とする
+SURFACE_AXES = (
+    np.linspace(20.0, 40.0, 9),
+    np.geomspace(4.0, 100.0, 97),
+    np.geomspace(50.0, 500.0, 37),
+)
+
+# 近似を採用する出口温度の誤差の許容値 [℃]
+DEFAULT_TOLERANCE = 0.01
+
+# 層流・乱流の境界（engine と同じ判定）
+_LAMINAR_REYNOLDS = 2300
+
+
+def _multilinear(values, axes, point):
+    """
+    格子上の値を多重線形補間する
+
+    Returns:
+        tuple: (補間値, セルの添字) - 格子の範囲外は (None, None)
+    """
+    index = []
+    weights = []
+    for axis, x in zip(axes, point):
+        if not axis[0] <= x <= axis[-1]:
+            return None, None
+        i = min(int(np.searchsorted(axis, x, side='right')) - 1, len(axis) - 2)
+        index.append(i)
+        weights.append((x - axis[i]) / (axis[i + 1] - axis[i]))
+
+    value = 0.0
+    for corner in itertools.product((0, 1), repeat=len(axes)):
+        weight = 1.0
+        for offset, t in zip(corner, weights):
+            weight *= t if offset else 1 - t
+        if weight:
+            value += weight * values[tuple(i + offset for i, offset in zip(index, corner))]
+    return value, tuple(index)
+
+
+class ResponseSurface:
+    """
+    1つの管径・材質についての NTU の応答曲面
+
+    管長1mあたりの NTU を（入口温度, 1本あたりの流量, 管外側熱伝達係数）の
+    格子点で計算しておく。NTU は管長に比例するため、管長と地下水温度は
+    補間せずに厳密に扱える。
+
+    各セルの誤差は、軸ごとに辺の中点での厳密値と補間値の差を求め、その合計の
+    2倍で見積もる。層流・乱流の境界をまたぐセルは補間できないため誤差を無限大とする。
+    """
+
+    def __init__(self, pipe_diameter, pipe_material, axes=SURFACE_AXES):
+        self.pipe_diameter = pipe_diameter
+        self.pipe_material = pipe_material
+        self.axes = axes
+
+        shape = tuple(len(axis) for axis in axes)
+        self.ntu_per_length = np.empty(shape)
+        laminar = np.empty(shape, dtype=bool)
+        for index in np.ndindex(*shape):
+            ntu, reynolds = self._exact(*(axis[i] for axis, i in zip(axes, index)))
+            self.ntu_per_length[index] = ntu
+            laminar[index] = reynolds < _LAMINAR_REYNOLDS
+
+        # セルごとの誤差の見積もり（管長1mあたりの NTU）
+        # 軸ごとに辺の中点で厳密値と線形補間値の差を求め、セルの各辺の最大値を合計する
+        self.error_bound = np.zeros(tuple(n - 1 for n in shape))
+        for dim, axis in enumerate(axes):
+            midpoints = (axis[:-1] + axis[1:]) / 2
+            mid_axes = axes[:dim] + (midpoints,) + axes[dim + 1:]
+            edge_error = np.empty(tuple(len(a) for a in mid_axes))
+            for index in np.ndindex(*edge_error.shape):
+                ntu, reynolds = self._exact(*(a[i] for a, i in zip(mid_axes, index)))
+                lower = index[:dim] + (index[dim],) + index[dim + 1:]
+                upper = index[:dim] + (index[dim] + 1,) + index[dim + 1:]
+                if not laminar[lower] == laminar[upper] == (reynolds < _LAMINAR_REYNOLDS):
+                    edge_error[index] = math.inf
+                else:
+                    edge_error[index] = abs(ntu - (self.ntu_per_length[lower] + self.ntu_per_length[upper]) / 2)
+            # 他の軸方向に隣り合う2辺のうち大きい方をセルの値とする
+            for other in range(len(axes)):
+                if other != dim:
+                    edge_error = np.maximum(np.take(edge_error, range(0, edge_error.shape[other] - 1), axis=other),
+                                            np.take(edge_error, range(1, edge_error.shape[other]), axis=other))
+            self.error_bound += edge_error
+        self.error_bound *= 2
+
+    def _exact(self, initial_temp, flow_per_pipe, h_outer):
+        """管長1m・1本あたりの NTU とレイノルズ数を厳密に計算する"""
+        return transfer_units(initial_temp, flow_per_pipe, self.pipe_diameter,
+                              self.pipe_material, h_outer)
+
+    def evaluate(self, initial_temp, ground_temp, flow_rate, pipe_length, num_pipes, h_outer):
+        """
+        出口温度と熱交換量を補間で求める（地下水温度一定）
+
+        Returns:
+            dict: final_temp, heat_exchange_rate, effectiveness, error_bound（出口温度の誤差の
+                  見積もり [℃]）- 格子の範囲外は None
+        """
+        flow_per_pipe = flow_rate / num_pipes
+        ntu_per_length, cell = _multilinear(self.ntu_per_length, self.axes,
+                                            (initial_temp, flow_per_pipe, h_outer))
+        if cell is None:
+            return None
+
+        NTU = ntu_per_length * pipe_length
+        effectiveness = 1 - math.exp(-NTU)
+        temp_diff = initial_temp - ground_temp
+        final_temp = initial_temp - effectiveness * temp_diff
+
+        # 出口温度の誤差（NTU の誤差による効率の変化分の1次近似）
+        error_bound = abs(temp_diff) * math.exp(-NTU) * pipe_length * self.error_bound[cell]
+
+        water_props = get_water_properties(initial_temp)
+        mass_flow_rate = flow_rate / 60000 * water_props['density']
+        return {
+            'final_temp': final_temp,
+            'heat_exchange_rate': mass_flow_rate * water_props['specific_heat'] * (initial_temp - final_temp),
+            'effectiveness': effectiveness,
+            'error_bound': error_bound,
+        }
+
+
+# 作成済みの応答曲面（全ての管径・材質の組を保持する）
+# 作成中の組を同時に要求した場合は作成を待って共有し、作成済みの組の参照は待たせない
+_SURFACES = MemoCache(max_entries=len(PIPE_INNER_DIAMETERS) * len(PIPE_THERMAL_CONDUCTIVITY))
+
+
+def response_surface(pipe_diameter, pipe_material):
+    """管径・材質の応答曲面を返す（初回の呼び出し時に作成する）"""
+    return _SURFACES.get_or_compute((pipe_diameter, pipe_material),
+                                    lambda: ResponseSurface(pipe_diameter, pipe_material))
+
+
+def live_estimate(inputs, tolerance=DEFAULT_TOLERANCE):
+    """
+    入力変更の都度表示する出口温度と熱交換量を求める
+
+    地下水温度上昇を考慮しない場合は応答曲面の補間値を返し、誤差の見積もりが
+    許容値を超える場合や格子の範囲外の場合、地下水温度上昇を考慮する場合は
+    計算エンジンで厳密に計算する。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値
+        tolerance: 出口温度の誤差の許容値 [℃]
+
+    Returns:
+        dict: final_temp, heat_exchange_rate, effectiveness, error_bound（厳密計算は 0）,
+              approximate（補間値なら True）
+    """
+    if not inputs['consider_groundwater_temp_rise']:
+        surface = response_surface(inputs['pipe_diameter'], inputs['pipe_material'])
+        estimate = surface.evaluate(inputs['initial_temp'], inputs['ground_temp'],
+                                    inputs['flow_rate'], inputs['pipe_length'],
+                                    inputs['num_pipes'], inputs['h_outer'])
+        if estimate is not None and estimate['error_bound'] <= tolerance:
+            return {**estimate, 'approximate': True}
+
+    result = calculate_cached(inputs)
+    return {
+        'final_temp': result['final_temp'],
+        'heat_exchange_rate': result['heat_exchange_rate'],
+        'effectiveness': result['effectiveness'],
+        'error_bound': 0.0,
+        'approximate': False,
+    }
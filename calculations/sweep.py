@@ -0,0 +1,218 @@
+"""
+パラメータスイープ
+計算条件の格子を分割し、複数プロセスで並列に計算して共有メモリの配列に結果を書き込む
+"""
+
+import itertools
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from calculations.batch import calculate_batch, is_time_stepped
+from calculations.engine import normalize_inputs
+
+# スイープで記録する計算結果の項目（結果の配列の列の順）
+SWEEP_FIELDS = (
+    'final_temp',
+    'heat_exchange_rate',
+    'effectiveness',
+    'NTU',
+    'reynolds',
+    'U',
+    'effective_ground_temp',
+    'groundwater_temp_rise',
+)
+
+# 1ワーカーあたりのチャンク数の目安（処理時間のばらつきを均すため複数に分ける）
+_CHUNKS_PER_WORKER = 4
+
+# 途中結果を返す間隔（計算条件数）
+DEFAULT_ITER_CHUNK = 500
+
+# 時系列計算が必要な格子の途中結果を返す間隔（1件ずつ計算するため短くする）
+DEFAULT_ITER_CHUNK_TIME_STEPPED = 20
+
+
+class SweepGrid:
+    """
+    計算条件の格子（基準の条件に対する各軸の値の直積）
+
+    i 番目の計算条件は軸の値の添字から決まるため、条件の一覧を作らずに
+    任意の区間の条件を作成できる（最後の軸が最も速く変わる）。
+
+    Parameters:
+        base: normalize_inputs の引数の dict（軸にない条件）
+        axes: 条件名 → 値の list の dict
+    """
+
+    def __init__(self, base=None, axes=None):
+        self.base = dict(base or {})
+        self.axes = {name: list(values) for name, values in (axes or {}).items()}
+        for name, values in self.axes.items():
+            if not values:
+                raise ValueError(f"軸 {name} の値がありません")
+        self.shape = tuple(len(values) for values in self.axes.values())
+
+    def __len__(self):
+        return math.prod(self.shape)
+
+    def axis_values(self, index):
+        """i 番目の計算条件の各軸の値を返す"""
+        values = {}
+        for (name, axis), size in zip(reversed(self.axes.items()), reversed(self.shape)):
+            index, position = divmod(index, size)
+            values[name] = axis[position]
+        return {name: values[name] for name in self.axes}
+
+    def scenario(self, index):
+        """i 番目の計算条件を返す（normalize_inputs の戻り値）"""
+        return normalize_inputs(**{**self.base, **self.axis_values(index)})
+
+    def scenarios(self, start=0, stop=None):
+        """区間 [start, stop) の計算条件を順に返す"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self.scenario(index)
+
+    def frame(self):
+        """各計算条件の軸の値の表を返す"""
+        rows = itertools.product(*self.axes.values())
+        return pd.DataFrame(list(rows), columns=list(self.axes))
+
+
+def evaluate_range(grid, start, stop, out):
+    """
+    区間 [start, stop) の計算条件を一括計算して out に書き込む
+
+    calculate_batch で配列として計算するため、計算エンジンのステージの
+    キャッシュは使用しない（時系列計算が必要な条件のみ1件ずつ計算する）。
+
+    Parameters:
+        grid: SweepGrid
+        out: 書き込み先（stop - start 行 × len(SWEEP_FIELDS) 列）
+    """
+    columns = calculate_batch(list(grid.scenarios(start, stop)))
+    for column, field in enumerate(SWEEP_FIELDS):
+        out[:, column] = columns[field]
+
+
+def chunk_ranges(total, chunk_size):
+    """[0, total) を chunk_size ごとの区間に分割する"""
+    return [(start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+
+
+def _run_chunk(name, shape, grid, start, stop):
+    """ワーカープロセスでチャンクを計算し、共有メモリの該当行に書き込む"""
+    # 共有メモリの解放は作成したプロセスが行う（ワーカーは close のみ）
+    shm = shared_memory.SharedMemory(name=name)
+    values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    try:
+        evaluate_range(grid, start, stop, values[start:stop])
+    finally:
+        del values
+        shm.close()
+    return stop - start
+
+
+def default_workers():
+    """既定のワーカー数（利用可能な CPU コア数）"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def run_sweep(grid, workers=None, chunk_size=None, progress=None):
+    """
+    計算条件の格子を並列に計算する
+
+    格子をチャンクに分割して ProcessPoolExecutor のワーカーに割り当てる。
+    ワーカーは共有メモリ上の結果の配列に直接書き込むため、計算結果は
+    プロセス間で受け渡さない。ワーカー数が1の場合は現在のプロセスで計算する。
+
+    Parameters:
+        grid: SweepGrid
+        workers: ワーカー数（省略時は CPU コア数）
+        chunk_size: 1チャンクの計算条件数（省略時はワーカーあたり約4チャンク）
+        progress: 計算済みの件数と全件数を受け取る関数（省略可）
+
+    Returns:
+        np.ndarray: 結果（len(grid) 行 × len(SWEEP_FIELDS) 列）
+    """
+    total = len(grid)
+    workers = default_workers() if workers is None else workers
+    if workers < 1:
+        raise ValueError("workers は1以上で指定してください")
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(total / (workers * _CHUNKS_PER_WORKER)))
+    shape = (total, len(SWEEP_FIELDS))
+
+    if workers == 1 or total <= chunk_size:
+        values = np.empty(shape)
+        for start, stop in chunk_ranges(total, chunk_size):
+            evaluate_range(grid, start, stop, values[start:stop])
+            if progress is not None:
+                progress(stop, total)
+        return values
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, total * len(SWEEP_FIELDS) * 8))
+    try:
+        # Streamlit のスレッドを複製しないよう、ワーカーは spawn で起動する
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = [executor.submit(_run_chunk, shm.name, shape, grid, start, stop)
+                       for start, stop in chunk_ranges(total, chunk_size)]
+            done = 0
+            for future in as_completed(futures):
+                done += future.result()
+                if progress is not None:
+                    progress(done, total)
+        values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return values
+
+
+def iter_sweep(grid, chunk_size=None):
+    """
+    計算条件の格子を現在のプロセスでチャンクごとに計算する（途中結果の表示用）
+
+    Parameters:
+        grid: SweepGrid
+        chunk_size: 1チャンクの計算条件数（省略時は時系列計算の有無で
+                    DEFAULT_ITER_CHUNK または DEFAULT_ITER_CHUNK_TIME_STEPPED）
+
+    Yields:
+        tuple: (計算済みの件数, 結果の配列) - 配列は全件分で、未計算の行は NaN
+    """
+    if chunk_size is None:
+        time_stepped = len(grid) > 0 and (is_time_stepped(grid.scenario(0))
+                                          or is_time_stepped(grid.scenario(len(grid) - 1)))
+        chunk_size = DEFAULT_ITER_CHUNK_TIME_STEPPED if time_stepped else DEFAULT_ITER_CHUNK
+    values = np.full((len(grid), len(SWEEP_FIELDS)), np.nan)
+    for start, stop in chunk_ranges(len(grid), chunk_size):
+        evaluate_range(grid, start, stop, values[start:stop])
+        yield stop, values
+
+
+def sweep_frame(grid, values):
+    """
+    スイープの結果を軸の値と結果の項目を列とする表にする
+
+    Parameters:
+        grid: SweepGrid
+        values: run_sweep の戻り値（途中結果の場合は先頭から計算済みの行のみ）
+
+    Returns:
+        pd.DataFrame: 軸の値の列と SWEEP_FIELDS の列
+    """
+    frame = grid.frame().iloc[:len(values)].copy()
+    for column, field in enumerate(SWEEP_FIELDS):
+        frame[field] = values[:, column]
+    return frame
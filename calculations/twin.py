@@ -0,0 +1,409 @@
+"""
+デジタルツイン（運転監視）
+稼働中のシステムの計測値を1件ずつ受け取って地下水の時系列モデルを進め、計測できない
+ボーリング孔内の地下水温度をカルマンフィルタで推定して、温度上昇上限値に達する時刻を予測する
+
+使用例:
+    python -m calculations.twin --config boreholes.json --tail readings.jsonl
+    python -m calculations.twin --config boreholes.json --listen 127.0.0.1:8766
+
+設定ファイル（JSON、掘削孔 ID → 条件）:
+    {"BH-1": {"pipe_length": 10, "num_pipes": 2, "ground_temp": 15, "temp_rise_limit": 5,
+              "h_outer": 150, "groundwater_volume": 0.8, "exchange_rate": 0.2}}
+    （normalize_inputs の引数と、calculations.calibration で推定したパラメータ）
+
+計測値（JSON Lines、1行1件）:
+    {"borehole": "BH-1", "time": "2026-01-01T08:00:00", "inlet_temp": 30.2, "outlet_temp": 27.9, "flow_rate": 45}
+    （time は ISO 形式の日時または経過時間 [s]、停止中は flow_rate を 0 とする）
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+from collections import deque
+from datetime import datetime
+
+from calculations.calibration import substep_sums
+from calculations.engine import TIME_STEP, calculate, normalize_inputs, transfer_units
+from calculations.properties import get_water_properties
+
+logger = logging.getLogger(__name__)
+
+# 保持する直近の計測値の件数（掘削孔ごと）
+DEFAULT_HISTORY = 1440
+
+# 地下水温度の変化の不確かさ（プロセスノイズの分散）[℃²/h]
+DEFAULT_PROCESS_NOISE = 0.01
+
+# 出口温度の計測誤差の標準偏差 [℃]
+DEFAULT_MEASUREMENT_STD = 0.1
+
+# 監視開始時の地下水温度の不確かさ（標準偏差）[℃]
+DEFAULT_INITIAL_STD = 1.0
+
+# 最初の計測値の前の時間刻み [s]
+DEFAULT_TIME_STEP = 60.0
+
+# 上限値に達する予測がこの時間以内なら警告する [h]
+DEFAULT_ALERT_HOURS = 24.0
+
+# ファイルの追記を確認する間隔 [s]
+DEFAULT_POLL_INTERVAL = 0.5
+
+# 設定ファイルのうち normalize_inputs の引数以外の項目
+TWIN_OPTIONS = ('groundwater_volume', 'exchange_rate', 'initial_std', 'process_noise', 'measurement_std', 'history')
+
+
+class BoreholeTwin:
+    """
+    1本の掘削孔のデジタルツイン
+
+    状態は孔内の地下水温度（スカラー）とその分散のみで、計測値1件ごとに
+    1. 出口温度 T_out = T_in - ε·(T_in - T_gw) による観測更新
+    2. 計算エンジンの連続供給と同じ更新式と交換率 λ による地下水温度の予測
+    を行う（calculations.calibration の LogModel と同じ時系列モデル）。
+    1件あたりの計算量は履歴の長さによらず一定で、直近の計測値は件数を限って保持する。
+
+    Parameters:
+        inputs: normalize_inputs の戻り値（配管・掘削孔の条件、初期地下水温度）
+        temp_rise_limit: 温度上昇上限値 [℃]
+        groundwater_volume: 実効地下水量 [m³]（省略時はボーリング孔内の地下水量）
+        exchange_rate: 地下水の交換率 [1/h]
+        initial_std: 監視開始時の地下水温度（初期地下水温度とする）の不確かさ [℃]
+        process_noise: 地下水温度の変化の不確かさ [℃²/h]
+        measurement_std: 出口温度の計測誤差の標準偏差 [℃]
+        history: 保持する直近の計測値の件数
+    """
+
+    def __init__(self, inputs, temp_rise_limit=5.0, groundwater_volume=None, exchange_rate=0.0,
+                 initial_std=DEFAULT_INITIAL_STD, process_noise=DEFAULT_PROCESS_NOISE, measurement_std=DEFAULT_MEASUREMENT_STD,
+                 history=DEFAULT_HISTORY):
+        self.inputs = inputs
+        if groundwater_volume is None:
+            groundwater_volume = calculate(inputs)['groundwater_volume']
+        if groundwater_volume <= 0:
+            raise ValueError("実効地下水量は正の値で指定してください")
+        self.groundwater_volume = groundwater_volume
+        self.exchange_rate = exchange_rate
+        self.process_noise = process_noise
+        self.measurement_variance = measurement_std ** 2
+        self.limit_temp = inputs['ground_temp'] + temp_rise_limit
+
+        self.ground_temp = inputs['ground_temp']
+        self.variance = initial_std ** 2
+        self.time = None
+        self.readings = 0
+        self.history = deque(maxlen=history)
+        # 最新の運転条件での TIME_STEP ごとの更新 T_gw ← A·T_gw + B の log A と B（予測用）
+        self._log_decay = 0.0
+        self._forcing = 0.0
+
+    def _exchange(self, inlet_temp, flow_rate):
+        """運転条件での熱交換効率 ε と 地下水が入口温度へ近づく速さ ṁ·ε / m_gw [1/s]"""
+        if flow_rate <= 0:
+            return 0.0, 0.0
+        inputs = self.inputs
+        NTU, _ = transfer_units(inlet_temp, flow_rate, inputs['pipe_diameter'], inputs['pipe_material'],
+                                inputs['h_outer'], inputs['pipe_length'], inputs['num_pipes'])
+        effectiveness = -math.expm1(-NTU)
+        density = get_water_properties(inlet_temp)['density']
+        # 全配管の質量流量 [kg/s] と地下水質量 [kg]（密度は入口温度での値）
+        mass_flow_rate = flow_rate / 60000 * density
+        return effectiveness, mass_flow_rate * effectiveness / (self.groundwater_volume * density)
+
+    def update(self, time, inlet_temp, flow_rate, outlet_temp=None):
+        """
+        計測値1件でモデルを進める
+
+        Parameters:
+            time: 計測時刻（経過時間 [s]、前回より後）
+            inlet_temp: 入口温度 [℃]
+            flow_rate: 総流量 [L/min]（0 以下は停止中）
+            outlet_temp: 出口温度 [℃]（省略時は観測更新しない）
+
+        Returns:
+            dict: status の戻り値と、predicted_outlet（観測前の予測出口温度）, innovation（予測との差）
+        """
+        time_step = DEFAULT_TIME_STEP if self.time is None else time - self.time
+        if time_step < 0:
+            raise ValueError(f"計測時刻が前回（{self.time}）より前です: {time}")
+        effectiveness, heating_rate = self._exchange(inlet_temp, flow_rate)
+
+        # 観測更新：出口温度は更新前の地下水温度で決まる（運転中のみ）
+        predicted_outlet = None
+        innovation = None
+        if flow_rate > 0:
+            predicted_outlet = inlet_temp - effectiveness * (inlet_temp - self.ground_temp)
+            if outlet_temp is not None and math.isfinite(outlet_temp):
+                innovation = outlet_temp - predicted_outlet
+                gain = self.variance * effectiveness / (
+                    effectiveness ** 2 * self.variance + self.measurement_variance)
+                self.ground_temp += gain * innovation
+                self.variance *= 1 - gain * effectiveness
+
+        # 時間更新：TIME_STEP ごとの T_gw ← T_gw + k·(T_in - T_gw)（k ≤ 1）と交換率で初期温度へ戻す
+        # 更新を計測間隔の分だけ繰り返す（LogModel と同じく計測間隔によらない）
+        k = min(heating_rate * TIME_STEP, 1.0)
+        recovery = math.exp(-self.exchange_rate * TIME_STEP / 3600)
+        log_decay = (math.log1p(-k) if k < 1 else -math.inf) - self.exchange_rate * TIME_STEP / 3600
+        decay, total, _ = substep_sums(log_decay, time_step / TIME_STEP)
+        forcing = k * inlet_temp * recovery + (1 - recovery) * self.inputs['ground_temp']
+        self.ground_temp = float(decay * self.ground_temp + total * forcing)
+        self.variance = float(decay ** 2 * self.variance + self.process_noise * time_step / 3600)
+
+        self.time = time
+        self.readings += 1
+        self._log_decay = log_decay
+        self._forcing = forcing
+        self.history.append((time, inlet_temp, flow_rate, outlet_temp, predicted_outlet, self.ground_temp,
+                             math.sqrt(self.variance)))
+        return {**self.status(), 'predicted_outlet': predicted_outlet, 'innovation': innovation}
+
+    def seconds_to_limit(self, ground_temp=None):
+        """
+        最新の運転条件が続いた場合に地下水温度が上限値に達するまでの時間 [s]
+
+        update と同じ TIME_STEP ごとの更新 T_gw ← A·T_gw + B を繰り返した場合の解析解から求める。
+        すでに上限値以上なら 0、到達しない場合は None を返す。
+        """
+        ground_temp = self.ground_temp if ground_temp is None else ground_temp
+        if ground_temp >= self.limit_temp:
+            return 0.0
+        if self._log_decay >= 0:
+            return None
+        steady = self._forcing / -math.expm1(self._log_decay)
+        if steady <= self.limit_temp:
+            return None
+        return math.log((steady - ground_temp) / (steady - self.limit_temp)) / -self._log_decay * TIME_STEP
+
+    def status(self):
+        """
+        現在の推定状態
+
+        Returns:
+            dict: time, readings, ground_temp, ground_std [℃], limit_temp,
+                  seconds_to_limit（推定値）, earliest_seconds_to_limit（推定値 + 2σ）
+        """
+        std = math.sqrt(self.variance)
+        return {
+            'time': self.time,
+            'readings': self.readings,
+            'ground_temp': self.ground_temp,
+            'ground_std': std,
+            'limit_temp': self.limit_temp,
+            'seconds_to_limit': self.seconds_to_limit(),
+            'earliest_seconds_to_limit': self.seconds_to_limit(self.ground_temp + 2 * std),
+        }
+
+
+def create_twin(config):
+    """設定（normalize_inputs の引数と TWIN_OPTIONS）からデジタルツインを作成する"""
+    if not isinstance(config, dict):
+        raise ValueError("掘削孔の設定は項目名と値の組で指定してください")
+    options = {name: config[name] for name in TWIN_OPTIONS if name in config}
+    kwargs = {name: value for name, value in config.items() if name not in TWIN_OPTIONS}
+    temp_rise_limit = kwargs.pop('temp_rise_limit', 5.0)
+    return BoreholeTwin(normalize_inputs(**kwargs), temp_rise_limit, **options)
+
+
+def load_twins(path):
+    """設定ファイル（JSON、掘削孔 ID → 設定）からデジタルツインを作成する"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    if not isinstance(config, dict) or not config:
+        raise ValueError("設定ファイルには掘削孔 ID → 設定 の組を1つ以上記述してください")
+    twins = {}
+    for borehole, settings in config.items():
+        try:
+            twins[str(borehole)] = create_twin(settings)
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"{borehole}: {exc}") from None
+    return twins
+
+
+def _parse_time(value):
+    """計測時刻を経過時間 [s]（日時は UNIX 時刻）にする"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def _optional_float(value):
+    return None if value is None else float(value)
+
+
+class TwinMonitor:
+    """
+    複数の掘削孔のデジタルツインに計測値を振り分ける
+
+    Parameters:
+        twins: 掘削孔 ID → BoreholeTwin
+        alert_hours: 上限値に達する予測がこの時間以内なら警告する [h]
+        on_status: 計測値ごとに (掘削孔 ID, update の戻り値) を受け取る関数（省略可）
+    """
+
+    def __init__(self, twins, alert_hours=DEFAULT_ALERT_HOURS, on_status=None):
+        self.twins = twins
+        self.alert_seconds = alert_hours * 3600
+        self.on_status = on_status
+        self.alerts = set()
+        self.rejected = 0
+        self._unknown = set()
+
+    def process(self, reading):
+        """計測値1件を処理して update の戻り値を返す（処理できない計測値は None）"""
+        try:
+            borehole = str(reading['borehole'])
+            twin = self.twins.get(borehole)
+            if twin is None:
+                if borehole not in self._unknown:
+                    self._unknown.add(borehole)
+                    logger.warning("設定にない掘削孔 %s の計測値は無視します", borehole)
+                self.rejected += 1
+                return None
+            status = twin.update(_parse_time(reading['time']), float(reading['inlet_temp']),
+                                 float(reading['flow_rate']), _optional_float(reading.get('outlet_temp')))
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("計測値を処理できません: %s（%s）", reading, exc)
+            self.rejected += 1
+            return None
+
+        # 上限値に達する予測（推定値 + 2σ）が警告時間以内になったら1回だけ通知する
+        remaining = status['earliest_seconds_to_limit']
+        alert = remaining is not None and remaining <= self.alert_seconds
+        if alert and borehole not in self.alerts:
+            self.alerts.add(borehole)
+            logger.warning("%s: 地下水温度 %.2f℃（±%.2f）、約 %.1f 時間で上限値 %.1f℃ に達する見込みです",
+                           borehole, status['ground_temp'], 2 * status['ground_std'], remaining / 3600,
+                           status['limit_temp'])
+        elif not alert and borehole in self.alerts:
+            self.alerts.discard(borehole)
+            logger.info("%s: 上限値に達する見込みがなくなりました", borehole)
+        if self.on_status is not None:
+            self.on_status(borehole, status)
+        return status
+
+    async def run(self, readings):
+        """計測値の非同期 iterable を順に処理する（計測値が途切れるまで）"""
+        async for reading in readings:
+            self.process(reading)
+
+    def summary(self):
+        """掘削孔ごとの現在の推定状態"""
+        return {borehole: twin.status() for borehole, twin in self.twins.items()}
+
+
+def _parse_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        reading = json.loads(line)
+    except ValueError as exc:
+        logger.warning("計測値の JSON を解析できません: %s（%s）", line[:200], exc)
+        return None
+    return reading if isinstance(reading, dict) else None
+
+
+async def tail_readings(path, poll_interval=DEFAULT_POLL_INTERVAL, from_start=True, stop=None):
+    """
+    追記されるファイル（JSON Lines）の計測値を順に返す
+
+    Parameters:
+        path: 計測値のファイル
+        poll_interval: 追記を確認する間隔 [s]
+        from_start: True ならファイルの先頭から、False なら現在の末尾以降のみ読む
+        stop: セットされたら終了する asyncio.Event（省略時は終了しない）
+    """
+    with open(path, encoding='utf-8') as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        pending = ''
+        while stop is None or not stop.is_set():
+            chunk = f.read()
+            if not chunk:
+                await asyncio.sleep(poll_interval)
+                continue
+            lines = (pending + chunk).split('\n')
+            # 書き込み途中の最後の行は次回に持ち越す
+            pending = lines.pop()
+            for line in lines:
+                reading = _parse_line(line)
+                if reading is not None:
+                    yield reading
+            # 他の処理に制御を戻す
+            await asyncio.sleep(0)
+
+
+async def socket_readings(host, port, ready=None):
+    """
+    TCP 接続で送られる計測値（JSON Lines）を順に返す（センサー収集装置の代わり）
+
+    Parameters:
+        ready: 待ち受け開始後に (host, port) を受け取る関数（省略可）
+    """
+    queue = asyncio.Queue()
+
+    async def receive(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reading = _parse_line(line.decode('utf-8', errors='replace'))
+                if reading is not None:
+                    await queue.put(reading)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(receive, host, port)
+    async with server:
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        while True:
+            yield await queue.get()
+
+
+def _address(text):
+    host, _, port = text.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m calculations.twin", description="デジタルツイン（運転監視）")
+    parser.add_argument("--config", required=True, help="掘削孔の設定ファイル（JSON）")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tail", help="追記される計測値のファイル（JSON Lines）")
+    source.add_argument("--listen", help="計測値を受け付ける HOST:PORT（TCP、JSON Lines）")
+    parser.add_argument("--from-end", action="store_true", help="ファイルの現在の末尾以降のみ読む")
+    parser.add_argument("--alert-hours", type=float, default=DEFAULT_ALERT_HOURS,
+                        help="上限値に達する予測がこの時間以内なら警告する [h]")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        twins = load_twins(args.config)
+    except (OSError, ValueError) as exc:
+        print(f"設定ファイルを読み込めません: {exc}", file=sys.stderr)
+        return 1
+    monitor = TwinMonitor(twins, args.alert_hours)
+    if args.tail:
+        readings = tail_readings(args.tail, from_start=not args.from_end)
+    else:
+        readings = socket_readings(*_address(args.listen))
+    logger.info("%d 本の掘削孔を監視しています", len(twins))
+    try:
+        asyncio.run(monitor.run(readings))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
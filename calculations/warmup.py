@@ -0,0 +1,172 @@
+"""
+サーバー起動時のキャッシュの事前計算
+既定の計算条件とよく使われる計算条件をバックグラウンドで計算し、最初の利用者の待ち時間をなくす
+"""
+
+import json
+import logging
+import threading
+import time
+
+from calculations.engine import calculate_cached, normalize_inputs
+from calculations.surface import response_surface
+from utils.admission import PRIORITY_BATCH, QuotaExceeded
+
+logger = logging.getLogger(__name__)
+
+# 複数配管比較ページで既定で選択される管径
+DEFAULT_COMPARE_PIPES = ["25A", "32A", "40A", "50A", "65A", "80A"]
+
+# 利用ログから事前計算する計算条件の上限数
+DEFAULT_POPULAR_LIMIT = 32
+
+# 受付制御で事前計算の CPU 時間を集計するセッションの識別子
+WARMUP_SESSION_ID = "warmup"
+
+
+def default_scenarios():
+    """
+    各ページの初期表示の計算条件を返す
+
+    Returns:
+        list: normalize_inputs の戻り値（単一配管計算、複数配管比較の各管径の順）
+    """
+    scenarios = [normalize_inputs()]
+    for pipe_size in DEFAULT_COMPARE_PIPES:
+        scenarios.append(normalize_inputs(pipe_diameter=pipe_size, stepwise=False))
+    return scenarios
+
+
+def load_scenarios(path):
+    """
+    事前計算する計算条件をファイルから読み込む
+
+    ファイルは normalize_inputs の引数を dict で並べた JSON の配列とする。
+    例: [{"pipe_diameter": "40A", "flow_rate": 80}, {"num_pipes": 2}]
+
+    Returns:
+        list: normalize_inputs の戻り値
+    """
+    with open(path, encoding='utf-8') as f:
+        return [normalize_inputs(**kwargs) for kwargs in json.load(f)]
+
+
+def _run_admitted(admission, func, *args):
+    """
+    受付制御が指定されていれば一括計算の優先度で実行枠を確保して func を実行する
+
+    事前計算の CPU 時間が上限を超えた場合は、上限を下回るまで待ってから再度受付を通す。
+    """
+    if admission is None:
+        return func(*args)
+    while True:
+        try:
+            with admission.admit(WARMUP_SESSION_ID, PRIORITY_BATCH):
+                return func(*args)
+        except QuotaExceeded as exc:
+            time.sleep(exc.retry_after)
+
+
+def warm_up(scenarios, admission=None):
+    """
+    計算条件を計算して結果をキャッシュに保存する
+
+    地下水温度上昇を考慮しない条件は、リアルタイム更新の応答曲面も作成する。
+    計算に失敗した条件は読み飛ばす（失敗として数える）。
+    admission を指定した場合は、計算条件・応答曲面の1件ごとに一括計算の優先度で
+    受付を通し、利用者の計算を優先する（CPU 時間は WARMUP_SESSION_ID として集計する）。
+
+    Parameters:
+        scenarios: normalize_inputs の戻り値の list
+        admission: AdmissionController（省略時は受付制御を通さない）
+
+    Returns:
+        dict: scenarios（計算した件数）, surfaces（作成した応答曲面の数）,
+              failed（失敗した件数）, seconds（所要時間）
+    """
+    started = time.perf_counter()
+    computed = 0
+    failed = 0
+    surfaces = []
+    for inputs in scenarios:
+        try:
+            _run_admitted(admission, calculate_cached, inputs)
+            computed += 1
+        except Exception as exc:
+            failed += 1
+            logger.warning("事前計算に失敗しました: %s", exc)
+            continue
+        surface_key = (inputs['pipe_diameter'], inputs['pipe_material'])
+        if not inputs['consider_groundwater_temp_rise'] and surface_key not in surfaces:
+            surfaces.append(surface_key)
+
+    # 応答曲面は作成に時間がかかるため、計算条件を全て計算してから作成する
+    for surface_key in surfaces:
+        _run_admitted(admission, response_surface, *surface_key)
+
+    return {
+        'scenarios': computed,
+        'surfaces': len(surfaces),
+        'failed': failed,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def _popular_scenarios(usage_log, limit):
+    """利用ログでよく使われた計算条件を normalize_inputs で正規化して返す"""
+    scenarios = []
+    for kwargs in usage_log.popular(limit):
+        try:
+            scenarios.append(normalize_inputs(**kwargs))
+        except (TypeError, ValueError):
+            # 古い形式の記録などは読み飛ばす
+            continue
+    return scenarios
+
+
+class WarmUp:
+    """
+    バックグラウンドのスレッドで事前計算を行う
+
+    完了すると report に warm_up の戻り値を保存し、所要時間をログに出力する。
+    admission を指定した場合は受付制御を通して計算する（warm_up を参照）。
+    """
+
+    def __init__(self, scenarios=None, scenarios_file=None, usage_log=None,
+                 popular_limit=DEFAULT_POPULAR_LIMIT, admission=None):
+        self.scenarios = scenarios
+        self.scenarios_file = scenarios_file
+        self.usage_log = usage_log
+        self.popular_limit = popular_limit
+        self.admission = admission
+        self.report = None
+        self.done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+
+    def start(self):
+        """事前計算を開始する"""
+        self._thread.start()
+        return self
+
+    def _collect(self):
+        """事前計算する計算条件を集める（指定された条件または既定の条件、条件ファイル、利用ログの順）"""
+        scenarios = list(self.scenarios) if self.scenarios is not None else default_scenarios()
+        if self.scenarios_file:
+            try:
+                scenarios.extend(load_scenarios(self.scenarios_file))
+            except (OSError, ValueError, TypeError) as exc:
+                logger.warning("事前計算の条件ファイルを読み込めませんでした: %s", exc)
+        if self.usage_log is not None:
+            scenarios.extend(_popular_scenarios(self.usage_log, self.popular_limit))
+        return scenarios
+
+    def _run(self):
+        try:
+            self.report = warm_up(self._collect(), self.admission)
+            logger.info(
+                "事前計算が完了しました: 計算条件 %d 件、応答曲面 %d 件、失敗 %d 件、所要時間 %.2f 秒",
+                self.report['scenarios'], self.report['surfaces'], self.report['failed'],
+                self.report['seconds']
+            )
+        finally:
+            self.done.set()
@@ -0,0 +1,387 @@
+"""
+差分テスト
+無作為に作成した計算条件を参照実装（reference.py、高速化前の Python のループ）と
+高速な計算経路（計算エンジン、配列の一括計算）で計算し、計算結果の差の最大値・分位点を集計する。
+計算を高速化する変更は、この差が許容範囲内であることを確認してから採用する。
+
+使用例:
+    python -m tests.differential --scenarios 100000
+    python -m tests.differential --scenarios 10000 --paths engine,batch --by-mode --tolerance 1e-9
+"""
+
+import argparse
+import math
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from calculations.batch import calculate_batch
+from calculations.engine import (
+    CIRCULATION_CONTINUOUS_SUPPLY,
+    CIRCULATION_SAME_WATER,
+    calculate,
+    normalize_inputs,
+)
+from calculations.properties import (
+    BORING_DIAMETERS,
+    PIPE_INNER_DIAMETERS,
+    PIPE_OUTER_DIAMETERS,
+    PIPE_THERMAL_CONDUCTIVITY,
+)
+from calculations.sweep import chunk_ranges, default_workers
+from tests.reference import REFERENCE_FIELDS, reference_multi, reference_single
+
+# 計算モード → (地下水温度上昇を考慮するか, 循環方式)
+MODES = {
+    '地下水温度一定': (False, None),
+    '1回通水': (True, None),
+    '同じ水を循環': (True, CIRCULATION_SAME_WATER),
+    '連続供給': (True, CIRCULATION_CONTINUOUS_SUPPLY),
+}
+
+# 計算条件の範囲（画面の入力範囲）
+SCENARIO_RANGES = {
+    'initial_temp': (20.0, 40.0),
+    'ground_temp': (0.0, 20.0),
+    'flow_rate': (20.0, 100.0),
+    'pipe_length': (1.0, 30.0),
+    'h_outer': (50.0, 500.0),
+    'temp_rise_limit': (5.0, 20.0),
+}
+
+# 配管セット本数・運転時間 [分] の範囲（両端を含む）
+NUM_PIPES_RANGE = (1, 5)
+OPERATION_MINUTES_RANGE = (1, 60)
+
+# 長時間運転の条件の割合と運転時間 [分] の範囲（lfilter の区間を伸ばす経路を通る長さ）
+LONG_FRACTION = 0.05
+LONG_OPERATION_MINUTES_RANGE = (61, 2880)
+
+# 連続供給（単一配管の計算画面）のうち入口温度プロファイルを与える条件の割合
+PROFILE_FRACTION = 0.5
+
+# 入口温度プロファイルの1分ごとの変化の標準偏差 [℃]
+PROFILE_STEP_STD = 0.5
+
+# 時系列計算の条件の直後に、運転時間だけを変えた同じ条件を加える割合（チェックポイントの延長・切り詰め）
+FOLLOW_UP_FRACTION = 0.2
+
+# 既定の計算条件数
+DEFAULT_SCENARIOS = 100_000
+
+
+def _engine(scenarios):
+    """計算エンジンで1件ずつ計算する"""
+    results = [calculate(scenario) for scenario in scenarios]
+    return {field: np.array([np.nan if result[field] is None else result[field] for result in results])
+            for field in REFERENCE_FIELDS}
+
+
+def _batch(precision):
+    def run(scenarios):
+        result = calculate_batch(scenarios, precision)
+        return {field: np.asarray(result[field], dtype=np.float64) for field in REFERENCE_FIELDS}
+    return run
+
+
+# 参照実装と比較する計算経路
+FAST_PATHS = {
+    'engine': _engine,
+    'batch': _batch('float64'),
+    'float32': _batch('float32'),
+}
+
+
+def _inlet_profile(rng, initial_temp, num_steps):
+    """入口温度から始まる1分ごとの入口温度（ランダムウォーク、画面の入力範囲内）"""
+    steps = rng.normal(0.0, PROFILE_STEP_STD, num_steps)
+    steps[0] = 0.0
+    low, high = SCENARIO_RANGES['initial_temp']
+    return np.clip(initial_temp + np.cumsum(steps), low, high).tolist()
+
+
+def _follow_up(rng, scenario):
+    """運転時間（入口温度プロファイルの長さ）だけを変えた同じ条件"""
+    minutes = int(rng.integers(1, 2 * scenario['operation_minutes'] + 1))
+    follow_up = dict(scenario, operation_minutes=minutes)
+    profile = scenario.get('inlet_profile')
+    if profile is not None:
+        if minutes <= len(profile):
+            follow_up['inlet_profile'] = profile[:minutes]
+        else:
+            follow_up['inlet_profile'] = profile + _inlet_profile(rng, profile[-1], minutes - len(profile))
+    return follow_up
+
+
+def random_scenarios(count, seed=0):
+    """
+    画面の入力範囲から無作為に計算条件を作成する
+
+    掘削孔内の地下水量が正（配管が掘削孔に収まる）の条件のみとする。
+    page が 'single' の条件は単一配管の計算画面（連続供給は1分ごとの時系列）、
+    'multi' の条件は複数配管の比較画面（連続供給は運転時間で一括計算）の計算と比較する。
+    LONG_FRACTION の条件は運転時間を長くし、単一配管の連続供給の PROFILE_FRACTION には
+    入口温度プロファイルを与える。時系列計算の条件の FOLLOW_UP_FRACTION には、運転時間だけを
+    変えた同じ条件を続けて加える（計算エンジンはチェックポイントから延長・切り詰めて計算する）。
+
+    Returns:
+        list: normalize_inputs の引数に mode（MODES のキー）と page を加えた dict の list
+    """
+    rng = np.random.default_rng(seed)
+    modes = list(MODES)
+    diameters = list(PIPE_INNER_DIAMETERS)
+    materials = list(PIPE_THERMAL_CONDUCTIVITY)
+    borings = list(BORING_DIAMETERS)
+
+    scenarios = []
+    while len(scenarios) < count:
+        size = count - len(scenarios)
+        values = {name: rng.uniform(low, high, size) for name, (low, high) in SCENARIO_RANGES.items()}
+        num_pipes = rng.integers(NUM_PIPES_RANGE[0], NUM_PIPES_RANGE[1] + 1, size)
+        operation_minutes = rng.integers(OPERATION_MINUTES_RANGE[0], OPERATION_MINUTES_RANGE[1] + 1, size)
+        long_minutes = rng.integers(LONG_OPERATION_MINUTES_RANGE[0], LONG_OPERATION_MINUTES_RANGE[1] + 1, size)
+        operation_minutes = np.where(rng.random(size) < LONG_FRACTION, long_minutes, operation_minutes)
+        profile = rng.random(size) < PROFILE_FRACTION
+        follow_up = rng.random(size) < FOLLOW_UP_FRACTION
+        diameter = rng.integers(len(diameters), size=size)
+        material = rng.integers(len(materials), size=size)
+        boring = rng.integers(len(borings), size=size)
+        mode = rng.integers(len(modes), size=size)
+        multi = rng.random(size) < 0.5
+
+        for i in range(size):
+            pipe_diameter = diameters[diameter[i]]
+            boring_diameter = borings[boring[i]]
+            # 掘削孔の断面積 > U字管（往復）の断面積の合計
+            boring_mm = BORING_DIAMETERS[boring_diameter]
+            outer_mm = PIPE_OUTER_DIAMETERS[pipe_diameter]
+            if boring_mm ** 2 <= outer_mm ** 2 * num_pipes[i] * 2:
+                continue
+            consider, circulation_type = MODES[modes[mode[i]]]
+            scenario = {name: float(values[name][i]) for name in SCENARIO_RANGES}
+            scenario.update({
+                'boring_diameter': boring_diameter,
+                'pipe_material': materials[material[i]],
+                'pipe_diameter': pipe_diameter,
+                'num_pipes': int(num_pipes[i]),
+                'consider_groundwater_temp_rise': consider,
+                'circulation_type': circulation_type,
+                'operation_minutes': int(operation_minutes[i]),
+                'mode': modes[mode[i]],
+                'page': 'multi' if multi[i] else 'single',
+            })
+            stepwise_supply = circulation_type == CIRCULATION_CONTINUOUS_SUPPLY and not multi[i]
+            if stepwise_supply and profile[i]:
+                scenario['inlet_profile'] = _inlet_profile(rng, scenario['initial_temp'], int(operation_minutes[i]))
+            scenarios.append(scenario)
+            if follow_up[i] and (circulation_type == CIRCULATION_SAME_WATER or stepwise_supply):
+                scenarios.append(_follow_up(rng, scenario))
+    return scenarios[:count]
+
+
+def _reference(scenario):
+    args = {name: value for name, value in scenario.items() if name not in ('mode', 'page')}
+    if scenario['page'] == 'multi':
+        return reference_multi(**args)
+    return reference_single(**args)
+
+
+def _normalize(scenario):
+    args = {name: value for name, value in scenario.items() if name not in ('mode', 'page')}
+    return normalize_inputs(**args, stepwise=scenario['page'] == 'single')
+
+
+def deviation(values, reference):
+    """
+    計算結果の差（|値 − 参照値| / max(1, |参照値|)）
+
+    参照値の絶対値が1以下（温度差など）は絶対差、1を超える項目（熱交換量・レイノルズ数など）は
+    相対差となる。参照値のない項目は NaN、参照値があるのに値がない場合は inf とする。
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        diff = np.abs(values - reference) / np.maximum(1.0, np.abs(reference))
+    diff[np.isnan(values) & ~np.isnan(reference)] = math.inf
+    return diff
+
+
+def compare(scenarios, paths=tuple(FAST_PATHS)):
+    """
+    計算条件を参照実装と各計算経路で計算して差を求める
+
+    Returns:
+        dict: 計算経路 → 項目 → 差の配列（deviation）
+    """
+    reference = [_reference(scenario) for scenario in scenarios]
+    reference = {field: np.array([np.nan if row[field] is None else row[field] for row in reference])
+                 for field in REFERENCE_FIELDS}
+    normalized = [_normalize(scenario) for scenario in scenarios]
+    deviations = {}
+    for path in paths:
+        values = FAST_PATHS[path](normalized)
+        deviations[path] = {field: deviation(values[field], reference[field]) for field in REFERENCE_FIELDS}
+    return deviations
+
+
+def _compare_chunk(scenarios, paths):
+    """ワーカープロセスで1チャンクを比較する"""
+    return compare(scenarios, paths)
+
+
+def run_differential(count=DEFAULT_SCENARIOS, seed=0, workers=None, paths=tuple(FAST_PATHS),
+                     chunk_size=None, progress=None):
+    """
+    無作為な計算条件で参照実装と各計算経路を比較する
+
+    計算条件をチャンクに分割して ProcessPoolExecutor のワーカーで計算する
+    （ワーカー数が1の場合は現在のプロセスで計算する）。
+
+    Parameters:
+        count: 計算条件数
+        seed: 計算条件の乱数のシード
+        workers: ワーカー数（省略時は CPU コア数）
+        paths: 比較する計算経路（FAST_PATHS のキー）
+        chunk_size: 1チャンクの計算条件数（省略時はワーカーあたり約4チャンク）
+        progress: 計算済みの件数と全件数を受け取る関数（省略可）
+
+    Returns:
+        dict: scenarios（計算条件の list）, seconds,
+              deviations（計算経路 → 項目 → 差の配列）
+    """
+    paths = tuple(paths)
+    unknown = [path for path in paths if path not in FAST_PATHS]
+    if unknown:
+        raise ValueError(f"計算経路 {', '.join(unknown)} はありません（{', '.join(FAST_PATHS)}）")
+    workers = default_workers() if workers is None else workers
+    if workers < 1:
+        raise ValueError("workers は1以上で指定してください")
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(count / (workers * 4)))
+
+    started = time.perf_counter()
+    scenarios = random_scenarios(count, seed)
+    ranges = chunk_ranges(count, chunk_size)
+    chunks = [None] * len(ranges)
+
+    if workers == 1 or len(ranges) == 1:
+        for index, (start, stop) in enumerate(ranges):
+            chunks[index] = compare(scenarios[start:stop], paths)
+            if progress is not None:
+                progress(stop, count)
+    else:
+        # 計算エンジンのスレッドを複製しないよう、ワーカーは spawn で起動する
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {executor.submit(_compare_chunk, scenarios[start:stop], paths): index
+                       for index, (start, stop) in enumerate(ranges)}
+            done = 0
+            for future in as_completed(futures):
+                index = futures[future]
+                chunks[index] = future.result()
+                done += ranges[index][1] - ranges[index][0]
+                if progress is not None:
+                    progress(done, count)
+
+    deviations = {
+        path: {field: np.concatenate([chunk[path][field] for chunk in chunks]) if chunks else np.empty(0)
+               for field in REFERENCE_FIELDS}
+        for path in paths
+    }
+    return {
+        'scenarios': scenarios,
+        'seconds': time.perf_counter() - started,
+        'deviations': deviations,
+    }
+
+
+def summarize(result, by_mode=False):
+    """
+    run_differential の結果を計算経路・項目ごとの差の最大値・分位点の表にする
+
+    Parameters:
+        result: run_differential の戻り値
+        by_mode: 計算モード（MODES）・画面ごとにも集計するか
+
+    Returns:
+        pd.DataFrame: 経路, 項目,（モード, 画面,）件数, P50, P99, P99.9, 最大, 最大の条件番号
+    """
+    scenarios = result['scenarios']
+    groups = [((), np.arange(len(scenarios)))]
+    if by_mode:
+        keys = np.array([f"{s['mode']}\t{s['page']}" for s in scenarios])
+        groups = [(tuple(key.split('\t')), np.flatnonzero(keys == key)) for key in sorted(set(keys))]
+
+    rows = []
+    for path, fields in result['deviations'].items():
+        for field, values in fields.items():
+            for group, index in groups:
+                subset = values[index]
+                valid = ~np.isnan(subset)
+                if not valid.any():
+                    continue
+                subset = subset[valid]
+                row = {'経路': path, '項目': field}
+                if by_mode:
+                    row.update({'モード': group[0], '画面': group[1]})
+                p50, p99, p999 = np.percentile(subset, [50, 99, 99.9])
+                row.update({
+                    '件数': int(subset.size),
+                    'P50': p50,
+                    'P99': p99,
+                    'P99.9': p999,
+                    '最大': float(subset.max()),
+                    '最大の条件番号': int(index[valid][np.argmax(subset)]),
+                })
+                rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.differential",
+        description="参照実装（高速化前のループ）と高速な計算経路の計算結果の差を集計する",
+    )
+    parser.add_argument("--scenarios", type=int, default=DEFAULT_SCENARIOS, help="計算条件数")
+    parser.add_argument("--seed", type=int, default=0, help="計算条件の乱数のシード")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカー数（省略時は CPU コア数）")
+    parser.add_argument("--paths", default=",".join(FAST_PATHS),
+                        help=f"比較する計算経路（カンマ区切り、{', '.join(FAST_PATHS)}）")
+    parser.add_argument("--by-mode", action="store_true", help="計算モード・画面ごとにも集計する")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="差の許容値（超えた場合は終了コード1、該当する条件を表示する）")
+    args = parser.parse_args(argv)
+
+    try:
+        result = run_differential(
+            args.scenarios, seed=args.seed, workers=args.workers,
+            paths=[path.strip() for path in args.paths.split(",") if path.strip()],
+            progress=lambda done, total: print(f"\r{done}/{total}", end="", file=sys.stderr),
+        )
+    except ValueError as e:
+        print(f"\n{e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+
+    table = summarize(result, by_mode=args.by_mode)
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:.3g}'.format):
+        print(table.to_string(index=False))
+    print(f"\n{len(result['scenarios'])} 件を {result['seconds']:.1f} 秒で比較しました")
+
+    if args.tolerance is not None:
+        exceeded = table[table['最大'] > args.tolerance]
+        if not exceeded.empty:
+            print(f"\n差が許容値 {args.tolerance:g} を超えています:", file=sys.stderr)
+            for _, row in exceeded.iterrows():
+                scenario = result['scenarios'][row['最大の条件番号']]
+                print(f"  {row['経路']} {row['項目']} {row['最大']:.3g}: {scenario}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+"""
+参照実装
+高速化する前の app.py の計算（1本ずつ・1分ずつの Python のループ）をそのまま関数にしたもの。
+計算エンジン（calculations.engine）や一括計算（calculations.batch）の結果が、
+元の計算と一致することを differential.py で確認するために使用する。
+
+計算式・分岐・物理的制約の順序は元のコードから変更しないこと
+（計算結果を変更する場合は、計算エンジンの変更とは別に理由を明記して修正する）。
+物性値・配管の寸法の表も calculations.properties を参照せず、元の app.py の値をここに持つ
+（表を変更した場合も差分テストで検出できるようにするため）。
+"""
+
+import math
+
+# 物性値テーブル（水、標準大気圧、15-40度）
+WATER_PROPERTIES = {
+    # 温度: (動粘度 m²/s, 熱伝導率 W/m·K, プラントル数, 密度 kg/m³, 比熱 J/kg·K)
+    15: (1.139e-6, 0.589, 8.09, 999.1, 4186),
+    20: (1.004e-6, 0.598, 7.01, 998.2, 4182),
+    25: (0.893e-6, 0.607, 6.13, 997.0, 4179),
+    30: (0.801e-6, 0.615, 5.42, 995.6, 4178),
+    35: (0.726e-6, 0.623, 4.83, 994.0, 4178),
+    40: (0.658e-6, 0.631, 4.32, 992.2, 4179),
+}
+
+# 配管内径 (mm)
+PIPE_INNER_DIAMETERS = {
+    "15A": 16.1,
+    "20A": 22.2,
+    "25A": 28.0,
+    "32A": 33.5,
+    "40A": 41.2,
+    "50A": 52.6,
+    "65A": 67.8,
+    "80A": 80.1
+}
+
+# 配管外径データ（SGP規格）(mm)
+PIPE_OUTER_DIAMETERS = {
+    "15A": 21.7,
+    "20A": 27.2,
+    "25A": 34.0,
+    "32A": 42.7,
+    "40A": 48.6,
+    "50A": 60.5,
+    "65A": 76.3,
+    "80A": 89.1
+}
+
+# 材質による熱伝導率 (W/m・K)
+PIPE_THERMAL_CONDUCTIVITY = {
+    "鋼管": 50.0,
+    "アルミ管": 237.0,
+    "銅管": 398.0
+}
+
+# 掘削径 (mm)
+BORING_DIAMETERS = {
+    "φ116": 116,
+    "φ250": 250
+}
+
+# 循環方式
+CIRCULATION_SAME_WATER = "同じ水を循環"
+CIRCULATION_CONTINUOUS_SUPPLY = "新しい水を連続供給"
+
+# 参照実装が返す計算結果の項目
+REFERENCE_FIELDS = (
+    'reynolds',
+    'U',
+    'NTU',
+    'effectiveness',
+    'heat_exchange_rate',
+    'final_temp',
+    'effective_ground_temp',
+    'groundwater_temp_rise',
+    'groundwater_temp_rise_unlimited',
+)
+
+
+def water_properties(temp):
+    """指定温度における水の物性値（元の get_water_properties の線形補間）"""
+    # 温度範囲の境界処理
+    if temp <= 15:
+        props = WATER_PROPERTIES[15]
+    elif temp >= 40:
+        props = WATER_PROPERTIES[40]
+    else:
+        # 線形補間のための温度区間を特定
+        temps = sorted(WATER_PROPERTIES.keys())
+        for i in range(len(temps) - 1):
+            t_low, t_high = temps[i], temps[i + 1]
+            if t_low < temp <= t_high:
+                t_ratio = (temp - t_low) / (t_high - t_low)
+                props_low = WATER_PROPERTIES[t_low]
+                props_high = WATER_PROPERTIES[t_high]
+                props = tuple(low + (high - low) * t_ratio for low, high in zip(props_low, props_high))
+                break
+    return {
+        'kinematic_viscosity': props[0],
+        'thermal_conductivity': props[1],
+        'prandtl': props[2],
+        'density': props[3],
+        'specific_heat': props[4]
+    }
+
+
+def reference_single(initial_temp, ground_temp, flow_rate, pipe_length, boring_diameter, pipe_material,
+                     pipe_diameter, num_pipes, h_outer, consider_groundwater_temp_rise,
+                     circulation_type, operation_minutes, temp_rise_limit, inlet_profile=None):
+    """
+    単一配管の計算画面の計算（1回通水、同じ水を循環、新しい水を連続供給の1分ごとの時系列）
+
+    Parameters:
+        normalize_inputs と同じ（circulation_type が None なら循環を考慮しない）
+
+    Returns:
+        dict: REFERENCE_FIELDS の各項目 → 値
+    """
+    consider_circulation = circulation_type is not None
+    if consider_groundwater_temp_rise and consider_circulation:
+        # 元の画面は連続供給を常に60分で計算していたが、計算エンジンへの移行時に
+        # 指定した運転時間で計算するよう変更した（時系列のループ自体は変更していない）
+        operation_hours = operation_minutes / 60  # 分を時間に変換
+    else:
+        operation_hours = 1  # デフォルト値（後で再計算される）
+
+    boring_diameter_mm = BORING_DIAMETERS[boring_diameter]
+
+    # 初期計算用の地下水温度
+    effective_ground_temp = ground_temp
+
+    # 配管内径と断面積の計算
+    inner_diameter = PIPE_INNER_DIAMETERS[pipe_diameter] / 1000  # m
+    pipe_area = math.pi * (inner_diameter / 2) ** 2  # m²
+
+    # 1本あたりの流量を計算
+    flow_per_pipe = flow_rate / num_pipes  # L/min/本
+
+    # 流速の計算 (m/s)
+    flow_rate_m3s_per_pipe = flow_per_pipe / 60000  # L/min → m³/s
+    velocity = flow_rate_m3s_per_pipe / pipe_area
+
+    # 温度依存の物性値計算（バルク温度法：入口温度基準）
+    water_props = water_properties(initial_temp)
+    kinematic_viscosity = water_props['kinematic_viscosity']
+    water_thermal_conductivity = water_props['thermal_conductivity']
+    prandtl = water_props['prandtl']
+    density = water_props['density']
+    specific_heat = water_props['specific_heat']
+
+    reynolds = velocity * inner_diameter / kinematic_viscosity
+
+    # ヌセルト数の計算（層流/乱流判定）
+    if reynolds < 2300:  # 層流
+        nusselt = 3.66
+    else:  # 乱流（Dittus-Boelter式、冷却時）
+        nusselt = 0.023 * (reynolds ** 0.8) * (prandtl ** 0.3)
+
+    # 熱伝達係数の計算 (W/m²・K)
+    heat_transfer_coefficient = nusselt * water_thermal_conductivity / inner_diameter
+
+    outer_diameter = PIPE_OUTER_DIAMETERS[pipe_diameter] / 1000
+    pipe_thermal_cond = PIPE_THERMAL_CONDUCTIVITY[pipe_material]
+
+    # 総括熱伝達係数 U (W/m²・K) - 内径基準
+    U = 1 / (1/heat_transfer_coefficient +
+             inner_diameter/(2*pipe_thermal_cond) * math.log(outer_diameter/inner_diameter) +
+             inner_diameter/(outer_diameter*h_outer))
+
+    # 熱交換面積（U字管として往復を考慮）
+    total_length = pipe_length * 2  # 往復分
+    heat_exchange_area = math.pi * inner_diameter * total_length
+
+    # 質量流量（1本あたり）
+    mass_flow_rate_per_pipe = flow_rate_m3s_per_pipe * density  # kg/s
+
+    # NTU（伝熱単位数）の計算（1本あたり）
+    NTU = U * heat_exchange_area / (mass_flow_rate_per_pipe * specific_heat)
+
+    # 効率の計算
+    effectiveness = 1 - math.exp(-NTU)
+
+    # 最終温度の計算
+    final_temp = initial_temp - effectiveness * (initial_temp - effective_ground_temp)
+
+    # 初期熱交換量の計算 [W]
+    heat_exchange_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (initial_temp - final_temp)
+    groundwater_temp_rise_unlimited = 0.0
+
+    # 地下水温度上昇の計算
+    if consider_groundwater_temp_rise:
+        # 地下水の体積計算（ボーリング孔内のみ）
+        # 掘削孔の体積
+        boring_volume = math.pi * (boring_diameter_mm / 2000) ** 2 * pipe_length  # m³
+        # 配管の総体積（U字管なので往復分で2倍）
+        pipe_total_volume = math.pi * (outer_diameter / 2) ** 2 * pipe_length * num_pipes * 2  # m³
+        # 地下水体積
+        groundwater_volume = boring_volume - pipe_total_volume  # m³
+        groundwater_mass = groundwater_volume * density  # kg
+
+        # 1回の通水時間を計算（循環を考慮しない場合）
+        if not consider_circulation:
+            # U字管の全長を流速で除して通水時間を求める
+            total_pipe_length = pipe_length * 2  # U字管往復
+            transit_time_seconds = total_pipe_length / velocity  # 秒
+            operation_hours = transit_time_seconds / 3600  # 時間に変換
+
+        # 循環方式に応じた計算
+        if consider_circulation and circulation_type == CIRCULATION_SAME_WATER:
+            # 同じ水を循環させる場合の計算（反復計算）
+            time_step = 60  # 1分ごとの計算
+            num_steps = int(operation_hours * 3600 / time_step)
+
+            current_inlet_temp = initial_temp
+            current_ground_temp = ground_temp
+
+            for i in range(num_steps):
+                # 現在の温度での熱交換計算
+                current_effectiveness = 1 - math.exp(-NTU)
+                current_outlet_temp = current_inlet_temp - current_effectiveness * (current_inlet_temp - current_ground_temp)
+
+                # 熱交換量
+                current_heat_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (current_inlet_temp - current_outlet_temp)
+
+                # 地下水温度上昇
+                if groundwater_mass > 0:
+                    delta_ground_temp = (current_heat_rate * time_step) / (groundwater_mass * specific_heat)
+                    current_ground_temp += delta_ground_temp
+                    # 物理的制約：地下水温度は入口温度を超えない
+                    current_ground_temp = min(current_ground_temp, ground_temp + temp_rise_limit, current_inlet_temp)
+
+                # 次のステップの入口温度は現在の出口温度
+                current_inlet_temp = current_outlet_temp
+
+            # 最終結果
+            final_temp = current_outlet_temp
+            effective_ground_temp = current_ground_temp
+            groundwater_temp_rise = current_ground_temp - ground_temp
+            groundwater_temp_rise_unlimited = groundwater_temp_rise
+
+        elif consider_circulation and circulation_type == CIRCULATION_CONTINUOUS_SUPPLY:
+            # 時系列データを生成（新しい水を連続供給）
+            time_step = 60  # 1分ごとの計算
+            num_steps = int(operation_hours * 3600 / time_step)
+            # 元の画面の入口温度は一定。入口温度プロファイル（計算エンジンで追加）を与えた場合は
+            # 各ステップの入口温度をその値に置き換える（ループ自体は変更していない）
+            if inlet_profile is not None:
+                num_steps = len(inlet_profile)
+
+            current_ground_temp = ground_temp
+            outlet_temp_history = []
+
+            for i in range(num_steps):
+                inlet_temp = initial_temp if inlet_profile is None else inlet_profile[i]
+
+                # 現在の地下水温度での出口温度計算
+                current_effectiveness = 1 - math.exp(-NTU)
+                current_outlet_temp = inlet_temp - current_effectiveness * (inlet_temp - current_ground_temp)
+
+                # 熱交換量
+                current_heat_rate = mass_flow_rate_per_pipe * num_pipes * specific_heat * (inlet_temp - current_outlet_temp)
+
+                # 地下水温度上昇
+                if groundwater_mass > 0:
+                    delta_ground_temp = (current_heat_rate * time_step) / (groundwater_mass * specific_heat)
+                    current_ground_temp += delta_ground_temp
+                    # 物理的制約：地下水温度は入口温度を超えない
+                    current_ground_temp = min(current_ground_temp, ground_temp + temp_rise_limit, inlet_temp)
+
+                outlet_temp_history.append(current_outlet_temp)
+
+            # 最終結果
+            final_temp = outlet_temp_history[-1] if outlet_temp_history else initial_temp
+            effective_ground_temp = current_ground_temp
+            groundwater_temp_rise = current_ground_temp - ground_temp
+            groundwater_temp_rise_unlimited = groundwater_temp_rise
+
+        else:
+            # 循環を考慮しない場合（1回通水）
+            operation_time = operation_hours * 3600  # 秒
+            if groundwater_mass > 0:
+                groundwater_temp_rise = (heat_exchange_rate * operation_time) / (groundwater_mass * specific_heat)
+            else:
+                groundwater_temp_rise = 0.0
+
+            # 温度上昇を制限（物理的制約も考慮）
+            groundwater_temp_rise_unlimited = groundwater_temp_rise
+            # 地下水温度は入口温度を超えない
+            max_possible_rise = initial_temp - ground_temp
+            groundwater_temp_rise = min(groundwater_temp_rise, temp_rise_limit, max_possible_rise)
+
+            # 実効地下水温度を更新
+            effective_ground_temp = ground_temp + groundwater_temp_rise
+
+            # 最終温度を再計算
+            final_temp = initial_temp - effectiveness * (initial_temp - effective_ground_temp)
+    else:
+        groundwater_temp_rise = 0.0
+
+    return {
+        'reynolds': reynolds,
+        'U': U,
+        'NTU': NTU,
+        'effectiveness': effectiveness,
+        'heat_exchange_rate': heat_exchange_rate,
+        'final_temp': final_temp,
+        'effective_ground_temp': effective_ground_temp,
+        'groundwater_temp_rise': groundwater_temp_rise,
+        'groundwater_temp_rise_unlimited': groundwater_temp_rise_unlimited,
+    }
+
+
+def reference_multi(initial_temp, ground_temp, flow_rate, pipe_length, boring_diameter, pipe_material,
+                    pipe_diameter, num_pipes, h_outer, consider_groundwater_temp_rise,
+                    circulation_type, operation_minutes, temp_rise_limit):
+    """
+    複数配管の比較画面の管径ごとのループの1回分（連続供給は運転時間で一括計算）
+
+    Parameters:
+        normalize_inputs と同じ（circulation_type が None なら循環を考慮しない）
+
+    Returns:
+        dict: REFERENCE_FIELDS の各項目 → 値（groundwater_temp_rise_unlimited は元の画面で
+              計算しないため None）
+    """
+    multi_consider_circulation = circulation_type is not None
+    multi_operation_hours = operation_minutes / 60 if multi_consider_circulation else None
+
+    # 初期計算用の地下水温度（複数配管用の値を使用）
+    effective_ground_temp = ground_temp
+    boring_diameter_mm = BORING_DIAMETERS[boring_diameter]
+
+    # 温度依存の物性値計算（バルク温度法：入口温度基準）
+    water_props = water_properties(initial_temp)
+    kinematic_viscosity = water_props['kinematic_viscosity']
+    water_thermal_conductivity = water_props['thermal_conductivity']
+    prandtl = water_props['prandtl']
+    density = water_props['density']
+    specific_heat = water_props['specific_heat']
+
+    pipe_thermal_cond = PIPE_THERMAL_CONDUCTIVITY[pipe_material]
+    total_length = pipe_length * 2
+
+    # 各管径での計算
+    inner_d = PIPE_INNER_DIAMETERS[pipe_diameter] / 1000
+    area = math.pi * (inner_d / 2) ** 2
+    n_pipes = num_pipes
+    flow_per_p = flow_rate / n_pipes
+    flow_rate_m3s_per_p = flow_per_p / 60000
+    vel = flow_rate_m3s_per_p / area
+    outer_d = PIPE_OUTER_DIAMETERS[pipe_diameter] / 1000
+    A_temp = math.pi * inner_d * total_length
+
+    # 熱伝達係数の計算（バルク温度法：入口温度基準）
+    re = vel * inner_d / kinematic_viscosity
+    if re < 2300:
+        nu = 3.66
+    else:
+        nu = 0.023 * (re ** 0.8) * (prandtl ** 0.3)
+
+    h = nu * water_thermal_conductivity / inner_d
+
+    # 総括熱伝達係数（内径基準）
+    U_temp = 1 / (1/h +
+                 inner_d/(2*pipe_thermal_cond) * math.log(outer_d/inner_d) +
+                 inner_d/(outer_d*h_outer))
+
+    mass_flow_per_p = flow_rate_m3s_per_p * density
+    NTU_temp = U_temp * A_temp / (mass_flow_per_p * specific_heat)
+    eff_temp = 1 - math.exp(-NTU_temp)
+    final_t = initial_temp - eff_temp * (initial_temp - effective_ground_temp)
+
+    # 熱交換量の計算 [W]
+    heat_rate_temp = mass_flow_per_p * n_pipes * specific_heat * (initial_temp - final_t)
+    effective_ground_temp_local = ground_temp
+
+    # 地下水温度上昇の計算（各配管サイズごと）
+    if consider_groundwater_temp_rise:
+        # 地下水の体積計算（ボーリング孔内のみ）
+        boring_volume_temp = math.pi * (boring_diameter_mm / 2000) ** 2 * pipe_length  # m³
+        # 配管の総体積（U字管なので往復分で2倍）
+        pipe_total_volume_temp = math.pi * (outer_d / 2) ** 2 * pipe_length * n_pipes * 2  # m³
+        # 地下水体積
+        groundwater_volume_temp = boring_volume_temp - pipe_total_volume_temp  # m³
+        groundwater_mass_temp = groundwater_volume_temp * density  # kg
+
+        # 循環方式に応じた計算
+        if multi_consider_circulation and circulation_type == CIRCULATION_SAME_WATER:
+            # 同じ水を循環させる場合の計算（反復計算）
+            time_step = 60  # 1分ごとの計算
+            num_steps = int(multi_operation_hours * 3600 / time_step)
+
+            current_inlet_temp = initial_temp
+            current_ground_temp = ground_temp
+
+            for i in range(num_steps):
+                # 現在の温度での熱交換計算
+                current_effectiveness = 1 - math.exp(-NTU_temp)
+                current_outlet_temp = current_inlet_temp - current_effectiveness * (current_inlet_temp - current_ground_temp)
+
+                # 熱交換量
+                current_heat_rate = mass_flow_per_p * n_pipes * specific_heat * (current_inlet_temp - current_outlet_temp)
+
+                # 地下水温度上昇
+                if groundwater_mass_temp > 0:
+                    delta_ground_temp = (current_heat_rate * time_step) / (groundwater_mass_temp * specific_heat)
+                    current_ground_temp += delta_ground_temp
+                    # 物理的制約：地下水温度は入口温度を超えない
+                    current_ground_temp = min(current_ground_temp, ground_temp + temp_rise_limit, current_inlet_temp)
+
+                # 次のステップの入口温度は現在の出口温度
+                current_inlet_temp = current_outlet_temp
+
+            # 最終結果
+            final_t = current_outlet_temp
+            effective_ground_temp_local = current_ground_temp
+            gw_temp_rise = current_ground_temp - ground_temp
+
+        else:
+            # 新しい水を連続供給する場合、または循環を考慮しない場合
+            # 循環を考慮しない場合は1回の通水時間を計算
+            if not multi_consider_circulation:
+                total_pipe_length_temp = pipe_length * 2  # U字管往復
+                transit_time_seconds_temp = total_pipe_length_temp / vel  # 秒
+                operation_hours_temp = transit_time_seconds_temp / 3600  # 時間に変換
+            else:
+                operation_hours_temp = multi_operation_hours
+
+            operation_time = operation_hours_temp * 3600  # 秒
+            if groundwater_mass_temp > 0:
+                gw_temp_rise = (heat_rate_temp * operation_time) / (groundwater_mass_temp * specific_heat)
+                # 物理的制約：地下水温度は入口温度を超えない
+                max_possible_rise = initial_temp - ground_temp
+                gw_temp_rise = min(gw_temp_rise, temp_rise_limit, max_possible_rise)
+            else:
+                gw_temp_rise = 0.0
+
+            # 実効地下水温度で再計算
+            effective_ground_temp_local = ground_temp + gw_temp_rise
+            final_t = initial_temp - eff_temp * (initial_temp - effective_ground_temp_local)
+    else:
+        gw_temp_rise = 0.0
+
+    return {
+        'reynolds': re,
+        'U': U_temp,
+        'NTU': NTU_temp,
+        'effectiveness': eff_temp,
+        'heat_exchange_rate': heat_rate_temp,
+        'final_temp': final_t,
+        'effective_ground_temp': effective_ground_temp_local,
+        'groundwater_temp_rise': gw_temp_rise,
+        'groundwater_temp_rise_unlimited': None,
+    }
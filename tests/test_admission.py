@@ -0,0 +1,58 @@
+"""
+計算の受付制御のテスト
+"""
+
+import threading
+import time
+
+import pytest
+
+from utils.admission import PRIORITY_BATCH, PRIORITY_INTERACTIVE, AdmissionController, QuotaExceeded
+
+# 待ちの状態を確認する上限時間 [s]
+TIMEOUT = 5.0
+
+
+def _wait_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_waiting_requests_run_in_priority_order():
+    admission = AdmissionController(max_concurrent=1)
+    release = threading.Event()
+    order = []
+
+    def run(name, priority):
+        with admission.admit(name, priority):
+            order.append(name)
+            if name == 'holder':
+                release.wait(TIMEOUT)
+
+    threads = [threading.Thread(target=run, args=('holder', PRIORITY_INTERACTIVE))]
+    threads[0].start()
+    _wait_until(lambda: admission.stats()['running'] == 1)
+    for depth, (name, priority) in enumerate([('batch', PRIORITY_BATCH), ('interactive', PRIORITY_INTERACTIVE)], 1):
+        threads.append(threading.Thread(target=run, args=(name, priority)))
+        threads[-1].start()
+        _wait_until(lambda: admission.stats()['queue_depth'] == depth)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+
+    # 後から届いた対話的な計算が一括計算より先に実行される
+    assert order == ['holder', 'interactive', 'batch']
+    assert admission.stats()['running'] == 0
+
+
+def test_session_over_quota_is_refused_batch_work():
+    admission = AdmissionController(max_concurrent=1, session_cpu_seconds=0.0)
+    with pytest.raises(QuotaExceeded):
+        with admission.admit('session', PRIORITY_BATCH):
+            pass
+    # 対話的な計算は優先度を下げて受け付ける
+    with admission.admit('session', PRIORITY_INTERACTIVE):
+        pass
+    assert admission.stats()['queue_depth'] == 0
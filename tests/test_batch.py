@@ -0,0 +1,22 @@
+"""
+一括計算（calculate_batch）のテスト
+"""
+
+import pytest
+
+import calculations.engine as engine
+from calculations.batch import calculate_batch
+from calculations.engine import CIRCULATION_SAME_WATER, calculate, normalize_inputs
+
+# 時系列計算が必要な計算条件の件数
+SCENARIOS = 50
+
+
+def test_time_stepped_rows_do_not_fill_checkpoints():
+    scenarios = [normalize_inputs(flow_rate=20.0 + i, consider_groundwater_temp_rise=True,
+                                  circulation_type=CIRCULATION_SAME_WATER, operation_minutes=30)
+                 for i in range(SCENARIOS)]
+    before = engine._CHECKPOINTS.nbytes()
+    result = calculate_batch(scenarios)
+    assert engine._CHECKPOINTS.nbytes() == before
+    assert result['final_temp'][7] == pytest.approx(calculate(scenarios[7])['final_temp'], abs=1e-12)
@@ -0,0 +1,82 @@
+"""
+入力ハッシュとメモ化キャッシュのテスト
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from utils.cache import MemoCache, input_hash, value_nbytes
+
+# 同時に同じキーを要求するスレッド数
+THREADS = 8
+
+
+def test_input_hash_normalizes_numbers_and_arrays():
+    assert input_hash({'a': 1, 'b': 2.0}) == input_hash({'b': 2, 'a': 1.0})
+    assert input_hash(np.array([1.0, 2.0])) == input_hash(np.array([1, 2]))
+    assert input_hash(np.array([1.0, 2.0])) != input_hash(np.array([2.0, 1.0]))
+
+
+def test_concurrent_requests_are_coalesced():
+    cache = MemoCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        owner = executor.submit(cache.get_or_compute, 'key', compute)
+        started.wait(5)
+        waiters = [executor.submit(cache.get_or_compute, 'key', compute) for _ in range(THREADS - 1)]
+        # 待機側が計算中の Future に登録されるまで待ってから計算を終える
+        while cache.stats()['coalesced'] < THREADS - 1:
+            threading.Event().wait(0.001)
+        release.set()
+        results = [owner.result()] + [future.result() for future in waiters]
+
+    assert results == ['value'] * THREADS
+    assert len(calls) == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_failed_compute_is_not_cached():
+    cache = MemoCache()
+
+    def fail():
+        raise ValueError("失敗")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('key', fail)
+    assert cache.get_or_compute('key', lambda: 1) == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = MemoCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get_or_compute('a', lambda: None)
+    cache.put('c', 3)
+    assert 'a' in cache and 'c' in cache
+    assert 'b' not in cache
+
+
+def test_entries_are_bounded_by_array_bytes():
+    array = np.zeros(100)
+    cache = MemoCache(max_bytes=2 * array.nbytes)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, {'series': np.zeros(100), 'value': 1.0})
+    assert 'a' not in cache and 'c' in cache
+    assert cache.stats()['bytes'] == 2 * array.nbytes
+
+    # 上限を超える1件は保持しない
+    cache.put('large', np.zeros(1000))
+    assert 'large' not in cache
+    assert value_nbytes({'series': [array, array], 'name': 'x'}) == 2 * array.nbytes
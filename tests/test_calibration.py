@@ -0,0 +1,63 @@
+"""
+運転ログによるモデルパラメータの同定のテスト
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculations.calibration import LogModel, calibrate, read_log
+from calculations.engine import calculate, normalize_inputs
+from calculations.groundwater import simulate_continuous_supply
+
+# 合成ログの日数（1分間隔）
+DAYS = 3
+
+# 合成ログの作成に使うパラメータ
+TRUE_PARAMETERS = {'h_outer': 150.0, 'groundwater_volume': 0.8, 'exchange_rate': 0.2, 'ground_temp': 15.0}
+
+INPUTS = normalize_inputs(pipe_length=10, num_pipes=2, ground_temp=15.0, h_outer=300.0)
+
+
+@pytest.fixture(scope='module')
+def log_csv():
+    """入口温度・流量が10分ごとに変わる合成ログ（時刻は経過時間 [s]）"""
+    time = np.arange(DAYS * 24 * 60) * 60.0
+    block = time // 600 * 600
+    hour = block / 3600 % 24
+    inlet = 28 + 4 * np.sin(2 * np.pi * block / 86400)
+    flow = np.where((hour > 8) & (hour < 20), 40 + 15 * np.sin(2 * np.pi * block / 7200), 0.0)
+    log = {'time': time, 'inlet_temp': inlet, 'outlet_temp': np.zeros(time.size), 'flow_rate': flow}
+    outlet, _ = LogModel(log, INPUTS).simulate(**TRUE_PARAMETERS)
+    outlet += np.random.default_rng(1).normal(0, 0.02, time.size)
+    frame = pd.DataFrame({'time': time, 'inlet_temp': inlet, 'outlet_temp': np.where(flow > 0, outlet, np.nan),
+                          'flow_rate': flow})
+    return frame.to_csv(index=False)
+
+
+def test_model_matches_engine():
+    n = 120
+    log = {'time': np.arange(n) * 60.0, 'inlet_temp': np.full(n, 30.0), 'outlet_temp': np.full(n, np.nan),
+           'flow_rate': np.full(n, 50.0)}
+    result = calculate(INPUTS)
+    outlet, ground = LogModel(log, INPUTS).simulate(300.0, result['groundwater_volume'], 0.0, 15.0)
+    series = simulate_continuous_supply(np.full(n, 30.0), 15.0, result['NTU'], result['mass_flow_rate_per_pipe'] * 2,
+                                        result['groundwater_mass'], 100.0, 60)
+    np.testing.assert_allclose(outlet, series.outlet_temp, atol=1e-9)
+    np.testing.assert_allclose(ground, series.ground_temp, atol=1e-9)
+
+
+def test_numeric_time_is_seconds(log_csv):
+    log = read_log(io.StringIO(log_csv))
+    assert np.all(np.diff(log['time']) == 60.0)
+
+
+@pytest.mark.parametrize('resample', [None, 600])
+def test_calibration_does_not_depend_on_log_interval(log_csv, resample):
+    result = calibrate(read_log(io.StringIO(log_csv), resample=resample), INPUTS)
+    parameters = result['parameters']
+    assert parameters['h_outer']['value'] == pytest.approx(150.0, rel=0.02)
+    assert parameters['groundwater_volume']['value'] == pytest.approx(0.8, rel=0.02)
+    assert parameters['ground_temp']['fitted'] is False
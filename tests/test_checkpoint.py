@@ -0,0 +1,78 @@
+"""
+時系列計算のチェックポイントのテスト
+"""
+
+import numpy as np
+import pytest
+
+from calculations.checkpoint import (CheckpointStore, simulate_circulation_cached,
+                                     simulate_continuous_supply_cached)
+from calculations.groundwater import simulate_circulation, simulate_continuous_supply
+
+# 循環・連続供給の計算条件（温度上昇上限値は途中で打ち切らない値）
+CIRCULATION = dict(initial_temp=30.0, ground_temp=15.0, NTU=0.8, mass_flow_rate=0.8,
+                   groundwater_mass=200.0, temp_rise_limit=100.0)
+CONTINUOUS = dict(ground_temp=15.0, NTU=0.8, mass_flow_rate=0.8, groundwater_mass=200.0,
+                  temp_rise_limit=100.0)
+
+
+def test_circulation_extends_and_truncates():
+    store = CheckpointStore()
+    direct = simulate_circulation(num_steps=100, **CIRCULATION)
+
+    simulate_circulation_cached(store, num_steps=30, **CIRCULATION)
+    extended = simulate_circulation_cached(store, num_steps=100, **CIRCULATION)
+    np.testing.assert_allclose(extended.buffer, direct.buffer, rtol=0, atol=1e-12)
+    assert extended.state['step'] == 100
+
+    truncated = simulate_circulation_cached(store, num_steps=50, **CIRCULATION)
+    np.testing.assert_array_equal(truncated.buffer, extended.buffer[:, :50])
+    assert truncated.state is None
+    assert not truncated.buffer.flags.writeable
+    with pytest.raises(ValueError):
+        truncated.outlet_temp[0] = 0.0
+
+
+def test_continuous_supply_extends_matching_profile():
+    store = CheckpointStore()
+    inlet = 30.0 + np.sin(np.arange(200) / 10)
+    direct = simulate_continuous_supply(inlet, **CONTINUOUS)
+
+    simulate_continuous_supply_cached(store, inlet[:120], **CONTINUOUS)
+    extended = simulate_continuous_supply_cached(store, inlet, **CONTINUOUS)
+    np.testing.assert_allclose(extended.buffer, direct.buffer, rtol=0, atol=1e-12)
+
+    # 途中から異なる入口温度は計算済みの区間を使わない
+    changed = inlet.copy()
+    changed[150:] += 1.0
+    np.testing.assert_allclose(simulate_continuous_supply_cached(store, changed, **CONTINUOUS).buffer,
+                               simulate_continuous_supply(changed, **CONTINUOUS).buffer, rtol=0, atol=1e-12)
+
+
+def test_profiles_with_different_heads_are_kept_separately():
+    store = CheckpointStore()
+    first = simulate_continuous_supply_cached(store, np.full(100, 30.0), **CONTINUOUS)
+    second = simulate_continuous_supply_cached(store, np.full(100, 25.0), **CONTINUOUS)
+    assert store.nbytes() == first.buffer.nbytes + second.buffer.nbytes
+
+
+def test_store_is_bounded_by_bytes():
+    series = simulate_circulation(num_steps=100, **CIRCULATION)
+    store = CheckpointStore(max_bytes=2 * series.buffer.nbytes)
+    for key in ('a', 'b', 'c'):
+        store.put(key, simulate_circulation(num_steps=100, **CIRCULATION))
+    assert store.nbytes() == 2 * series.buffer.nbytes
+    assert store.get('a') is None
+    assert store.get('c') is not None
+
+    # 上限を超える1件は保持しない
+    store.put('large', simulate_circulation(num_steps=300, **CIRCULATION))
+    assert store.get('large') is None
+    assert store.nbytes() <= store.max_bytes
+
+
+def test_returned_state_is_a_copy():
+    store = CheckpointStore()
+    store.put('key', simulate_circulation(num_steps=10, **CIRCULATION))
+    store.get('key').state['step'] = 0
+    assert store.get('key').state['step'] == 10
@@ -0,0 +1,50 @@
+"""
+計算条件ファイルの一括計算（python -m calculations）のテスト
+"""
+
+import csv
+import io
+import json
+
+import numpy as np
+import pytest
+
+from calculations.cli import RESULT_FIELDS, CsvWriter, JsonlWriter, iter_results, main, read_csv
+
+
+def test_input_format_without_dot(tmp_path, capsys):
+    source = tmp_path / "scenarios.txt"
+    source.write_text('{"id": 1, "flow_rate": 30}\n', encoding='utf-8')
+    assert main([str(source), "--input-format", "jsonl", "--format", "jsonl"]) == 0
+    [row] = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert row['id'] == 1
+    assert row['flow_rate'] == 30.0
+
+
+def test_csv_header_is_known_fields():
+    rows = list(read_csv(io.StringIO("id,flow_rate\na,30\nb,50\n")))
+    out = io.StringIO()
+    writer = CsvWriter(out)
+    for chunk in iter_results(rows, chunk_size=1):
+        writer.write(chunk)
+    written = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert list(written[0]) == ['id', *RESULT_FIELDS]
+    assert [row['id'] for row in written] == ['a', 'b']
+
+
+def test_csv_rejects_columns_missing_from_first_row():
+    writer = CsvWriter(io.StringIO())
+    [chunk] = iter_results([{'id': 1}, {'id': 2, 'note': 'x'}])
+    with pytest.raises(ValueError, match='note'):
+        writer.write(chunk)
+
+
+def test_jsonl_writes_null_for_non_finite():
+    # 流量0では移動時間が無限大になる
+    out = io.StringIO()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        [chunk] = iter_results([{'flow_rate': 0}])
+    JsonlWriter(out).write(chunk)
+    assert json.loads(out.getvalue())['transit_time_seconds'] is None
+    with pytest.raises(ValueError):
+        JsonlWriter(io.StringIO()).write([{'id': float('nan')}])
@@ -0,0 +1,49 @@
+"""
+スイープ結果の列ファイルのテスト
+"""
+
+import numpy as np
+import pytest
+
+from calculations.columnar import SweepColumns, best_by, feasible_fraction, quantiles, write_columns
+from calculations.sweep import SWEEP_FIELDS, SweepGrid, run_sweep
+
+GRID = SweepGrid({'pipe_length': 10.0}, {'pipe_diameter': ['20A', '32A', '50A'],
+                                         'flow_rate': list(np.linspace(20.0, 100.0, 41))})
+
+
+@pytest.fixture(scope='module')
+def columns(tmp_path_factory):
+    # チャンクの区切りが軸の区切りと一致しない行数で書き込む
+    return write_columns(GRID, str(tmp_path_factory.mktemp('columns')), chunk_rows=17)
+
+
+@pytest.fixture(scope='module')
+def expected():
+    values = run_sweep(GRID, workers=1)
+    return {field: values[:, i] for i, field in enumerate(SWEEP_FIELDS)}
+
+
+def test_columns_match_sweep(columns, expected):
+    reopened = SweepColumns(columns.path)
+    assert len(reopened) == len(GRID)
+    np.testing.assert_allclose(reopened.column('final_temp'), expected['final_temp'])
+
+
+def test_quantiles_match_numpy(columns, expected):
+    result = quantiles(columns, 'final_temp', q=(0.1, 0.5, 0.9), by='pipe_diameter', chunk_rows=10)
+    codes = columns.axis_codes('pipe_diameter', 0, len(columns))
+    for code, diameter in enumerate(GRID.axes['pipe_diameter']):
+        values = expected['final_temp'][codes == code]
+        for q, value in result[diameter].items():
+            assert value == pytest.approx(np.quantile(values, q), abs=1e-12)
+
+
+def test_feasible_fraction_and_best(columns, expected):
+    target = float(np.median(expected['final_temp']))
+    feasible = feasible_fraction(columns, max_value=target, chunk_rows=10)[None]
+    assert feasible['feasible'] == int(np.sum(expected['final_temp'] <= target))
+    best = best_by(columns, 'pipe_diameter', field='heat_exchange_rate', chunk_rows=10)
+    for diameter, row in best.items():
+        assert row['axes']['pipe_diameter'] == diameter
+        assert row['value'] == expected['heat_exchange_rate'][row['index']]
@@ -0,0 +1,51 @@
+"""
+計算エンジン・一括計算と参照実装（高速化前のループ）の差分テスト
+（件数を増やした比較は python -m tests.differential で行う）
+"""
+
+import numpy as np
+import pytest
+
+from tests.differential import compare, random_scenarios
+
+# テストの計算条件数
+SCENARIOS = 2000
+
+# float64 の計算経路の許容差（丸め誤差の範囲）
+TOLERANCE = 1e-9
+
+# float32 の許容差（calculations.batch.PRECISIONS の出口温度・地下水温度上昇の精度）
+FLOAT32_TOLERANCE = 1e-4
+
+
+@pytest.fixture(scope='module')
+def deviations():
+    return compare(random_scenarios(SCENARIOS, seed=1))
+
+
+@pytest.mark.parametrize('path', ['engine', 'batch'])
+def test_float64_matches_reference(deviations, path):
+    for field, values in deviations[path].items():
+        assert np.nanmax(values) < TOLERANCE, field
+
+
+@pytest.mark.parametrize('field', ['final_temp', 'groundwater_temp_rise'])
+def test_float32_within_precision(deviations, field):
+    assert np.nanmax(deviations['float32'][field]) < FLOAT32_TOLERANCE
+
+
+def test_scenarios_cover_all_modes():
+    scenarios = random_scenarios(200, seed=1)
+    assert {(s['mode'], s['page']) for s in scenarios} == {
+        (mode, page) for mode in ('地下水温度一定', '1回通水', '同じ水を循環', '連続供給')
+        for page in ('single', 'multi')
+    }
+
+
+def test_scenarios_cover_long_runs_and_profiles():
+    scenarios = random_scenarios(SCENARIOS, seed=1)
+    assert any(s['operation_minutes'] > 256 for s in scenarios)
+    assert any('inlet_profile' in s for s in scenarios)
+    # 運転時間だけを変えた同じ条件（チェックポイントの延長・切り詰め）
+    assert any(a['initial_temp'] == b['initial_temp'] and a['operation_minutes'] < b['operation_minutes']
+               for a, b in zip(scenarios, scenarios[1:]))
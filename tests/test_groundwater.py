@@ -0,0 +1,60 @@
+"""
+地下水温度の漸化式のテスト
+"""
+
+import time
+
+import numpy as np
+
+from calculations.groundwater import _clamped_linear_recurrence
+
+# 入口温度の系列のステップ数
+STEPS = 200_000
+
+# 追従係数・初期地下水温度・地下水温度の上限
+K = 0.03
+INITIAL = 15.0
+UPPER = 20.0
+
+# 計算時間の計測回数（最短の時間で比較する）
+REPEATS = 3
+
+
+def _scalar_loop(inlet):
+    """1ステップずつ計算する元の実装"""
+    ground = np.empty(inlet.size)
+    prev = INITIAL
+    for i, x in enumerate(inlet.tolist()):
+        prev = min((1 - K) * prev + K * x, UPPER, x)
+        ground[i] = prev
+    return ground
+
+
+def _best_time(function, inlet):
+    times = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        function(inlet)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def test_noisy_inlet_matches_scalar_loop_and_is_not_slower():
+    # 入口温度が地下水温度付近で変動し、クランプがほぼ毎ステップ切り替わる
+    inlet = INITIAL + np.random.default_rng(0).normal(0, 0.5, STEPS)
+
+    def vectorized(values):
+        return _clamped_linear_recurrence(values, K, INITIAL, UPPER)
+
+    np.testing.assert_allclose(vectorized(inlet), _scalar_loop(inlet), rtol=0, atol=1e-12)
+    assert _best_time(vectorized, inlet) < _best_time(_scalar_loop, inlet)
+
+
+def test_alternating_regimes_match_scalar_loop():
+    # 変動区間・上限値に張り付く区間・滑らかな区間が交互に続く
+    rng = np.random.default_rng(1)
+    block = np.arange(STEPS) // 5000 % 3
+    inlet = np.select([block == 0, block == 1], [INITIAL + rng.normal(0, 0.5, STEPS), np.full(STEPS, 30.0)],
+                      25 + 5 * np.sin(np.arange(STEPS) / 500))
+    np.testing.assert_allclose(_clamped_linear_recurrence(inlet, K, INITIAL, UPPER), _scalar_loop(inlet),
+                               rtol=0, atol=1e-12)
@@ -0,0 +1,59 @@
+"""
+バックグラウンドジョブのテスト
+"""
+
+import threading
+import time
+
+from utils.jobs import JOB_CANCELLED, JOB_DONE, JOB_FAILED, JobExecutor
+
+# ジョブの終了を待つ上限時間 [s]
+TIMEOUT = 5.0
+
+
+def _wait(job):
+    deadline = time.monotonic() + TIMEOUT
+    while job.active:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    return job
+
+
+def test_done_job_has_result_and_progress():
+    def work(job, count):
+        for i in range(count):
+            job.report(i + 1, count, partial=i)
+        return 'result'
+
+    job = _wait(JobExecutor(max_workers=1).submit("計算", work, 4))
+    assert job.status == JOB_DONE
+    assert job.result == 'result'
+    assert job.fraction == 1.0
+    assert job.partial == 3
+
+
+def test_cancel_stops_at_next_report():
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(job):
+        started.set()
+        release.wait(TIMEOUT)
+        job.report(1, 2)
+        return 'not reached'
+
+    job = JobExecutor(max_workers=1).submit("計算", work)
+    started.wait(TIMEOUT)
+    job.cancel()
+    release.set()
+    assert _wait(job).status == JOB_CANCELLED
+    assert job.result is None
+
+
+def test_failed_job_keeps_error():
+    def work(job):
+        raise ValueError("失敗")
+
+    job = _wait(JobExecutor(max_workers=1).submit("計算", work))
+    assert job.status == JOB_FAILED
+    assert isinstance(job.error, ValueError)
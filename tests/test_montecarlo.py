@@ -0,0 +1,61 @@
+"""
+モンテカルロ法による不確実性の評価のテスト
+"""
+
+import numpy as np
+import pytest
+
+from calculations.batch import calculate_batch
+from calculations.engine import calculate, normalize_inputs
+from calculations.montecarlo import QuantileSketch, RunningStats, monte_carlo
+
+INPUTS = normalize_inputs(flow_rate=40.0, pipe_length=10.0)
+
+# スケッチの分位点の許容差（分位の差）
+SKETCH_TOLERANCE = 0.005
+
+
+def test_running_stats_match_numpy():
+    values = np.random.default_rng(0).normal(3.0, 2.0, 10001)
+    stats = RunningStats()
+    for chunk in np.array_split(values, 7):
+        part = RunningStats()
+        part.update(chunk)
+        stats.merge(part)
+    assert stats.count == values.size
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.variance == pytest.approx(values.var(ddof=1))
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_quantile_sketch_is_close_to_exact():
+    values = np.random.default_rng(0).lognormal(0.0, 1.0, 200000)
+    sketch = QuantileSketch()
+    for chunk in np.array_split(values, 4):
+        part = QuantileSketch()
+        part.update(chunk)
+        sketch.merge(part)
+    for q in (0.01, 0.1, 0.5, 0.9, 0.99):
+        # 推定値の分位（経験分布関数）の差で比較する
+        assert np.mean(values <= sketch.quantile(q)) == pytest.approx(q, abs=SKETCH_TOLERANCE)
+
+
+def test_monte_carlo_matches_direct_evaluation():
+    uncertainty = {'h_outer': {'dist': 'uniform', 'low': 50.0, 'high': 500.0}}
+    result = monte_carlo(INPUTS, uncertainty, samples=20000, seed=1, batch_size=3000)
+    # 同じシードなら同じ結果
+    again = monte_carlo(INPUTS, uncertainty, samples=20000, seed=1, batch_size=3000)
+    assert again['summary'] == result['summary']
+
+    summary = result['summary']['final_temp']
+    assert summary['count'] == 20000
+    # 出口温度は h_outer に対して単調なので、範囲の両端の計算結果の間に収まる
+    ends = calculate_batch([dict(INPUTS, h_outer=50.0), dict(INPUTS, h_outer=500.0)])['final_temp']
+    assert min(ends) <= summary['min'] <= summary[0.1] <= summary[0.5] <= summary[0.9] <= summary['max'] <= max(ends)
+
+
+def test_no_uncertainty_reproduces_single_result():
+    result = monte_carlo(INPUTS, {}, samples=100, seed=0)
+    summary = result['summary']['final_temp']
+    assert summary['mean'] == pytest.approx(calculate(INPUTS)['final_temp'])
+    assert summary['std'] == pytest.approx(0.0, abs=1e-12)
@@ -0,0 +1,58 @@
+"""
+近傍条件の先読み計算のテスト
+"""
+
+import time
+
+import pytest
+
+from calculations.engine import configure_result_store, normalize_inputs, result_cache, scenario_hash
+from calculations.prefetch import Prefetcher, neighbor_inputs
+from utils.admission import AdmissionController
+from utils.result_store import ResultStore
+
+# 先読みの完了を待つ上限時間 [s]
+TIMEOUT = 30.0
+
+# 他のテストの計算結果と重ならない計算条件
+INPUTS = normalize_inputs(pipe_length=7.5, h_outer=250.0, initial_temp=33.0)
+
+
+def _wait_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"), "test")
+    configure_result_store(store)
+    yield store
+    configure_result_store(None)
+
+
+def test_neighbors_stay_within_input_ranges():
+    neighbors = neighbor_inputs(normalize_inputs(flow_rate=100.0), ['flow_rate'])
+    assert [inputs['flow_rate'] for inputs in neighbors] == [99.0]
+
+
+def test_prefetch_is_not_persisted(store):
+    prefetcher = Prefetcher(cpu_budget=1.0)
+    prefetcher.submit(INPUTS, previous={**INPUTS, 'pipe_length': 7.0})
+    neighbors = neighbor_inputs(INPUTS, ['pipe_length'])
+    _wait_until(lambda: all(scenario_hash(inputs) in result_cache() for inputs in neighbors)
+                and prefetcher.stats()['pending'] == 0)
+    assert prefetcher.stats()['computed'] == len(neighbors)
+    assert store.stats()['entries'] == 0
+
+
+def test_prefetch_stops_when_quota_is_exceeded():
+    prefetcher = Prefetcher(cpu_budget=1.0, admission=AdmissionController(session_cpu_seconds=0.0))
+    inputs = {**INPUTS, 'initial_temp': 34.0}
+    prefetcher.submit(inputs, previous={**inputs, 'h_outer': 200.0})
+    neighbors = neighbor_inputs(inputs, ['h_outer'])
+    _wait_until(lambda: prefetcher.stats()['skipped'] == len(neighbors))
+    assert prefetcher.stats()['computed'] == 0
+    assert not any(scenario_hash(neighbor) in result_cache() for neighbor in neighbors)
@@ -0,0 +1,45 @@
+"""
+計算結果の永続キャッシュ（SQLite）のテスト
+"""
+
+import sqlite3
+
+import utils.result_store as result_store
+from utils.result_store import ResultStore
+
+
+def _accessed(path, key):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT accessed FROM results WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_values_survive_reopening(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    ResultStore(path, "1.0").put('key', {'final_temp': 25.0})
+    assert ResultStore(path, "1.0").get('key') == {'final_temp': 25.0}
+    # エンジンのバージョンが異なる結果は使わない
+    assert ResultStore(path, "2.0").get('key') is None
+
+
+def test_oldest_entries_are_evicted(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"), "1.0", max_bytes=3000)
+    for i in range(5):
+        store.put(f'key{i}', b'x' * 1000)
+    assert store.stats()['bytes'] <= 3000
+    assert store.get('key0') is None
+    assert store.get('key4') == b'x' * 1000
+
+
+def test_recent_hit_does_not_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "results.sqlite3")
+    store = ResultStore(path, "1.0")
+    store.put('key', 1)
+    stored = _accessed(path, 'key')
+    assert store.get('key') == 1
+    assert _accessed(path, 'key') == stored
+
+    # 参照時刻が ACCESS_UPDATE_INTERVAL より古くなってからの参照は更新する
+    now = result_store.time.time()
+    monkeypatch.setattr(result_store.time, 'time', lambda: now + result_store.ACCESS_UPDATE_INTERVAL + 1)
+    assert store.get('key') == 1
+    assert _accessed(path, 'key') > stored
@@ -0,0 +1,38 @@
+"""
+感度解析（トルネード図・Sobol 指標）のテスト
+"""
+
+import pytest
+
+from calculations.engine import normalize_inputs
+from calculations.sensitivity import ranked, sobol_indices, tornado
+
+# Sobol 指標のテストの範囲（掘削径は地下水温度上昇を考慮しなければ出口温度に影響しない）
+SOBOL_FACTORS = {
+    'flow_rate': {'low': 20.0, 'high': 100.0},
+    'pipe_length': {'low': 1.0, 'high': 30.0},
+    'boring_diameter': {'levels': ('φ116', 'φ250')},
+}
+
+
+@pytest.mark.parametrize('ground_temp', [0.0, 15.0])
+def test_tornado_shifts_temperatures_by_absolute_delta(ground_temp):
+    # 地下水温度 0℃ でも ±ΔT℃ 変化させるため影響は0にならない
+    result = tornado(normalize_inputs(ground_temp=ground_temp), fraction=0.1, temp_delta=2.0)
+    assert result['values']['ground_temp'] == pytest.approx((ground_temp - 2.0, ground_temp + 2.0))
+    assert result['values']['flow_rate'] == pytest.approx((45.0, 55.0))
+    effects = {name: (low, high) for name, low, high in result['effects']['final_temp']}
+    low, high = effects['ground_temp']
+    assert low < result['base']['final_temp'] < high
+
+
+def test_sobol_indices_rank_factors():
+    result = sobol_indices(normalize_inputs(), SOBOL_FACTORS, samples=2 ** 14, chunk_samples=2 ** 12)
+    assert result['evaluations'] == 2 ** 14 * (len(SOBOL_FACTORS) + 2)
+    indices = result['indices']['final_temp']
+    assert indices['boring_diameter']['total'] == 0.0
+    assert [name for name, _ in ranked(result)] == ['pipe_length', 'flow_rate', 'boring_diameter']
+    for name in ('flow_rate', 'pipe_length'):
+        assert 0.0 < indices[name]['total'] <= 1.0 + indices[name]['total_conf']
+    # 同じ条件の結果はキャッシュから返す
+    assert sobol_indices(normalize_inputs(), SOBOL_FACTORS, samples=2 ** 14, chunk_samples=2 ** 12) is result
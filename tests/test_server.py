@@ -0,0 +1,95 @@
+"""
+計算エンジンの HTTP API のテスト
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from calculations.server import EngineServer
+
+
+async def _post(requests):
+    """サーバーを起動し、1つの接続で要求を順に送って (状態コード, 応答) の list を返す"""
+    server = EngineServer()
+    server.batcher.start()
+    listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    host, port = listener.sockets[0].getsockname()[:2]
+    responses = []
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        for path, payload in requests:
+            body = json.dumps(payload).encode('utf-8')
+            writer.write(f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while (line := await reader.readline()) != b'\r\n':
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            responses.append((status, json.loads(await reader.readexactly(int(headers['content-length'])))))
+        writer.close()
+        await writer.wait_closed()
+    finally:
+        listener.close()
+        await listener.wait_closed()
+        await server.batcher.stop()
+    return responses
+
+
+async def _send_raw(data):
+    """サーバーを起動し、data をそのまま送って応答の状態コードを返す"""
+    server = EngineServer()
+    listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    host, port = listener.sockets[0].getsockname()[:2]
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(data)
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        await writer.wait_closed()
+    finally:
+        listener.close()
+        await listener.wait_closed()
+    return int(status_line.split()[1])
+
+
+def test_calculate_returns_result():
+    [(status, payload)] = asyncio.run(_post([('/calculate', {'flow_rate': 30})]))
+    assert status == 200
+    assert payload['result']['final_temp'] < 30.0
+
+
+@pytest.mark.parametrize('path, payload', [
+    ('/calculate', {'flow_rate': 0}),
+    ('/calculate', {'num_pipes': 0}),
+    ('/batch', {'scenarios': [{'flow_rate': 30}, {'flow_rate': 0}]}),
+    ('/sweep', {'base': {}, 'axes': {'flow_rate': [0, 30]}}),
+])
+def test_out_of_range_is_bad_request(path, payload):
+    # 範囲外の条件は 400 で返し、同じ接続で次の要求を処理できる
+    responses = asyncio.run(_post([(path, payload), ('/calculate', {'flow_rate': 30})]))
+    assert responses[0][0] == 400
+    assert 'error' in responses[0][1]
+    assert responses[1][0] == 200
+
+
+def test_boolean_fields_accept_text():
+    responses = asyncio.run(_post([
+        ('/calculate', {'consider_groundwater_temp_rise': "false"}),
+        ('/calculate', {'consider_groundwater_temp_rise': "true"}),
+        ('/calculate', {'consider_groundwater_temp_rise': "maybe"}),
+    ]))
+    assert responses[0][1]['result']['groundwater_temp_rise'] == 0.0
+    assert responses[1][1]['result']['groundwater_temp_rise'] > 0.0
+    assert responses[2][0] == 400
+
+
+@pytest.mark.parametrize('data, status', [
+    (b"GET /" + b"x" * 70000 + b" HTTP/1.1\r\n\r\n", 400),
+    (b"GET /health HTTP/1.1\r\nX-Long: " + b"x" * 70000 + b"\r\n\r\n", 431),
+])
+def test_overlong_lines_are_answered(data, status):
+    assert asyncio.run(_send_raw(data)) == status
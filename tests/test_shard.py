@@ -0,0 +1,87 @@
+"""
+分散パラメータスイープ（ロックファイルによるチャンクの確保）のテスト
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+import calculations.shard as shard
+from calculations.sweep import SweepGrid, run_sweep, sweep_frame
+
+SWEEP = {'base': {'pipe_length': 10.0}, 'axes': {'flow_rate': [20.0, 40.0, 60.0], 'pipe_diameter': ['25A', '32A']}}
+
+# ロックを放棄されたとみなすまでの時間 [s]
+STALE_SECONDS = 60
+
+
+def _write_lock(run_dir, chunk_id, pid):
+    with open(shard._lock_path(run_dir, chunk_id), 'w', encoding='utf-8') as f:
+        json.dump({'host': socket.gethostname(), 'pid': pid, 'time': time.time()}, f)
+
+
+def _finished_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_work_and_collect_match_local_sweep(tmp_path):
+    run_dir = str(tmp_path)
+    shard.plan(SWEEP, run_dir, chunk_size=4)
+    assert shard.work(run_dir, STALE_SECONDS) == 2
+    assert shard.status(run_dir)['done'] == 2
+    grid = SweepGrid(SWEEP['base'], SWEEP['axes'])
+    pd.testing.assert_frame_equal(shard.collect(run_dir), sweep_frame(grid, run_sweep(grid, workers=1)))
+
+
+def test_live_lock_is_not_taken(tmp_path):
+    run_dir = str(tmp_path)
+    shard.plan(SWEEP, run_dir, chunk_size=4)
+    _write_lock(run_dir, '000000', os.getpid())
+    assert shard.work(run_dir, STALE_SECONDS) == 1
+    assert shard.status(run_dir) == {'total': 2, 'done': 1, 'running': 1, 'pending': 0}
+
+
+def test_lock_of_finished_process_is_taken_over(tmp_path):
+    run_dir = str(tmp_path)
+    shard.plan(SWEEP, run_dir, chunk_size=4)
+    _write_lock(run_dir, '000000', _finished_pid())
+    assert shard._claim(run_dir, '000000', STALE_SECONDS)
+    with open(shard._lock_path(run_dir, '000000'), encoding='utf-8') as f:
+        assert json.load(f)['pid'] == os.getpid()
+
+
+def test_empty_lock_is_judged_by_age(tmp_path):
+    run_dir = str(tmp_path)
+    shard.plan(SWEEP, run_dir, chunk_size=4)
+    lock_path = shard._lock_path(run_dir, '000000')
+    open(lock_path, 'w').close()
+    assert not shard._claim(run_dir, '000000', STALE_SECONDS)
+    old = time.time() - 2 * STALE_SECONDS
+    os.utime(lock_path, (old, old))
+    assert shard._claim(run_dir, '000000', STALE_SECONDS)
+
+
+def test_new_lock_created_after_stale_check_is_restored(tmp_path, monkeypatch):
+    # 放棄されたロックを判定した後、名前を変える前に他のプロセスが新しいロックを作成した場合
+    run_dir = str(tmp_path)
+    shard.plan(SWEEP, run_dir, chunk_size=4)
+    lock_path = shard._lock_path(run_dir, '000000')
+    _write_lock(run_dir, '000000', _finished_pid())
+    stale = shard._stale_lock(lock_path, STALE_SECONDS)
+    os.remove(lock_path)
+    _write_lock(run_dir, '000000', os.getpid())
+    with open(lock_path, encoding='utf-8') as f:
+        new_lock = f.read()
+    monkeypatch.setattr(shard, '_stale_lock', lambda path, seconds: stale)
+
+    assert not shard._claim(run_dir, '000000', STALE_SECONDS)
+    with open(lock_path, encoding='utf-8') as f:
+        assert f.read() == new_lock
+    assert os.listdir(os.path.dirname(lock_path)) == ['000000.lock']
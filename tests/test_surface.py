@@ -0,0 +1,40 @@
+"""
+応答曲面の作成と参照のテスト
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import calculations.surface as surface
+from utils.cache import MemoCache
+
+# 待ちの状態を確認する上限時間 [s]
+TIMEOUT = 5.0
+
+
+def test_building_one_surface_does_not_block_others(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    built = []
+
+    class SlowSurface:
+        def __init__(self, pipe_diameter, pipe_material):
+            built.append(pipe_diameter)
+            if pipe_diameter == '25A':
+                started.set()
+                release.wait(TIMEOUT)
+
+    monkeypatch.setattr(surface, 'ResponseSurface', SlowSurface)
+    monkeypatch.setattr(surface, '_SURFACES', MemoCache())
+    ready = surface.response_surface('32A', '鋼管')
+
+    with ThreadPoolExecutor(3) as executor:
+        building = [executor.submit(surface.response_surface, '25A', '鋼管') for _ in range(2)]
+        assert started.wait(TIMEOUT)
+        # 作成中の応答曲面があっても、作成済みの応答曲面はすぐに返す
+        assert executor.submit(surface.response_surface, '32A', '鋼管').result(TIMEOUT) is ready
+        release.set()
+        first, second = [future.result(TIMEOUT) for future in building]
+
+    assert first is second
+    assert built == ['32A', '25A']
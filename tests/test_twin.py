@@ -0,0 +1,66 @@
+"""
+掘削孔のデジタルツインのテスト
+"""
+
+import numpy as np
+import pytest
+
+from calculations.calibration import LogModel
+from calculations.engine import calculate, normalize_inputs
+from calculations.twin import BoreholeTwin, TwinMonitor
+
+INPUTS = normalize_inputs(pipe_length=10, num_pipes=2, ground_temp=15.0)
+
+# 計測値の件数（1分間隔）
+READINGS = 240
+
+
+def test_twin_tracks_log_model():
+    # 実際の初期地下水温度（17℃）は設定（15℃）と異なる
+    time = np.arange(READINGS) * 60.0
+    inlet = 28 + 2 * np.sin(time / 3600)
+    flow = np.full(READINGS, 40.0)
+    log = {'time': time, 'inlet_temp': inlet, 'outlet_temp': np.zeros(READINGS), 'flow_rate': flow}
+    volume = calculate(INPUTS)['groundwater_volume']
+    outlet, ground = LogModel(log, INPUTS).simulate(INPUTS['h_outer'], volume, 0.0, 17.0)
+
+    twin = BoreholeTwin(INPUTS, initial_std=3.0)
+    for row in range(READINGS):
+        status = twin.update(time[row], inlet[row], flow[row], outlet[row])
+    assert status['ground_temp'] == pytest.approx(ground[-1], abs=0.02)
+    assert status['ground_std'] < 0.1
+    assert status['readings'] == READINGS
+
+
+def test_seconds_to_limit_matches_prediction():
+    twin = BoreholeTwin(INPUTS, temp_rise_limit=5.0)
+    twin.update(0.0, 30.0, 40.0)
+    seconds = twin.seconds_to_limit()
+    assert seconds > 0
+    # 同じ運転条件で予測時間だけ進めると上限値に達する
+    twin.update(seconds, 30.0, 40.0)
+    assert twin.ground_temp == pytest.approx(twin.limit_temp, abs=1e-9)
+
+    # 停止中は上限値に達しない
+    stopped = BoreholeTwin(INPUTS)
+    stopped.update(0.0, 30.0, 0.0)
+    assert stopped.seconds_to_limit() is None
+
+
+def test_monitor_rejects_bad_readings():
+    statuses = []
+    monitor = TwinMonitor({'B1': BoreholeTwin(INPUTS)}, on_status=lambda borehole, status: statuses.append(status))
+    readings = [
+        {'borehole': 'B1', 'time': 0, 'inlet_temp': 30, 'flow_rate': 40},
+        {'borehole': 'B9', 'time': 60, 'inlet_temp': 30, 'flow_rate': 40},
+        {'borehole': 'B1', 'time': 60, 'flow_rate': 40},
+        {'borehole': 'B1', 'time': 'yesterday', 'inlet_temp': 30, 'flow_rate': 40},
+        # 前回より前の時刻
+        {'borehole': 'B1', 'time': -60, 'inlet_temp': 30, 'flow_rate': 40},
+        {'borehole': 'B1', 'time': 60, 'inlet_temp': 30, 'flow_rate': 40, 'outlet_temp': 25},
+    ]
+    for reading in readings:
+        monitor.process(reading)
+    assert monitor.rejected == 4
+    # 数値の時刻は経過時間 [s]
+    assert [status['time'] for status in statuses] == [0.0, 60.0]
@@ -0,0 +1,47 @@
+"""
+サーバー起動時の事前計算のテスト
+"""
+
+import threading
+import time
+
+from calculations.engine import normalize_inputs
+from calculations.warmup import warm_up
+from utils.admission import PRIORITY_INTERACTIVE, AdmissionController
+
+# 待ちの状態を確認する上限時間 [s]
+TIMEOUT = 5.0
+
+
+def _wait_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_warm_up_waits_for_interactive_work():
+    admission = AdmissionController(max_concurrent=1)
+    release = threading.Event()
+    reports = []
+
+    def interactive():
+        with admission.admit('user', PRIORITY_INTERACTIVE):
+            release.wait(TIMEOUT)
+
+    holder = threading.Thread(target=interactive)
+    holder.start()
+    _wait_until(lambda: admission.stats()['running'] == 1)
+
+    # 地下水温度上昇を考慮する条件（応答曲面は作成しない）
+    scenarios = [normalize_inputs(flow_rate=37.0, consider_groundwater_temp_rise=True)]
+    worker = threading.Thread(target=lambda: reports.append(warm_up(scenarios, admission)))
+    worker.start()
+    _wait_until(lambda: admission.stats()['queue_depth'] == 1)
+    assert not reports
+
+    release.set()
+    holder.join(TIMEOUT)
+    worker.join(TIMEOUT)
+    assert reports[0]['scenarios'] == 1
+    assert reports[0]['surfaces'] == 0
@@ -0,0 +1,161 @@
+"""
+計算の受付制御
+サーバー全体の同時計算数を制限し、優先度の高い計算から順に実行する。
+セッションごとの CPU 時間を集計し、上限を超えたセッションの一括計算は受け付けない
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# 優先度（値が小さいほど先に実行する）
+PRIORITY_INTERACTIVE = 0   # 単一配管計算
+PRIORITY_COMPARISON = 5    # 複数配管比較
+PRIORITY_BATCH = 10        # パラメータスイープなどの一括計算
+
+# セッションごとの CPU 時間の上限 [s]（集計期間あたり）
+DEFAULT_SESSION_CPU_SECONDS = 120.0
+
+# CPU 時間の集計期間 [s]
+DEFAULT_WINDOW_SECONDS = 600.0
+
+# 待ち時間の統計に使用する直近の件数（優先度ごと）
+_WAIT_HISTORY = 1000
+
+
+class QuotaExceeded(Exception):
+    """セッションの CPU 時間が上限を超えている"""
+
+    def __init__(self, used, limit, retry_after):
+        super().__init__(
+            f"計算時間の上限（{limit:.0f} 秒）に達しました。約 {retry_after:.0f} 秒後に再実行してください"
+        )
+        self.used = used
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    計算の受付制御
+
+    admit で囲んだ計算は、同時に max_concurrent 件まで実行する。
+    それを超える分は優先度順（同じ優先度は到着順）に待たせる。
+    計算中のスレッドの CPU 時間をセッションごとに集計し、直近 window_seconds の
+    合計が session_cpu_seconds を超えたセッションは、一括計算を QuotaExceeded で
+    拒否し、対話的な計算を一括計算と同じ優先度に下げる。
+    """
+
+    def __init__(self, max_concurrent=None, session_cpu_seconds=DEFAULT_SESSION_CPU_SECONDS,
+                 window_seconds=DEFAULT_WINDOW_SECONDS):
+        self.max_concurrent = max_concurrent or os.cpu_count() or 1
+        self.session_cpu_seconds = session_cpu_seconds
+        self.window_seconds = window_seconds
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._usage = defaultdict(deque)
+        self._waits = defaultdict(lambda: deque(maxlen=_WAIT_HISTORY))
+
+    def _session_usage(self, session_id, now):
+        """直近の集計期間のセッションの CPU 時間を返す（期間外の記録は破棄する）"""
+        usage = self._usage.get(session_id)
+        if usage is None:
+            return 0.0
+        while usage and usage[0][0] < now - self.window_seconds:
+            usage.popleft()
+        if not usage:
+            del self._usage[session_id]
+        return sum(seconds for _, seconds in usage)
+
+    def _retry_after(self, session_id, now):
+        """CPU 時間が上限を下回るまでの時間 [s] を見積もる"""
+        excess = self._session_usage(session_id, now) - self.session_cpu_seconds
+        for recorded, seconds in self._usage.get(session_id, ()):
+            excess -= seconds
+            if excess < 0:
+                return max(0.0, recorded + self.window_seconds - now)
+        return self.window_seconds
+
+    @contextmanager
+    def admit(self, session_id, priority=PRIORITY_INTERACTIVE):
+        """
+        計算の実行枠を確保する（空くまで待つ）
+
+        Parameters:
+            session_id: セッションの識別子
+            priority: 優先度（PRIORITY_INTERACTIVE など）
+
+        Raises:
+            QuotaExceeded: CPU 時間が上限を超えたセッションの一括計算
+        """
+        arrived = time.monotonic()
+        with self._condition:
+            used = self._session_usage(session_id, arrived)
+            if used >= self.session_cpu_seconds:
+                if priority >= PRIORITY_BATCH:
+                    raise QuotaExceeded(used, self.session_cpu_seconds,
+                                        self._retry_after(session_id, arrived))
+                priority = PRIORITY_BATCH
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+            try:
+                while self._running >= self.max_concurrent or self._queue[0] != ticket:
+                    self._condition.wait()
+            except BaseException:
+                # 待ちの途中で中断された要求は待ち行列から取り除く
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self._running += 1
+            self._waits[priority].append(time.monotonic() - arrived)
+            # 次の順番の要求も空きがあれば実行できるよう知らせる
+            self._condition.notify_all()
+
+        cpu_started = time.thread_time()
+        try:
+            yield
+        finally:
+            cpu_seconds = time.thread_time() - cpu_started
+            with self._condition:
+                self._running -= 1
+                self._usage[session_id].append((time.monotonic(), cpu_seconds))
+                self._condition.notify_all()
+
+    def session_usage(self, session_id):
+        """直近の集計期間のセッションの CPU 時間 [s] を返す"""
+        with self._condition:
+            return self._session_usage(session_id, time.monotonic())
+
+    def stats(self):
+        """
+        受付状況を返す
+
+        Returns:
+            dict: queue_depth（待ち件数）, running（実行中の件数）, max_concurrent,
+                  waits（優先度 → {'count', 'p50', 'p99'} 待ち時間 [s]）
+        """
+        with self._condition:
+            waits = {
+                priority: {
+                    'count': len(history),
+                    'p50': float(np.percentile(history, 50)),
+                    'p99': float(np.percentile(history, 99)),
+                }
+                for priority, history in self._waits.items() if history
+            }
+            return {
+                'queue_depth': len(self._queue),
+                'running': self._running,
+                'max_concurrent': self.max_concurrent,
+                'waits': waits,
+            }
@@ -0,0 +1,184 @@
+"""
+計算結果のキャッシュ
+入力値の正規化ハッシュと、LRU方式のメモ化キャッシュを提供する
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+# メモ化キャッシュの既定の上限数
+DEFAULT_MAX_ENTRIES = 256
+
+
+def _normalize_value(value):
+    """ハッシュ用に値を正規化する（数値は float、配列はハッシュ値に変換）"""
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value, dtype=float)
+        return 'ndarray:' + hashlib.sha256(data.tobytes()).hexdigest()
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(v) for k, v in sorted(value.items())}
+    return value
+
+
+def value_nbytes(value):
+    """
+    値が保持する配列の合計サイズ [bytes] を返す
+
+    dict・list・tuple の要素と、nbytes 属性を持つオブジェクト（ndarray、TimeSeries など）
+    を数える。それ以外の値は0とする。
+    """
+    if isinstance(value, dict):
+        return sum(value_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(value_nbytes(v) for v in value)
+    nbytes = getattr(value, 'nbytes', 0)
+    return nbytes if isinstance(nbytes, int) else 0
+
+
+def input_hash(*values):
+    """
+    入力値から正規化したハッシュ文字列を作成する
+
+    数値は int/float を区別せず、dict はキー順に並べ替えてから
+    ハッシュするため、同じ条件は常に同じハッシュになる。
+
+    Parameters:
+        values: ハッシュ対象の値（数値・文字列・None・配列・list・dict）
+
+    Returns:
+        str: SHA-256 ハッシュ（16進数）
+    """
+    normalized = [_normalize_value(v) for v in values]
+    payload = json.dumps(normalized, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoCache:
+    """
+    計算結果のメモ化キャッシュ（LRU方式）
+
+    上限数、または max_bytes を指定した場合は保持する配列の合計サイズ
+    （value_nbytes）が上限を超えた場合に、最も古く参照されたものから破棄する
+    （合計サイズの上限を超える1件は保持しない）。
+    同じキーの計算が同時に要求された場合は最初の1件のみが計算し、
+    残りはその結果を待って共有する。
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        キャッシュ済みの結果を返し、なければ計算して保存する
+
+        Parameters:
+            key: キャッシュキー（input_hash の戻り値）
+            compute: 引数なしで結果を返す関数
+
+        Returns:
+            計算結果
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                self.misses += 1
+                pending = Future()
+                self._pending[key] = pending
+            else:
+                self.coalesced += 1
+
+        # 同じキーを計算中の要求があれば、その結果を待つ
+        if not owner:
+            return pending.result()
+
+        try:
+            value = compute()
+        except BaseException as exc:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(exc)
+            raise
+        self.put(key, value)
+        with self._lock:
+            del self._pending[key]
+        pending.set_result(value)
+        return value
+
+    def get(self, key, default=None):
+        """キャッシュ済みの結果を返す（統計には数えない）"""
+        with self._lock:
+            return self._entries.get(key, default)
+
+    def put(self, key, value):
+        """結果を保存する"""
+        size = value_nbytes(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+                self._bytes -= self._sizes.pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def stats(self):
+        """
+        キャッシュの統計を返す
+
+        Returns:
+            dict: hits, misses, coalesced, size, max_entries, bytes, max_bytes
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        """保存済みの結果と統計を破棄する"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
@@ -0,0 +1,181 @@
+"""
+バックグラウンドジョブ
+時間のかかる計算をスクリプトのスレッドから切り離して実行し、進捗の確認と中止を可能にする
+"""
+
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ジョブの状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_CANCELLED = "cancelled"
+JOB_FAILED = "failed"
+
+# 同時に実行するジョブ数の既定値
+DEFAULT_MAX_WORKERS = 2
+
+
+class JobCancelled(Exception):
+    """ジョブの中止が要求された"""
+
+
+class Job:
+    """
+    バックグラウンドで実行する1件のジョブ
+
+    ジョブの関数は第1引数にこのオブジェクトを受け取り、report で進捗と
+    途中結果を報告する。report は中止が要求されていれば JobCancelled を
+    送出するため、関数は区切りごとに report を呼ぶこと。
+
+    状態（status・結果・エラー・開始/終了時刻）はロックの内側でまとめて
+    更新するため、status が JOB_DONE なら result は設定済みである。
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name):
+        self.id = next(self._ids)
+        self.name = name
+        self.done = 0
+        self.total = None
+        self.partial = None
+        self.submitted = time.time()
+        self._status = JOB_QUEUED
+        self._result = None
+        self._error = None
+        self._started = None
+        self._finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def _transition(self, status, **fields):
+        """状態と関連する項目をまとめて更新する（JobExecutor から呼ぶ）"""
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, '_' + name, value)
+            self._status = status
+
+    @property
+    def status(self):
+        with self._lock:
+            return self._status
+
+    @property
+    def result(self):
+        with self._lock:
+            return self._result
+
+    @property
+    def error(self):
+        with self._lock:
+            return self._error
+
+    @property
+    def started(self):
+        with self._lock:
+            return self._started
+
+    @property
+    def finished(self):
+        with self._lock:
+            return self._finished
+
+    def report(self, done, total=None, partial=None):
+        """
+        進捗を報告する（ジョブの関数から呼ぶ）
+
+        Parameters:
+            done: 完了した件数
+            total: 全件数（省略時は前回の値）
+            partial: 途中結果（省略時は前回の値）
+
+        Raises:
+            JobCancelled: 中止が要求されている場合
+        """
+        with self._lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+            if partial is not None:
+                self.partial = partial
+        # 区切りごとに他のスレッド（セッションのスクリプト）へ GIL を譲る
+        time.sleep(0)
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        """中止を要求する（実行中のジョブは次の report で中止する）"""
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def active(self):
+        """実行待ちまたは実行中なら True"""
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+    @property
+    def fraction(self):
+        """進捗の割合（0〜1、全件数が不明なら 0）"""
+        with self._lock:
+            return self.done / self.total if self.total else 0.0
+
+    @property
+    def elapsed(self):
+        """実行時間 [s]（未開始なら 0）"""
+        with self._lock:
+            started, finished = self._started, self._finished
+        if started is None:
+            return 0.0
+        return (finished or time.time()) - started
+
+
+class JobExecutor:
+    """
+    ジョブをスレッドプールで実行する
+
+    全セッションで共有し、同時に実行するジョブ数を max_workers に制限する。
+    ジョブはスクリプトと同じプロセスのスレッドで実行するため、Python で書いた
+    計算は GIL を取り合う。ジョブの関数は numpy の一括計算（calculate_batch など）
+    で区切りごとに計算し、区切りを短くしてその都度 report を呼ぶこと。
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, name, func, *args, **kwargs):
+        """
+        ジョブを投入する
+
+        Parameters:
+            name: ジョブの名前（表示用）
+            func: func(job, *args, **kwargs) の形で呼び出す関数
+
+        Returns:
+            Job: ジョブ（セッション状態に保存して進捗の確認に使う）
+        """
+        job = Job(name)
+        self._pool.submit(self._run, job, func, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job, func, args, kwargs):
+        if job.cancel_requested:
+            job._transition(JOB_CANCELLED, finished=time.time())
+            return
+        job._transition(JOB_RUNNING, started=time.time())
+        try:
+            result = func(job, *args, **kwargs)
+        except JobCancelled:
+            job._transition(JOB_CANCELLED, finished=time.time())
+        except Exception as exc:
+            job._transition(JOB_FAILED, error=exc, finished=time.time())
+        else:
+            job._transition(JOB_DONE, result=result, finished=time.time())
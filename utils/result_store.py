@@ -0,0 +1,172 @@
+"""
+計算結果の永続キャッシュ
+計算結果を SQLite ファイルに保存し、サーバーの再起動後や別プロセスからも再利用する
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 保存する計算結果の合計サイズの上限（既定 256MB）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 一度に破棄する件数（サイズ超過時）
+_EVICT_BATCH = 64
+
+# 参照時刻を更新する間隔 [s]（これより新しい参照時刻は更新せず、読み込みを書き込みにしない）
+ACCESS_UPDATE_INTERVAL = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (key, version)
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+class ResultStore:
+    """
+    SQLite による計算結果の永続キャッシュ
+
+    入力ハッシュとエンジンのバージョンをキーに計算結果を保存する。
+    合計サイズが上限を超えた場合は最も古く参照されたものから破棄する。
+    参照時刻は前回の更新から ACCESS_UPDATE_INTERVAL 秒以上経過した場合のみ
+    更新するため、キャッシュのヒットは通常は読み込みのみで完了する。
+    WAL モードで開くため、複数の Streamlit ワーカープロセスから同時に
+    読み書きできる。値は pickle で保存するため、信頼できるローカルの
+    ファイルのみを指定すること。
+
+    データベースのエラー（ロック待ちのタイムアウトなど）はキャッシュの
+    ミスとして扱い、計算自体は止めない。
+    """
+
+    def __init__(self, path, version, max_bytes=DEFAULT_MAX_BYTES, timeout=30.0):
+        self.path = path
+        self.version = str(version)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+
+    def _connection(self):
+        """スレッドごとの接続を返す（sqlite3 の接続はスレッド間で共有しない）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """
+        保存済みの計算結果を返す
+
+        Parameters:
+            key: 入力ハッシュ
+
+        Returns:
+            保存済みの計算結果（なければ None）
+        """
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, accessed FROM results WHERE key = ? AND version = ?",
+                (key, self.version)
+            ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("永続キャッシュの読み込みに失敗しました: %s", exc)
+            return None
+        if row is None:
+            return None
+        value, accessed = row
+        now = time.time()
+        if now - accessed >= ACCESS_UPDATE_INTERVAL:
+            try:
+                conn.execute(
+                    "UPDATE results SET accessed = ? WHERE key = ? AND version = ? AND accessed < ?",
+                    (now, key, self.version, now - ACCESS_UPDATE_INTERVAL)
+                )
+            except sqlite3.Error as exc:
+                # 参照時刻の更新は破棄の順序にのみ使うため、失敗しても結果は返す
+                logger.debug("永続キャッシュの参照時刻の更新に失敗しました: %s", exc)
+        return pickle.loads(value)
+
+    def put(self, key, value):
+        """
+        計算結果を保存する（上限サイズを超える結果は保存しない）
+
+        Parameters:
+            key: 入力ハッシュ
+            value: 計算結果（pickle 可能なオブジェクト）
+        """
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, version, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, self.version, blob, len(blob), now, now)
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as exc:
+            logger.warning("永続キャッシュへの保存に失敗しました: %s", exc)
+
+    def _evict(self, conn):
+        """合計サイズが上限以下になるまで古いものから破棄する"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, version, size FROM results ORDER BY accessed LIMIT ?",
+                (_EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            for key, version, size in rows:
+                conn.execute("DELETE FROM results WHERE key = ? AND version = ?", (key, version))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self):
+        """
+        保存状況を返す
+
+        Returns:
+            dict: entries（件数）, bytes（合計サイズ）, max_bytes
+        """
+        try:
+            count, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+        except sqlite3.Error:
+            count, total = 0, 0
+        return {'entries': count, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        """保存済みの計算結果を全て破棄する"""
+        self._connection().execute("DELETE FROM results")
@@ -0,0 +1,109 @@
+"""
+計算条件の利用ログ
+計算した条件を JSON Lines 形式で追記し、よく使われる条件を集計する
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from utils.cache import input_hash
+
+logger = logging.getLogger(__name__)
+
+# 集計に使用する直近の記録件数
+DEFAULT_WINDOW = 5000
+
+# ファイルの行数がこの倍数を超えたら直近 window 件に切り詰める
+_COMPACT_FACTOR = 4
+
+
+class UsageLog:
+    """
+    計算条件の利用ログ
+
+    1行に1件、{"time": 記録時刻, "inputs": 計算条件} を追記する。
+    配列（入口温度プロファイルなど）を含む条件は記録しない。
+    ファイルの読み書きのエラーは記録・集計の失敗として扱い、計算自体は止めない。
+    """
+
+    def __init__(self, path, window=DEFAULT_WINDOW):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._lines = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def record(self, inputs):
+        """
+        計算条件を1件記録する
+
+        Parameters:
+            inputs: normalize_inputs の戻り値
+        """
+        try:
+            line = json.dumps({'time': time.time(), 'inputs': inputs}, ensure_ascii=False)
+        except TypeError:
+            return
+        try:
+            with self._lock:
+                if self._lines is None:
+                    self._tail()
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+                self._lines += 1
+                if self._lines > self.window * _COMPACT_FACTOR:
+                    self._compact()
+        except OSError as exc:
+            logger.warning("利用ログの記録に失敗しました: %s", exc)
+
+    def _tail(self):
+        """直近 window 行を返す"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        self._lines = len(lines)
+        return lines[-self.window:]
+
+    def _compact(self):
+        """ファイルを直近 window 行に切り詰める"""
+        lines = self._tail()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+        self._lines = len(lines)
+
+    def popular(self, limit):
+        """
+        直近の記録でよく使われた計算条件を返す
+
+        Parameters:
+            limit: 返す件数の上限
+
+        Returns:
+            list: 計算条件（使用回数の多い順）
+        """
+        try:
+            with self._lock:
+                lines = self._tail()
+        except OSError as exc:
+            logger.warning("利用ログの読み込みに失敗しました: %s", exc)
+            return []
+        counts = Counter()
+        first = {}
+        for line in lines:
+            try:
+                inputs = json.loads(line)['inputs']
+            except (ValueError, KeyError, TypeError):
+                # 書き込み途中の行や壊れた行は読み飛ばす
+                continue
+            key = input_hash(inputs)
+            counts[key] += 1
+            first.setdefault(key, inputs)
+        return [first[key] for key, _ in counts.most_common(limit)]